@@ -1,15 +1,109 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
 from logging import getLogger
 
-from fastapi import FastAPI, HTTPException
+from typing import Literal, Optional
+
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from core.config import settings
-from schemas.endpoints import RepositoryRequest
+from schemas.endpoints import BatchRepositoryRequest, RepositoryRequest, TemplateRequest
 from tools.app_functions import send_files_to_model
+from tools.batch import stream_batch_review
+from tools.clients import check_clients_health, close_clients
+from tools.metrics import render_metrics, track_review_cost
+from tools.rate_limit import call_github
+from tools.jobs import create_review_job, get_review_job, run_review_job, stream_review_job_events
+from tools.review_cache import get_review_cache_stats
+from tools.review_queue import enqueue_review_job
+from tools.review_store import (
+    ReviewRecorder,
+    get_stored_review,
+    hash_assignment,
+    list_stored_reviews,
+    prune_review_store,
+    store_review,
+)
+from tools.single_flight import build_review_flight_key, get_single_flight_stats, run_single_flight
+from tools.templates import register_assignment_template
 from tools.texts import clear_github_url
+from tools.tiered_cache import get_local_cache_stats, start_cache_invalidation
+from tools.utils import get_head_commit_sha
 
 
 logger = getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Checks the backends, prunes the review store and starts listening to cache
+    invalidations on startup, and closes the shared client connections on shutdown.
+    """
+    health = await check_clients_health()
+    unavailable = [backend for backend, status in health.items() if status == "unavailable"]
+    if unavailable:
+        logger.warning(f"Unavailable backends on startup: {', '.join(unavailable)}")
+    if settings.ENABLE_REVIEW_STORE:
+        await asyncio.to_thread(prune_review_store)
+    start_cache_invalidation()
+    yield
+    await close_clients()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    """
+    Endpoint reporting the status of the backends the application depends on.
+
+    Returns:
+        dict: The status of Redis and GitHub (ok, disabled or unavailable).
+
+    Raises:
+        HTTPException: 503 if a backend is unavailable.
+    """
+    backends = await check_clients_health()
+    if "unavailable" in backends.values():
+        raise HTTPException(status_code=503, detail=backends)
+    return backends
+
+
+@app.get("/stats")
+async def stats():
+    """
+    Endpoint reporting how much work the caches and request coalescing saved.
+
+    Returns:
+        dict: The review cache counters (hits, misses, entries), the in-process cache counters
+              of this replica (entries, bytes, hits, misses, evictions) and the single-flight
+              counters (leaders, coalesced, takeovers).
+    """
+    return {
+        "review_cache": await asyncio.to_thread(get_review_cache_stats),
+        "local_cache": get_local_cache_stats(),
+        "single_flight": await get_single_flight_stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Endpoint exposing the metrics of this process in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: The stage and model call latency histograms, and the
+                           token and cache counters.
+
+    Raises:
+        HTTPException: 404 if `METRICS_ENABLED` is not set.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.post("/review")
@@ -23,6 +117,10 @@ async def review_repository(request: RepositoryRequest):
     using an AI model that analyzes the repository files and provides feedback
     on code quality, areas of improvement, and overall performance.
 
+    Concurrent requests for the same repository commit, level and assignment,
+    on any replica, share a single review computation, and its cost. The review
+    is kept in the review store (see `GET /history`).
+
     Args:
         request (RepositoryRequest): The request body containing the GitHub repository URL,
                                       the candidate's level (Junior, Middle, Senior), and the
@@ -30,7 +128,9 @@ async def review_repository(request: RepositoryRequest):
 
     Returns:
         dict: A dictionary containing the review result, including a summary of the
-              repository analysis.
+              repository analysis, and the cost of the review: its duration, the seconds
+              spent in each pipeline stage, the review cache hits and misses, and the
+              model calls and tokens.
 
     Raises:
         HTTPException: If any error occurs during processing, a 500 HTTP exception is raised
@@ -38,12 +138,268 @@ async def review_repository(request: RepositoryRequest):
     """
     try:
         repo_name = clear_github_url(str(request.github_repo_url))
-        repo = settings.github_client.get_repo(repo_name)
-        result = send_files_to_model(
-            repo=repo,
-            candidate_level=request.candidate_level,
-            assignment_description=request.assignment_description,
+        repo = await asyncio.to_thread(call_github, settings.github_client.get_repo, repo_name)
+        commit_sha = await asyncio.to_thread(get_head_commit_sha, repo)
+
+        async def review_with_cost() -> dict:
+            recorder = ReviewRecorder()
+            with track_review_cost() as cost:
+                review = await send_files_to_model(
+                    repo=repo,
+                    candidate_level=request.candidate_level,
+                    assignment_description=request.assignment_description,
+                    on_files_selected=recorder.on_files_selected,
+                    on_file_reviewed=recorder.on_file_reviewed,
+                    commit_sha=commit_sha,
+                )
+            await store_review(
+                repo_name,
+                commit_sha,
+                request.candidate_level,
+                request.assignment_description,
+                review,
+                recorder.file_reviews,
+                cost.as_dict(),
+            )
+            return {"review": review, "cost": cost.as_dict()}
+
+        return await run_single_flight(
+            build_review_flight_key(
+                repo_name, commit_sha, request.candidate_level, request.assignment_description
+            ),
+            review_with_cost,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/review/batch")
+async def review_repositories_batch(request: BatchRepositoryRequest):
+    """
+    Endpoint to review several GitHub repositories for the same assignment in one request.
+
+    The repositories are reviewed concurrently with shared limits on the files in
+    flight and the tokens per minute, and files with identical content across
+    repositories are reviewed once. Each result is streamed back as a line of
+    JSON as soon as its review is done.
+
+    Args:
+        request (BatchRepositoryRequest): The request body containing the GitHub repository URLs,
+                                          the candidate's level (Junior, Middle, Senior), and the
+                                          assignment description.
+
+    Returns:
+        StreamingResponse: The ``application/x-ndjson`` response, one line per repository
+                           with its review and cost, or its error.
+
+    Raises:
+        HTTPException: 400 if there are more than `BATCH_REVIEW_MAX_REPOSITORIES` repositories.
+    """
+    if len(request.github_repo_urls) > settings.BATCH_REVIEW_MAX_REPOSITORIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_REVIEW_MAX_REPOSITORIES} repositories can be reviewed at once.",
+        )
+    results = stream_batch_review(
+        [str(url) for url in request.github_repo_urls],
+        request.candidate_level,
+        request.assignment_description,
+    )
+    return StreamingResponse(
+        (json.dumps(result) + "\n" async for result in results),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/templates")
+async def register_template(request: TemplateRequest):
+    """
+    Endpoint to register the starter repository handed out with an assignment.
+
+    Reviews for the assignment then skip the files identical to a file of the
+    starter repository, and send the files changed from it as a diff.
+
+    Args:
+        request (TemplateRequest): The request body containing the GitHub URL of the starter
+                                   repository and the assignment description.
+
+    Returns:
+        dict: The indexed repository, its commit and its number of files.
+
+    Raises:
+        HTTPException: 503 if Redis is disabled, or 500 if the repository cannot be indexed.
+    """
+    if not settings.ENABLE_REDIS:
+        raise HTTPException(status_code=503, detail="Assignment templates require Redis to be enabled.")
+    try:
+        repo_name = clear_github_url(str(request.github_repo_url))
+        repo = await asyncio.to_thread(call_github, settings.github_client.get_repo, repo_name)
+        template = await asyncio.to_thread(
+            register_assignment_template, repo, request.assignment_description
         )
-        return {"review": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "repository": template.repository,
+        "commit_sha": template.commit_sha,
+        "files": len(template.blob_shas),
+    }
+
+
+@app.post("/reviews", status_code=202)
+async def submit_review(request: RepositoryRequest, background_tasks: BackgroundTasks):
+    """
+    Endpoint to submit a GitHub repository review as a background job.
+
+    The review is computed by a background task running the same pipeline as
+    `/review`, or, when `REVIEW_EXECUTION` is ``queue``, fanned out as per-file
+    tasks to the workers started with `python worker.py`. The job state is kept
+    in Redis so that any replica can report on it. The job can then be polled
+    with `GET /reviews/{job_id}` or followed with `GET /reviews/{job_id}/events`.
+
+    Args:
+        request (RepositoryRequest): The request body containing the GitHub repository URL,
+                                      the candidate's level (Junior, Middle, Senior), and the
+                                      assignment description.
+        background_tasks (BackgroundTasks): The tasks run once the response is sent.
+
+    Returns:
+        dict: A dictionary containing the job identifier and its status.
+
+    Raises:
+        HTTPException: 503 if Redis is disabled, or 500 if the job cannot be created.
+    """
+    if not settings.ENABLE_REDIS:
+        raise HTTPException(status_code=503, detail="Review jobs require Redis to be enabled.")
+    try:
+        repo_name = clear_github_url(str(request.github_repo_url))
+        job_id = await create_review_job(repo_name, request.candidate_level)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    background_tasks.add_task(
+        enqueue_review_job if settings.REVIEW_EXECUTION == "queue" else run_review_job,
+        job_id,
+        repo_name,
+        request.candidate_level,
+        request.assignment_description,
+    )
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/reviews/{job_id}")
+async def get_review(job_id: str):
+    """
+    Endpoint to get the status and progress of a review job.
+
+    Args:
+        job_id (str): The identifier returned by `POST /reviews`.
+
+    Returns:
+        dict: The job status (queued, running, completed, failed), the number of files
+              done and in total, the tokens used, and the review or error once finished.
+
+    Raises:
+        HTTPException: 404 if the job does not exist or has expired.
+    """
+    job = await get_review_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Review job not found.")
+    return job
+
+
+@app.get("/reviews/{job_id}/events")
+async def stream_review_events(job_id: str, last_event_id: str = Header("0")):
+    """
+    Endpoint streaming the events of a review job as Server-Sent Events.
+
+    A ``file`` event is sent with the review of each file as soon as it is
+    reviewed, followed by a final ``completed`` or ``failed`` event. Clients
+    reconnecting with the ``Last-Event-ID`` header resume after that event.
+
+    Args:
+        job_id (str): The identifier returned by `POST /reviews`.
+        last_event_id (str): The id of the last event received, from the ``Last-Event-ID`` header.
+
+    Returns:
+        StreamingResponse: The ``text/event-stream`` response.
+
+    Raises:
+        HTTPException: 404 if the job does not exist or has expired.
+    """
+    if await get_review_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Review job not found.")
+    return StreamingResponse(
+        stream_review_job_events(job_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/history")
+async def list_history(
+    repository: Optional[str] = None,
+    commit_sha: Optional[str] = None,
+    candidate_level: Optional[Literal["Junior", "Middle", "Senior"]] = None,
+    assignment_description: Optional[str] = None,
+    assignment_hash: Optional[str] = None,
+    before: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    Endpoint listing past reviews from the review store, most recent first, without calling GitHub or the model.
+
+    The review store is the SQLite database of this replica (see `list_stored_reviews`).
+
+    Args:
+        repository (str, optional): Only the reviews of this repository (username/repository).
+        commit_sha (str, optional): Only the reviews of this commit.
+        candidate_level (str, optional): Only the reviews for this level.
+        assignment_description (str, optional): Only the reviews of this assignment.
+        assignment_hash (str, optional): Only the reviews of the assignment with this hash, as listed.
+        before (int, optional): Only the reviews older than the one with this identifier, for the next page.
+        limit (int, optional): The maximum number of reviews, at most 100. Defaults to 20.
+
+    Returns:
+        dict: The ``reviews``, with their identifier, repository, commit, level, assignment hash,
+              model, prompt version, cost and creation time.
+
+    Raises:
+        HTTPException: 503 if the review store is disabled.
+    """
+    if not settings.ENABLE_REVIEW_STORE:
+        raise HTTPException(status_code=503, detail="The review store is disabled.")
+    if assignment_description is not None:
+        assignment_hash = hash_assignment(assignment_description)
+    reviews = await asyncio.to_thread(
+        list_stored_reviews,
+        repository=repository,
+        commit_sha=commit_sha,
+        candidate_level=candidate_level,
+        assignment_hash=assignment_hash,
+        before=before,
+        limit=limit,
+    )
+    return {"reviews": reviews}
+
+
+@app.get("/history/{review_id}")
+async def get_history(review_id: int):
+    """
+    Endpoint returning a past review from the review store, without calling GitHub or the model.
+
+    Args:
+        review_id (int): The identifier of the review, as listed by `GET /history`.
+
+    Returns:
+        dict: The repository, commit, level, assignment, model, prompt version, review, cost
+              and the review of each file of the review.
+
+    Raises:
+        HTTPException: 503 if the review store is disabled, or 404 if the review does not exist or was pruned.
+    """
+    if not settings.ENABLE_REVIEW_STORE:
+        raise HTTPException(status_code=503, detail="The review store is disabled.")
+    review = await asyncio.to_thread(get_stored_review, review_id)
+    if review is None:
+        raise HTTPException(status_code=404, detail="Review not found.")
+    return review
@@ -0,0 +1,80 @@
+import argparse
+import json
+import statistics
+import time
+from typing import Callable, List
+
+from core.config import settings
+from tools.texts import estimate_tokens, get_token_counter, split_by_tokens, split_large_file
+
+
+def generate_source(size_bytes: int) -> str:
+    """
+    Generates synthetic Python source of roughly `size_bytes` bytes.
+    """
+    blocks = []
+    total = 0
+    index = 0
+    while total < size_bytes:
+        block = (
+            f"class Service{index}:\n"
+            f"    def handle(self, request):\n"
+            f"        payload = request.get('payload', {{}})\n"
+            f"        if not payload:\n"
+            f"            raise ValueError('empty payload {index}')\n"
+            f"        return {{key: value for key, value in payload.items() if value}}\n"
+            f"\n"
+            f"\n"
+            f"def helper_{index}(values):\n"
+            f"    return sorted(value * {index} for value in values)\n"
+            f"\n"
+        )
+        blocks.append(block)
+        total += len(block)
+        index += 1
+    return "".join(blocks)
+
+
+def measure(split: Callable[[], List[str]], count_tokens: Callable[[str], int], repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = split()
+        timings.append(time.perf_counter() - started)
+    chunk_tokens = [count_tokens(chunk) for chunk in chunks]
+    return {
+        "seconds": round(min(timings), 4),
+        "chunks": len(chunks),
+        "max_chunk_tokens": max(chunk_tokens),
+        "mean_chunk_tokens": round(statistics.mean(chunk_tokens), 1),
+        "stdev_chunk_tokens": round(statistics.pstdev(chunk_tokens), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare split_large_file with split_by_tokens.")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[0.25, 1, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    count_tokens = get_token_counter(settings.model_name)
+    results = []
+    for size_mb in args.sizes_mb:
+        source = generate_source(int(size_mb * 1024 * 1024))
+        results.append({
+            "size_mb": size_mb,
+            "tokenizer": "estimate" if count_tokens is estimate_tokens else settings.model_name,
+            "split_large_file": measure(
+                lambda: split_large_file(source, settings.LLM_API_CHAR_LIMIT), count_tokens, args.repeat
+            ),
+            "split_by_tokens": measure(
+                lambda: split_by_tokens(source, settings.LLM_CHUNK_TOKEN_LIMIT, count_tokens),
+                count_tokens,
+                args.repeat,
+            ),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
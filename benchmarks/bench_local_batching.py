@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from contextlib import ExitStack
+from typing import List
+
+from tests.fake_local_model import FakeLocalModelServer
+from tools.local_inference import LocalBatchedChatModel, LocalInferenceBackend
+
+
+async def measure(
+    endpoints: List[str], api: str, prompts: int, concurrency: int, max_batch_size: int, max_wait_seconds: float
+) -> dict:
+    backend = LocalInferenceBackend(
+        endpoints, "llama3", api=api, max_batch_size=max_batch_size, max_wait_seconds=max_wait_seconds
+    )
+    model = LocalBatchedChatModel(backend=backend)
+    # Bounds the prompts in flight, like REVIEW_CONCURRENCY bounds the files reviewed at once.
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def send(index: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await model.ainvoke(f"Review chunk {index}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(index) for index in range(prompts)))
+    seconds = time.perf_counter() - started
+    await backend.aclose()
+    latencies.sort()
+    return {
+        "prompts_per_second": round(prompts / seconds, 2),
+        "p50_latency_seconds": round(latencies[len(latencies) // 2], 3),
+        "p95_latency_seconds": round(latencies[int(len(latencies) * 0.95)], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the throughput of batched local inference against stub CPU model servers, "
+        "compared with sending each prompt in its own request."
+    )
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--api", choices=["completions", "ollama"], default="completions")
+    parser.add_argument("--endpoints", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--max-wait-seconds", type=float, default=0.02)
+    parser.add_argument(
+        "--parallel", type=int, default=1, help="Prompts of concurrent requests a stub generates together."
+    )
+    parser.add_argument("--base-seconds", type=float, default=0.1, help="Fixed cost of a generation step.")
+    parser.add_argument("--per-prompt-seconds", type=float, default=0.01, help="Cost of each prompt of a step.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    results = {"prompts": args.prompts, "concurrency": args.concurrency, "api": args.api, "runs": []}
+    for endpoint_count in args.endpoints:
+        unbatched_throughput = None
+        # The first run sends every prompt in its own request, as without batching.
+        for max_batch_size in [1, *args.batch_sizes]:
+            with ExitStack() as stack:
+                servers = [
+                    stack.enter_context(
+                        FakeLocalModelServer(args.base_seconds, args.per_prompt_seconds, args.parallel)
+                    )
+                    for _ in range(endpoint_count)
+                ]
+                run = asyncio.run(
+                    measure(
+                        [server.base_url for server in servers],
+                        args.api,
+                        args.prompts,
+                        args.concurrency,
+                        max_batch_size,
+                        args.max_wait_seconds if max_batch_size > 1 else 0,
+                    )
+                )
+                batch_sizes = [size for server in servers for size in server.batch_sizes]
+            unbatched_throughput = unbatched_throughput or run["prompts_per_second"]
+            results["runs"].append(
+                {
+                    "endpoints": endpoint_count,
+                    "max_batch_size": max_batch_size,
+                    **run,
+                    "speedup_over_unbatched": round(run["prompts_per_second"] / unbatched_throughput, 2),
+                    "mean_batch_size": round(sum(batch_sizes) / len(batch_sizes), 2),
+                    "batches_per_endpoint": [len(server.batch_sizes) for server in servers],
+                }
+            )
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import json
+from unittest.mock import patch
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from benchmarks.bench_chunker import generate_source
+from benchmarks.fakes import PromptTokenCounter
+from core.config import settings
+from tools.texts import get_token_counter, split_by_tokens
+from tools.usage import TokenUsageHandler
+from tools.utils import process_file
+
+
+async def review_tokens(mode: str, file_chunks, count_tokens, response_tokens: int) -> dict:
+    counter = PromptTokenCounter(count_tokens)
+    usage = TokenUsageHandler()
+    model = FakeListChatModel(responses=["note " * response_tokens], callbacks=[counter, usage])
+    with patch.object(settings, "GENERATIVE_MODEL", model), patch.object(settings, "REVIEW_MODE", mode):
+        await process_file(file_chunks, "synthetic.py", "Middle", "Synthetic assignment")
+    return {
+        "calls": counter.calls,
+        "prompt_tokens": counter.prompt_tokens,
+        # The estimated share of the prompt tokens which a prompt cache could serve.
+        "cached_prefix_ratio": round(usage.cached_prefix_ratio, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare prompt tokens of the chunk review modes.")
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--response-tokens", type=int, default=200)
+    args = parser.parse_args()
+
+    count_tokens = get_token_counter(settings.model_name)
+    results = []
+    for size_kb in args.sizes_kb:
+        file_chunks = split_by_tokens(
+            generate_source(size_kb * 1024), settings.LLM_CHUNK_TOKEN_LIMIT, count_tokens
+        )
+        conversation = await review_tokens("conversation", file_chunks, count_tokens, args.response_tokens)
+        map_reduce = await review_tokens("map_reduce", file_chunks, count_tokens, args.response_tokens)
+        results.append({
+            "size_kb": size_kb,
+            "chunks": len(file_chunks),
+            "conversation": conversation,
+            "map_reduce": map_reduce,
+            "prompt_token_ratio": round(conversation["prompt_tokens"] / map_reduce["prompt_tokens"], 2),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import json
+import logging
+import resource
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import httpx
+from github import Github
+
+from app import app
+from benchmarks.fakes import (
+    PromptTokenCounter,
+    SlowFakeChatModel,
+    SyntheticGithubServer,
+    synthetic_repository_files,
+)
+from core.config import settings
+from tools.texts import get_token_counter
+
+
+async def run_reviews(client: httpx.AsyncClient, requests: int, concurrency: int, same_assignment: bool):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def review(index: int):
+        assignment = "Synthetic assignment" if same_assignment else f"Synthetic assignment {index}"
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/review",
+                json={
+                    "github_repo_url": "https://github.com/username/repository",
+                    "candidate_level": "Middle",
+                    "assignment_description": assignment,
+                },
+            )
+            latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(review(index) for index in range(requests)))
+    return time.perf_counter() - started, latencies
+
+
+def percentiles(latencies):
+    if len(latencies) == 1:
+        return {name: round(latencies[0] * 1000, 1) for name in ("p50_ms", "p95_ms", "p99_ms")}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 1),
+        "p95_ms": round(cuts[94] * 1000, 1),
+        "p99_ms": round(cuts[98] * 1000, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the /review pipeline against a fake model and a fake GitHub API."
+    )
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--file-bytes", type=int, default=4096)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-seconds", type=float, default=0.05)
+    parser.add_argument("--response-tokens", type=int, default=100)
+    parser.add_argument(
+        "--same-assignment", action="store_true",
+        help="Send identical requests, so that concurrent ones are coalesced.",
+    )
+    parser.add_argument(
+        "--trace-memory", action="store_true",
+        help="Also report the peak of Python allocations, at the cost of a slower run.",
+    )
+    parser.add_argument("--output", help="Also write the JSON results to this file.")
+    args = parser.parse_args()
+    # Per-file logs would dominate the output and the measured time.
+    logging.disable(logging.INFO)
+
+    count_tokens = get_token_counter(settings.model_name)
+    counter = PromptTokenCounter(count_tokens)
+    model = SlowFakeChatModel(
+        responses=["note " * args.response_tokens],
+        latency_seconds=args.latency_seconds,
+        callbacks=[counter],
+    )
+    files = synthetic_repository_files(args.files, args.file_bytes)
+    with SyntheticGithubServer(files) as server, ExitStack() as stack:
+        github_client = Github(
+            base_url=server.base_url,
+            pool_size=settings.GITHUB_POOL_SIZE,
+            retry=None,
+            seconds_between_requests=None,
+        )
+        # Redis is left out, so that every request goes through the whole pipeline.
+        for name, value in (
+            ("ENABLE_REDIS", False),
+            ("GENERATIVE_MODEL", model),
+            ("github_client", github_client),
+        ):
+            stack.enter_context(patch.object(settings, name, value))
+        server.tarball()
+        if args.trace_memory:
+            tracemalloc.start()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            elapsed, latencies = await run_reviews(
+                client, args.requests, args.concurrency, args.same_assignment
+            )
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+        tracemalloc.stop()
+        github_calls = sum(server.requests.values())
+
+    results = {
+        "files": args.files,
+        "file_bytes": args.file_bytes,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "model_latency_seconds": args.latency_seconds,
+        "requests_per_second": round(args.requests / elapsed, 2),
+        **percentiles(latencies),
+        "llm_calls_per_review": round(counter.calls / args.requests, 2),
+        "prompt_tokens_per_review": round(counter.prompt_tokens / args.requests),
+        "github_calls_per_review": round(github_calls / args.requests, 2),
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if traced_peak is not None:
+        results["peak_traced_mb"] = round(traced_peak / 2**20, 1)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import Callable, List
+from unittest.mock import patch
+
+from tools import review_store
+from tools.review_store import (
+    close_review_store,
+    get_stored_review,
+    hash_assignment,
+    list_stored_reviews,
+    save_review,
+)
+
+ASSIGNMENTS = [f"Assignment {index}: build a REST API with tests." for index in range(10)]
+LEVELS = ["Junior", "Middle", "Senior"]
+
+
+def measure(operation: Callable[[], object], runs: int) -> dict:
+    latencies: List[float] = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the write and read latencies of the review store.")
+    parser.add_argument("--reviews", type=int, default=10000)
+    parser.add_argument("--repositories", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=30, help="File reviews of each review.")
+    parser.add_argument("--file-review-bytes", type=int, default=1500)
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as directory, \
+            patch.object(review_store.settings, "REVIEW_STORE_PATH", os.path.join(directory, "reviews.sqlite3")), \
+            patch.object(review_store.settings, "REVIEW_STORE_MAX_REVIEWS", 0), \
+            patch.object(review_store, "PRUNE_EVERY_SAVES", args.reviews + args.runs + 1):
+        file_review = ("Consider extracting this logic into a function. " * 64)[: args.file_review_bytes]
+        file_reviews = {f"src/module_{index}.py": file_review for index in range(args.files)}
+
+        def save() -> int:
+            return save_review(
+                f"candidate-{random.randrange(args.repositories)}/api",
+                f"{random.getrandbits(160):040x}",
+                random.choice(LEVELS),
+                random.choice(ASSIGNMENTS),
+                "Overall, the repository is well structured.",
+                file_reviews,
+                {"seconds": 12.4, "total_tokens": 54242},
+            )
+
+        started = time.perf_counter()
+        review_ids = [save() for _ in range(args.reviews)]
+        populate_seconds = time.perf_counter() - started
+        stored = get_stored_review(review_ids[0])
+
+        results = {
+            "reviews": args.reviews,
+            "files": args.files,
+            "populate_seconds": round(populate_seconds, 2),
+            "database_mb": round(os.path.getsize(review_store.settings.REVIEW_STORE_PATH) / 2**20, 1),
+            "save": measure(save, args.runs),
+            "get": measure(lambda: get_stored_review(random.choice(review_ids)), args.runs),
+            "list_recent": measure(lambda: list_stored_reviews(limit=20), args.runs),
+            "list_by_repository": measure(
+                lambda: list_stored_reviews(repository=f"candidate-{random.randrange(args.repositories)}/api"),
+                args.runs,
+            ),
+            "list_by_commit": measure(
+                lambda: list_stored_reviews(repository=stored["repository"], commit_sha=stored["commit_sha"]),
+                args.runs,
+            ),
+            "list_by_assignment_and_level": measure(
+                lambda: list_stored_reviews(
+                    assignment_hash=hash_assignment(random.choice(ASSIGNMENTS)),
+                    candidate_level=random.choice(LEVELS),
+                    before=random.choice(review_ids),
+                ),
+                args.runs,
+            ),
+        }
+        close_review_store()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import json
+import logging
+import random
+import time
+import tracemalloc
+from typing import Callable, List
+from unittest.mock import patch
+
+from benchmarks.bench_chunker import generate_source
+from benchmarks.fakes import SyntheticGithubServer, synthetic_repository_files
+from core.config import settings
+from tools.filters import select_review_files
+from tools.snapshot import RepositorySnapshot, load_repository_snapshot
+from tools.texts import get_token_counter, iter_chunks_by_tokens, iter_lines, split_by_tokens
+
+
+def generate_data_file(seed: int, size_bytes: int) -> bytes:
+    """
+    Generates CSV measurements of about `size_bytes` bytes, compressing like real data rather than repeated rows.
+    """
+    generator = random.Random(seed)
+    rows = ["timestamp,sensor,value\n"]
+    total = len(rows[0])
+    while total < size_bytes:
+        rows.append(f"{1700000000 + len(rows)},{generator.randrange(100)},{generator.random():.6f}\n")
+        total += len(rows[-1])
+    return "".join(rows).encode()
+
+
+def trace_peak(run: Callable[[], object]) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 3), "peak_traced_mb": round(peak / 2 ** 20, 2)}
+
+
+def measure_snapshot(server: SyntheticGithubServer, memory_file_bytes: int) -> dict:
+    repo = server.client().get_repo(server.full_name)
+
+    def load():
+        with patch("tools.snapshot.settings.SNAPSHOT_MEMORY_FILE_BYTES", memory_file_bytes):
+            snapshot = load_repository_snapshot(repo, commit_sha=server.commit_sha)
+        select_review_files(snapshot)
+        return snapshot
+
+    return trace_peak(load)
+
+
+def measure_chunking(source: bytes, count_tokens) -> dict:
+    snapshot = RepositorySnapshot(
+        full_name="username/repository", commit_sha="sha", blob_shas={"large.py": "blob"}, files={"large.py": source}
+    )
+
+    def whole() -> List[str]:
+        return split_by_tokens(snapshot.read_bytes("large.py").decode(), settings.LLM_CHUNK_TOKEN_LIMIT, count_tokens)
+
+    def streamed() -> int:
+        # Chunks are consumed one at a time, like a sequential review would.
+        return sum(
+            1
+            for _ in iter_chunks_by_tokens(
+                iter_lines(snapshot.iter_text("large.py")), settings.LLM_CHUNK_TOKEN_LIMIT, count_tokens
+            )
+        )
+
+    return {"whole": trace_peak(whole), "streamed": trace_peak(streamed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the peak memory of loading a repository holding large data files, and of chunking a large file."
+    )
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--file-bytes", type=int, default=4096)
+    parser.add_argument("--data-files", type=int, default=3)
+    parser.add_argument("--data-file-mb", type=float, default=8)
+    parser.add_argument("--chunked-file-mb", type=float, default=4)
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    files = synthetic_repository_files(args.files, args.file_bytes)
+    for index in range(args.data_files):
+        files[f"data/measurements{index}.csv"] = generate_data_file(index, int(args.data_file_mb * 2 ** 20))
+    count_tokens = get_token_counter(settings.model_name)
+
+    with SyntheticGithubServer(files) as server:
+        server.tarball()
+        results = {
+            "files": args.files,
+            "data_files": args.data_files,
+            "data_file_mb": args.data_file_mb,
+            # Large enough to hold every file in memory, as before spilling.
+            "snapshot_in_memory": measure_snapshot(server, max(map(len, files.values()))),
+            "snapshot_spilled": measure_snapshot(server, settings.SNAPSHOT_MEMORY_FILE_BYTES),
+        }
+    source = generate_source(int(args.chunked_file_mb * 2 ** 20)).encode()
+    results["chunked_file_mb"] = args.chunked_file_mb
+    results["chunking"] = measure_chunking(source, count_tokens)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+# The modules a cold start imports: the settings, the API application and the review worker.
+MODULES = ["core.config", "app", "worker"]
+
+# Heavy client libraries which should only be imported on first use.
+LAZY_MODULES = ["langchain_openai", "langchain_ollama", "openai", "langchain.chains"]
+
+
+def measure_import(module: str) -> dict:
+    """
+    Imports a module in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        dict: The cumulative import time in seconds, the packages which took the
+              longest to import, and the lazy modules which were imported anyway.
+    """
+    environment = {
+        "GITHUB_ACCESS_TOKEN": "benchmark",
+        "ENABLE_REDIS": "False",
+        "LOCAL_DEVELOPMENT": "True",
+        **os.environ,
+    }
+    completed = subprocess.run(
+        [
+            sys.executable, "-X", "importtime", "-c",
+            f"import sys, {module}; print(','.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        env=environment,
+        check=True,
+    )
+    # Lines look like "import time: self [us] | cumulative | imported package".
+    total_microseconds = 0
+    packages: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            total_microseconds += int(cumulative)
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(own)
+    imported = set(completed.stdout.strip().split(","))
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:8]
+    return {
+        "seconds": round(total_microseconds / 1e6, 3),
+        "slowest": {name: round(microseconds / 1e6, 3) for name, microseconds in slowest},
+        "lazy_modules_imported": [name for name in LAZY_MODULES if name in imported],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the cold import time of the application and of the worker, against a budget."
+    )
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=3, help="Keep the fastest of this many runs.")
+    parser.add_argument(
+        "--budget-seconds", type=float, default=0, help="Fail when a module takes longer to import (0 disables)."
+    )
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = {}
+    failures: List[str] = []
+    for module in args.modules:
+        runs = [measure_import(module) for _ in range(args.repeat)]
+        results[module] = min(runs, key=lambda run: run["seconds"])
+        if args.budget_seconds and results[module]["seconds"] > args.budget_seconds:
+            failures.append(f"{module} took {results[module]['seconds']}s to import")
+        if results[module]["lazy_modules_imported"]:
+            failures.append(f"{module} imported {', '.join(results[module]['lazy_modules_imported'])}")
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if failures:
+        sys.exit("Startup budget exceeded: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
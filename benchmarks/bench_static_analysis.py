@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from unittest.mock import patch
+
+from tools import static_analysis
+from tools.static_analysis import AnalysisOptions, analyze_file, analyze_source, shutdown_static_analysis
+from tools.texts import estimate_tokens
+
+
+def load_sources(directory: str) -> dict:
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*.py"), recursive=True)):
+        with open(path, encoding="utf-8") as source:
+            sources[os.path.relpath(path, directory)] = source.read()
+    return sources
+
+
+async def analyze_in_pool(sources: dict, workers: int) -> float:
+    with patch.object(static_analysis.settings, "STATIC_ANALYSIS_WORKERS", workers):
+        shutdown_static_analysis()
+        # The workers are started before timing, as they are once per process.
+        await asyncio.gather(*(analyze_file(path, "") for path in list(sources)[:workers]))
+        started = time.perf_counter()
+        await asyncio.gather(*(analyze_file(path, text) for path, text in sources.items()))
+        elapsed = time.perf_counter() - started
+        shutdown_static_analysis()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the static analysis of Python files, and the files and prompt tokens it saves."
+    )
+    parser.add_argument("--directory", default=".", help="Directory whose Python files are analyzed.")
+    parser.add_argument("--copies", type=int, default=5, help="Times each file is analyzed, to weigh down startup.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    files = load_sources(args.directory)
+    sources = {f"{index}/{path}": text for index in range(args.copies) for path, text in files.items()}
+    options = AnalysisOptions.from_settings()
+    started = time.perf_counter()
+    analyses = [analyze_source(path, text, options) for path, text in sources.items()]
+    serial_seconds = time.perf_counter() - started
+
+    trivial = [analysis for analysis in analyses if analysis.is_trivial]
+    total_tokens = sum(estimate_tokens(text) for text in files.values()) * args.copies
+    digest_tokens = sum(estimate_tokens(analysis.digest()) for analysis in analyses if not analysis.is_trivial)
+    skipped_tokens = sum(estimate_tokens(sources[analysis.file_path]) for analysis in trivial)
+    results = {
+        "files": len(sources),
+        "findings": sum(len(analysis.findings) for analysis in analyses),
+        "trivial_files": len(trivial),
+        "file_tokens": total_tokens,
+        "skipped_file_tokens": skipped_tokens,
+        "added_digest_tokens": digest_tokens,
+        "serial_seconds": round(serial_seconds, 3),
+        "pool_seconds": {
+            str(workers): round(asyncio.run(analyze_in_pool(sources, workers)), 3) for workers in args.workers
+        },
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
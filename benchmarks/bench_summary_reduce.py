@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+from benchmarks.fakes import PromptTokenCounter, SlowFakeChatModel
+from core.config import settings
+from tools.summary_reduce import reduce_file_reviews
+from tools.texts import get_token_counter
+
+
+def synthetic_reviews(files: int, review_tokens: int):
+    # Ten top-level packages, each split in modules of ten files.
+    return [
+        (f"package{index % 10}/module{index // 100}/file{index}.py", "finding " * review_tokens)
+        for index in range(files)
+    ]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure the reduction of file reviews as repositories grow.")
+    parser.add_argument("--files", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--review-tokens", type=int, default=150)
+    parser.add_argument("--latency-seconds", type=float, default=0.05)
+    args = parser.parse_args()
+
+    count_tokens = get_token_counter(settings.model_name)
+    # The fake model condenses to about the target size, like the prompt asks.
+    response = "finding"
+    while count_tokens(response) < settings.REVIEW_GROUP_SUMMARY_TOKENS:
+        response += " finding"
+    results = []
+    for files in args.files:
+        counter = PromptTokenCounter(count_tokens)
+        model = SlowFakeChatModel(
+            responses=[response],
+            latency_seconds=args.latency_seconds,
+            callbacks=[counter],
+        )
+        reviews = synthetic_reviews(files, args.review_tokens)
+        with patch.object(settings, "GENERATIVE_MODEL", model):
+            started = time.perf_counter()
+            file_summaries = await reduce_file_reviews(reviews, "Middle", "Synthetic assignment", count_tokens)
+            elapsed = time.perf_counter() - started
+        results.append({
+            "files": files,
+            "input_tokens": sum(count_tokens(review) for _, review in reviews),
+            "final_prompt_input_tokens": count_tokens(file_summaries),
+            "model_calls": counter.calls,
+            "concurrency": settings.REVIEW_CONCURRENCY,
+            "seconds": round(elapsed, 3),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import asyncio
+from functools import lru_cache
+from typing import Dict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from benchmarks.bench_chunker import generate_source
+from tests.fake_github import FakeGithubServer
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    """
+    Fake chat model answering after a fixed latency, like a remote model would.
+    """
+
+    latency_seconds: float = 0.05
+
+    async def _agenerate(self, *args, **kwargs):
+        await asyncio.sleep(self.latency_seconds)
+        return await super()._agenerate(*args, **kwargs)
+
+
+class PromptTokenCounter(BaseCallbackHandler):
+    """
+    Counts the model calls and the prompt tokens sent to the model.
+    """
+
+    def __init__(self, count_tokens):
+        self.count_tokens = count_tokens
+        self.calls = 0
+        self.prompt_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+        self.prompt_tokens += sum(
+            self.count_tokens(message.content) for batch in messages for message in batch
+        )
+
+
+class SyntheticGithubServer(FakeGithubServer):
+    """
+    Fake GitHub API serving a synthetic repository, building its tarball only once.
+    """
+
+    @lru_cache(maxsize=1)
+    def tarball(self) -> bytes:
+        return super().tarball()
+
+
+def synthetic_repository_files(files: int, file_bytes: int) -> Dict[str, bytes]:
+    """
+    Generates a repository tree of `files` Python files of about `file_bytes` bytes each.
+
+    Files are spread over ten packages of modules of ten files, and each one
+    differs from the others, so that no two files share a git blob.
+    """
+    source = generate_source(file_bytes)
+    tree = {
+        f"package{index % 10}/module{index // 100}/file{index}.py": (
+            f"# file {index}\n{source}".encode()
+        )
+        for index in range(files)
+    }
+    tree["README.md"] = b"# Synthetic repository\n"
+    return tree
@@ -1,12 +1,16 @@
 import logging
+from functools import cached_property
 from logging import getLogger
 
-from github import Github, Auth
 from pydantic_settings import BaseSettings
-from pydantic import field_validator, ValidationInfo
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
-from typing import Optional
+from pydantic import model_validator
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional
+
+from core.providers import create_generative_model, create_github_client
+
+if TYPE_CHECKING:
+    from github import Github
+    from langchain_core.language_models.chat_models import BaseChatModel
 
 logger = getLogger(__name__)
 
@@ -22,73 +26,139 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT_SECONDS: int = 20
+    REDIS_HEALTH_CHECK_INTERVAL_SECONDS: int = 30
 
     CACHE_EXPIRATION_MINUTES: int = 60
+    REVIEW_JOB_TTL_MINUTES: int = 24 * 60
+    REVIEW_JOB_POLL_SECONDS: int = 5
+    CACHE_COMPRESSION_MIN_BYTES: int = 1024
+    LOCAL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LOCAL_CACHE_TTL_SECONDS: int = 300
+    CACHE_INVALIDATION_CHANNEL: str = "cache_invalidation"
+    CACHE_REDIS_RETRY_SECONDS: int = 30
+
+    REVIEW_CONCURRENCY: int = 8
+    BATCH_REVIEW_MAX_REPOSITORIES: int = 50
+    BATCH_REVIEW_CONCURRENCY: int = 4
+    REVIEW_MODE: Literal["map_reduce", "conversation"] = "map_reduce"
+    REVIEW_INCLUDE_GLOBS: List[str] = []
+    REVIEW_EXCLUDE_GLOBS: List[str] = []
+    MAX_REVIEW_FILE_BYTES: int = 100_000
+    SNAPSHOT_MEMORY_FILE_BYTES: int = 256 * 1024
+    REVIEW_TOKEN_BUDGET: int = 0
+
+    REVIEW_EXECUTION: Literal["local", "queue"] = "local"
+    REVIEW_QUEUE_STREAM: str = "review_tasks"
+    REVIEW_QUEUE_GROUP: str = "review_workers"
+    REVIEW_QUEUE_BLOCK_MS: int = 5000
+    REVIEW_TASK_VISIBILITY_TIMEOUT_SECONDS: int = 300
+    REVIEW_TASK_MAX_ATTEMPTS: int = 3
+    WORKER_CONCURRENCY: int = 4
+
+    TEMPLATE_DIFF_MAX_RATIO: float = 0.5
+    TEMPLATE_DIFF_CONTEXT_LINES: int = 3
+
+    ENABLE_INCREMENTAL_REVIEW: bool = True
+    INCREMENTAL_REVIEW_MAX_CHANGED_FILES: int = 100
+    REVIEW_STATE_TTL_DAYS: int = 30
+
+    ENABLE_SINGLE_FLIGHT: bool = True
+    SINGLE_FLIGHT_LEASE_SECONDS: int = 60
+    SINGLE_FLIGHT_POLL_MS: int = 500
+    SINGLE_FLIGHT_RESULT_TTL_SECONDS: int = 60
+
+    METRICS_ENABLED: bool = True
+
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_TOKENS_PER_MINUTE: int = 0
+    GITHUB_REQUESTS_PER_MINUTE: int = 0
+    RATE_LIMIT_MAX_RETRIES: int = 5
+    RATE_LIMIT_BACKOFF_BASE_SECONDS: float = 1.0
+    RATE_LIMIT_BACKOFF_MAX_SECONDS: float = 60.0
+
+    ENABLE_REVIEW_CACHE: bool = True
+    REVIEW_CACHE_TTL_MINUTES: int = 7 * 24 * 60
+    REVIEW_CACHE_MAX_ENTRIES: int = 10000
+
+    ENABLE_REVIEW_STORE: bool = True
+    REVIEW_STORE_PATH: str = "data/reviews.sqlite3"
+    REVIEW_STORE_RETENTION_DAYS: int = 180
+    REVIEW_STORE_MAX_REVIEWS: int = 100_000
+
+    ENABLE_STATIC_ANALYSIS: bool = True
+    STATIC_ANALYSIS_WORKERS: Optional[int] = None
+    STATIC_ANALYSIS_MAX_COMPLEXITY: int = 10
+    STATIC_ANALYSIS_MAX_FINDINGS: int = 30
+    STATIC_ANALYSIS_TRIVIAL_LINES: int = 10
+    STATIC_ANALYSIS_LINTERS: Dict[str, str] = {}
+    STATIC_ANALYSIS_LINTER_TIMEOUT_SECONDS: int = 20
 
     GITHUB_ACCESS_TOKEN: str
+    GITHUB_ARCHIVE_TIMEOUT_SECONDS: int = 60
+    GITHUB_POOL_SIZE: int = 20
+    GITHUB_TIMEOUT_SECONDS: int = 15
     LLM_API_CHAR_LIMIT: int = 2028
+    LLM_CHUNK_TOKEN_LIMIT: int = 1500
+    REVIEW_SUMMARY_TOKEN_BUDGET: int = 6000
+    REVIEW_GROUP_SUMMARY_TOKENS: int = 600
     OPENAI_MODEL_NAME: str = "gpt-4-turbo"
+    LOCAL_MODEL_NAME: str = "llama3"
+    LOCAL_MODEL_ENDPOINTS: List[str] = []
+    LOCAL_MODEL_API: Literal["ollama", "completions"] = "ollama"
+    LOCAL_BATCH_MAX_SIZE: int = 8
+    LOCAL_BATCH_MAX_WAIT_SECONDS: float = 0.02
+    LOCAL_MODEL_MAX_TOKENS: int = 1024
+    LOCAL_MODEL_CHAT_TEMPLATE: Literal["llama3", "chatml"] = "llama3"
     LOCAL_DEVELOPMENT: bool = False
     OPENAI_API_KEY: Optional[str] = None
-    GENERATIVE_MODEL: Optional[ChatOllama | ChatOpenAI] = None
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    LLM_KEEPALIVE_EXPIRY_SECONDS: int = 30
+    LLM_TIMEOUT_SECONDS: int = 120
 
-    github_client: Optional[Github] = None
-
-    @field_validator("GENERATIVE_MODEL")
-    def validate_generative_model(
-        cls, value: Optional[ChatOpenAI | ChatOllama], info: ValidationInfo
-    ):
+    @model_validator(mode="after")
+    def validate_credentials(self) -> "Settings":
         """
-        Validates and initializes the appropriate generative model based on LOCAL_DEVELOPMENT.
-
-        Args:
-            value: The current value of the GENERATIVE_MODEL field.
-            info: Validation information containing other field values.
-
-        Returns:
-            The appropriate generative model (ChatOpenAI or ChatOllama).
+        Checks the credentials of the clients at startup, although the clients are created on first use.
 
         Raises:
-            ValueError: If OPENAI_API_KEY is missing when LOCAL_DEVELOPMENT is False.
-        """
-        if info.data.get("LOCAL_DEVELOPMENT", False):
-            logger.info("Using local development model: Llama3")
-            return ChatOllama(model="llama3")
-
-        openai_api_key = info.data.get("OPENAI_API_KEY")
-        if not openai_api_key:
-            raise ValueError(
-                "OPENAI_API_KEY must be provided when LOCAL_DEVELOPMENT is False."
-            )
-
-        logger.info("Using remote model: OpenAI GPT")
-        return ChatOpenAI(
-            model=info.data.get("OPENAI_MODEL_NAME", "gpt-4-turbo"),
-            openai_api_key=openai_api_key,
-        )
-
-    @field_validator("github_client", mode="before")
-    def validate_github_client(cls, value: Optional[Github], info: ValidationInfo):
+            ValueError: If GITHUB_ACCESS_TOKEN is empty, or OPENAI_API_KEY is missing when
+                        LOCAL_DEVELOPMENT is False.
         """
-        Validates and initializes the GitHub client.
+        if not self.GITHUB_ACCESS_TOKEN:
+            raise ValueError("GITHUB_ACCESS_TOKEN must be provided.")
+        if not self.LOCAL_DEVELOPMENT and not self.OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY must be provided when LOCAL_DEVELOPMENT is False.")
+        return self
 
-        Args:
-            value: The current value of the github_client field.
-            info: Validation information containing other field values.
+    @cached_property
+    def GENERATIVE_MODEL(self) -> "BaseChatModel":
+        """
+        The generative model reviews are produced with (see `create_generative_model`), created on first use.
+        """
+        return create_generative_model(self)
 
-        Returns:
-            The initialized GitHub client.
+    @cached_property
+    def github_client(self) -> "Github":
+        """
+        The GitHub client (see `create_github_client`), created on first use.
+        """
+        return create_github_client(self)
 
-        Raises:
-            ValueError: If GITHUB_ACCESS_TOKEN is missing.
+    def is_created(self, client_name: str) -> bool:
         """
-        github_access_token = info.data.get("GITHUB_ACCESS_TOKEN")
-        if not github_access_token:
-            raise ValueError("GITHUB_ACCESS_TOKEN must be provided.")
+        Tells whether a client created on first use, such as ``github_client``, was created.
+        """
+        return client_name in self.__dict__
 
-        logger.info("Initializing GitHub client...")
-        auth = Auth.Token(github_access_token)
-        return Github(auth=auth)
+    @property
+    def model_name(self) -> str:
+        """
+        Name of the generative model reviews are produced with.
+        """
+        return self.LOCAL_MODEL_NAME if self.LOCAL_DEVELOPMENT else self.OPENAI_MODEL_NAME
 
     model_config = {
         "env_file": ".env",
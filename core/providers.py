@@ -0,0 +1,102 @@
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from github import Github
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+    from core.config import Settings
+
+logger = getLogger(__name__)
+
+# The client libraries are imported by the factories, on first use: importing them
+# takes most of the startup time of the application and of the review workers.
+
+
+def create_generative_model(settings: "Settings") -> "BaseChatModel":
+    """
+    Creates the generative model reviews are produced with, based on LOCAL_DEVELOPMENT.
+
+    In development, prompts are batched over LOCAL_MODEL_ENDPOINTS when set (see
+    `tools.local_inference`), and sent one at a time to a local Ollama otherwise.
+
+    The model's HTTP clients keep up to LLM_MAX_KEEPALIVE_CONNECTIONS connections
+    alive between calls, out of at most LLM_MAX_CONNECTIONS. Retries are left to
+    `tools.rate_limit`, which needs the rate-limit headers of the responses.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        BaseChatModel: The local model in development, the OpenAI model otherwise.
+    """
+    if settings.LOCAL_DEVELOPMENT and settings.LOCAL_MODEL_ENDPOINTS:
+        from tools.local_inference import LocalBatchedChatModel, LocalInferenceBackend
+
+        logger.info(f"Using batched local model on {len(settings.LOCAL_MODEL_ENDPOINTS)} endpoints")
+        return LocalBatchedChatModel(
+            backend=LocalInferenceBackend(
+                endpoints=settings.LOCAL_MODEL_ENDPOINTS,
+                model=settings.LOCAL_MODEL_NAME,
+                api=settings.LOCAL_MODEL_API,
+                max_batch_size=settings.LOCAL_BATCH_MAX_SIZE,
+                max_wait_seconds=settings.LOCAL_BATCH_MAX_WAIT_SECONDS,
+                timeout_seconds=settings.LLM_TIMEOUT_SECONDS,
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_tokens=settings.LOCAL_MODEL_MAX_TOKENS,
+                chat_template=settings.LOCAL_MODEL_CHAT_TEMPLATE,
+            )
+        )
+
+    import httpx
+
+    http_options = {
+        "limits": httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        "timeout": settings.LLM_TIMEOUT_SECONDS,
+    }
+    if settings.LOCAL_DEVELOPMENT:
+        from langchain_ollama import ChatOllama
+
+        logger.info("Using local development model: Llama3")
+        return ChatOllama(model=settings.LOCAL_MODEL_NAME, client_kwargs=http_options)
+
+    from langchain_openai import ChatOpenAI
+
+    logger.info("Using remote model: OpenAI GPT")
+    return ChatOpenAI(
+        model=settings.OPENAI_MODEL_NAME,
+        openai_api_key=settings.OPENAI_API_KEY,
+        http_client=httpx.Client(**http_options),
+        http_async_client=httpx.AsyncClient(**http_options),
+        include_response_headers=True,
+        max_retries=0,
+    )
+
+
+def create_github_client(settings: "Settings") -> "Github":
+    """
+    Creates the GitHub client.
+
+    The client keeps a pool of GITHUB_POOL_SIZE connections, so that concurrent
+    requests from worker threads reuse connections instead of opening new ones.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        Github: The GitHub client authenticated with GITHUB_ACCESS_TOKEN.
+    """
+    from github import Auth, Github
+
+    logger.info("Initializing GitHub client...")
+    return Github(
+        auth=Auth.Token(settings.GITHUB_ACCESS_TOKEN),
+        pool_size=settings.GITHUB_POOL_SIZE,
+        timeout=settings.GITHUB_TIMEOUT_SECONDS,
+        # Retries are left to `tools.rate_limit`, which shares the rate limits between processes.
+        retry=None,
+    )
@@ -1,9 +1,14 @@
-def review_repository_files_prompt(file_summaries: str, candidate_level: str, assignment_description: str) -> str:
-    return f"""
-    You are an advanced AI model tasked with reviewing the contents of multiple files from a GitHub repository. The repository has been analyzed in chunks, and your goal is to evaluate the files and provide a detailed review based on the following structure:
+from prompts.assembly import Prompt, PromptTemplate, prompts_version
 
-    **Assignment Description**:
-    {assignment_description}
+# Every prompt starts with static instructions, followed by the review context (the
+# assignment and the candidate level) and ends with the content of the call, so that
+# calls share a cacheable prefix. See `prompts.assembly`.
+
+REPOSITORY_REVIEW = PromptTemplate(
+    name="repository_review",
+    version=1,
+    instructions="""
+    You are an advanced AI model tasked with reviewing the contents of multiple files from a GitHub repository. The repository has been analyzed in chunks, and your goal is to evaluate the files and provide a detailed review based on the following structure.
 
     Consider the candidate's level—whether Junior, Middle, or Senior—throughout your review. For example:
     - **Junior**: Expect more basic understanding, limited use of design patterns, and simpler solutions.
@@ -20,12 +25,7 @@ def review_repository_files_prompt(file_summaries: str, candidate_level: str, as
     3. **Rating**: Give an overall rating based on the candidate's level (Junior, Middle, Senior). Rate from 1/5 (worst) to 5/5 (best), with a brief explanation of the rating based on the quality of the code and your findings.
     4. **Conclusion**: Summarize the strengths and weaknesses of the repository and provide a final recommendation, considering the candidate's level.
 
-    The provided text will contain summaries of all the repository files. Summarize them with the above instructions, focusing on the level of the candidate: {candidate_level}.
-
-    **File Summaries**:
-    {file_summaries}
-
-    ---
+    You will receive the assignment description and the candidate level, then the summaries of all the repository files. Summarize them with the above instructions, focusing on the level of the candidate.
 
     **Instructions for the AI**:
     - Ensure that the **Analyzed files** section clearly lists each file analyzed.
@@ -33,25 +33,16 @@ def review_repository_files_prompt(file_summaries: str, candidate_level: str, as
     - **Rating** should be based on a realistic evaluation of the code, considering the candidate's experience level. Rate from 1/5 to 5/5 and explain why.
     - In the **Conclusion**, provide a balanced final recommendation, detailing what the candidate did well and what could be improved.
     - Ensure that you follow the structure: Analyzed files, Downsides/comments, Rating, Conclusion.
-    """
+    """,
+    content="""**File Summaries**:
+{file_summaries}""",
+)
 
-
-def review_single_file_prompt(
-        file_content: str,
-        file_path: str,
-        candidate_level: str,
-        chunk_num: int,
-        total_chunk_num: int,
-        assignment_description: str
-) -> str:
-    return f"""
-    You are an AI model tasked with reviewing the code of a single file from a GitHub repository. The file has been analyzed in chunks, and you will receive multiple chunks of code. Each chunk will be labeled with its number (e.g., chunk {chunk_num} out of {total_chunk_num}). As you receive each chunk, make sure to keep track of the overall context and content of the file.
-
-    **Assignment Description**:
-    {assignment_description}
-
-    **Candidate Level**:
-    {candidate_level}
+CONVERSATION_CHUNK_REVIEW = PromptTemplate(
+    name="conversation_chunk_review",
+    version=1,
+    instructions="""
+    You are an AI model tasked with reviewing the code of a single file from a GitHub repository. The file has been analyzed in chunks, and you will receive multiple chunks of code. Each chunk will be labeled with its number (e.g., chunk 2 out of 5). As you receive each chunk, make sure to keep track of the overall context and content of the file.
 
     Consider the candidate’s experience level when reviewing the code:
     - **Junior**: The code might be simpler, with some room for improvement in organization, error handling, and documentation.
@@ -74,26 +65,19 @@ def review_single_file_prompt(
     5. **Conclusion**: Summarize your feedback and provide a final recommendation, considering the candidate's level. What could the candidate do better? What are the strengths?
 
     ### Note:
-    As I send you each chunk, make sure to review the current chunk while keeping the previous chunks in mind. Each chunk is part of the full file, and you may make notes as you go. You can consider the whole file context after receiving all the chunks, but for now, focus on reviewing and making observations based on this chunk:
-
-    **Chunk {chunk_num} out of {total_chunk_num}**:  
-    {file_content}
-
-    **File Path**: {file_path}
+    As I send you each chunk, make sure to review the current chunk while keeping the previous chunks in mind. Each chunk is part of the full file, and you may make notes as you go. You can consider the whole file context after receiving all the chunks, but for now, focus on reviewing and making observations based on the chunk sent last.
+    """,
+    content="""**File Path**: {file_path}
 
-    **Candidate Level**: {candidate_level}
-    """
+**Chunk {chunk_num} out of {total_chunk_num}**:
+{file_content}""",
+)
 
-
-def review_single_file_summary_prompt(file_path: str, candidate_level: str, assignment_description: str) -> str:
-    return f"""
-    You have analyzed a code file from a GitHub repository in multiple chunks. Based on the previous analysis of all chunks, provide a final summary focusing on the following:
-
-    **Assignment Description**:
-    {assignment_description}
-
-    **Candidate Level**:
-    {candidate_level}
+CONVERSATION_FILE_SUMMARY = PromptTemplate(
+    name="conversation_file_summary",
+    version=1,
+    instructions="""
+    You have analyzed a code file from a GitHub repository in multiple chunks. Based on the previous analysis of all chunks, provide a final summary focusing on the following.
 
     Considering the candidate’s level:
     - **Junior**: The candidate’s code should meet basic requirements, but may lack advanced design patterns or optimizations.
@@ -104,22 +88,16 @@ def review_single_file_summary_prompt(file_path: str, candidate_level: str, assi
     2. **Candidate Level**: Considering the candidate's level (Junior, Middle, Senior), assess whether the code aligns with expectations for that level. Provide a rating from 1/5 to 5/5 based on their performance.
     3. **Areas for Improvement**: Identify any critical areas where the candidate could improve. This could include code optimization, documentation, error handling, or other coding practices.
     4. **Final Thoughts**: Provide a brief conclusion, recommending whether the code meets the requirements for the assigned candidate level, and any advice on how to improve further.
-
-    **File Path**: {file_path}
-    **Candidate Level**: {candidate_level}
-    """
-
-
-def review_one_chunk_file_prompt(file_content: str, file_path: str, candidate_level: str, assignment_description: str):
-    return f"""
+    """,
+    content="""**File Path**: {file_path}""",
+)
+
+FILE_REVIEW = PromptTemplate(
+    name="file_review",
+    version=2,
+    instructions="""
     You are an AI model tasked with reviewing a single code chunk from a GitHub repository. You will be reviewing the content based on the assignment description and candidate's level.
 
-    **Assignment Description**:
-    {assignment_description}
-
-    **Candidate Level**:
-    {candidate_level}
-
     Considering the candidate’s level:
     - **Junior**: The code might be simpler, with some room for improvement in organization, error handling, and documentation.
     - **Middle**: Expect a balance of solid code structure, efficiency, and best practices.
@@ -133,9 +111,178 @@ def review_one_chunk_file_prompt(file_content: str, file_path: str, candidate_le
     2. **Downsides/Comments**: Point out any issues or areas for improvement.
     3. **Rating**: Provide a rating from 1/5 to 5/5 based on the candidate's experience level, with a brief justification.
 
-    **File Path**: {file_path}
-    **Candidate Level**: {candidate_level}
+    The code comes with the findings of static analysis tools (syntax errors, unused imports, complexity, missing docstrings, naming): "None" when they found nothing, "Not available" for files they do not cover. They are reliable: mention them briefly where they matter for the candidate's level instead of looking for such issues yourself, and spend the review on what needs judgment, such as design, correctness, edge cases and fit to the assignment.
+    """,
+    content="""**File Path**: {file_path}
+
+**Static Analysis Findings**:
+{static_findings}
+
+**Code Chunk**:
+{file_content}""",
+)
+
+CHUNK_MAP = PromptTemplate(
+    name="chunk_map",
+    version=3,
+    instructions="""
+    You are an AI model tasked with reviewing one chunk of a code file from a GitHub repository. The chunks of the file are reviewed independently, so rely on the outline of the file for the context of the rest of the file, and do not comment on code that is not in this chunk. The outline is "Not included" for files with static analysis findings, which then stand in for it.
+
+    Considering the candidate’s level:
+    - **Junior**: The code might be simpler, with some room for improvement in organization, error handling, and documentation.
+    - **Middle**: Expect a balance of solid code structure, efficiency, and best practices.
+    - **Senior**: The code should be optimized, well-structured, and demonstrate advanced problem-solving skills.
+
+    Write short, factual notes about this chunk only:
+    1. **Content**: What the code in this chunk does.
+    2. **Issues**: Bugs, unhandled edge cases, inefficiencies, missing documentation, or violations of best practices.
+    3. **Strengths**: Anything done particularly well.
+
+    The file comes with the findings of static analysis tools (syntax errors, unused imports, complexity, missing docstrings, naming): "None" when they found nothing, "Not available" for files they do not cover. They are reliable: mention those in this chunk briefly where they matter for the candidate's level instead of looking for such issues yourself, and spend the review on what needs judgment, such as design, correctness, edge cases and fit to the assignment.
+    """,
+    # The path, the outline and the findings, shared by the chunks of a file, come before the chunk.
+    content="""**File Path**: {file_path}
+
+**File Outline**:
+{file_outline}
+
+**Static Analysis Findings**:
+{static_findings}
+
+**Chunk {chunk_num} out of {total_chunk_num}**:
+{file_content}""",
+)
+
+CHUNK_REDUCE = PromptTemplate(
+    name="chunk_reduce",
+    version=1,
+    instructions="""
+    You have reviewed a code file from a GitHub repository chunk by chunk. Combine the notes of all chunks into a single review of the whole file, focusing on the following:
+
+    1. **Overall Evaluation**: Summarize the quality of the code, highlighting its strengths and weaknesses. Focus on areas such as readability, structure, efficiency, and adherence to best practices.
+    2. **Candidate Level**: Considering the candidate's level (Junior, Middle, Senior), assess whether the code aligns with expectations for that level. Provide a rating from 1/5 to 5/5 based on their performance.
+    3. **Areas for Improvement**: Identify any critical areas where the candidate could improve.
+    4. **Final Thoughts**: Provide a brief conclusion.
+    """,
+    content="""**File Path**: {file_path}
+
+**Chunk Notes**:
+{chunk_reviews}""",
+)
+
+GROUP_SUMMARY = PromptTemplate(
+    name="group_summary",
+    version=1,
+    instructions="""
+    You have reviewed part of a GitHub repository file by file. Condense the reviews of the files and modules of that part of the repository into a single review of it, for a later overall review of the repository.
+
+    Keep the following, within the word limit given with the reviews:
+    1. **Contents**: The files and modules reviewed, and what they do.
+    2. **Issues**: The most important problems found, naming the files they are in.
+    3. **Strengths**: What is done well.
+    4. **Ratings**: The ratings given to the files, with a one-line justification.
+    """,
+    content="""**Part of the repository**: **{group_name}**
+**Word limit**: {max_words}
+
+**Reviews**:
+{summaries}""",
+)
+
+PROMPT_TEMPLATES = (
+    REPOSITORY_REVIEW,
+    CONVERSATION_CHUNK_REVIEW,
+    CONVERSATION_FILE_SUMMARY,
+    FILE_REVIEW,
+    CHUNK_MAP,
+    CHUNK_REDUCE,
+    GROUP_SUMMARY,
+)
+
+# Shown in place of the findings of files without static analysis (see `tools.static_analysis`).
+NO_STATIC_FINDINGS = "Not available"
+# Shown in place of the outline of analyzed files, whose findings are sent with every chunk instead.
+NO_FILE_OUTLINE = "Not included"
+
+# Part of the review cache keys: changes with any prompt, so cached reviews made with older prompts are not reused.
+PROMPT_VERSION = prompts_version(PROMPT_TEMPLATES)
+
+
+def review_repository_files_prompt(file_summaries: str, candidate_level: str, assignment_description: str) -> Prompt:
+    return REPOSITORY_REVIEW.render(candidate_level, assignment_description, file_summaries=file_summaries)
+
+
+def review_single_file_prompt(
+        file_content: str,
+        file_path: str,
+        candidate_level: str,
+        chunk_num: int,
+        total_chunk_num: int,
+        assignment_description: str
+) -> Prompt:
+    return CONVERSATION_CHUNK_REVIEW.render(
+        candidate_level,
+        assignment_description,
+        file_content=file_content,
+        file_path=file_path,
+        chunk_num=chunk_num,
+        total_chunk_num=total_chunk_num,
+    )
+
+
+def review_single_file_summary_prompt(file_path: str, candidate_level: str, assignment_description: str) -> Prompt:
+    return CONVERSATION_FILE_SUMMARY.render(candidate_level, assignment_description, file_path=file_path)
 
-    **Code Chunk**:
-    {file_content}
-    """
+
+def review_one_chunk_file_prompt(
+        file_content: str,
+        file_path: str,
+        candidate_level: str,
+        assignment_description: str,
+        static_findings: str = NO_STATIC_FINDINGS,
+) -> Prompt:
+    return FILE_REVIEW.render(
+        candidate_level,
+        assignment_description,
+        file_content=file_content,
+        file_path=file_path,
+        static_findings=static_findings,
+    )
+
+
+def review_chunk_map_prompt(
+        file_content: str,
+        file_path: str,
+        candidate_level: str,
+        chunk_num: int,
+        total_chunk_num: int,
+        file_outline: str,
+        assignment_description: str,
+        static_findings: str = NO_STATIC_FINDINGS,
+) -> Prompt:
+    return CHUNK_MAP.render(
+        candidate_level,
+        assignment_description,
+        file_content=file_content,
+        file_path=file_path,
+        chunk_num=chunk_num,
+        total_chunk_num=total_chunk_num,
+        file_outline=file_outline,
+        static_findings=static_findings,
+    )
+
+
+def review_chunk_reduce_prompt(
+        chunk_reviews: str, file_path: str, candidate_level: str, assignment_description: str
+) -> Prompt:
+    return CHUNK_REDUCE.render(
+        candidate_level, assignment_description, chunk_reviews=chunk_reviews, file_path=file_path
+    )
+
+
+def review_group_summary_prompt(
+        summaries: str, group_name: str, candidate_level: str, assignment_description: str, max_words: int
+) -> Prompt:
+    return GROUP_SUMMARY.render(
+        candidate_level, assignment_description, summaries=summaries, group_name=group_name, max_words=max_words
+    )
@@ -0,0 +1,141 @@
+import hashlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from string import Formatter
+from typing import FrozenSet, Iterable, List
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# The review context, shared by every prompt of a review and sent right after the instructions.
+REVIEW_CONTEXT = """**Assignment Description**:
+{assignment_description}
+
+**Candidate Level**:
+{candidate_level}"""
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A versioned prompt, split so that model calls share the longest possible prefix.
+
+    Prompts are sent as three messages, from the most to the least stable, so that
+    provider-side prompt caching and the KV cache of local servers reuse the prefix:
+
+    1. the static `instructions`, as the system message, identical for every call;
+    2. the review context (see `REVIEW_CONTEXT`), identical for every call of a review;
+    3. the `content` of the call, such as a file, with its largest part last.
+
+    Attributes:
+        name (str): The name of the prompt, e.g. in logs.
+        version (int): Bumped whenever the prompt changes.
+        instructions (str): The static instructions, without any field.
+        content (str): The format string of the last message.
+        fields (FrozenSet[str]): The fields of `content`, parsed once.
+    """
+
+    name: str
+    version: int
+    instructions: str
+    content: str
+    fields: FrozenSet[str] = field(init=False)
+
+    def __post_init__(self):
+        if any(name for _, name, _, _ in Formatter().parse(self.instructions)):
+            raise ValueError(f"The instructions of the {self.name} prompt must be static.")
+        fields = frozenset(name for _, name, _, _ in Formatter().parse(self.content) if name)
+        object.__setattr__(self, "fields", fields)
+
+    def render(self, candidate_level: str, assignment_description: str, **values: object) -> "Prompt":
+        """
+        Renders the prompt of one model call.
+
+        Args:
+            candidate_level (str): The candidate's level (Junior, Middle, Senior).
+            assignment_description (str): The description of the coding assignment.
+            **values: The fields of the content.
+
+        Returns:
+            Prompt: The rendered prompt.
+
+        Raises:
+            KeyError: If a field of the content is missing.
+        """
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Missing fields of the {self.name} prompt: {', '.join(sorted(missing))}")
+        return Prompt(
+            template=self,
+            context=review_context(candidate_level, assignment_description),
+            content=self.content.format_map(values),
+        )
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """
+    A rendered prompt (see `PromptTemplate`).
+
+    Attributes:
+        template (PromptTemplate): The template the prompt was rendered from.
+        context (str): The review context.
+        content (str): The content of the call.
+    """
+
+    template: PromptTemplate
+    context: str
+    content: str
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """
+        The messages sent to chat models, from the most to the least stable.
+        """
+        return [
+            SystemMessage(content=self.template.instructions),
+            HumanMessage(content=self.context),
+            HumanMessage(content=self.content),
+        ]
+
+    @property
+    def text(self) -> str:
+        """
+        The prompt as a single text, in the same order, for chains which take text.
+        """
+        return f"{self.template.instructions}\n\n{self.context}\n\n{self.content}"
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@lru_cache(maxsize=256)
+def review_context(candidate_level: str, assignment_description: str) -> str:
+    """
+    Renders the review context, once per review.
+
+    Args:
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+        assignment_description (str): The description of the coding assignment.
+
+    Returns:
+        str: The review context.
+    """
+    return REVIEW_CONTEXT.format(
+        candidate_level=candidate_level, assignment_description=assignment_description
+    )
+
+
+def prompts_version(templates: Iterable[PromptTemplate]) -> str:
+    """
+    Derives a version from the versions and texts of prompts, which changes whenever any of them changes.
+
+    Args:
+        templates (Iterable[PromptTemplate]): The prompts.
+
+    Returns:
+        str: A short digest.
+    """
+    digest = hashlib.sha256(REVIEW_CONTEXT.encode())
+    for template in sorted(templates, key=lambda template: template.name):
+        digest.update(f"\0{template.name}\0{template.version}\0{template.instructions}\0{template.content}".encode())
+    return digest.hexdigest()[:12]
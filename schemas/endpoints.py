@@ -1,5 +1,5 @@
-from typing import Literal
-from pydantic import BaseModel, HttpUrl
+from typing import List, Literal
+from pydantic import BaseModel, Field, HttpUrl
 
 
 class RepositoryRequest(BaseModel):
@@ -10,3 +10,22 @@ class RepositoryRequest(BaseModel):
     assignment_description: str
     github_repo_url: HttpUrl
     candidate_level: Literal["Junior", "Middle", "Senior"]
+
+
+class BatchRepositoryRequest(BaseModel):
+    """
+    Schema for the /review/batch POST endpoint request body.
+    """
+
+    assignment_description: str
+    github_repo_urls: List[HttpUrl] = Field(min_length=1)
+    candidate_level: Literal["Junior", "Middle", "Senior"]
+
+
+class TemplateRequest(BaseModel):
+    """
+    Schema for the /templates POST endpoint request body.
+    """
+
+    assignment_description: str
+    github_repo_url: HttpUrl
@@ -0,0 +1,6 @@
+import os
+
+# Reviews run by the tests are not kept in the review store, unless a test enables it.
+os.environ.setdefault("ENABLE_REVIEW_STORE", "False")
+# Files are analyzed in threads rather than spawned processes, unless a test needs the pool.
+os.environ.setdefault("STATIC_ANALYSIS_WORKERS", "0")
@@ -0,0 +1,157 @@
+import base64
+import hashlib
+import io
+import json
+import tarfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from github import Github
+
+
+def git_blob_sha(content: bytes) -> str:
+    digest = hashlib.sha1(b"blob %d\0" % len(content))
+    digest.update(content)
+    return digest.hexdigest()
+
+
+class FakeGithubServer:
+    """
+    Minimal local stand-in for the GitHub REST API serving one repository.
+
+    It implements the endpoints used to load repository snapshots and counts
+    every request it receives, so tests can assert on the number of API calls.
+    """
+
+    def __init__(
+        self,
+        files: Dict[str, bytes],
+        full_name: str = "username/repository",
+        commit_sha: Optional[str] = None,
+        archive_excludes: tuple = (),
+    ):
+        self.files = files
+        self.full_name = full_name
+        # Like a real commit, the default one identifies the files, since trees are cached by commit.
+        self.commit_sha = commit_sha or hashlib.sha1(
+            "".join(f"{path}\0{git_blob_sha(content)}\0" for path, content in sorted(files.items())).encode()
+        ).hexdigest()
+        self.archive_excludes = archive_excludes
+        self.requests = Counter()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def repo_url(self) -> str:
+        return f"{self.base_url}/repos/{self.full_name}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def client(self) -> Github:
+        return Github(base_url=self.base_url, retry=None, seconds_between_requests=None)
+
+    def tarball(self) -> bytes:
+        buffer = io.BytesIO()
+        prefix = f"{self.full_name.replace('/', '-')}-{self.commit_sha}"
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for path, content in self.files.items():
+                if path in self.archive_excludes:
+                    continue
+                info = tarfile.TarInfo(f"{prefix}/{path}")
+                info.size = len(content)
+                archive.addfile(info, io.BytesIO(content))
+        return buffer.getvalue()
+
+    def blob(self, blob_sha: str):
+        for content in self.files.values():
+            if git_blob_sha(content) == blob_sha:
+                return content
+        return None
+
+    def _routes(self, path: str):
+        repo = f"/repos/{self.full_name}"
+        if path == repo:
+            return 200, {
+                "full_name": self.full_name,
+                "name": self.full_name.split("/")[1],
+                "default_branch": "main",
+                "url": self.repo_url,
+            }
+        if path in (f"{repo}/git/ref/heads/main", f"{repo}/git/refs/heads/main"):
+            return 200, {
+                "ref": "refs/heads/main",
+                "object": {"sha": self.commit_sha, "type": "commit"},
+            }
+        if path == f"{repo}/git/trees/{self.commit_sha}":
+            tree = [
+                {
+                    "path": file_path,
+                    "mode": "100644",
+                    "type": "blob",
+                    "sha": git_blob_sha(content),
+                    "size": len(content),
+                }
+                for file_path, content in self.files.items()
+            ]
+            return 200, {"sha": "tree", "tree": tree, "truncated": False}
+        if path.startswith(f"{repo}/git/blobs/"):
+            blob_sha = path.rsplit("/", 1)[1]
+            content = self.blob(blob_sha)
+            if content is not None:
+                return 200, {
+                    "sha": blob_sha,
+                    "size": len(content),
+                    "encoding": "base64",
+                    "content": base64.b64encode(content).decode(),
+                }
+        return 404, {"message": "Not Found"}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlparse(self.path).path
+                server.requests[path] += 1
+                if path == f"/repos/{server.full_name}/tarball/{server.commit_sha}":
+                    self.send_response(302)
+                    self.send_header("Location", f"{server.base_url}/archive/{server.commit_sha}.tar.gz")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if path == f"/archive/{server.commit_sha}.tar.gz":
+                    body = server.tarball()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/gzip")
+                elif self.headers.get("Accept") == "application/vnd.github.raw" and "/git/blobs/" in path:
+                    body = server.blob(path.rsplit("/", 1)[1])
+                    self.send_response(200 if body is not None else 404)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    body = body or b""
+                else:
+                    status, payload = server._routes(path)
+                    body = json.dumps(payload).encode()
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
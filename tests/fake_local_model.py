@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+
+class _Job:
+    def __init__(self, prompts: int):
+        self.prompts = prompts
+        self.done = threading.Event()
+
+
+class FakeLocalModelServer:
+    """
+    Minimal local stand-in for a model server on a CPU-only machine.
+
+    Like such a server, it generates one batch at a time, and a batch of `n`
+    prompts takes `base_seconds + n * per_prompt_seconds`, so batching amortizes
+    the fixed cost of a generation step. It serves the OpenAI-compatible
+    ``/v1/completions`` endpoint, whose requests carry a batch of prompts, and
+    Ollama's ``/api/chat``. Concurrent requests are batched together up to
+    `parallel` prompts, like ``OLLAMA_NUM_PARALLEL``. The answer to a prompt is
+    "Review of" the prompt, or of the last message of a conversation.
+    """
+
+    def __init__(self, base_seconds: float = 0.05, per_prompt_seconds: float = 0.005, parallel: int = 1):
+        self.base_seconds = base_seconds
+        self.per_prompt_seconds = per_prompt_seconds
+        self.parallel = parallel
+        self.requests = Counter()
+        # The generation limit of each request.
+        self.max_tokens: List[Optional[int]] = []
+        # The prompts received by the completions endpoint.
+        self.prompts: List[str] = []
+        # The chat messages of each request to the chat endpoint.
+        self.messages: List[List[Dict[str, str]]] = []
+        # The number of prompts generated by each batch.
+        self.batch_sizes: List[int] = []
+        # When set, requests are answered with this status instead.
+        self.fail_status: Optional[int] = None
+        self._queue: List[_Job] = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, daemon=True),
+            threading.Thread(target=self._generate_batches, daemon=True),
+        ]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def generate(self, prompts: int) -> None:
+        job = _Job(prompts)
+        with self._condition:
+            self._queue.append(job)
+            self._condition.notify_all()
+        job.done.wait()
+
+    def _generate_batches(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                jobs = [self._queue.pop(0)]
+                prompts = jobs[0].prompts
+                while self._queue and prompts + self._queue[0].prompts <= self.parallel:
+                    prompts += self._queue[0].prompts
+                    jobs.append(self._queue.pop(0))
+            time.sleep(self.base_seconds + prompts * self.per_prompt_seconds)
+            self.batch_sizes.append(prompts)
+            for job in jobs:
+                job.done.set()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                path = urlparse(self.path).path
+                server.requests[path] += 1
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if server.fail_status is not None:
+                    status, payload = server.fail_status, {"error": "unavailable"}
+                elif path == "/v1/completions" and not request.get("max_tokens"):
+                    # The API would generate 16 tokens only, cutting reviews short.
+                    status, payload = 400, {"error": "max_tokens is required"}
+                elif path == "/v1/completions":
+                    server.max_tokens.append(request["max_tokens"])
+                    prompts = request["prompt"] if isinstance(request["prompt"], list) else [request["prompt"]]
+                    server.prompts.extend(prompts)
+                    server.generate(len(prompts))
+                    status, payload = 200, {
+                        "choices": [
+                            {"index": index, "text": f"Review of {prompt}"} for index, prompt in enumerate(prompts)
+                        ],
+                        "usage": {"prompt_tokens": 10 * len(prompts), "completion_tokens": 5 * len(prompts)},
+                    }
+                elif path == "/api/chat":
+                    server.max_tokens.append(request.get("options", {}).get("num_predict"))
+                    server.messages.append(request["messages"])
+                    server.generate(1)
+                    answer = {"role": "assistant", "content": f"Review of {request['messages'][-1]['content']}"}
+                    status, payload = 200, {"message": answer, "prompt_eval_count": 10, "eval_count": 5}
+                else:
+                    status, payload = 404, {"error": "not found"}
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
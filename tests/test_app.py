@@ -1,17 +1,21 @@
+import json
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, AsyncMock, patch, MagicMock
 from fastapi.testclient import TestClient
 from app import app
+from tools.review_store import hash_assignment
 
 
 class TestReviewRepository(unittest.TestCase):
     def setUp(self):
         self.client = TestClient(app)
 
+    @patch("app.get_head_commit_sha", return_value="sha")
     @patch("app.settings.github_client")
-    @patch("app.send_files_to_model")
+    @patch("app.send_files_to_model", new_callable=AsyncMock)
     @patch("app.clear_github_url")
-    def test_analyze_repository(self, mock_clear_github_url, mock_send_files_to_model, mock_github_client):
+    def test_analyze_repository(self, mock_clear_github_url, mock_send_files_to_model, mock_github_client,
+                                mock_get_head_commit_sha):
         mock_clear_github_url.return_value = "username/repository"
 
         mock_repo = MagicMock()
@@ -28,7 +32,12 @@ class TestReviewRepository(unittest.TestCase):
         response = self.client.post("/review", json=request_data)
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json(), {"review": "This is a review result"})
+        self.assertEqual(response.json()["review"], "This is a review result")
+        self.assertEqual(
+            set(response.json()["cost"]),
+            {"seconds", "stages", "cache_hits", "cache_misses", "calls", "prompt_tokens",
+             "completion_tokens", "total_tokens", "cached_prompt_tokens", "cached_prefix_ratio"},
+        )
 
         mock_clear_github_url.assert_called_once_with("https://github.com/username/repository")
         mock_github_client.get_repo.assert_called_once_with("username/repository")
@@ -36,12 +45,17 @@ class TestReviewRepository(unittest.TestCase):
             repo=mock_repo,
             candidate_level="Junior",
             assignment_description="Review repository files",
+            on_files_selected=ANY,
+            on_file_reviewed=ANY,
+            commit_sha="sha",
         )
 
+    @patch("app.get_head_commit_sha", return_value="sha")
     @patch("app.settings.github_client")
-    @patch("app.send_files_to_model")
+    @patch("app.send_files_to_model", new_callable=AsyncMock)
     @patch("app.clear_github_url")
-    def test_analyze_repository_error(self, mock_clear_github_url, mock_send_files_to_model, mock_github_client):
+    def test_analyze_repository_error(self, mock_clear_github_url, mock_send_files_to_model, mock_github_client,
+                                      mock_get_head_commit_sha):
         mock_clear_github_url.return_value = "username/repository"
 
         mock_repo = MagicMock()
@@ -66,4 +80,255 @@ class TestReviewRepository(unittest.TestCase):
             repo=mock_repo,
             candidate_level="Junior",
             assignment_description="Review repository files",
+            on_files_selected=ANY,
+            on_file_reviewed=ANY,
+            commit_sha="sha",
+        )
+
+
+class TestReviewBatch(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+
+    @patch("app.stream_batch_review")
+    def test_review_batch(self, mock_stream_batch_review):
+        async def results(*args):
+            yield {"index": 1, "repository": "username/second", "review": "review"}
+            yield {"index": 0, "repository": "username/first", "error": "error"}
+
+        mock_stream_batch_review.side_effect = results
+        request_data = {
+            "github_repo_urls": ["https://github.com/username/first", "https://github.com/username/second"],
+            "candidate_level": "Junior",
+            "assignment_description": "Review repository files",
+        }
+
+        response = self.client.post("/review/batch", json=request_data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        self.assertEqual(
+            [json.loads(line) for line in response.text.splitlines()],
+            [
+                {"index": 1, "repository": "username/second", "review": "review"},
+                {"index": 0, "repository": "username/first", "error": "error"},
+            ],
+        )
+        mock_stream_batch_review.assert_called_once_with(
+            ["https://github.com/username/first", "https://github.com/username/second"],
+            "Junior",
+            "Review repository files",
+        )
+
+    @patch("app.settings.BATCH_REVIEW_MAX_REPOSITORIES", 1)
+    def test_review_batch_too_many_repositories(self):
+        request_data = {
+            "github_repo_urls": ["https://github.com/username/first", "https://github.com/username/second"],
+            "candidate_level": "Junior",
+            "assignment_description": "Review repository files",
+        }
+
+        response = self.client.post("/review/batch", json=request_data)
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TestTemplates(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        self.request_data = {
+            "github_repo_url": "https://github.com/username/template",
+            "assignment_description": "Review repository files",
+        }
+
+    @patch("app.settings.ENABLE_REDIS", True)
+    @patch("app.settings.github_client")
+    @patch("app.register_assignment_template")
+    def test_register_template(self, mock_register_assignment_template, mock_github_client):
+        mock_register_assignment_template.return_value = MagicMock(
+            repository="username/template", commit_sha="sha", blob_shas={"main.py": "blob"}
+        )
+
+        response = self.client.post("/templates", json=self.request_data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"repository": "username/template", "commit_sha": "sha", "files": 1}
+        )
+        mock_github_client.get_repo.assert_called_once_with("username/template")
+        mock_register_assignment_template.assert_called_once_with(
+            mock_github_client.get_repo.return_value, "Review repository files"
+        )
+
+    @patch("app.settings.ENABLE_REDIS", False)
+    def test_register_template_without_redis(self):
+        response = self.client.post("/templates", json=self.request_data)
+
+        self.assertEqual(response.status_code, 503)
+
+
+class TestHealth(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+
+    @patch("app.check_clients_health", new_callable=AsyncMock)
+    def test_health(self, mock_check_clients_health):
+        mock_check_clients_health.return_value = {"redis": "disabled", "github": "ok"}
+
+        response = self.client.get("/health")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"redis": "disabled", "github": "ok"})
+
+    @patch("app.check_clients_health", new_callable=AsyncMock)
+    def test_health_unavailable(self, mock_check_clients_health):
+        mock_check_clients_health.return_value = {"redis": "unavailable", "github": "ok"}
+
+        self.assertEqual(self.client.get("/health").status_code, 503)
+
+    @patch("app.close_clients", new_callable=AsyncMock)
+    @patch("app.check_clients_health", new_callable=AsyncMock)
+    def test_lifespan(self, mock_check_clients_health, mock_close_clients):
+        mock_check_clients_health.return_value = {"redis": "ok", "github": "ok"}
+
+        with TestClient(app):
+            mock_check_clients_health.assert_awaited_once()
+            mock_close_clients.assert_not_awaited()
+
+        mock_close_clients.assert_awaited_once()
+
+
+class TestStats(unittest.TestCase):
+    @patch("app.get_single_flight_stats", new_callable=AsyncMock)
+    @patch("app.get_review_cache_stats")
+    def test_stats(self, mock_get_review_cache_stats, mock_get_single_flight_stats):
+        mock_get_review_cache_stats.return_value = {"hits": 1, "misses": 2, "entries": 2}
+        mock_get_single_flight_stats.return_value = {"leaders": 1, "coalesced": 3, "takeovers": 0}
+
+        response = TestClient(app).get("/stats")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["single_flight"]["coalesced"], 3)
+        self.assertEqual(response.json()["review_cache"]["hits"], 1)
+        self.assertIn("evictions", response.json()["local_cache"])
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+
+    def test_metrics(self):
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE review_stage_duration_seconds histogram", response.text)
+        self.assertIn("# TYPE llm_tokens_total counter", response.text)
+
+    @patch("app.settings.METRICS_ENABLED", False)
+    def test_metrics_disabled(self):
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+
+    @patch("app.settings.ENABLE_REVIEW_STORE", True)
+    @patch("app.list_stored_reviews")
+    def test_list_history(self, mock_list_stored_reviews):
+        mock_list_stored_reviews.return_value = [{"id": 3, "repository": "username/repository"}]
+
+        response = self.client.get(
+            "/history",
+            params={"repository": "username/repository", "assignment_description": "Build an API", "limit": 5},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"reviews": [{"id": 3, "repository": "username/repository"}]})
+        mock_list_stored_reviews.assert_called_once_with(
+            repository="username/repository",
+            commit_sha=None,
+            candidate_level=None,
+            assignment_hash=hash_assignment("Build an API"),
+            before=None,
+            limit=5,
+        )
+        self.assertEqual(self.client.get("/history", params={"limit": 1000}).status_code, 422)
+
+    @patch("app.settings.ENABLE_REVIEW_STORE", True)
+    @patch("app.get_stored_review")
+    def test_get_history(self, mock_get_stored_review):
+        mock_get_stored_review.side_effect = lambda review_id: {"id": 3} if review_id == 3 else None
+
+        self.assertEqual(self.client.get("/history/3").json(), {"id": 3})
+        self.assertEqual(self.client.get("/history/4").status_code, 404)
+
+    @patch("app.settings.ENABLE_REVIEW_STORE", False)
+    def test_history_disabled(self):
+        self.assertEqual(self.client.get("/history").status_code, 503)
+        self.assertEqual(self.client.get("/history/3").status_code, 503)
+
+
+class TestReviewJobs(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        self.request_data = {
+            "github_repo_url": "https://github.com/username/repository",
+            "candidate_level": "Junior",
+            "assignment_description": "Review repository files",
+        }
+
+    @patch("app.settings.ENABLE_REDIS", True)
+    @patch("app.run_review_job", new_callable=AsyncMock)
+    @patch("app.create_review_job", new_callable=AsyncMock)
+    def test_submit_review(self, mock_create_review_job, mock_run_review_job):
+        mock_create_review_job.return_value = "job-id"
+
+        response = self.client.post("/reviews", json=self.request_data)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"job_id": "job-id", "status": "queued"})
+        mock_create_review_job.assert_awaited_once_with("username/repository", "Junior")
+        mock_run_review_job.assert_awaited_once_with(
+            "job-id", "username/repository", "Junior", "Review repository files"
         )
+
+    @patch("app.settings.ENABLE_REDIS", False)
+    def test_submit_review_without_redis(self):
+        response = self.client.post("/reviews", json=self.request_data)
+
+        self.assertEqual(response.status_code, 503)
+
+    @patch("app.get_review_job", new_callable=AsyncMock)
+    def test_get_review(self, mock_get_review_job):
+        mock_get_review_job.return_value = {"id": "job-id", "status": "running", "files_done": 1}
+
+        response = self.client.get("/reviews/job-id")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["files_done"], 1)
+
+    @patch("app.get_review_job", new_callable=AsyncMock)
+    def test_get_review_not_found(self, mock_get_review_job):
+        mock_get_review_job.return_value = None
+
+        self.assertEqual(self.client.get("/reviews/job-id").status_code, 404)
+        self.assertEqual(self.client.get("/reviews/job-id/events").status_code, 404)
+
+    @patch("app.stream_review_job_events")
+    @patch("app.get_review_job", new_callable=AsyncMock)
+    def test_stream_review_events(self, mock_get_review_job, mock_stream_review_job_events):
+        async def events(job_id, last_event_id):
+            yield f"id: 2-0\nevent: completed\ndata: {{\"after\": \"{last_event_id}\"}}\n\n"
+
+        mock_get_review_job.return_value = {"id": "job-id"}
+        mock_stream_review_job_events.side_effect = events
+
+        response = self.client.get("/reviews/job-id/events", headers={"Last-Event-ID": "1-0"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        self.assertIn('"after": "1-0"', response.text)
@@ -1,50 +1,361 @@
+import asyncio
+import time
 import unittest
-from unittest.mock import patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from tools.app_functions import send_files_to_model
+from tools.app_functions import review_repository_file, send_files_to_model
+from tools.incremental import IncrementalReviewPlan
+from tools.review_pool import ReviewPool
+from tools.snapshot import RepositorySnapshot
+from tools.templates import AssignmentTemplate
 
 
-class TestSendFilesToModel(unittest.TestCase):
-    @patch("tools.app_functions.settings.GENERATIVE_MODEL.predict")
+class TestSendFilesToModel(unittest.IsolatedAsyncioTestCase):
+    @patch("tools.app_functions.select_review_files")
     @patch("tools.app_functions.settings")
-    @patch("tools.app_functions.settings.GENERATIVE_MODEL")
     @patch("tools.app_functions.review_repository_files_prompt")
-    @patch("tools.app_functions.process_file")
-    @patch("tools.app_functions.split_large_file")
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    @patch("tools.app_functions.iter_chunks_by_tokens")
     @patch("github.Repository.Repository")
-    @patch('tools.app_functions.get_all_repository_paths')
-    def test_send_files_to_model(self, mock_get_all_repository_paths, mock_repository, mock_split_large_file,
-                                 mock_process_file, mock_prompt, mock_GENERATIVE_MODEL, mock_settings, mock_predict):
+    @patch('tools.app_functions.load_repository_snapshot')
+    async def test_send_files_to_model(self, mock_load_repository_snapshot, mock_repository, mock_iter_chunks_by_tokens,
+                                       mock_process_file, mock_prompt, mock_settings, mock_select_review_files):
         file_paths = ['path1', 'path2']
-        mock_get_all_repository_paths.return_value = file_paths
-        mock_split_large_file.return_value = ['chunk1', 'chunk2']
+        mock_select_review_files.return_value = file_paths
+        mock_iter_chunks_by_tokens.return_value = ['chunk1', 'chunk2']
         mock_process_file.return_value = 'summary'
+        mock_settings.REVIEW_CONCURRENCY = 2
 
         expected_result = "result"
-        mock_predict.return_value = expected_result
+        mock_settings.GENERATIVE_MODEL.ainvoke = AsyncMock(return_value=MagicMock(content=expected_result))
 
-        result = send_files_to_model(mock_repository, 'level', 'description')
+        result = await send_files_to_model(mock_repository, 'level', 'description')
         files_found = ", ".join(file_paths)
         expected_result = f"Files found: {files_found}\n{expected_result}"
         self.assertEqual(result, expected_result)
 
-        mock_predict.assert_called_once()
+        mock_settings.GENERATIVE_MODEL.ainvoke.assert_awaited_once()
+        mock_load_repository_snapshot.assert_called_once_with(mock_repository, None)
 
-    @patch("tools.app_functions.settings.GENERATIVE_MODEL.predict")
+    @patch("tools.app_functions.select_review_files")
     @patch("tools.app_functions.settings")
-    @patch("tools.app_functions.settings.GENERATIVE_MODEL")
     @patch("tools.app_functions.review_repository_files_prompt")
-    @patch("tools.app_functions.process_file")
-    @patch("tools.app_functions.split_large_file")
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    @patch("tools.app_functions.iter_chunks_by_tokens")
     @patch("github.Repository.Repository")
-    @patch('tools.app_functions.get_all_repository_paths')
-    def test_send_files_to_model_no_file_summary(self, mock_get_all_repository_paths, mock_repository, mock_split_large_file,
-                                 mock_process_file, mock_prompt, mock_GENERATIVE_MODEL, mock_settings, mock_predict):
-        mock_get_all_repository_paths.return_value = ['path1', 'path2']
-        mock_split_large_file.return_value = ['chunk1', 'chunk2']
+    @patch('tools.app_functions.load_repository_snapshot')
+    async def test_send_files_to_model_no_file_summary(self, mock_load_repository_snapshot, mock_repository,
+                                                       mock_iter_chunks_by_tokens, mock_process_file, mock_prompt,
+                                                       mock_settings, mock_select_review_files):
+        mock_select_review_files.return_value = ['path1', 'path2']
+        mock_iter_chunks_by_tokens.return_value = ['chunk1', 'chunk2']
         mock_process_file.return_value = None
+        mock_settings.REVIEW_CONCURRENCY = 2
+        mock_settings.GENERATIVE_MODEL.ainvoke = AsyncMock()
 
         with self.assertRaises(Exception):
-            send_files_to_model(mock_repository, 'level', 'description')
+            await send_files_to_model(mock_repository, 'level', 'description')
+
+        mock_settings.GENERATIVE_MODEL.ainvoke.assert_not_awaited()
+
+    @patch("tools.app_functions.get_token_counter")
+    @patch("tools.app_functions.select_review_files")
+    @patch("tools.app_functions.settings")
+    @patch("tools.app_functions.review_repository_files_prompt")
+    @patch("tools.app_functions.process_file")
+    @patch("tools.app_functions.iter_chunks_by_tokens")
+    @patch("github.Repository.Repository")
+    @patch('tools.app_functions.load_repository_snapshot')
+    async def test_send_files_to_model_concurrency(self, mock_load_repository_snapshot, mock_repository,
+                                                   mock_iter_chunks_by_tokens, mock_process_file, mock_prompt,
+                                                   mock_settings, mock_select_review_files,
+                                                   mock_get_token_counter):
+        file_paths = ['slow', 'fast1', 'fast2', 'fast3']
+        mock_select_review_files.return_value = file_paths
+        mock_get_token_counter.return_value = len
+        mock_iter_chunks_by_tokens.return_value = ['chunk']
+        mock_settings.REVIEW_CONCURRENCY = 2
+        mock_settings.GENERATIVE_MODEL.ainvoke = AsyncMock(return_value=MagicMock(content="result"))
+        in_flight = 0
+        max_in_flight = 0
+
+        async def fake_process_file(file_chunks, file_path, candidate_level, assignment_description, static_findings):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.2 if file_path == 'slow' else 0.05)
+            in_flight -= 1
+            return f"summary of {file_path}"
+
+        mock_process_file.side_effect = fake_process_file
+
+        started = time.perf_counter()
+        await send_files_to_model(mock_repository, 'level', 'description')
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(max_in_flight, 2)
+        # The slow file overlaps with the fast ones instead of adding to them.
+        self.assertLess(elapsed, 0.3)
+        file_summaries = mock_prompt.call_args.kwargs["file_summaries"]
+        self.assertEqual(
+            file_summaries,
+            "".join(f"File: {path}\nsummary of {path}" for path in file_paths),
+        )
+
+    @patch("tools.app_functions.set_cached_review")
+    @patch("tools.app_functions.get_cached_review")
+    @patch("tools.app_functions.select_review_files")
+    @patch("tools.app_functions.settings")
+    @patch("tools.app_functions.review_repository_files_prompt")
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    @patch("tools.app_functions.iter_chunks_by_tokens")
+    @patch("github.Repository.Repository")
+    @patch('tools.app_functions.load_repository_snapshot')
+    async def test_send_files_to_model_cached_reviews(self, mock_load_repository_snapshot, mock_repository,
+                                                      mock_iter_chunks_by_tokens, mock_process_file, mock_prompt,
+                                                      mock_settings, mock_select_review_files,
+                                                      mock_get_cached_review, mock_set_cached_review):
+        mock_select_review_files.return_value = ['cached', 'new']
+        mock_load_repository_snapshot.return_value.blob_shas = {'cached': 'sha1', 'new': 'sha2'}
+        mock_iter_chunks_by_tokens.return_value = ['chunk']
+        mock_process_file.return_value = 'new summary'
+        mock_settings.REVIEW_CONCURRENCY = 2
+        mock_settings.GENERATIVE_MODEL.ainvoke = AsyncMock(return_value=MagicMock(content="result"))
+        mock_get_cached_review.side_effect = lambda key: 'cached summary' if key.endswith(':sha1') else None
+
+        await send_files_to_model(mock_repository, 'level', 'description')
+
+        mock_process_file.assert_awaited_once_with(['chunk'], 'new', 'level', 'description', 'Not available')
+        mock_set_cached_review.assert_called_once()
+        self.assertTrue(mock_set_cached_review.call_args.args[0].endswith(':sha2'))
+        self.assertEqual(
+            mock_prompt.call_args.kwargs["file_summaries"],
+            "File: cached\ncached summaryFile: new\nnew summary",
+        )
+
+    @patch("tools.app_functions.get_token_counter")
+    @patch("tools.app_functions.select_review_files")
+    @patch("tools.app_functions.settings")
+    @patch("tools.app_functions.review_repository_files_prompt")
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    @patch('tools.app_functions.load_repository_snapshot')
+    async def test_send_files_to_model_shared_pool(self, mock_load_repository_snapshot, mock_process_file, mock_prompt, mock_settings,
+                                                   mock_select_review_files, mock_get_token_counter):
+        def load_repository_snapshot(repo, commit_sha):
+            snapshot = RepositorySnapshot(full_name=repo.full_name, commit_sha="sha")
+            snapshot.files = {"template.py": b"scaffolding", "solution.py": repo.full_name.encode()}
+            snapshot.blob_shas = {"template.py": "template", "solution.py": f"{repo.full_name}-solution"}
+            return snapshot
+
+        mock_load_repository_snapshot.side_effect = load_repository_snapshot
+        mock_select_review_files.return_value = ["template.py", "solution.py"]
+        mock_get_token_counter.return_value = len
+        mock_process_file.return_value = "summary"
+        mock_settings.LLM_CHUNK_TOKEN_LIMIT = 100
+        mock_settings.ENABLE_STATIC_ANALYSIS = False
+        mock_settings.GENERATIVE_MODEL.ainvoke = AsyncMock(return_value=MagicMock(content="result"))
+        pool = ReviewPool(semaphore=asyncio.Semaphore(2))
+
+        await asyncio.gather(
+            send_files_to_model(MagicMock(full_name="username/first"), "level", "description", pool=pool),
+            send_files_to_model(MagicMock(full_name="username/second"), "level", "description", pool=pool),
+        )
+
+        # The scaffolding shared by both repositories is reviewed once.
+        self.assertEqual(mock_process_file.await_count, 3)
+        self.assertEqual(
+            sorted(call.args[1] for call in mock_process_file.await_args_list),
+            ["solution.py", "solution.py", "template.py"],
+        )
+
+    @patch("tools.app_functions.load_assignment_template")
+    @patch("tools.app_functions.get_token_counter")
+    @patch("tools.app_functions.select_review_files")
+    @patch("tools.app_functions.settings")
+    @patch("tools.app_functions.review_repository_files_prompt")
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    @patch('tools.app_functions.load_repository_snapshot')
+    async def test_send_files_to_model_template(self, mock_load_repository_snapshot, mock_process_file, mock_prompt,
+                                                mock_settings, mock_select_review_files, mock_get_token_counter,
+                                                mock_load_assignment_template):
+        starter = "".join(f"x{index} = {index}\n" for index in range(60))
+        snapshot = RepositorySnapshot(full_name="username/repository", commit_sha="sha")
+        snapshot.files = {
+            "scaffold.py": b"unchanged",
+            "main.py": starter.replace("x3 = 3", "x3 = 4").encode(),
+            "solution.py": b"import os\n",
+        }
+        snapshot.blob_shas = {"scaffold.py": "scaffold", "main.py": "main", "solution.py": "solution"}
+        mock_load_repository_snapshot.return_value = snapshot
+        mock_select_review_files.return_value = ["scaffold.py", "main.py", "solution.py"]
+        mock_load_assignment_template.return_value = AssignmentTemplate(
+            repository="username/template",
+            commit_sha="template-sha",
+            blob_shas={"scaffold.py": "scaffold", "main.py": "template-main"},
+            texts={"scaffold.py": "unchanged", "main.py": starter},
+        )
+        mock_get_token_counter.return_value = len
+        mock_process_file.side_effect = lambda chunks, path, level, description, findings: (
+            f"review of {path} with findings {findings}"
+        )
+        mock_settings.LLM_CHUNK_TOKEN_LIMIT = 10000
+        mock_settings.REVIEW_CONCURRENCY = 2
+        mock_settings.GENERATIVE_MODEL.ainvoke = AsyncMock(return_value=MagicMock(content="result"))
+
+        result = await send_files_to_model(MagicMock(full_name="username/repository"), "level", "description")
+
+        self.assertTrue(result.startswith("Files found: main.py, solution.py\n"))
+        reviewed = {call.args[1]: call.args[0][0] for call in mock_process_file.await_args_list}
+        self.assertEqual(set(reviewed), {"main.py", "solution.py"})
+        self.assertIn("-x3 = 3\n+x3 = 4\n", reviewed["main.py"])
+        self.assertEqual(reviewed["solution.py"], "import os\n")
+        # The diff sent for main.py is not code to analyze.
+        findings = {call.args[1]: call.args[4] for call in mock_process_file.await_args_list}
+        self.assertEqual(
+            findings, {"main.py": "Not available", "solution.py": "1: [unused-import] `os` is imported but unused"}
+        )
+
+    @patch("tools.app_functions.save_review_state")
+    @patch("tools.app_functions.plan_incremental_review")
+    @patch("tools.app_functions.load_review_state")
+    @patch("tools.app_functions.get_head_commit_sha")
+    @patch("tools.app_functions.settings")
+    @patch("tools.app_functions.review_repository_files_prompt")
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    @patch("github.Repository.Repository")
+    @patch('tools.app_functions.load_repository_snapshot')
+    async def test_send_files_to_model_incremental(self, mock_load_repository_snapshot, mock_repository,
+                                                   mock_process_file, mock_prompt, mock_settings,
+                                                   mock_get_head_commit_sha, mock_load_review_state,
+                                                   mock_plan_incremental_review, mock_save_review_state):
+        mock_get_head_commit_sha.return_value = 'sha2'
+        mock_settings.REVIEW_CONCURRENCY = 2
+        mock_settings.LLM_CHUNK_TOKEN_LIMIT = 1500
+        mock_settings.ENABLE_STATIC_ANALYSIS = False
+        mock_settings.GENERATIVE_MODEL.ainvoke = AsyncMock(return_value=MagicMock(content="result"))
+        mock_process_file.return_value = 'new summary'
+        changed = RepositorySnapshot(
+            full_name='username/repository', commit_sha='sha2',
+            blob_shas={'changed.py': 'blob2'}, sizes={'changed.py': 6}, files={'changed.py': b'x = 2\n'},
+        )
+        mock_plan_incremental_review.return_value = IncrementalReviewPlan(
+            file_paths=['changed.py', 'unchanged.py'],
+            blob_shas={'changed.py': 'blob2', 'unchanged.py': 'blob1'},
+            changed=changed,
+            reused={'unchanged.py': 'stored summary'},
+        )
+
+        await send_files_to_model(mock_repository, 'level', 'description')
+
+        mock_load_repository_snapshot.assert_not_called()
+        mock_plan_incremental_review.assert_called_once_with(
+            mock_repository, mock_load_review_state.return_value, 'sha2'
+        )
+        mock_process_file.assert_awaited_once_with(['x = 2\n'], 'changed.py', 'level', 'description', 'Not available')
+        self.assertEqual(
+            mock_prompt.call_args.kwargs["file_summaries"],
+            "File: changed.py\nnew summaryFile: unchanged.py\nstored summary",
+        )
+        saved_state = mock_save_review_state.call_args.args[3]
+        self.assertEqual(saved_state.commit_sha, 'sha2')
+        self.assertEqual(
+            saved_state.summaries, {'changed.py': 'new summary', 'unchanged.py': 'stored summary'}
+        )
+
+
+class TestReviewRepositoryFile(unittest.IsolatedAsyncioTestCase):
+    @patch("tools.app_functions.settings.ENABLE_STATIC_ANALYSIS", False)
+    @patch("tools.app_functions.set_cached_review")
+    @patch("tools.app_functions.get_cached_review", return_value=None)
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    async def test_review_repository_file_streams_content(self, mock_process_file, mock_get_cached_review,
+                                                          mock_set_cached_review):
+        mock_process_file.return_value = "summary"
+        snapshot = RepositorySnapshot(
+            full_name="username/repository", commit_sha="sha", blob_shas={"main.py": "blob"},
+            files={"main.py": "print('café')\n".encode()},
+        )
+
+        review = await review_repository_file(
+            "main.py", "blob", lambda: snapshot.iter_text("main.py"), "level", "description", len
+        )
+
+        self.assertEqual(review, "summary")
+        mock_process_file.assert_awaited_once_with(
+            ["print('café')\n"], "main.py", "level", "description", "Not available"
+        )
+
+    @patch("tools.app_functions.set_cached_review")
+    @patch("tools.app_functions.get_cached_review", return_value=None)
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    async def test_review_repository_file_skips_binary_content(self, mock_process_file, mock_get_cached_review,
+                                                               mock_set_cached_review):
+        snapshot = RepositorySnapshot(
+            full_name="username/repository", commit_sha="sha", blob_shas={"data.txt": "blob"},
+            files={"data.txt": b"header\n" + "café".encode("latin-1")},
+        )
+
+        review = await review_repository_file(
+            "data.txt", "blob", lambda: snapshot.iter_text("data.txt"), "level", "description", len
+        )
+
+        self.assertIsNone(review)
+        mock_process_file.assert_not_awaited()
+        mock_set_cached_review.assert_not_called()
+
+    @patch("tools.app_functions.set_cached_review")
+    @patch("tools.app_functions.get_cached_review", return_value=None)
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock, return_value="summary")
+    async def test_review_repository_file_sends_static_findings(self, mock_process_file, mock_get_cached_review,
+                                                                mock_set_cached_review):
+        text = "import os\n\n\ndef main():\n    return 1\n"
+
+        review = await review_repository_file("main.py", "blob", lambda: iter([text]), "level", "description", len)
+
+        self.assertEqual(review, "summary")
+        mock_process_file.assert_awaited_once_with(
+            [text], "main.py", "level", "description",
+            "1: [unused-import] `os` is imported but unused\n4: [docstring] `main` has no docstring",
+        )
+        mock_set_cached_review.assert_called_once()
+
+    @patch("tools.app_functions.set_cached_review")
+    @patch("tools.app_functions.get_cached_review", return_value=None)
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    async def test_review_repository_file_skips_trivial_files(self, mock_process_file, mock_get_cached_review,
+                                                              mock_set_cached_review):
+        review = await review_repository_file(
+            "config.py", "blob", lambda: iter(["DEBUG = False\n"]), "level", "description", len
+        )
+
+        self.assertIn("no issues in this 1-line file", review)
+        mock_process_file.assert_not_awaited()
+        mock_set_cached_review.assert_not_called()
+        # Files without an analyzer are always reviewed.
+        await review_repository_file("notes.txt", "blob", lambda: iter(["Done.\n"]), "level", "description", len)
+        mock_process_file.assert_awaited_once_with(["Done.\n"], "notes.txt", "level", "description", "Not available")
+
+
+    @patch("tools.app_functions.set_cached_review")
+    @patch("tools.app_functions.get_cached_review", return_value=None)
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock, return_value="summary")
+    async def test_review_repository_file_reads_and_analyzes_under_semaphore(self, mock_process_file,
+                                                                             mock_get_cached_review,
+                                                                             mock_set_cached_review):
+        semaphore = asyncio.Semaphore(1)
+        read_text = MagicMock(return_value=iter(["import os\n"]))
+        await semaphore.acquire()
+
+        review = asyncio.create_task(
+            review_repository_file("main.py", "blob", read_text, "level", "description", len, semaphore=semaphore)
+        )
+        await asyncio.sleep(0.01)
+
+        read_text.assert_not_called()
+        semaphore.release()
+        self.assertEqual(await review, "summary")
+        read_text.assert_called_once()
+
 
-        mock_predict.assert_not_called()
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+from tools.batch import stream_batch_review
+
+
+class TestStreamBatchReview(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch("tools.batch.settings.github_client")
+        self.mock_github_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_github_client.get_repo.side_effect = lambda name: MagicMock(full_name=name)
+
+    @patch("tools.batch.send_files_to_model")
+    async def test_results_are_streamed_as_they_complete(self, mock_send_files_to_model):
+        pools = []
+
+        async def send_files_to_model(repo, candidate_level, assignment_description, pool, **kwargs):
+            pools.append(pool)
+            if repo.full_name == "username/slow":
+                await asyncio.sleep(0.05)
+            if repo.full_name == "username/broken":
+                await asyncio.sleep(0.02)
+                raise Exception("Error processing repository")
+            return f"review of {repo.full_name}"
+
+        mock_send_files_to_model.side_effect = send_files_to_model
+
+        results = [
+            result
+            async for result in stream_batch_review(
+                [
+                    "https://github.com/username/slow",
+                    "https://github.com/username/fast",
+                    "https://github.com/username/broken",
+                ],
+                "Junior",
+                "description",
+            )
+        ]
+
+        self.assertEqual([result["index"] for result in results], [1, 2, 0])
+        self.assertEqual(results[0]["review"], "review of username/fast")
+        self.assertIn("cost", results[0])
+        self.assertEqual(
+            results[1], {"index": 2, "repository": "username/broken", "error": "Error processing repository"}
+        )
+        # All reviews share the same pool.
+        self.assertEqual(len(set(map(id, pools))), 1)
+
+    async def test_invalid_url(self):
+        results = [result async for result in stream_batch_review(["https://gitlab.com/a/b"], "Junior", "d")]
+
+        self.assertEqual(results[0]["repository"], "https://gitlab.com/a/b")
+        self.assertIn("not a valid GitHub repository URL", results[0]["error"])
+
+    @patch("tools.batch.settings.BATCH_REVIEW_CONCURRENCY", 1)
+    @patch("tools.batch.send_files_to_model")
+    async def test_repositories_concurrency(self, mock_send_files_to_model):
+        in_flight = 0
+        max_in_flight = 0
+
+        async def send_files_to_model(**kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return "review"
+
+        mock_send_files_to_model.side_effect = send_files_to_model
+        urls = [f"https://github.com/username/repository{index}" for index in range(3)]
+
+        results = [result async for result in stream_batch_review(urls, "Junior", "description")]
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(max_in_flight, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from tools import clients
+from tools.clients import check_clients_health, close_clients, get_http_session
+
+
+class TestClients(unittest.IsolatedAsyncioTestCase):
+    def test_get_http_session(self):
+        session = get_http_session()
+
+        self.assertIs(get_http_session(), session)
+
+    @patch("tools.clients.settings.ENABLE_REDIS", True)
+    @patch("tools.clients.settings.github_client")
+    @patch("tools.clients.ping_redis", new_callable=AsyncMock, return_value=False)
+    async def test_check_clients_health(self, mock_ping_redis, mock_github_client):
+        self.assertEqual(await check_clients_health(), {"redis": "unavailable", "github": "ok"})
+
+        mock_github_client.get_rate_limit.side_effect = Exception("Bad credentials")
+        mock_ping_redis.return_value = True
+        self.assertEqual(await check_clients_health(), {"redis": "ok", "github": "unavailable"})
+
+    @patch("tools.clients.settings.ENABLE_REDIS", False)
+    @patch("tools.clients.settings.github_client")
+    async def test_check_clients_health_without_redis(self, mock_github_client):
+        self.assertEqual((await check_clients_health())["redis"], "disabled")
+
+    @patch("tools.clients.settings")
+    @patch("tools.clients.close_redis_pools", new_callable=AsyncMock)
+    async def test_close_clients(self, mock_close_redis_pools, mock_settings):
+        get_http_session()
+        http_client = MagicMock(spec=["close"])
+        http_async_client = MagicMock(spec=["aclose"])
+        http_async_client.aclose = AsyncMock()
+        mock_settings.GENERATIVE_MODEL = MagicMock(
+            spec=["http_client", "http_async_client"],
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+        await close_clients()
+
+        mock_close_redis_pools.assert_awaited_once()
+        mock_settings.github_client.close.assert_called_once()
+        http_client.close.assert_called_once()
+        http_async_client.aclose.assert_awaited_once()
+        self.assertIsNone(clients._http_session)
+
+    @patch("tools.clients.settings")
+    @patch("tools.clients.close_redis_pools", new_callable=AsyncMock)
+    async def test_close_clients_not_created(self, mock_close_redis_pools, mock_settings):
+        mock_settings.is_created.return_value = False
+
+        await close_clients()
+
+        mock_settings.github_client.close.assert_not_called()
+        mock_settings.is_created.assert_any_call("GENERATIVE_MODEL")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import patch
+
+from tools.filters import is_binary_content, parse_gitignore, select_review_files
+from tools.snapshot import RepositorySnapshot
+
+
+def make_snapshot(files):
+    return RepositorySnapshot(
+        full_name="username/repository",
+        commit_sha="sha",
+        blob_shas={path: str(index) for index, path in enumerate(files)},
+        sizes={path: len(content) for path, content in files.items()},
+        files=files,
+    )
+
+
+class TestSelectReviewFiles(unittest.TestCase):
+    def test_select_review_files_skips_noise(self):
+        snapshot = make_snapshot({
+            "app.py": b"print('app')\n",
+            "logo.png": b"\x89PNG\r\n",
+            "data.bin": b"\x00\x01\x02",
+            "latin1.txt": "café au lait".encode("latin-1"),
+            "package-lock.json": b"{}",
+            "static/app.min.js": b"var a=1;",
+            ".idea/misc.xml": b"<xml/>",
+            "node_modules/lib/index.js": b"module.exports = 1;",
+            "app/migrations/0001_initial.py": b"operations = []",
+        })
+
+        self.assertEqual(select_review_files(snapshot), ["app.py"])
+
+    def test_select_review_files_applies_gitignore(self):
+        snapshot = make_snapshot({
+            ".gitignore": b"# build output\n/generated/\n*.out\n!keep.out\n",
+            "generated/models.py": b"class Model: pass\n",
+            "src/generated/models.py": b"class Model: pass\n",
+            "result.out": b"output",
+            "keep.out": b"output",
+        })
+
+        self.assertEqual(
+            sorted(select_review_files(snapshot)),
+            [".gitignore", "keep.out", "src/generated/models.py"],
+        )
+
+    @patch("tools.filters.settings.MAX_REVIEW_FILE_BYTES", 10)
+    def test_select_review_files_size_cap(self):
+        snapshot = make_snapshot({"small.py": b"x = 1", "large.py": b"x = 1\n" * 10})
+
+        self.assertEqual(select_review_files(snapshot), ["small.py"])
+
+    @patch("tools.filters.settings.REVIEW_EXCLUDE_GLOBS", ["docs/*"])
+    @patch("tools.filters.settings.REVIEW_INCLUDE_GLOBS", ["*.py", "*.md"])
+    def test_select_review_files_globs(self):
+        snapshot = make_snapshot({
+            "main.py": b"x = 1",
+            "README.md": b"# Title",
+            "docs/guide.md": b"# Guide",
+            "setup.cfg": b"[metadata]",
+        })
+
+        self.assertEqual(select_review_files(snapshot), ["main.py", "README.md"])
+
+    def test_select_review_files_ranks_source_first(self):
+        snapshot = make_snapshot({
+            "tests/test_service.py": b"x = 1",
+            "config.yml": b"a: 1",
+            "src/service/handlers.py": b"x = 1",
+            "main.py": b"x = 1",
+        })
+
+        self.assertEqual(
+            select_review_files(snapshot),
+            ["main.py", "src/service/handlers.py", "tests/test_service.py", "config.yml"],
+        )
+
+    @patch("tools.filters.settings.REVIEW_TOKEN_BUDGET", 30)
+    def test_select_review_files_token_budget(self):
+        snapshot = make_snapshot({
+            "main.py": b"x" * 80,
+            "service.py": b"x" * 80,
+            "utils.py": b"x" * 40,
+        })
+
+        self.assertEqual(select_review_files(snapshot), ["main.py", "utils.py"])
+
+
+class TestIsBinaryContent(unittest.TestCase):
+    def test_text(self):
+        self.assertFalse(is_binary_content("print('café')".encode()))
+
+    def test_truncated_multibyte_character(self):
+        self.assertFalse(is_binary_content("café".encode()[:-1]))
+
+    def test_utf8_byte_order_mark(self):
+        self.assertFalse(is_binary_content(b"\xef\xbb\xbfprint('hello')"))
+
+    def test_binary(self):
+        self.assertTrue(is_binary_content(b"GIF89a\x00\x01"))
+        self.assertTrue(is_binary_content(b"\xff\xfe\xfa"))
+
+
+class TestParseGitignore(unittest.TestCase):
+    def test_parse_gitignore(self):
+        rules = parse_gitignore("build/\ndocs/**/*.html\n?.tmp\n")
+
+        def ignored(path):
+            return any(pattern.search(path) for pattern, _ in rules)
+
+        self.assertTrue(ignored("build/output.py"))
+        self.assertTrue(ignored("src/build/output.py"))
+        self.assertFalse(ignored("build.py"))
+        self.assertTrue(ignored("docs/index.html"))
+        self.assertTrue(ignored("docs/api/v1/index.html"))
+        self.assertFalse(ignored("src/docs/index.html"))
+        self.assertTrue(ignored("a.tmp"))
+        self.assertFalse(ignored("ab.tmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
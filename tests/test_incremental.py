@@ -0,0 +1,182 @@
+import io
+import unittest
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+
+from tools.incremental import (
+    ReviewState,
+    load_review_state,
+    plan_incremental_review,
+    save_review_state,
+)
+from tools.tiered_cache import clear_local_cache
+
+
+def make_file(filename, status, sha, previous_filename=None):
+    file = MagicMock()
+    file.filename = filename
+    file.status = status
+    file.sha = sha
+    file.previous_filename = previous_filename
+    return file
+
+
+def make_repo(status, files, blobs):
+    repo = MagicMock()
+    repo.full_name = "username/repository"
+    repo.compare.return_value.status = status
+    repo.compare.return_value.files = files
+    repo.blobs = blobs
+    return repo
+
+
+def fake_get_repository_tree(repo, commit_sha):
+    return [
+        {"path": file.filename, "sha": file.sha, "size": len(repo.blobs.get(file.sha, b""))}
+        for file in repo.compare.return_value.files
+    ]
+
+
+def fake_download_blob(repo, path, snapshot):
+    snapshot.store(path, io.BytesIO(repo.blobs[snapshot.blob_shas[path]]))
+
+
+class TestReviewState(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(clear_local_cache)
+
+    @patch("tools.incremental.settings.ENABLE_REDIS", True)
+    @patch("tools.tiered_cache.get_redis_client")
+    def test_save_and_load_review_state(self, mock_get_redis_client):
+        mock_get_redis_client.return_value = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        state = ReviewState(
+            commit_sha="sha1",
+            blob_shas={"main.py": "blob1", "empty.py": "blob2"},
+            summaries={"main.py": "review of main", "empty.py": None},
+            gitignore="*.log\n",
+        )
+
+        save_review_state("username/repository", "Junior", "description", state)
+
+        self.assertEqual(load_review_state("username/repository", "Junior", "description"), state)
+        self.assertIsNone(load_review_state("username/repository", "Senior", "description"))
+
+    @patch("tools.incremental.settings.ENABLE_REDIS", True)
+    @patch("tools.tiered_cache.get_redis_client")
+    def test_review_state_of_other_model_or_prompts_is_not_loaded(self, mock_get_redis_client):
+        mock_get_redis_client.return_value = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        save_review_state("username/repository", "Junior", "description", ReviewState(commit_sha="sha1"))
+
+        with patch("tools.incremental.PROMPT_VERSION", "other"):
+            self.assertIsNone(load_review_state("username/repository", "Junior", "description"))
+        with patch("tools.incremental.settings.LOCAL_MODEL_NAME", "other-model"), \
+                patch("tools.incremental.settings.OPENAI_MODEL_NAME", "other-model"):
+            self.assertIsNone(load_review_state("username/repository", "Junior", "description"))
+
+    @patch("tools.incremental.settings.ENABLE_REDIS", False)
+    def test_load_review_state_without_redis(self):
+        self.assertIsNone(load_review_state("username/repository", "Junior", "description"))
+
+
+class TestPlanIncrementalReview(unittest.TestCase):
+    def setUp(self):
+        patch("tools.incremental.get_repository_tree", side_effect=fake_get_repository_tree).start()
+        self.mock_download_blob = patch("tools.incremental.download_blob", side_effect=fake_download_blob).start()
+        self.addCleanup(patch.stopall)
+        self.state = ReviewState(
+            commit_sha="sha1",
+            blob_shas={"main.py": "m1", "utils.py": "u1", "old.py": "o1", "tests/test_main.py": "t1"},
+            summaries={
+                "main.py": "main review",
+                "utils.py": "utils review",
+                "old.py": "old review",
+                "tests/test_main.py": "test review",
+            },
+            gitignore="*.log\n",
+        )
+
+    def test_plan_incremental_review(self):
+        repo = make_repo(
+            "ahead",
+            [
+                make_file("utils.py", "modified", "u2"),
+                make_file("old.py", "removed", "0"),
+                make_file("src/new.py", "added", "n1"),
+                make_file("debug.log", "added", "l1"),
+                make_file("tests/test_helpers.py", "renamed", "t1", previous_filename="tests/test_main.py"),
+            ],
+            {"u2": b"x = 2\n", "n1": b"y = 1\n", "l1": b"log\n", "t1": b"assert True\n"},
+        )
+
+        plan = plan_incremental_review(repo, self.state, "sha2")
+
+        repo.compare.assert_called_once_with("sha1", "sha2")
+        self.assertEqual(
+            plan.file_paths, ["main.py", "utils.py", "src/new.py", "tests/test_helpers.py"]
+        )
+        self.assertEqual(plan.reused, {"main.py": "main review"})
+        self.assertEqual(plan.blob_shas["utils.py"], "u2")
+        self.assertEqual(plan.changed.read_text("src/new.py"), "y = 1\n")
+        self.assertEqual(plan.changed.commit_sha, "sha2")
+        # Ignored files are not downloaded.
+        self.assertNotIn("debug.log", [call.args[1] for call in self.mock_download_blob.call_args_list])
+
+    @patch("tools.incremental.settings.MAX_REVIEW_FILE_BYTES", 10)
+    def test_plan_incremental_review_skips_large_files_before_download(self):
+        repo = make_repo(
+            "ahead",
+            [make_file("utils.py", "modified", "u2"), make_file("data.py", "added", "d1")],
+            {"u2": b"x = 2\n", "d1": b"DATA = [" + b"0, " * 100 + b"]\n"},
+        )
+
+        plan = plan_incremental_review(repo, self.state, "sha2")
+
+        self.assertEqual([call.args[1] for call in self.mock_download_blob.call_args_list], ["utils.py"])
+        self.assertNotIn("data.py", plan.file_paths)
+        self.assertEqual(plan.blob_shas["utils.py"], "u2")
+
+    def test_plan_incremental_review_drops_review_of_file_now_excluded(self):
+        with patch("tools.incremental.settings.MAX_REVIEW_FILE_BYTES", 10):
+            plan = plan_incremental_review(
+                make_repo("ahead", [make_file("utils.py", "modified", "u2")], {"u2": b"x = 2\n" * 10}),
+                self.state,
+                "sha2",
+            )
+
+        self.assertNotIn("utils.py", plan.file_paths)
+        self.assertNotIn("utils.py", plan.reused)
+
+    def test_plan_incremental_review_same_commit(self):
+        repo = make_repo("identical", [], {})
+
+        plan = plan_incremental_review(repo, self.state, "sha1")
+
+        repo.compare.assert_not_called()
+        self.assertEqual(plan.reused, self.state.summaries)
+        self.assertEqual(plan.changed.paths, [])
+
+    def test_plan_incremental_review_diverged(self):
+        repo = make_repo("diverged", [make_file("utils.py", "modified", "u2")], {"u2": b""})
+
+        self.assertIsNone(plan_incremental_review(repo, self.state, "sha2"))
+
+    def test_plan_incremental_review_gitignore_changed(self):
+        repo = make_repo("ahead", [make_file(".gitignore", "modified", "g2")], {"g2": b""})
+
+        self.assertIsNone(plan_incremental_review(repo, self.state, "sha2"))
+
+    @patch("tools.incremental.settings.INCREMENTAL_REVIEW_MAX_CHANGED_FILES", 1)
+    def test_plan_incremental_review_too_many_changes(self):
+        repo = make_repo(
+            "ahead",
+            [make_file("a.py", "added", "a"), make_file("b.py", "added", "b")],
+            {"a": b"", "b": b""},
+        )
+
+        self.assertIsNone(plan_incremental_review(repo, self.state, "sha2"))
+        self.mock_download_blob.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
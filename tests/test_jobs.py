@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+import fakeredis.aioredis
+
+from tools.jobs import (
+    create_review_job,
+    get_review_job,
+    read_review_job_events,
+    run_review_job,
+    stream_review_job_events,
+)
+
+
+class TestReviewJobs(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        patcher = patch(
+            "tools.jobs.get_async_redis_client",
+            side_effect=lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_create_review_job(self):
+        job_id = await create_review_job("username/repository", "Junior")
+
+        job = await get_review_job(job_id)
+
+        self.assertEqual(job["status"], "queued")
+        self.assertEqual(job["repository"], "username/repository")
+        self.assertEqual(job["files_done"], 0)
+        self.assertIsNone(await get_review_job("unknown"))
+
+    @patch("tools.jobs.store_review", new_callable=AsyncMock)
+    @patch("tools.jobs.get_head_commit_sha", return_value="sha")
+    @patch("tools.jobs.settings.github_client")
+    @patch("tools.jobs.send_files_to_model", new_callable=AsyncMock)
+    async def test_run_review_job(
+        self, mock_send_files_to_model, mock_github_client, mock_get_head_commit_sha, mock_store_review
+    ):
+        async def fake_send_files_to_model(repo, candidate_level, assignment_description,
+                                           on_files_selected, on_file_reviewed, commit_sha):
+            await on_files_selected(["a.py", "b.py"])
+            # Files finish in any order.
+            await on_file_reviewed("b.py", "review of b")
+            await on_file_reviewed("a.py", "review of a")
+            return "final review"
+
+        mock_send_files_to_model.side_effect = fake_send_files_to_model
+        job_id = await create_review_job("username/repository", "Junior")
+
+        await run_review_job(job_id, "username/repository", "Junior", "description")
+
+        job = await get_review_job(job_id)
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual(job["review"], "final review")
+        self.assertEqual((job["files_done"], job["files_total"]), (2, 2))
+        mock_github_client.get_repo.assert_called_once_with("username/repository")
+
+        events = await read_review_job_events(job_id)
+        self.assertEqual([event_type for _, event_type, _ in events], ["file", "file", "completed"])
+        self.assertEqual(events[0][2], {"path": "b.py", "review": "review of b"})
+
+        stream = [event async for event in stream_review_job_events(job_id, events[0][0])]
+        self.assertEqual(len(stream), 2)
+        self.assertTrue(stream[0].startswith(f"id: {events[1][0]}\nevent: file\ndata: "))
+        self.assertIn("event: completed", stream[1])
+
+        stored = mock_store_review.call_args.args
+        self.assertEqual(stored[:5], ("username/repository", "sha", "Junior", "description", "final review"))
+        self.assertEqual(list(stored[5].items()), [("a.py", "review of a"), ("b.py", "review of b")])
+        self.assertIn("seconds", stored[6])
+
+    @patch("tools.jobs.settings.github_client")
+    @patch("tools.jobs.send_files_to_model", new_callable=AsyncMock)
+    async def test_run_review_job_failure(self, mock_send_files_to_model, mock_github_client):
+        mock_send_files_to_model.side_effect = Exception("Error processing repository")
+        job_id = await create_review_job("username/repository", "Junior")
+
+        await run_review_job(job_id, "username/repository", "Junior", "description")
+
+        job = await get_review_job(job_id)
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["error"], "Error processing repository")
+        stream = [event async for event in stream_review_job_events(job_id)]
+        self.assertIn("event: failed", stream[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import unittest
+
+import httpx
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from tests.fake_local_model import FakeLocalModelServer
+from tools.local_inference import CHAT_TEMPLATES, LocalBatchedChatModel, LocalInferenceBackend
+
+
+def user(content: str) -> list:
+    return [{"role": "user", "content": content}]
+
+
+class TestLocalInferenceBackend(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = FakeLocalModelServer(base_seconds=0.01, per_prompt_seconds=0)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    def create_backend(self, **options) -> LocalInferenceBackend:
+        backend = LocalInferenceBackend([self.server.base_url], "llama3", **options)
+        self.addAsyncCleanup(backend.aclose)
+        return backend
+
+    async def test_concurrent_prompts_are_batched(self):
+        backend = self.create_backend(api="completions", max_batch_size=4, max_wait_seconds=10)
+
+        completions = await asyncio.gather(*(backend.generate(user(f"file {i}")) for i in range(8)))
+
+        self.assertEqual(
+            [completion.text for completion in completions],
+            [f"Review of {CHAT_TEMPLATES['llama3'].render(user(f'file {i}'))}" for i in range(8)],
+        )
+        self.assertEqual(self.server.requests["/v1/completions"], 2)
+        self.assertEqual(self.server.batch_sizes, [4, 4])
+        self.assertEqual((completions[0].prompt_tokens, completions[0].completion_tokens), (10, 5))
+        self.assertEqual(self.server.max_tokens, [1024, 1024])
+
+    async def test_partial_batch_is_sent_after_max_wait(self):
+        backend = self.create_backend(api="completions", max_batch_size=8, max_wait_seconds=0.01)
+
+        await asyncio.gather(*(backend.generate(user(f"file {i}")) for i in range(3)))
+
+        self.assertEqual(self.server.batch_sizes, [3])
+
+    async def test_ollama_prompts_are_sent_without_waiting(self):
+        self.server.parallel = 4
+        backend = self.create_backend(api="ollama", max_batch_size=4, max_wait_seconds=10)
+
+        completions = await asyncio.wait_for(
+            asyncio.gather(*(backend.generate(user(f"file {i}")) for i in range(3))), timeout=5
+        )
+
+        self.assertEqual(completions[2].text, "Review of file 2")
+        self.assertEqual(self.server.requests["/api/chat"], 3)
+        self.assertEqual(self.server.max_tokens, [1024] * 3)
+        self.assertEqual(sum(self.server.batch_sizes), 3)
+
+    async def test_endpoint_errors_reach_every_caller(self):
+        self.server.fail_status = 503
+        backend = self.create_backend(api="completions", max_batch_size=2)
+
+        results = await asyncio.gather(
+            backend.generate(user("file 1")), backend.generate(user("file 2")), return_exceptions=True
+        )
+
+        for result in results:
+            self.assertIsInstance(result, httpx.HTTPStatusError)
+            self.assertEqual(result.response.status_code, 503)
+
+    async def test_chat_model(self):
+        model = LocalBatchedChatModel(backend=self.create_backend(api="ollama"))
+
+        message = await model.ainvoke([SystemMessage(content="You review code."), HumanMessage(content="main.py")])
+
+        self.assertEqual(message.content, "Review of main.py")
+        self.assertEqual(message.usage_metadata["total_tokens"], 15)
+        self.assertEqual(
+            self.server.messages,
+            [[{"role": "system", "content": "You review code."}, {"role": "user", "content": "main.py"}]],
+        )
+
+    async def test_chat_model_applies_chat_template(self):
+        model = LocalBatchedChatModel(
+            backend=self.create_backend(api="completions", max_wait_seconds=0, chat_template="chatml")
+        )
+
+        await model.ainvoke([SystemMessage(content="You review code."), HumanMessage(content="main.py")])
+
+        self.assertEqual(
+            self.server.prompts,
+            ["<|im_start|>system\nYou review code.<|im_end|>\n<|im_start|>user\nmain.py<|im_end|>\n"
+             "<|im_start|>assistant\n"],
+        )
+
+
+class TestLeastLoadedRouting(unittest.TestCase):
+    def test_batches_go_to_least_loaded_endpoint(self):
+        backend = LocalInferenceBackend(["http://first", "http://second"], "llama3")
+
+        first = backend._acquire_endpoint(4)
+        second = backend._acquire_endpoint(1)
+        self.assertEqual((first.url, second.url), ("http://first", "http://second"))
+        self.assertEqual(backend._acquire_endpoint(2).url, "http://second")
+
+        backend._release_endpoint(first, 4)
+        self.assertEqual(backend._acquire_endpoint(1).url, "http://first")
+
+    def test_requires_an_endpoint(self):
+        with self.assertRaises(ValueError):
+            LocalInferenceBackend([], "llama3")
+
+    def test_requires_a_known_chat_template(self):
+        with self.assertRaises(ValueError):
+            LocalInferenceBackend(["http://first"], "llama3", chat_template="unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
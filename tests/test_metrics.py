@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import patch
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from tools.metrics import (
+    MODEL_CALL_DURATION,
+    REVIEW_CACHE_REQUESTS,
+    STAGE_DURATION,
+    Counter,
+    Histogram,
+    record_cache_lookup,
+    render_metrics,
+    time_stage,
+    track_review_cost,
+)
+
+
+class TestMetricTypes(unittest.TestCase):
+    def test_histogram_render(self):
+        histogram = Histogram("test_duration_seconds", "Test durations.", ("stage",), buckets=(0.1, 1))
+
+        histogram.observe(0.05, stage="fetch")
+        histogram.observe(0.5, stage="fetch")
+        histogram.observe(5, stage="fetch")
+
+        self.assertEqual(
+            histogram.render(),
+            [
+                "# HELP test_duration_seconds Test durations.",
+                "# TYPE test_duration_seconds histogram",
+                'test_duration_seconds_bucket{stage="fetch",le="0.1"} 1',
+                'test_duration_seconds_bucket{stage="fetch",le="1"} 2',
+                'test_duration_seconds_bucket{stage="fetch",le="+Inf"} 3',
+                'test_duration_seconds_sum{stage="fetch"} 5.55',
+                'test_duration_seconds_count{stage="fetch"} 3',
+            ],
+        )
+
+    def test_counter_render_escapes_labels(self):
+        counter = Counter("test_total", "Test events.", ("path",))
+
+        counter.inc(path='a"b')
+        counter.inc(2, path='a"b')
+
+        self.assertEqual(counter.render()[-1], 'test_total{path="a\\"b"} 3')
+
+    def test_render_metrics(self):
+        metrics = render_metrics()
+
+        self.assertIn("# TYPE review_duration_seconds histogram", metrics)
+        self.assertIn("# TYPE review_cache_requests_total counter", metrics)
+
+
+class TestReviewCost(unittest.IsolatedAsyncioTestCase):
+    @patch("tools.metrics.settings.METRICS_ENABLED", True)
+    async def test_track_review_cost(self):
+        model = FakeListChatModel(responses=["review"])
+        model_calls = MODEL_CALL_DURATION.count()
+        fetches = STAGE_DURATION.count(stage="fetch")
+        hits = REVIEW_CACHE_REQUESTS.value(result="hit")
+
+        with track_review_cost() as cost:
+            with time_stage("fetch"):
+                pass
+            with time_stage("fetch"):
+                await model.ainvoke("prompt")
+            record_cache_lookup(hit=True)
+            record_cache_lookup(hit=False)
+        with time_stage("fetch"):
+            pass
+
+        self.assertEqual(set(cost.stages), {"fetch"})
+        self.assertEqual((cost.cache_hits, cost.cache_misses), (1, 1))
+        self.assertEqual(cost.as_dict()["calls"], 1)
+        self.assertGreaterEqual(cost.seconds, cost.stages["fetch"])
+        self.assertEqual(STAGE_DURATION.count(stage="fetch"), fetches + 3)
+        self.assertEqual(MODEL_CALL_DURATION.count(), model_calls + 1)
+        self.assertEqual(REVIEW_CACHE_REQUESTS.value(result="hit"), hits + 1)
+
+    @patch("tools.metrics.settings.METRICS_ENABLED", False)
+    async def test_disabled(self):
+        model = FakeListChatModel(responses=["review"])
+        model_calls = MODEL_CALL_DURATION.count()
+        fetches = STAGE_DURATION.count(stage="fetch")
+
+        with track_review_cost() as cost:
+            with time_stage("fetch"):
+                await model.ainvoke("prompt")
+
+        self.assertEqual(cost.stages, {})
+        self.assertEqual(cost.token_usage.calls, 1)
+        self.assertEqual(STAGE_DURATION.count(stage="fetch"), fetches)
+        self.assertEqual(MODEL_CALL_DURATION.count(), model_calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from prompts import CHUNK_MAP, PROMPT_TEMPLATES, review_chunk_map_prompt, review_one_chunk_file_prompt
+from prompts.assembly import PromptTemplate, prompts_version
+
+
+def render_chunk(chunk_num: int, candidate_level: str = "Junior"):
+    return review_chunk_map_prompt(
+        file_content=f"chunk {chunk_num}",
+        file_path="main.py",
+        candidate_level=candidate_level,
+        chunk_num=chunk_num,
+        total_chunk_num=2,
+        file_outline="1: def main():",
+        assignment_description="Build an API",
+    )
+
+
+class TestPromptAssembly(unittest.TestCase):
+    def test_messages_go_from_static_to_variable(self):
+        messages = render_chunk(1).messages
+
+        self.assertEqual([type(message) for message in messages], [SystemMessage, HumanMessage, HumanMessage])
+        self.assertEqual(messages[0].content, CHUNK_MAP.instructions)
+        self.assertIn("Build an API", messages[1].content)
+        self.assertIn("Junior", messages[1].content)
+        self.assertTrue(messages[2].content.endswith("**Chunk 1 out of 2**:\nchunk 1"))
+        self.assertIn("**Static Analysis Findings**:\nNot available\n\n**Chunk 1", messages[2].content)
+
+    def test_calls_of_a_review_share_their_prefix(self):
+        first, second = render_chunk(1).messages, render_chunk(2).messages
+
+        self.assertEqual(first[:2], second[:2])
+        self.assertNotEqual(first[2], second[2])
+        self.assertNotEqual(render_chunk(1, "Senior").messages[1], first[1])
+
+    def test_instructions_do_not_depend_on_the_review(self):
+        junior = review_one_chunk_file_prompt("x = 1", "main.py", "Junior", "Build an API")
+        senior = review_one_chunk_file_prompt("y = 2", "app.py", "Senior", "Build a CLI")
+
+        self.assertEqual(junior.messages[0], senior.messages[0])
+        self.assertTrue(junior.text.startswith(junior.template.instructions))
+
+    def test_missing_field(self):
+        with self.assertRaises(KeyError):
+            CHUNK_MAP.render("Junior", "Build an API", file_content="x = 1")
+
+    def test_instructions_must_be_static(self):
+        with self.assertRaises(ValueError):
+            PromptTemplate(name="test", version=1, instructions="Review {file_path}", content="{file_content}")
+
+    def test_version_changes_with_any_prompt(self):
+        changed = PromptTemplate(
+            name=CHUNK_MAP.name, version=CHUNK_MAP.version, instructions="Other", content=CHUNK_MAP.content
+        )
+        templates = [changed if template is CHUNK_MAP else template for template in PROMPT_TEMPLATES]
+
+        self.assertEqual(prompts_version(PROMPT_TEMPLATES), prompts_version(reversed(PROMPT_TEMPLATES)))
+        self.assertNotEqual(prompts_version(templates), prompts_version(PROMPT_TEMPLATES))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+from pydantic import ValidationError
+
+from core.config import Settings
+from core.providers import create_generative_model, create_github_client
+
+
+def create_settings(**values) -> Settings:
+    return Settings(_env_file=None, GITHUB_ACCESS_TOKEN="token", **values)
+
+
+class TestProviders(unittest.TestCase):
+    def test_create_generative_model_local(self):
+        model = create_generative_model(create_settings(LOCAL_DEVELOPMENT=True, LOCAL_MODEL_NAME="llama3"))
+
+        self.assertEqual(type(model).__name__, "ChatOllama")
+        self.assertEqual(model.model, "llama3")
+
+    def test_create_generative_model_batched_local(self):
+        model = create_generative_model(
+            create_settings(
+                LOCAL_DEVELOPMENT=True, LOCAL_MODEL_ENDPOINTS=["http://first/", "http://second"], LOCAL_BATCH_MAX_SIZE=4,
+                LOCAL_MODEL_MAX_TOKENS=2048, LOCAL_MODEL_CHAT_TEMPLATE="chatml",
+            )
+        )
+
+        self.assertEqual(type(model).__name__, "LocalBatchedChatModel")
+        self.assertEqual([endpoint.url for endpoint in model.backend.endpoints], ["http://first", "http://second"])
+        self.assertEqual(model.backend.max_batch_size, 4)
+        self.assertEqual(model.backend.max_tokens, 2048)
+        self.assertEqual(model.backend.chat_template.stop, "<|im_end|>")
+
+    def test_create_generative_model_openai(self):
+        model = create_generative_model(create_settings(LOCAL_DEVELOPMENT=False, OPENAI_API_KEY="key"))
+
+        self.assertEqual(type(model).__name__, "ChatOpenAI")
+        self.assertEqual(model.max_retries, 0)
+
+    def test_create_github_client(self):
+        with patch("github.Github") as mock_github:
+            create_github_client(create_settings(GITHUB_POOL_SIZE=4))
+
+        self.assertEqual(mock_github.call_args.kwargs["pool_size"], 4)
+        self.assertIsNone(mock_github.call_args.kwargs["retry"])
+
+    def test_missing_openai_api_key_fails_at_startup(self):
+        with self.assertRaises(ValidationError):
+            create_settings(LOCAL_DEVELOPMENT=False, OPENAI_API_KEY=None)
+
+
+class TestLazyClients(unittest.TestCase):
+    @patch("core.config.create_github_client")
+    def test_clients_are_created_once_on_first_use(self, mock_create_github_client):
+        settings = create_settings()
+        self.assertFalse(settings.is_created("github_client"))
+        mock_create_github_client.assert_not_called()
+
+        self.assertIs(settings.github_client, settings.github_client)
+
+        mock_create_github_client.assert_called_once_with(settings)
+        self.assertTrue(settings.is_created("github_client"))
+
+    def test_importing_the_application_does_not_import_client_libraries(self):
+        environment = {"GITHUB_ACCESS_TOKEN": "token", "ENABLE_REDIS": "False", **os.environ}
+        completed = subprocess.run(
+            [sys.executable, "-c", "import sys, app, worker; print(','.join(sys.modules))"],
+            capture_output=True,
+            text=True,
+            env=environment,
+            check=True,
+        )
+        imported = completed.stdout.strip().split(",")
+
+        for module in ("langchain_openai", "langchain_ollama", "openai", "langchain.chains"):
+            self.assertNotIn(module, imported)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+from github import GithubException, RateLimitExceededException
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from tools.rate_limit import (
+    ModelRateLimitHandler,
+    RateLimiter,
+    _BucketState,
+    _classify_error,
+    _parse_seconds,
+    _take,
+    background_priority,
+)
+
+
+def create_rate_limiter(requests_per_minute: int = 0, tokens_per_minute: int = 0) -> RateLimiter:
+    return RateLimiter("test", lambda: requests_per_minute, lambda: tokens_per_minute)
+
+
+class TestTake(unittest.TestCase):
+    def test_requests_per_minute(self):
+        state = _BucketState()
+        for _ in range(2):
+            state, wait = _take(state, 100.0, 0, 2, 0)
+            self.assertEqual(wait, 0)
+
+        state, wait = _take(state, 100.0, 0, 2, 0)
+        self.assertEqual(wait, 30)
+
+        state, wait = _take(state, 130.0, 0, 2, 0)
+        self.assertEqual(wait, 0)
+
+    def test_tokens_per_minute(self):
+        state, wait = _take(_BucketState(), 100.0, 600, 0, 1000)
+        self.assertEqual(wait, 0)
+
+        state, wait = _take(state, 100.0, 600, 0, 1000)
+        self.assertAlmostEqual(wait, 12)
+        self.assertAlmostEqual(state.tokens, 400)
+
+    def test_request_larger_than_bucket_waits_for_full_bucket(self):
+        state, wait = _take(_BucketState(), 100.0, 5000, 0, 1000)
+
+        self.assertEqual(wait, 0)
+        self.assertEqual(state.tokens, 0)
+
+    def test_blocked(self):
+        state, wait = _take(_BucketState(blocked_until=110.0), 100.0, 0, 0, 0)
+
+        self.assertEqual(wait, 10)
+
+
+class TestClassifyError(unittest.TestCase):
+    def test_github_rate_limit(self):
+        error = RateLimitExceededException(
+            403, {"message": "API rate limit exceeded"}, {"X-RateLimit-Remaining": "0", "Retry-After": "30"}
+        )
+
+        self.assertEqual(_classify_error(error), (True, 30))
+
+    def test_github_forbidden(self):
+        error = GithubException(403, {"message": "Resource not accessible"}, {})
+
+        self.assertEqual(_classify_error(error), (False, None))
+
+    def test_server_error(self):
+        error = GithubException(502, {"message": "Bad gateway"}, {})
+
+        self.assertEqual(_classify_error(error), (True, None))
+
+    def test_not_found(self):
+        error = GithubException(404, {"message": "Not Found"}, {})
+
+        self.assertEqual(_classify_error(error), (False, None))
+
+    def test_parse_seconds(self):
+        self.assertEqual(_parse_seconds("12"), 12)
+        self.assertEqual(_parse_seconds("6m0s"), 360)
+        self.assertAlmostEqual(_parse_seconds("1s20ms"), 1.02)
+        self.assertIsNone(_parse_seconds(None))
+
+
+@patch("tools.rate_limit.settings.ENABLE_REDIS", False)
+@patch("tools.rate_limit.settings.RATE_LIMIT_MAX_RETRIES", 2)
+@patch("tools.rate_limit.settings.RATE_LIMIT_BACKOFF_BASE_SECONDS", 0.01)
+class TestRateLimiterCall(unittest.IsolatedAsyncioTestCase):
+    async def test_retries_transient_errors(self):
+        func = AsyncMock(side_effect=[GithubException(503, {}, {}), "result"])
+
+        self.assertEqual(await create_rate_limiter().call(func), "result")
+        self.assertEqual(func.await_count, 2)
+
+    async def test_raises_after_max_retries(self):
+        func = AsyncMock(side_effect=GithubException(503, {}, {}))
+
+        with self.assertRaises(GithubException):
+            await create_rate_limiter().call(func)
+        self.assertEqual(func.await_count, 3)
+
+    async def test_does_not_retry_other_errors(self):
+        func = AsyncMock(side_effect=ValueError("bad request"))
+
+        with self.assertRaises(ValueError):
+            await create_rate_limiter().call(func)
+        func.assert_awaited_once()
+
+    def test_retry_after_blocks_all_callers(self):
+        clock = MagicMock()
+        clock.time.return_value = 100.0
+        clock.sleep.side_effect = lambda seconds: setattr(clock.time, "return_value", clock.time() + seconds)
+        rate_limiter = create_rate_limiter()
+        error = GithubException(429, {}, {"Retry-After": "30"})
+
+        with patch("tools.rate_limit.time", clock):
+            self.assertEqual(rate_limiter.call_sync(MagicMock(side_effect=[error, "result"])), "result")
+
+        self.assertGreaterEqual(clock.time(), 130)
+
+    def test_call_sync(self):
+        func = MagicMock(side_effect=[GithubException(503, {}, {}), "result"])
+
+        self.assertEqual(create_rate_limiter().call_sync(func), "result")
+        self.assertEqual(func.call_count, 2)
+
+
+@patch("tools.rate_limit.settings.ENABLE_REDIS", False)
+class TestRateLimiterAcquire(unittest.IsolatedAsyncioTestCase):
+    async def test_waiters_are_served_by_priority(self):
+        rate_limiter = create_rate_limiter(requests_per_minute=600)
+        for _ in range(600):
+            rate_limiter.try_acquire()
+        served = []
+
+        async def acquire(name: str):
+            await rate_limiter.acquire()
+            served.append(name)
+
+        with background_priority():
+            background = [asyncio.create_task(acquire(f"background {i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(acquire("interactive"))
+        await asyncio.gather(*background, interactive)
+
+        self.assertEqual(served, ["interactive", "background 0", "background 1"])
+
+
+@patch("tools.rate_limit.settings.ENABLE_REDIS", False)
+class TestRateLimiterDebit(unittest.TestCase):
+    def test_debit_keeps_the_request_budget(self):
+        rate_limiter = create_rate_limiter(requests_per_minute=60, tokens_per_minute=10000)
+        self.assertEqual(rate_limiter.try_acquire(100), 0)
+
+        rate_limiter.debit(500)
+
+        self.assertAlmostEqual(rate_limiter._local_state.requests, 59, delta=0.1)
+        self.assertAlmostEqual(rate_limiter._local_state.tokens, 9400, delta=10)
+        self.assertEqual(rate_limiter.try_acquire(100), 0)
+
+
+@patch("tools.rate_limit.settings.ENABLE_REDIS", True)
+class TestSharedRateLimiter(unittest.TestCase):
+    def setUp(self):
+        redis_client = fakeredis.FakeStrictRedis(decode_responses=True)
+        patcher = patch("tools.rate_limit.get_redis_client", return_value=redis_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_budget_is_shared_between_instances(self):
+        self.assertEqual(create_rate_limiter(requests_per_minute=1).try_acquire(), 0)
+
+        self.assertGreater(create_rate_limiter(requests_per_minute=1).try_acquire(), 0)
+
+    def test_block_is_shared_between_instances(self):
+        create_rate_limiter().block(30)
+
+        self.assertGreater(create_rate_limiter().try_acquire(), 29)
+
+
+class TestModelRateLimitHandler(unittest.TestCase):
+    @patch("tools.rate_limit.model_rate_limiter")
+    def test_exhausted_quota_blocks(self, mock_model_rate_limiter):
+        message = AIMessage(
+            content="review",
+            response_metadata={
+                "headers": {"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "1m30s"},
+            },
+            usage_metadata={"input_tokens": 100, "output_tokens": 50, "total_tokens": 150},
+        )
+
+        ModelRateLimitHandler().on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+
+        mock_model_rate_limiter.debit.assert_called_once_with(50)
+        mock_model_rate_limiter.block.assert_called_once_with(90)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import redis
+
+from tools.redis_client import (
+    close_redis_pools,
+    get_async_redis_client,
+    get_redis_client,
+    ping_redis,
+)
+
+
+class TestRedisClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        await close_redis_pools()
+
+    async def test_clients_share_a_pool(self):
+        self.assertIs(get_redis_client().connection_pool, get_redis_client().connection_pool)
+        self.assertIsNot(
+            get_redis_client().connection_pool,
+            get_redis_client(decode_responses=False).connection_pool,
+        )
+        self.assertIs(
+            get_async_redis_client().connection_pool, get_async_redis_client().connection_pool
+        )
+
+    @patch("tools.redis_client.settings.REDIS_MAX_CONNECTIONS", 3)
+    async def test_pool_settings(self):
+        pool = get_async_redis_client().connection_pool
+
+        self.assertEqual(pool.max_connections, 3)
+        self.assertTrue(pool.connection_kwargs["socket_keepalive"])
+
+    async def test_async_pools_are_per_event_loop(self):
+        pool = get_async_redis_client().connection_pool
+
+        async def other_loop_pool():
+            return get_async_redis_client().connection_pool
+
+        self.assertIsNot(await asyncio.to_thread(asyncio.run, other_loop_pool()), pool)
+
+    async def test_close_redis_pools(self):
+        pool = get_redis_client().connection_pool
+        async_pool = get_async_redis_client().connection_pool
+
+        await close_redis_pools()
+
+        self.assertIsNot(get_redis_client().connection_pool, pool)
+        self.assertIsNot(get_async_redis_client().connection_pool, async_pool)
+
+    @patch("redis.asyncio.StrictRedis.ping", side_effect=redis.exceptions.ConnectionError)
+    async def test_ping_redis_unavailable(self, mock_ping):
+        self.assertFalse(await ping_redis())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import time
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+import redis
+
+from core.config import settings
+from tools.review_cache import (
+    build_review_cache_key,
+    get_cached_review,
+    get_review_cache_stats,
+    set_cached_review,
+)
+
+
+class TestBuildReviewCacheKey(unittest.TestCase):
+    def test_key_is_content_addressed(self):
+        key = build_review_cache_key("blob", "Junior", "Build a TODO app")
+
+        self.assertEqual(key, build_review_cache_key("blob", "Junior", "Build a TODO app"))
+        self.assertTrue(key.endswith(":Junior:" + key.split(":")[-2] + ":blob"))
+
+    def test_key_depends_on_review_inputs(self):
+        key = build_review_cache_key("blob", "Junior", "Build a TODO app")
+
+        self.assertNotEqual(key, build_review_cache_key("other", "Junior", "Build a TODO app"))
+        self.assertNotEqual(key, build_review_cache_key("blob", "Senior", "Build a TODO app"))
+        self.assertNotEqual(key, build_review_cache_key("blob", "Junior", "Build a chat app"))
+
+    def test_key_depends_on_static_analysis_settings(self):
+        key = build_review_cache_key("blob", "Junior", "Build a TODO app")
+
+        with patch("tools.review_cache.settings.ENABLE_STATIC_ANALYSIS", not settings.ENABLE_STATIC_ANALYSIS):
+            self.assertNotEqual(key, build_review_cache_key("blob", "Junior", "Build a TODO app"))
+        with patch("tools.review_cache.settings.ENABLE_STATIC_ANALYSIS", True):
+            analyzed_key = build_review_cache_key("blob", "Junior", "Build a TODO app")
+            with patch("tools.review_cache.settings.STATIC_ANALYSIS_LINTERS", {".js": "eslint --stdin"}):
+                self.assertNotEqual(analyzed_key, build_review_cache_key("blob", "Junior", "Build a TODO app"))
+
+    @patch("tools.review_cache.PROMPT_VERSION", "2")
+    def test_key_depends_on_prompt_version(self):
+        self.assertIn("review:2:", build_review_cache_key("blob", "Junior", "Build a TODO app"))
+
+
+@patch("tools.review_cache.settings.ENABLE_REVIEW_CACHE", True)
+@patch("tools.review_cache.settings.ENABLE_REDIS", True)
+class TestCachedReview(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        patcher = patch("tools.review_cache.get_redis_client", return_value=self.redis_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cache_miss_then_hit(self):
+        self.assertIsNone(get_cached_review("review:key"))
+
+        set_cached_review("review:key", "Looks good")
+
+        self.assertEqual(get_cached_review("review:key"), "Looks good")
+        self.assertEqual(get_review_cache_stats(), {"hits": 1, "misses": 1, "entries": 1})
+        self.assertGreater(self.redis_client.ttl("review:key"), 0)
+
+    @patch("tools.review_cache.settings.REVIEW_CACHE_MAX_ENTRIES", 2)
+    def test_least_recently_used_reviews_are_evicted(self):
+        set_cached_review("review:a", "a")
+        set_cached_review("review:b", "b")
+        get_cached_review("review:a")
+
+        set_cached_review("review:c", "c")
+
+        self.assertIsNone(self.redis_client.get("review:b"))
+        self.assertEqual(self.redis_client.get("review:a"), "a")
+        self.assertEqual(self.redis_client.get("review:c"), "c")
+        self.assertEqual(get_review_cache_stats()["entries"], 2)
+
+    def test_expired_reviews_are_pruned_from_the_index(self):
+        expired_at = time.time() - 2 * 60 * 60
+        self.redis_client.zadd("review_cache:index", {"review:expired": expired_at})
+
+        with patch("tools.review_cache.settings.REVIEW_CACHE_TTL_MINUTES", 60):
+            set_cached_review("review:key", "Looks good")
+
+        self.assertEqual(self.redis_client.zrange("review_cache:index", 0, -1), ["review:key"])
+        self.assertEqual(get_review_cache_stats()["entries"], 1)
+
+    def test_redis_errors_are_a_miss_and_skip_storing(self):
+        with patch("tools.review_cache.get_redis_client", side_effect=redis.exceptions.ConnectionError):
+            set_cached_review("review:key", "Looks good")
+
+            self.assertIsNone(get_cached_review("review:key"))
+        self.assertIsNone(self.redis_client.get("review:key"))
+
+    def test_disabled_cache(self):
+        with patch("tools.review_cache.settings.ENABLE_REVIEW_CACHE", False):
+            set_cached_review("review:key", "Looks good")
+
+            self.assertIsNone(get_cached_review("review:key"))
+        self.assertIsNone(self.redis_client.get("review:key"))
+
+
+if __name__ == "__main__":
+    unittest.main()
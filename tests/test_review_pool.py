@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from tools.review_pool import ReviewPool, create_review_pool
+
+
+class TestReviewPool(unittest.IsolatedAsyncioTestCase):
+    async def test_identical_files_are_reviewed_once(self):
+        pool = ReviewPool(semaphore=asyncio.Semaphore(2))
+
+        async def slow_review():
+            await asyncio.sleep(0.01)
+            return "review"
+
+        review = AsyncMock(side_effect=slow_review)
+
+        results = await asyncio.gather(
+            pool.review_once("main.py", "blob", review), pool.review_once("main.py", "blob", review)
+        )
+
+        self.assertEqual(results, ["review", "review"])
+        review.assert_awaited_once()
+
+    async def test_files_at_other_paths_are_reviewed_apart(self):
+        pool = ReviewPool(semaphore=asyncio.Semaphore(2))
+        review = AsyncMock(side_effect=["review of main.py", "review of app.py"])
+
+        results = await asyncio.gather(
+            pool.review_once("main.py", "blob", review), pool.review_once("app.py", "blob", review)
+        )
+
+        self.assertEqual(results, ["review of main.py", "review of app.py"])
+        self.assertEqual(review.await_count, 2)
+
+    @patch("tools.review_pool.settings.REVIEW_CONCURRENCY", 3)
+    async def test_create_review_pool(self):
+        pool = create_review_pool()
+
+        self.assertEqual(pool.semaphore._value, 3)
+        self.assertEqual(pool.file_reviews, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+import fakeredis.aioredis
+import redis
+
+from tools.jobs import create_review_job, get_review_job, read_review_job_events
+from tools.review_queue import (
+    claim_review_tasks,
+    enqueue_review_job,
+    process_review_task,
+    run_worker,
+)
+from tools.snapshot import RepositorySnapshot
+from tools.templates import AssignmentTemplate
+from tools.texts import estimate_tokens
+
+
+def make_snapshot(files):
+    return RepositorySnapshot(
+        full_name="username/repository",
+        commit_sha="sha",
+        blob_shas={path: f"blob{index}" for index, path in enumerate(files)},
+        sizes={path: len(content) for path, content in files.items()},
+        files=files,
+    )
+
+
+class TestReviewQueue(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+
+        def redis_client(decode_responses=True):
+            return fakeredis.aioredis.FakeRedis(server=self.server, decode_responses=decode_responses)
+
+        patchers = [
+            patch("tools.jobs.get_async_redis_client", side_effect=redis_client),
+            patch("tools.review_queue.get_async_redis_client", side_effect=redis_client),
+            patch("tools.review_queue.settings.github_client"),
+            patch("tools.review_queue.settings.REVIEW_QUEUE_BLOCK_MS", 10),
+            patch("tools.review_queue.get_token_counter", return_value=estimate_tokens),
+            patch(
+                "tools.review_queue.load_repository_snapshot",
+                return_value=make_snapshot({"main.py": b"print('main')\n", "utils.py": b"x = 1\n"}),
+            ),
+            patch("tools.review_queue.load_assignment_template", return_value=None),
+            # The one-line test files would not be sent to the model.
+            patch("tools.app_functions.settings.ENABLE_STATIC_ANALYSIS", False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.redis_client = redis_client()
+        self.blob_client = redis_client(decode_responses=False)
+
+    async def enqueue(self):
+        job_id = await create_review_job("username/repository", "Junior")
+        await enqueue_review_job(job_id, "username/repository", "Junior", "description")
+        return job_id
+
+    async def process(self, consumer_name, tasks):
+        for message_id, task in tasks:
+            await process_review_task(
+                self.redis_client, self.blob_client, consumer_name,
+                message_id, task, estimate_tokens,
+            )
+
+    @patch("tools.app_functions.settings.GENERATIVE_MODEL")
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock)
+    async def test_workers_complete_job(self, mock_process_file, mock_model):
+        mock_process_file.side_effect = lambda chunks, path, level, description, findings: f"review of {path}"
+        mock_model.ainvoke = AsyncMock(return_value=MagicMock(content="final review"))
+        job_id = await self.enqueue()
+        self.assertEqual((await get_review_job(job_id))["files_total"], 2)
+
+        async def claim_with_latency(*args):
+            # fakeredis serves blocking reads without yielding to the event loop, unlike a Redis server.
+            await asyncio.sleep(0.005)
+            return await claim_review_tasks(*args)
+
+        stop_event = asyncio.Event()
+        with patch("tools.review_queue.claim_review_tasks", side_effect=claim_with_latency):
+            workers = [
+                asyncio.create_task(run_worker(f"worker-{index}", stop_event)) for index in range(2)
+            ]
+            for _ in range(200):
+                if (await get_review_job(job_id))["status"] == "completed":
+                    break
+                await asyncio.sleep(0.01)
+            stop_event.set()
+            await asyncio.gather(*workers)
+
+        job = await get_review_job(job_id)
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual(job["review"], "Files found: main.py, utils.py\nfinal review")
+        self.assertEqual(job["files_done"], 2)
+        events = await read_review_job_events(job_id)
+        self.assertEqual(sorted(event_type for _, event_type, _ in events), ["completed", "file", "file"])
+        self.assertEqual(mock_model.ainvoke.await_count, 1)
+        self.assertEqual(await self.redis_client.xlen("review_tasks"), 0)
+
+    @patch("tools.app_functions.settings.GENERATIVE_MODEL")
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock, return_value="review")
+    async def test_worker_survives_redis_errors_while_claiming(self, mock_process_file, mock_model):
+        mock_model.ainvoke = AsyncMock(return_value=MagicMock(content="final review"))
+        job_id = await self.enqueue()
+        claims = []
+
+        async def flaky_claim(*args):
+            await asyncio.sleep(0.005)
+            claims.append(args)
+            if len(claims) == 1:
+                raise redis.exceptions.ConnectionError("Connection reset by peer")
+            return await claim_review_tasks(*args)
+
+        stop_event = asyncio.Event()
+        with patch("tools.review_queue.claim_review_tasks", side_effect=flaky_claim):
+            worker = asyncio.create_task(run_worker("worker", stop_event))
+            for _ in range(200):
+                if (await get_review_job(job_id))["status"] == "completed":
+                    break
+                await asyncio.sleep(0.01)
+            stop_event.set()
+            await worker
+
+        self.assertGreater(len(claims), 1)
+        self.assertEqual((await get_review_job(job_id))["status"], "completed")
+
+    @patch("tools.app_functions.settings.GENERATIVE_MODEL")
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock, return_value="review")
+    async def test_crashed_worker_tasks_are_reclaimed(self, mock_process_file, mock_model):
+        mock_model.ainvoke = AsyncMock(return_value=MagicMock(content="final review"))
+        job_id = await self.enqueue()
+
+        # The first worker takes the tasks and dies without acknowledging them.
+        self.assertEqual(len(await claim_review_tasks(self.redis_client, "crashed", 10)), 2)
+        self.assertEqual(await claim_review_tasks(self.redis_client, "alive", 10), [])
+        with patch("tools.review_queue.settings.REVIEW_TASK_VISIBILITY_TIMEOUT_SECONDS", 0):
+            reclaimed = await claim_review_tasks(self.redis_client, "alive", 10)
+        self.assertEqual(sorted(task["path"] for _, task in reclaimed), ["main.py", "utils.py"])
+
+        await self.process("alive", reclaimed)
+        await self.process("alive", await claim_review_tasks(self.redis_client, "alive", 10))
+
+        self.assertEqual((await get_review_job(job_id))["status"], "completed")
+
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock, return_value="review")
+    async def test_redelivered_task_is_counted_once(self, mock_process_file):
+        job_id = await self.enqueue()
+        tasks = await claim_review_tasks(self.redis_client, "worker", 1)
+
+        await self.process("worker", tasks)
+        await self.process("worker", tasks)
+
+        self.assertEqual((await get_review_job(job_id))["files_done"], 1)
+        events = await read_review_job_events(job_id)
+        self.assertEqual([event_type for _, event_type, _ in events], ["file"])
+
+    async def test_files_of_the_template(self):
+        template = AssignmentTemplate(
+            repository="username/template",
+            commit_sha="template-sha",
+            blob_shas={"main.py": "blob0", "utils.py": "template-blob"},
+            texts={"utils.py": "".join(f"x = {index}\n" for index in range(60))},
+        )
+        files = {
+            "main.py": b"print('main')\n",
+            "utils.py": template.texts["utils.py"].replace("x = 3\n", "y = 3\n").encode(),
+        }
+        with patch("tools.review_queue.load_assignment_template", return_value=template), \
+                patch("tools.review_queue.load_repository_snapshot", return_value=make_snapshot(files)):
+            await self.enqueue()
+
+        tasks = await claim_review_tasks(self.redis_client, "worker", 10)
+        # main.py is the same as in the template, utils.py is sent as a diff against it.
+        self.assertEqual([task["path"] for _, task in tasks], ["utils.py"])
+        self.assertEqual(tasks[0][1]["blob_sha"], "blob1:template-blob")
+        content = (await self.blob_client.get("review_blob:blob1:template-blob")).decode()
+        self.assertIn("-x = 3\n+y = 3\n", content)
+
+    async def test_undecodable_template_file_fails_the_job(self):
+        template = AssignmentTemplate(
+            repository="username/template",
+            commit_sha="template-sha",
+            blob_shas={"utils.py": "template-blob"},
+            texts={"utils.py": "x = 1\n"},
+        )
+        # Only the head of a file is checked for binary content.
+        files = {"main.py": b"print('main')\n", "utils.py": b"x = 1\n" * 2000 + "y = 'café'\n".encode("latin-1")}
+        with patch("tools.review_queue.load_assignment_template", return_value=template), \
+                patch("tools.review_queue.load_repository_snapshot", return_value=make_snapshot(files)):
+            job_id = await self.enqueue()
+
+        self.assertEqual((await get_review_job(job_id))["status"], "failed")
+        self.assertEqual(await self.redis_client.exists("review_tasks"), 0)
+
+    @patch("tools.review_queue.settings.REVIEW_TASK_VISIBILITY_TIMEOUT_SECONDS", 1)
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock, return_value="review")
+    async def test_summary_lock_is_renewed_while_summarizing(self, mock_process_file):
+        job_id = await self.enqueue()
+        await self.process("worker", await claim_review_tasks(self.redis_client, "worker", 10))
+        summarize_tasks = await claim_review_tasks(self.redis_client, "worker", 10)
+        lock_holders = []
+
+        async def slow_summary(*args):
+            await asyncio.sleep(1.5)
+            lock_holders.append(await self.redis_client.get(f"review_job:{job_id}:summary_lock"))
+            return "final review"
+
+        with patch("tools.review_queue.summarize_file_reviews", side_effect=slow_summary):
+            await self.process("worker", summarize_tasks)
+
+        self.assertEqual(lock_holders, [summarize_tasks[0][0]])
+        self.assertEqual((await get_review_job(job_id))["status"], "completed")
+
+    @patch("tools.review_queue.settings.REVIEW_TASK_MAX_ATTEMPTS", 2)
+    @patch("tools.app_functions.process_file", new_callable=AsyncMock, side_effect=Exception("model error"))
+    async def test_failing_task_is_given_up(self, mock_process_file):
+        job_id = await self.enqueue()
+        tasks = await claim_review_tasks(self.redis_client, "worker", 10)
+
+        for _ in range(3):
+            await self.process("worker", tasks)
+
+        self.assertEqual(mock_process_file.await_count, 4)
+        summarize_tasks = await claim_review_tasks(self.redis_client, "worker", 10)
+        self.assertEqual([task["kind"] for _, task in summarize_tasks], ["summarize"])
+        await self.process("worker", summarize_tasks)
+        job = await get_review_job(job_id)
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["files_done"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from tools import review_store
+from tools.review_store import (
+    ReviewRecorder,
+    close_review_store,
+    get_stored_review,
+    hash_assignment,
+    list_stored_reviews,
+    prune_review_store,
+    save_review,
+    store_review,
+)
+
+
+def save(repository: str = "username/repository", commit_sha: str = "sha", candidate_level: str = "Junior",
+         assignment_description: str = "Build an API", file_reviews: dict = None) -> int:
+    return save_review(
+        repository,
+        commit_sha,
+        candidate_level,
+        assignment_description,
+        f"review of {repository}@{commit_sha}",
+        {"main.py": "review of main.py", "empty.py": None} if file_reviews is None else file_reviews,
+        {"seconds": 1.5, "total_tokens": 120},
+    )
+
+
+class TestReviewStore(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "store", "reviews.sqlite3")
+        for name, value in (("REVIEW_STORE_PATH", self.path), ("ENABLE_REVIEW_STORE", True)):
+            patcher = patch.object(review_store.settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(close_review_store)
+
+    def test_save_and_get(self):
+        large_review = "Consider splitting this function. " * 100
+        review_id = save(file_reviews={"main.py": large_review, "app.py": "short", "empty.py": None})
+
+        stored = get_stored_review(review_id)
+
+        self.assertEqual(stored["repository"], "username/repository")
+        self.assertEqual(stored["commit_sha"], "sha")
+        self.assertEqual(stored["assignment_description"], "Build an API")
+        self.assertEqual(stored["assignment_hash"], hash_assignment("Build an API"))
+        self.assertEqual(stored["review"], "review of username/repository@sha")
+        self.assertEqual(stored["cost"], {"seconds": 1.5, "total_tokens": 120})
+        self.assertEqual(
+            stored["files"],
+            [
+                {"path": "main.py", "review": large_review},
+                {"path": "app.py", "review": "short"},
+                {"path": "empty.py", "review": None},
+            ],
+        )
+        self.assertIsNone(get_stored_review(review_id + 1))
+
+    def test_reviews_survive_the_connection(self):
+        review_id = save()
+        close_review_store()
+
+        self.assertEqual(get_stored_review(review_id)["commit_sha"], "sha")
+
+    def test_list_filters(self):
+        first = save()
+        second = save(commit_sha="other")
+        third = save(repository="username/other", candidate_level="Senior")
+        fourth = save(assignment_description="Build a CLI")
+
+        self.assertEqual([review["id"] for review in list_stored_reviews()], [fourth, third, second, first])
+        self.assertEqual(
+            [review["id"] for review in list_stored_reviews(repository="username/repository", commit_sha="sha")],
+            [fourth, first],
+        )
+        self.assertEqual([review["id"] for review in list_stored_reviews(candidate_level="Senior")], [third])
+        self.assertEqual(
+            [review["id"] for review in list_stored_reviews(assignment_hash=hash_assignment("Build a CLI"))],
+            [fourth],
+        )
+        listed = list_stored_reviews(commit_sha="other")[0]
+        self.assertEqual(listed["cost"], {"seconds": 1.5, "total_tokens": 120})
+        self.assertNotIn("review", listed)
+
+    def test_list_pages(self):
+        review_ids = [save(commit_sha=str(index)) for index in range(5)]
+
+        first_page = list_stored_reviews(limit=2)
+        second_page = list_stored_reviews(before=first_page[-1]["id"], limit=2)
+
+        self.assertEqual([review["id"] for review in first_page], review_ids[:2:-1])
+        self.assertEqual([review["id"] for review in second_page], review_ids[2:0:-1])
+
+    def test_lookups_use_indexes(self):
+        save()
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        for query, values in (
+            ("SELECT * FROM reviews WHERE repository = ? AND commit_sha = ? ORDER BY id DESC", ("a", "b")),
+            ("SELECT * FROM reviews WHERE assignment_hash = ? AND candidate_level = ? ORDER BY id DESC", ("a", "b")),
+            ("SELECT * FROM reviews WHERE commit_sha = ? ORDER BY id DESC", ("a",)),
+            ("SELECT * FROM reviews WHERE candidate_level = ? ORDER BY id DESC", ("a",)),
+        ):
+            plan = " ".join(row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {query}", values))
+            self.assertIn("USING INDEX", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    @patch.object(review_store.settings, "REVIEW_STORE_RETENTION_DAYS", 30)
+    @patch.object(review_store.settings, "REVIEW_STORE_MAX_REVIEWS", 2)
+    def test_prune(self):
+        with patch("tools.review_store.time.time", return_value=time.time() - 31 * 24 * 3600):
+            expired = save()
+        kept = [save(commit_sha=str(index)) for index in range(3)]
+
+        self.assertEqual(prune_review_store(), 2)
+
+        self.assertEqual([review["id"] for review in list_stored_reviews()], kept[:0:-1])
+        self.assertIsNone(get_stored_review(expired))
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM file_reviews").fetchone()[0], 4)
+
+    @patch.object(review_store, "PRUNE_EVERY_SAVES", 3)
+    @patch.object(review_store.settings, "REVIEW_STORE_MAX_REVIEWS", 2)
+    def test_saves_prune_periodically(self):
+        prune_review_store()
+        save()
+        save()
+        self.assertEqual(len(list_stored_reviews()), 2)
+
+        save()
+
+        self.assertEqual(len(list_stored_reviews()), 2)
+
+
+class TestStoreReview(unittest.IsolatedAsyncioTestCase):
+    async def test_recorder_keeps_the_order_of_relevance(self):
+        recorder = ReviewRecorder()
+
+        await recorder.on_files_selected(["main.py", "utils.py"])
+        await recorder.on_file_reviewed("utils.py", "review of utils.py")
+        await recorder.on_file_reviewed("main.py", None)
+
+        self.assertEqual(list(recorder.file_reviews.items()), [("main.py", None), ("utils.py", "review of utils.py")])
+
+    @patch("tools.review_store.save_review", return_value=7)
+    async def test_store_review(self, mock_save_review):
+        with patch.object(review_store.settings, "ENABLE_REVIEW_STORE", False):
+            self.assertIsNone(await store_review("a/b", "sha", "Junior", "d", "review", {}, {}))
+        mock_save_review.assert_not_called()
+
+        with patch.object(review_store.settings, "ENABLE_REVIEW_STORE", True):
+            self.assertEqual(await store_review("a/b", "sha", "Junior", "d", "review", {}, {}), 7)
+            mock_save_review.side_effect = sqlite3.OperationalError("disk I/O error")
+            self.assertIsNone(await store_review("a/b", "sha", "Junior", "d", "review", {}, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
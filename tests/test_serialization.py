@@ -0,0 +1,32 @@
+import unittest
+from unittest.mock import patch
+
+from tools.serialization import dumps_compact, loads_compact
+
+
+class TestCompactSerialization(unittest.TestCase):
+    def test_small_payload_round_trip(self):
+        value = [["app.py", "sha", 10]]
+
+        payload = dumps_compact(value)
+
+        self.assertTrue(payload.startswith(b"j"))
+        self.assertEqual(loads_compact(payload), value)
+
+    @patch("tools.serialization.settings.CACHE_COMPRESSION_MIN_BYTES", 16)
+    def test_large_payload_is_compressed(self):
+        value = [[f"src/module_{i}.py", "0" * 40, i] for i in range(500)]
+
+        payload = dumps_compact(value)
+
+        self.assertTrue(payload.startswith(b"z"))
+        self.assertLess(len(payload), len(str(value)) / 4)
+        self.assertEqual(loads_compact(payload), value)
+
+    def test_unknown_payload(self):
+        with self.assertRaises(ValueError):
+            loads_compact(b"['app.py']")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import unittest
+from collections import Counter
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+import fakeredis.aioredis
+
+from tools.single_flight import build_review_flight_key, get_single_flight_stats, run_single_flight
+
+
+class TestBuildReviewFlightKey(unittest.TestCase):
+    def test_build_review_flight_key(self):
+        key = build_review_flight_key("username/repository", "sha", "Junior", "description")
+
+        self.assertTrue(key.startswith("review_flight:username/repository:sha:Junior:"))
+        self.assertNotEqual(
+            key, build_review_flight_key("username/repository", "sha", "Junior", "other description")
+        )
+
+
+class TestRunSingleFlightLocal(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patchers = [
+            patch("tools.single_flight.settings.ENABLE_REDIS", False),
+            patch("tools.single_flight._local_stats", Counter()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_concurrent_calls_are_coalesced(self):
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "review"
+
+        compute_mock = AsyncMock(side_effect=compute)
+        callers = [asyncio.create_task(run_single_flight("key", compute_mock)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await asyncio.gather(*callers), ["review"] * 3)
+        compute_mock.assert_awaited_once()
+        self.assertEqual(
+            await get_single_flight_stats(), {"leaders": 1, "coalesced": 2, "takeovers": 0}
+        )
+
+        # Finished computations are not reused.
+        self.assertEqual(await run_single_flight("key", compute_mock), "review")
+        self.assertEqual(compute_mock.await_count, 2)
+
+    async def test_errors_are_shared(self):
+        async def compute():
+            await asyncio.sleep(0)
+            raise Exception("Error processing repository")
+
+        results = await asyncio.gather(
+            run_single_flight("key", compute), run_single_flight("key", compute),
+            return_exceptions=True,
+        )
+
+        self.assertEqual([str(result) for result in results], ["Error processing repository"] * 2)
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "review"
+
+        first = asyncio.create_task(run_single_flight("key", compute))
+        second = asyncio.create_task(run_single_flight("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+
+        self.assertEqual(await second, "review")
+
+    @patch("tools.single_flight.settings.ENABLE_SINGLE_FLIGHT", False)
+    async def test_disabled(self):
+        compute = AsyncMock(return_value="review")
+
+        await asyncio.gather(run_single_flight("key", compute), run_single_flight("key", compute))
+
+        self.assertEqual(compute.await_count, 2)
+
+
+class TestRunSingleFlightDistributed(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        patchers = [
+            patch("tools.single_flight.settings.ENABLE_REDIS", True),
+            patch("tools.single_flight.settings.SINGLE_FLIGHT_POLL_MS", 10),
+            patch(
+                "tools.single_flight.get_async_redis_client",
+                side_effect=lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_leader_stores_result_and_releases_lease(self):
+        compute = AsyncMock(return_value="review")
+
+        self.assertEqual(await run_single_flight("key", compute), "review")
+
+        self.assertFalse(await self.redis_client.exists("key:lease"))
+        [result_key] = await self.redis_client.keys("key:result:*")
+        self.assertEqual(json.loads(await self.redis_client.get(result_key)), {"result": "review"})
+
+    async def test_waits_for_leader_in_another_process(self):
+        await self.redis_client.set("key:lease", "other-process", px=60_000)
+        compute = AsyncMock(return_value="own review")
+
+        async def other_process_finishes():
+            await asyncio.sleep(0.05)
+            await self.redis_client.set("key:result:other-process", json.dumps({"result": "review"}))
+            await self.redis_client.delete("key:lease")
+
+        result, _ = await asyncio.gather(run_single_flight("key", compute), other_process_finishes())
+
+        self.assertEqual(result, "review")
+        compute.assert_not_awaited()
+        self.assertEqual((await get_single_flight_stats())["coalesced"], 1)
+
+    async def test_error_of_leader_in_another_process(self):
+        await self.redis_client.set("key:result:other-process", json.dumps({"error": "Error processing repository"}))
+        await self.redis_client.set("key:lease", "other-process", px=60_000)
+
+        with self.assertRaisesRegex(Exception, "Error processing repository"):
+            await run_single_flight("key", AsyncMock())
+
+    async def test_new_flight_does_not_read_error_of_previous_flight(self):
+        with self.assertRaises(Exception):
+            await run_single_flight("key", AsyncMock(side_effect=Exception("transient error")))
+        await self.redis_client.set("key:lease", "other-process", px=60_000)
+
+        async def other_process_succeeds():
+            await asyncio.sleep(0.05)
+            await self.redis_client.set("key:result:other-process", json.dumps({"result": "review"}))
+            await self.redis_client.delete("key:lease")
+
+        result, _ = await asyncio.gather(run_single_flight("key", AsyncMock()), other_process_succeeds())
+
+        self.assertEqual(result, "review")
+
+    async def test_takes_over_from_crashed_leader(self):
+        # The leader died without storing a result: its lease expires.
+        await self.redis_client.set("key:lease", "crashed-process", px=50)
+        compute = AsyncMock(return_value="review")
+
+        self.assertEqual(await run_single_flight("key", compute), "review")
+
+        compute.assert_awaited_once()
+        self.assertEqual(
+            await get_single_flight_stats(), {"leaders": 0, "coalesced": 1, "takeovers": 1}
+        )
+
+    async def test_lease_of_another_process_is_not_released(self):
+        async def compute():
+            # The lease expired during the computation and was taken by another process.
+            await self.redis_client.set("key:lease", "other-process")
+            return "review"
+
+        await run_single_flight("key", compute)
+
+        self.assertEqual(await self.redis_client.get("key:lease"), "other-process")
+
+
+if __name__ == "__main__":
+    unittest.main()
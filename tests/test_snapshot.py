@@ -0,0 +1,85 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from tests.fake_github import FakeGithubServer, git_blob_sha
+from tools.snapshot import RepositorySnapshot, load_repository_snapshot
+
+
+class TestLoadRepositorySnapshot(unittest.TestCase):
+    def setUp(self):
+        self.files = {
+            "app.py": b"print('hello')\n",
+            "tools/utils.py": b"def add(a, b):\n    return a + b\n",
+            "tools/nested/deep.py": b"X = 1\n",
+        }
+
+    def test_load_repository_snapshot(self):
+        with FakeGithubServer(self.files) as server:
+            repo = server.client().get_repo(server.full_name)
+            server.requests.clear()
+
+            snapshot = load_repository_snapshot(repo)
+
+        self.assertEqual(snapshot.commit_sha, server.commit_sha)
+        self.assertEqual(snapshot.paths, list(self.files))
+        self.assertEqual(snapshot.files, self.files)
+        self.assertEqual(snapshot.read_text("tools/utils.py"), self.files["tools/utils.py"].decode())
+        self.assertEqual(snapshot.blob_shas["app.py"], git_blob_sha(self.files["app.py"]))
+        self.assertEqual(snapshot.sizes["tools/nested/deep.py"], 6)
+        # ref + tree + archive link + archive download, regardless of the number of files
+        self.assertEqual(sum(server.requests.values()), 4)
+
+    def test_load_repository_snapshot_fetches_files_missing_from_archive(self):
+        with FakeGithubServer(self.files, archive_excludes=("app.py",)) as server:
+            repo = server.client().get_repo(server.full_name)
+            server.requests.clear()
+
+            snapshot = load_repository_snapshot(repo, commit_sha=server.commit_sha)
+
+        self.assertEqual(snapshot.files, self.files)
+        blob_path = f"/repos/{server.full_name}/git/blobs/{git_blob_sha(self.files['app.py'])}"
+        self.assertEqual(server.requests[blob_path], 1)
+        self.assertFalse(any("/git/ref" in path for path in server.requests))
+
+    @patch("tools.snapshot.settings.SNAPSHOT_MEMORY_FILE_BYTES", 16)
+    def test_load_repository_snapshot_spills_large_files(self):
+        self.files["data.csv"] = b"id,value\n" + b"".join(b"%d,%d\n" % (index, index) for index in range(10000))
+        with FakeGithubServer(self.files, archive_excludes=("tools/utils.py",)) as server:
+            repo = server.client().get_repo(server.full_name)
+
+            snapshot = load_repository_snapshot(repo, commit_sha=server.commit_sha)
+
+        self.assertEqual(set(snapshot.spilled), {"data.csv", "tools/utils.py"})
+        self.assertNotIn("data.csv", snapshot.files)
+        self.assertEqual(snapshot.read_bytes("data.csv"), self.files["data.csv"])
+        self.assertEqual(snapshot.read_head("data.csv", 8), b"id,value")
+        self.assertEqual(snapshot.read_text("tools/utils.py"), self.files["tools/utils.py"].decode())
+        spill_path = snapshot.spilled["data.csv"]
+        del snapshot
+        self.assertFalse(os.path.exists(spill_path))
+
+
+class TestRepositorySnapshot(unittest.TestCase):
+    def test_paths_follow_tree_order(self):
+        snapshot = RepositorySnapshot(
+            full_name="username/repository",
+            commit_sha="sha",
+            blob_shas={"b.py": "1", "a.py": "2"},
+            files={"a.py": b"a", "b.py": b"b"},
+        )
+
+        self.assertEqual(snapshot.paths, ["b.py", "a.py"])
+        self.assertEqual(snapshot.read_bytes("a.py"), b"a")
+
+    def test_iter_text_binary(self):
+        snapshot = RepositorySnapshot(
+            full_name="username/repository", commit_sha="sha", blob_shas={"a.bin": "1"}, files={"a.bin": b"\x00\x01"}
+        )
+
+        with self.assertRaises(UnicodeDecodeError):
+            snapshot.read_text("a.bin")
+
+
+if __name__ == "__main__":
+    unittest.main()
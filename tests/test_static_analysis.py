@@ -0,0 +1,145 @@
+import os
+import sys
+import unittest
+from textwrap import dedent
+from unittest.mock import patch
+
+from tools import static_analysis
+from tools.static_analysis import (
+    AnalysisOptions,
+    FileAnalysis,
+    Finding,
+    analyze_file,
+    analyze_source,
+    can_analyze,
+    shutdown_static_analysis,
+)
+
+OPTIONS = AnalysisOptions(max_complexity=3, linters={}, linter_timeout_seconds=10)
+
+
+def findings_of(text: str, file_path: str = "main.py", options: AnalysisOptions = OPTIONS):
+    return [(finding.line, finding.code) for finding in analyze_source(file_path, dedent(text), options).findings]
+
+
+class TestAnalyzeSource(unittest.TestCase):
+    def test_clean_file(self):
+        analysis = analyze_source("main.py", '"""Entry point."""\n\nANSWER = 42\n', OPTIONS)
+
+        self.assertEqual(analysis, FileAnalysis(file_path="main.py", lines=2, findings=[]))
+
+    def test_syntax_error(self):
+        self.assertEqual(findings_of("def main(:\n    pass\n"), [(1, "syntax-error")])
+
+    def test_unused_imports(self):
+        text = """
+            import os.path
+            import json as serializer
+            from __future__ import annotations
+            from typing import List, Optional
+            import sys
+
+            def first(values: "List[int]") -> Optional[int]:
+                \"\"\"Returns the first value.\"\"\"
+                return values[0] if os.path.exists(sys.argv[0]) else None
+        """
+
+        self.assertEqual(findings_of(text), [(3, "unused-import")])
+        # Imports of a package are its exports.
+        self.assertEqual(findings_of("from .models import User\n", "package/__init__.py"), [])
+
+    def test_complexity(self):
+        text = """
+            def _branchy(values):
+                for value in values:
+                    if value and value > 1:
+                        return [item for item in values if item]
+                return None
+
+            def _simple(values):
+                def _nested(value):
+                    return value if value else None
+                return _nested
+        """
+
+        self.assertEqual(findings_of(text), [(2, "complexity")])
+
+    def test_docstrings_and_naming(self):
+        text = """
+            class user_service:
+                def getUser(self):
+                    \"\"\"Returns the user.\"\"\"
+
+                def _helper(self):
+                    pass
+
+                def setUp(self):
+                    \"\"\"Overridden.\"\"\"
+
+            class TestUserService:
+                def test_get_user(self):
+                    pass
+        """
+
+        self.assertEqual(findings_of(text), [(2, "docstring"), (2, "naming"), (3, "naming")])
+
+    def test_files_without_analyzer(self):
+        self.assertFalse(can_analyze("README.md", OPTIONS))
+        self.assertIsNone(analyze_source("README.md", "# Title\n", OPTIONS))
+
+    def test_external_linter(self):
+        script = "import sys; sys.stdin.read(); print('-:2:5: missing semicolon'); print('summary'); sys.exit(1)"
+        options = AnalysisOptions(
+            max_complexity=3, linters={".js": f'"{sys.executable}" -c "{script}" {{path}}'}, linter_timeout_seconds=10
+        )
+
+        analysis = analyze_source("app.js", "let a = 1\nlet b = 2\n", options)
+
+        self.assertTrue(can_analyze("src/app.js", options))
+        self.assertEqual(analysis.findings, [Finding(2, os.path.basename(sys.executable), "missing semicolon")])
+
+    def test_missing_linter(self):
+        options = AnalysisOptions(max_complexity=3, linters={".go": "missing-linter {path}"}, linter_timeout_seconds=10)
+
+        self.assertIsNone(analyze_source("main.go", "package main\n", options))
+
+
+class TestFileAnalysis(unittest.TestCase):
+    @patch.object(static_analysis.settings, "STATIC_ANALYSIS_MAX_FINDINGS", 2)
+    def test_digest(self):
+        findings = [Finding(line, "docstring", f"`f{line}` has no docstring") for line in (1, 5, 9)]
+
+        self.assertEqual(FileAnalysis("main.py", 10).digest(), "None")
+        self.assertEqual(
+            FileAnalysis("main.py", 10, findings).digest(),
+            "1: [docstring] `f1` has no docstring\n5: [docstring] `f5` has no docstring\n... and 1 more",
+        )
+
+    @patch.object(static_analysis.settings, "STATIC_ANALYSIS_TRIVIAL_LINES", 10)
+    def test_is_trivial(self):
+        self.assertTrue(FileAnalysis("main.py", 10).is_trivial)
+        self.assertFalse(FileAnalysis("main.py", 11).is_trivial)
+        self.assertFalse(FileAnalysis("main.py", 1, [Finding(1, "syntax-error", "invalid syntax")]).is_trivial)
+
+
+class TestAnalyzeFile(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.addCleanup(shutdown_static_analysis)
+
+    @patch.object(static_analysis.settings, "STATIC_ANALYSIS_WORKERS", 2)
+    async def test_analyzes_in_worker_processes(self):
+        shutdown_static_analysis()
+
+        analyses = [await analyze_file(f"module_{index}.py", f"import os\nVALUE = {index}\n") for index in range(3)]
+
+        self.assertIsInstance(static_analysis._executor, static_analysis.ProcessPoolExecutor)
+        self.assertEqual([analysis.findings[0].code for analysis in analyses], ["unused-import"] * 3)
+        self.assertIsNone(await analyze_file("README.md", "# Title\n"))
+
+    @patch("tools.static_analysis.analyze_source", side_effect=RecursionError("too deep"))
+    async def test_failed_analysis_is_skipped(self, mock_analyze_source):
+        self.assertIsNone(await analyze_file("main.py", "x = 1\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from langchain_core.messages import AIMessage
+
+from tools.summary_reduce import reduce_file_reviews
+
+
+@patch("tools.summary_reduce.settings.REVIEW_GROUP_SUMMARY_TOKENS", 30)
+@patch("tools.summary_reduce.settings.REVIEW_SUMMARY_TOKEN_BUDGET", 200)
+class TestReduceFileReviews(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch("tools.summary_reduce.settings.GENERATIVE_MODEL")
+        self.mock_model = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        async def ainvoke(messages):
+            group_name = messages[-1].content.split("**")[3]
+            return AIMessage(content=f"condensed {group_name}")
+
+        self.mock_model.ainvoke = AsyncMock(side_effect=ainvoke)
+
+    async def test_reviews_within_budget_are_unchanged(self):
+        reviews = [("main.py", "good"), ("src/utils.py", "fine")]
+
+        result = await reduce_file_reviews(reviews, "Junior", "description", len)
+
+        self.assertEqual(result, "File: main.py\ngoodFile: src/utils.py\nfine")
+        self.mock_model.ainvoke.assert_not_awaited()
+
+    async def test_reviews_are_reduced_by_directory(self):
+        reviews = [
+            ("main.py", "x" * 60),
+            ("src/api/routes.py", "x" * 60),
+            ("src/api/schemas.py", "x" * 60),
+            ("src/service.py", "x" * 60),
+        ]
+
+        result = await reduce_file_reviews(reviews, "Junior", "description", len)
+
+        self.assertLessEqual(len(result), 200)
+        prompts = [call.args[0][-1].content for call in self.mock_model.ainvoke.await_args_list]
+        # The api directory is condensed first, then with its sibling into src/.
+        self.assertIn("**src/api/**", prompts[0])
+        self.assertIn("File: src/api/routes.py", prompts[0])
+        self.assertIn("**src/**", prompts[1])
+        self.assertIn("Module: src/api/ (2 files)", prompts[1])
+        self.assertIn("File: src/service.py", prompts[1])
+
+    async def test_single_short_review_moves_up_without_model_call(self):
+        reviews = [("main.py", "x" * 190), ("a/b/c/deep.py", "ok")]
+
+        result = await reduce_file_reviews(reviews, "Junior", "description", len)
+
+        self.assertIn("File: a/b/c/deep.py\nok", result)
+        # Only main.py, too long to move up as is, needs condensing.
+        self.mock_model.ainvoke.assert_awaited_once()
+        self.assertIn("**the repository root**", self.mock_model.ainvoke.await_args.args[0][-1].content)
+
+    async def test_groups_are_condensed_concurrently(self):
+        in_flight = 0
+        max_in_flight = 0
+
+        async def ainvoke(messages):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return AIMessage(content="condensed")
+
+        self.mock_model.ainvoke.side_effect = ainvoke
+        reviews = [(f"module{index}/file{file}.py", "x" * 40) for index in range(4) for file in range(2)]
+
+        await reduce_file_reviews(reviews, "Junior", "description", len)
+
+        self.assertEqual(max_in_flight, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+
+from tools.snapshot import RepositorySnapshot
+from tools.templates import (
+    AssignmentTemplate,
+    exclude_template_files,
+    load_assignment_template,
+    register_assignment_template,
+    template_review_id,
+    template_review_text,
+)
+from tools.tiered_cache import clear_local_cache
+
+STARTER = "".join(f"def handler_{index}():\n    return {index}\n" for index in range(20))
+
+
+def make_template():
+    return AssignmentTemplate(
+        repository="username/template",
+        commit_sha="sha",
+        blob_shas={"main.py": "main", "README.md": "readme"},
+        texts={"main.py": STARTER},
+    )
+
+
+class TestAssignmentTemplateStore(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(clear_local_cache)
+
+    @patch("tools.templates.settings.ENABLE_REDIS", True)
+    @patch("tools.templates.load_repository_snapshot")
+    @patch("tools.tiered_cache.get_redis_client")
+    def test_register_and_load(self, mock_get_redis_client, mock_load_repository_snapshot):
+        mock_get_redis_client.return_value = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        mock_load_repository_snapshot.return_value = RepositorySnapshot(
+            full_name="username/template",
+            commit_sha="sha",
+            blob_shas={"main.py": "main", "logo.png": "logo"},
+            sizes={"main.py": len(STARTER), "logo.png": 4},
+            files={"main.py": STARTER.encode(), "logo.png": b"\x89PNG"},
+        )
+
+        register_assignment_template(MagicMock(full_name="username/template"), "description")
+        template = load_assignment_template("description")
+
+        self.assertEqual(template.blob_shas, {"main.py": "main", "logo.png": "logo"})
+        # Only the files which would be reviewed are kept for diffs.
+        self.assertEqual(template.texts, {"main.py": STARTER})
+        self.assertTrue(template.contains_blob("logo"))
+        self.assertIsNone(load_assignment_template("other description"))
+
+    @patch("tools.templates.settings.ENABLE_REDIS", False)
+    def test_load_without_redis(self):
+        self.assertIsNone(load_assignment_template("description"))
+
+
+class TestTemplateFiles(unittest.TestCase):
+    def test_exclude_template_files(self):
+        blob_shas = {"main.py": "changed", "docs/README.md": "readme", "solution.py": "solution"}
+
+        kept = exclude_template_files(make_template(), ["main.py", "docs/README.md", "solution.py"], blob_shas)
+
+        # Identical content is skipped even at another path.
+        self.assertEqual(kept, ["main.py", "solution.py"])
+
+    def test_template_review_id(self):
+        template = make_template()
+
+        self.assertEqual(template_review_id(template, "main.py", "changed"), "changed:main")
+        self.assertEqual(template_review_id(template, "solution.py", "solution"), "solution")
+
+    def test_small_change_is_sent_as_diff(self):
+        text = STARTER.replace("return 7", "return compute(7)")
+
+        review_text = template_review_text(make_template(), "main.py", text)
+
+        self.assertIn("unified diff against the starter code", review_text)
+        self.assertIn("-    return 7\n+    return compute(7)\n", review_text)
+        self.assertLess(len(review_text), len(text))
+
+    def test_rewritten_file_is_sent_in_full(self):
+        text = "".join(f"class Model{index}:\n    pass\n" for index in range(20))
+
+        self.assertEqual(template_review_text(make_template(), "main.py", text), text)
+
+    def test_file_without_counterpart_is_sent_in_full(self):
+        self.assertEqual(template_review_text(make_template(), "solution.py", "x = 1\n"), "x = 1\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,22 @@
 import unittest
-from tools.texts import split_large_file, clear_github_url
+from unittest.mock import patch
+
+from tools.texts import (
+    build_file_outline,
+    clear_github_url,
+    decode_pieces,
+    estimate_tokens,
+    get_token_counter,
+    iter_chunks_by_tokens,
+    iter_lines,
+    register_token_counter,
+    split_by_tokens,
+    split_large_file,
+)
+
+
+def count_words(text):
+    return len(text.split())
 
 
 class TestSplitLargeFile(unittest.TestCase):
@@ -38,6 +55,130 @@ class TestSplitLargeFile(unittest.TestCase):
         self.assertEqual(result, expected_result)
 
 
+class TestSplitByTokens(unittest.TestCase):
+    def test_split_by_tokens_respects_budget(self):
+        file_content = "\n".join(f"value_{i} = {i}" for i in range(100))
+
+        result = split_by_tokens(file_content, 20, count_words)
+
+        self.assertEqual("\n".join(result), file_content)
+        for chunk in result:
+            self.assertLessEqual(sum(count_words(line) + 1 for line in chunk.split("\n")), 20)
+
+    def test_split_by_tokens_prefers_definitions(self):
+        file_content = "\n".join([
+            "import os",
+            "",
+            "def first():",
+            "    a = 1",
+            "    b = 2",
+            "    return a + b",
+            "",
+            "@decorator",
+            "def second():",
+            "    c = 3",
+            "    return c",
+        ])
+
+        result = split_by_tokens(file_content, 30, count_words)
+
+        self.assertEqual(len(result), 2)
+        self.assertTrue(result[1].startswith("@decorator\ndef second():"))
+
+    def test_split_by_tokens_splits_methods_of_large_classes(self):
+        methods = [f"    def method_{i}(self):\n        return {i}" for i in range(6)]
+        file_content = "class Large:\n" + "\n".join(methods)
+
+        result = split_by_tokens(file_content, 12, count_words)
+
+        self.assertEqual("\n".join(result), file_content)
+        for chunk in result[1:]:
+            self.assertTrue(chunk.startswith("    def method_"))
+
+    def test_split_by_tokens_long_line(self):
+        file_content = "x" * 1000
+
+        result = split_by_tokens(file_content, 50, estimate_tokens)
+
+        self.assertGreater(len(result), 1)
+        self.assertEqual("".join(result), file_content)
+
+    def test_split_by_tokens_empty(self):
+        self.assertEqual(split_by_tokens("", 50, count_words), [])
+
+    def test_iter_chunks_by_tokens_is_lazy(self):
+        read_lines = []
+
+        def lines():
+            for index in range(1000):
+                read_lines.append(index)
+                yield f"line {index}"
+
+        chunks = iter_chunks_by_tokens(lines(), 50, count_words)
+        next(chunks)
+
+        self.assertLess(len(read_lines), 30)
+        self.assertEqual(
+            [next(chunks), *chunks][-1],
+            split_by_tokens("\n".join(f"line {index}" for index in range(1000)), 50, count_words)[-1],
+        )
+
+
+class TestStreamingText(unittest.TestCase):
+    def test_iter_lines(self):
+        for text in ("", "a", "a\n", "\nab\ncd\n\nef"):
+            pieces = [text[index:index + 2] for index in range(0, len(text), 2)]
+
+            self.assertEqual(list(iter_lines(pieces)), text.split("\n"))
+
+    def test_decode_pieces_multibyte_character_across_pieces(self):
+        content = "# café\nprint('thé')\n".encode()
+
+        pieces = [content[index:index + 3] for index in range(0, len(content), 3)]
+
+        self.assertEqual("".join(decode_pieces(pieces)), content.decode())
+
+    def test_decode_pieces_drops_byte_order_mark(self):
+        self.assertEqual("".join(decode_pieces([b"\xef\xbb\xbfx = 1\n"])), "x = 1\n")
+
+    def test_decode_pieces_binary(self):
+        with self.assertRaises(UnicodeDecodeError):
+            list(decode_pieces([b"GIF89a\x00\x01"]))
+
+    def test_decode_pieces_binary_after_first_piece(self):
+        with self.assertRaises(UnicodeDecodeError):
+            list(decode_pieces([b"text\n", "café".encode("latin-1")]))
+
+
+class TestGetTokenCounter(unittest.TestCase):
+    def test_registered_token_counter(self):
+        register_token_counter("test-model", count_words)
+
+        self.assertIs(get_token_counter("test-model"), count_words)
+
+    def test_token_counter_without_tokenizer(self):
+        with patch.dict("sys.modules", {"tiktoken": None}):
+            token_counter = get_token_counter("unavailable-model")
+
+        self.assertIs(token_counter, estimate_tokens)
+        self.assertEqual(token_counter("abcdefgh"), 2)
+
+
+class TestBuildFileOutline(unittest.TestCase):
+    def test_build_file_outline(self):
+        file_content = "import os\n\n@cached\ndef load():\n    pass\n\nclass Store:\n    def get(self):\n        pass"
+
+        self.assertEqual(
+            build_file_outline(file_content),
+            "4: def load():\n7: class Store:\n8:     def get(self):",
+        )
+
+    def test_build_file_outline_limit(self):
+        file_content = "\n".join(f"def f{i}(): pass" for i in range(5))
+
+        self.assertEqual(build_file_outline(file_content, max_lines=2), "1: def f0(): pass\n2: def f1(): pass\n...")
+
+
 class TestClearGithubUrl(unittest.TestCase):
     def test_clear_github_url_valid(self):
         url = "https://github.com/username/repository"
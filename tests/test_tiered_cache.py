@@ -0,0 +1,174 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+import redis
+
+from tools import tiered_cache
+from tools.tiered_cache import (
+    LocalCache,
+    cache_get,
+    cache_set,
+    clear_local_cache,
+    get_local_cache_stats,
+    start_cache_invalidation,
+    stop_cache_invalidation,
+)
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestLocalCache(unittest.TestCase):
+    def test_evicts_least_recently_used_by_size(self):
+        cache = LocalCache(max_bytes=45)
+        for key in "abcd":
+            cache.set(key, b"x" * 9, 60)
+        cache.get("a")
+
+        cache.set("e", b"x" * 9, 60)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([cache.get(key) is not None for key in "acde"], [True, True, True, True])
+        self.assertEqual(cache.stats()["bytes"], 40)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_values_too_large_are_not_kept(self):
+        cache = LocalCache(max_bytes=40)
+        cache.set("a", b"small", 60)
+
+        cache.set("a", b"x" * 20, 60)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_entries_expire(self):
+        cache = LocalCache(max_bytes=1000)
+        with patch("tools.tiered_cache.time.monotonic", return_value=100.0):
+            cache.set("a", b"value", 10)
+            self.assertEqual(cache.get("a"), b"value")
+        with patch("tools.tiered_cache.time.monotonic", return_value=110.0):
+            self.assertIsNone(cache.get("a"))
+
+        self.assertEqual(cache.stats(), {"entries": 0, "bytes": 0, "hits": 1, "misses": 1, "evictions": 0})
+
+
+@patch("tools.tiered_cache.settings.ENABLE_REDIS", True)
+class TestTieredCache(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+        patcher = patch("tools.tiered_cache.get_redis_client", return_value=self.redis_client)
+        self.mock_get_redis_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(clear_local_cache)
+        self.addCleanup(setattr, tiered_cache, "_redis_retry_at", 0.0)
+
+    def test_hot_values_are_served_in_process(self):
+        self.redis_client.set("key", b"value", ex=3600)
+        hits = get_local_cache_stats()["hits"]
+
+        self.assertEqual(cache_get("key"), b"value")
+        self.redis_client.delete("key")
+
+        self.assertEqual(cache_get("key"), b"value")
+        self.assertEqual(get_local_cache_stats()["hits"], hits + 1)
+
+    @patch("tools.tiered_cache.settings.LOCAL_CACHE_TTL_SECONDS", 300)
+    def test_values_expire_in_process_with_redis(self):
+        self.redis_client.set("key", b"value", ex=5)
+
+        with patch("tools.tiered_cache.time.monotonic", return_value=1000.0):
+            cache_get("key")
+        self.redis_client.delete("key")
+
+        with patch("tools.tiered_cache.time.monotonic", return_value=1006.0):
+            self.assertIsNone(cache_get("key"))
+
+    def test_set_writes_through_and_invalidates(self):
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(tiered_cache.settings.CACHE_INVALIDATION_CHANNEL)
+
+        cache_set("key", b"value", ttl_seconds=60)
+
+        self.assertEqual(self.redis_client.get("key"), b"value")
+        self.assertLessEqual(self.redis_client.ttl("key"), 60)
+        messages = []
+        self.assertTrue(wait_until(lambda: messages.append(pubsub.get_message()) or any(messages)))
+        self.assertEqual(next(filter(None, messages))["data"], f"{tiered_cache._PROCESS_ID}:key".encode())
+
+    def test_local_only_without_redis(self):
+        with patch("tools.tiered_cache.settings.ENABLE_REDIS", False):
+            cache_set("key", b"value")
+
+            self.assertEqual(cache_get("key"), b"value")
+            self.assertIsNone(cache_get("other"))
+        self.mock_get_redis_client.assert_not_called()
+
+    def test_redis_down(self):
+        # Nothing listens on port 1, so connections are refused.
+        self.mock_get_redis_client.return_value = redis.StrictRedis(host="127.0.0.1", port=1)
+
+        self.assertIsNone(cache_get("key"))
+        cache_set("key", b"value")
+        self.assertEqual(cache_get("key"), b"value")
+        self.assertIsNone(cache_get("other"))
+
+        # Redis is skipped until the retry delay passes, except for required writes.
+        self.assertEqual(self.mock_get_redis_client.call_count, 1)
+        with self.assertRaises(redis.exceptions.ConnectionError):
+            cache_set("required", b"value", required=True)
+        self.assertIsNone(cache_get("required"))
+
+
+@patch("tools.tiered_cache.settings.ENABLE_REDIS", True)
+class TestCacheInvalidation(unittest.TestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis_client = fakeredis.FakeStrictRedis(server=server, decode_responses=True)
+        patcher = patch(
+            "tools.tiered_cache.get_redis_client",
+            side_effect=lambda decode_responses=True: fakeredis.FakeStrictRedis(
+                server=server, decode_responses=decode_responses
+            ),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(clear_local_cache)
+        self.addCleanup(stop_cache_invalidation)
+
+    def test_changes_of_other_processes_are_dropped(self):
+        channel = tiered_cache.settings.CACHE_INVALIDATION_CHANNEL
+        start_cache_invalidation()
+        self.assertTrue(wait_until(lambda: self.redis_client.pubsub_numsub(channel)[0][1] == 1))
+        cache_set("mine", b"value")
+        cache_set("theirs", b"value")
+
+        self.redis_client.publish(channel, "other-process:theirs")
+
+        self.assertTrue(wait_until(lambda: get_local_cache_stats()["entries"] == 1))
+        self.assertEqual(cache_get("mine"), b"value")
+
+    def test_subscribing_clears_the_cache(self):
+        # Invalidations published before subscribing were missed.
+        subscribed = threading.Event()
+        with patch.object(tiered_cache._local_cache, "clear", side_effect=subscribed.set):
+            start_cache_invalidation()
+            self.assertTrue(subscribed.wait(5))
+
+    def test_not_started_without_redis(self):
+        with patch("tools.tiered_cache.settings.ENABLE_REDIS", False):
+            start_cache_invalidation()
+
+        self.assertIsNone(tiered_cache._listener)
+
+
+if __name__ == "__main__":
+    unittest.main()
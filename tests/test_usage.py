@@ -0,0 +1,85 @@
+import unittest
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from tools.usage import TokenUsageHandler, track_token_usage
+
+
+class TestTokenUsageHandler(unittest.TestCase):
+    def test_usage_metadata(self):
+        handler = TokenUsageHandler()
+        message = AIMessage(
+            content="review",
+            usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15},
+        )
+
+        handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+
+        self.assertEqual(
+            handler.as_dict(),
+            {
+                "calls": 1,
+                "prompt_tokens": 10,
+                "completion_tokens": 5,
+                "total_tokens": 15,
+                "cached_prompt_tokens": 0,
+                "cached_prefix_ratio": 0.0,
+            },
+        )
+
+    def test_llm_output_token_usage(self):
+        handler = TokenUsageHandler()
+        result = LLMResult(
+            generations=[[ChatGeneration(message=AIMessage(content="review"))]],
+            llm_output={"token_usage": {"prompt_tokens": 7, "completion_tokens": 3}},
+        )
+
+        handler.on_llm_end(result)
+
+        self.assertEqual(handler.total_tokens, 10)
+
+
+class TestTrackTokenUsage(unittest.IsolatedAsyncioTestCase):
+    async def test_track_token_usage(self):
+        model = FakeListChatModel(responses=["review"])
+
+        with track_token_usage() as usage:
+            await model.ainvoke("prompt")
+            await model.ainvoke("prompt")
+        await model.ainvoke("prompt")
+
+        self.assertEqual(usage.calls, 2)
+
+    async def test_cached_prefix_ratio(self):
+        model = FakeListChatModel(responses=["review"])
+        prefix = [SystemMessage(content="x" * 400), HumanMessage(content="y" * 400)]
+
+        with track_token_usage() as usage:
+            await model.ainvoke([*prefix, HumanMessage(content="first file".ljust(200))])
+            await model.ainvoke([*prefix, HumanMessage(content="second file".ljust(200))])
+
+        self.assertEqual(usage.estimated_prompt_tokens, 500)
+        self.assertEqual(usage.cached_prefix_tokens, 200)
+        self.assertAlmostEqual(usage.cached_prefix_ratio, 0.4)
+
+    def test_reported_cached_tokens(self):
+        handler = TokenUsageHandler()
+        message = AIMessage(
+            content="review",
+            usage_metadata={
+                "input_tokens": 1200,
+                "output_tokens": 5,
+                "total_tokens": 1205,
+                "input_token_details": {"cache_read": 1024},
+            },
+        )
+
+        handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+
+        self.assertEqual(handler.cached_prompt_tokens, 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,33 +1,43 @@
+import asyncio
 import unittest
-from unittest.mock import patch, MagicMock
-from tools.utils import process_file, get_all_repository_paths
+import weakref
+from unittest.mock import AsyncMock, patch, MagicMock
 
+import fakeredis
+from tools.tiered_cache import clear_local_cache
+from tools.utils import process_file, get_all_repository_paths, get_repository_tree
 
-class TestProcessFile(unittest.TestCase):
-    @patch("tools.utils.ConversationBufferMemory")
-    @patch("tools.utils.ConversationChain")
+
+def fake_prompt(text: str) -> MagicMock:
+    return MagicMock(messages=text, text=text)
+
+
+class TestProcessFile(unittest.IsolatedAsyncioTestCase):
+    @patch("tools.utils.settings.REVIEW_MODE", "conversation")
+    @patch("langchain.memory.ConversationBufferMemory")
+    @patch("langchain.chains.conversation.base.ConversationChain")
     @patch("tools.utils.settings.GENERATIVE_MODEL")
     @patch("tools.utils.review_single_file_prompt")
     @patch("tools.utils.review_single_file_summary_prompt")
-    def test_process_file(self, mock_review_single_file_summary_prompt, mock_review_single_file_prompt,
+    async def test_process_file(self, mock_review_single_file_summary_prompt, mock_review_single_file_prompt,
                           mock_generative_model, mock_conversation_chain, mock_conversation_buffer_memory):
         mock_conversation_chain.return_value = MagicMock()
         mock_conversation_chain_instance = MagicMock()
         mock_conversation_chain.return_value = mock_conversation_chain_instance
-        mock_conversation_chain_instance.invoke.return_value = {"response": "File Summary"}
+        mock_conversation_chain_instance.ainvoke = AsyncMock(return_value={"response": "File Summary"})
 
-        mock_review_single_file_prompt.return_value = "File review prompt"
-        mock_review_single_file_summary_prompt.return_value = "File summary prompt"
+        mock_review_single_file_prompt.return_value = fake_prompt("File review prompt")
+        mock_review_single_file_summary_prompt.return_value = fake_prompt("File summary prompt")
 
         file_chunks = ["This is chunk 1", "This is chunk 2"]
         file_path = "test/file/path"
         candidate_level = "Junior"
         assignment_description = "Code review for junior developer"
 
-        result = process_file(file_chunks, file_path, candidate_level, assignment_description)
+        result = await process_file(file_chunks, file_path, candidate_level, assignment_description)
 
         self.assertEqual(result, "File Summary")
-        mock_conversation_chain_instance.invoke.assert_called()
+        mock_conversation_chain_instance.ainvoke.assert_awaited()
 
         mock_review_single_file_prompt.assert_any_call(
             file_content="This is chunk 1",
@@ -52,59 +62,208 @@ class TestProcessFile(unittest.TestCase):
         )
         mock_conversation_buffer_memory.assert_called_once()
 
-    @patch("tools.utils.ConversationBufferMemory")
-    @patch("tools.utils.ConversationChain")
-    def test_process_file_empty_chunks(self, mock_conversation_chain, mock_conversation_buffer_memory):
+    @patch("langchain.memory.ConversationBufferMemory")
+    @patch("langchain.chains.conversation.base.ConversationChain")
+    async def test_process_file_empty_chunks(self, mock_conversation_chain, mock_conversation_buffer_memory):
         file_chunks = []
         file_path = "test/file/path"
         candidate_level = "Junior"
         assignment_description = "Code review for junior developer"
 
-        result = process_file(file_chunks, file_path, candidate_level, assignment_description)
+        result = await process_file(file_chunks, file_path, candidate_level, assignment_description)
 
         self.assertIsNone(result)
         mock_conversation_chain.assert_not_called()
         mock_conversation_buffer_memory.assert_not_called()
 
 
+    @patch("tools.utils.settings.REVIEW_MODE", "map_reduce")
+    @patch("langchain.chains.conversation.base.ConversationChain")
+    @patch("tools.utils.settings.GENERATIVE_MODEL")
+    @patch("tools.utils.review_chunk_reduce_prompt")
+    @patch("tools.utils.review_chunk_map_prompt")
+    async def test_process_file_map_reduce(self, mock_review_chunk_map_prompt, mock_review_chunk_reduce_prompt,
+                                           mock_generative_model, mock_conversation_chain):
+        mock_review_chunk_map_prompt.side_effect = lambda **kwargs: fake_prompt(f"map {kwargs['chunk_num']}")
+        mock_review_chunk_reduce_prompt.return_value = fake_prompt("reduce")
+        mock_generative_model.ainvoke = AsyncMock(
+            side_effect=lambda prompt: MagicMock(content=f"response to {prompt}")
+        )
+        file_chunks = ["def first():\n    return 1", "class Second:\n    pass"]
+
+        result = await process_file(
+            file_chunks, "test/file/path", "Junior", "Code review", "1: [docstring] `first` has no docstring"
+        )
+
+        self.assertEqual(result, "response to reduce")
+        self.assertEqual(mock_generative_model.ainvoke.await_count, 3)
+        mock_review_chunk_map_prompt.assert_any_call(
+            file_content="class Second:\n    pass",
+            file_path="test/file/path",
+            candidate_level="Junior",
+            chunk_num=2,
+            total_chunk_num=2,
+            file_outline="Not included",
+            assignment_description="Code review",
+            static_findings="1: [docstring] `first` has no docstring",
+        )
+        mock_review_chunk_reduce_prompt.assert_called_once_with(
+            chunk_reviews="Chunk 1:\nresponse to map 1\n\nChunk 2:\nresponse to map 2",
+            file_path="test/file/path",
+            candidate_level="Junior",
+            assignment_description="Code review",
+        )
+        mock_conversation_chain.assert_not_called()
+
+    @patch("tools.utils.settings.REVIEW_MODE", "map_reduce")
+    @patch("tools.utils.settings.GENERATIVE_MODEL")
+    @patch("tools.utils.review_chunk_reduce_prompt")
+    @patch("tools.utils.review_chunk_map_prompt")
+    async def test_process_file_map_reduce_outlines_files_without_analysis(self, mock_review_chunk_map_prompt,
+                                                                          mock_review_chunk_reduce_prompt,
+                                                                          mock_generative_model):
+        mock_review_chunk_map_prompt.side_effect = lambda **kwargs: fake_prompt("map")
+        mock_review_chunk_reduce_prompt.return_value = fake_prompt("reduce")
+        mock_generative_model.ainvoke = AsyncMock(return_value=MagicMock(content="review"))
+
+        await process_file(["def first():\n    return 1", "class Second:\n    pass"], "file.js", "Junior", "Code review")
+
+        for call in mock_review_chunk_map_prompt.call_args_list:
+            self.assertEqual(call.kwargs["file_outline"], "1: def first():\n3: class Second:")
+            self.assertEqual(call.kwargs["static_findings"], "Not available")
+
+    @patch("tools.utils._chunk_semaphores", weakref.WeakKeyDictionary())
+    @patch("tools.utils.settings.REVIEW_CONCURRENCY", 2)
+    @patch("tools.utils.settings.REVIEW_MODE", "map_reduce")
+    @patch("tools.utils.settings.GENERATIVE_MODEL")
+    @patch("tools.utils.review_chunk_reduce_prompt")
+    @patch("tools.utils.review_chunk_map_prompt")
+    async def test_process_file_map_reduce_bounds_chunks_over_files(self, mock_review_chunk_map_prompt,
+                                                                    mock_review_chunk_reduce_prompt,
+                                                                    mock_generative_model):
+        mock_review_chunk_map_prompt.side_effect = lambda **kwargs: fake_prompt("map")
+        mock_review_chunk_reduce_prompt.return_value = fake_prompt("reduce")
+        in_flight = []
+        max_in_flight = []
+
+        async def ainvoke(prompt):
+            in_flight.append(prompt)
+            max_in_flight.append(in_flight.count("map"))
+            await asyncio.sleep(0.01)
+            in_flight.remove(prompt)
+            return MagicMock(content="review")
+
+        mock_generative_model.ainvoke = AsyncMock(side_effect=ainvoke)
+
+        await asyncio.gather(
+            *(process_file(["a = 1", "b = 2", "c = 3"], f"file_{i}.py", "Junior", "Code review") for i in range(3))
+        )
+
+        self.assertEqual(max(max_in_flight), 2)
+
+    @patch("tools.utils.settings.REVIEW_MODE", "map_reduce")
+    @patch("tools.utils.settings.GENERATIVE_MODEL")
+    @patch("tools.utils.review_one_chunk_file_prompt")
+    async def test_process_file_map_reduce_single_chunk(self, mock_review_one_chunk_file_prompt,
+                                                        mock_generative_model):
+        mock_review_one_chunk_file_prompt.return_value = fake_prompt("single")
+        mock_generative_model.ainvoke = AsyncMock(return_value=MagicMock(content="File Summary"))
+
+        result = await process_file(["x = 1"], "test/file/path", "Junior", "Code review")
+
+        self.assertEqual(result, "File Summary")
+        mock_generative_model.ainvoke.assert_awaited_once_with("single")
+
 class TestGetAllRepositoryPaths(unittest.TestCase):
-    @patch("tools.utils.get_all_repository_paths")
-    @patch("tools.utils.Repository")
-    def test_get_all_repository_paths(self, mock_repository, mock_get_all_repository_paths):
+    @patch("tools.utils.get_repository_tree")
+    @patch("tools.utils.get_head_commit_sha")
+    def test_get_all_repository_paths(self, mock_get_head_commit_sha, mock_get_repository_tree):
         mock_repo = MagicMock()
-        mock_repository.return_value = mock_repo
+        mock_get_head_commit_sha.return_value = "sha"
+        mock_get_repository_tree.return_value = [
+            {"path": "file1.py", "sha": "1", "size": 1},
+            {"path": "dir1/file2.py", "sha": "2", "size": 1},
+        ]
+
+        result = get_all_repository_paths(mock_repo)
 
-        mock_repo.get_contents.return_value = [
-            MagicMock(type="file", path="file1.py"),
-            MagicMock(type="dir", path="dir1"),
-            MagicMock(type="file", path="dir1/file2.py"),
+        self.assertEqual(result, ["file1.py", "dir1/file2.py"])
+        mock_get_repository_tree.assert_called_once_with(mock_repo, "sha")
+
+    @patch("tools.utils.get_repository_tree")
+    @patch("tools.utils.get_head_commit_sha")
+    def test_get_all_repository_paths_subdirectory(self, mock_get_head_commit_sha, mock_get_repository_tree):
+        mock_get_repository_tree.return_value = [
+            {"path": "file1.py", "sha": "1", "size": 1},
+            {"path": "dir1/file2.py", "sha": "2", "size": 1},
+            {"path": "dir10/file3.py", "sha": "3", "size": 1},
         ]
 
-        repo = mock_repo
-        path = ""
+        result = get_all_repository_paths(MagicMock(), "dir1")
 
-        result = get_all_repository_paths(repo, path)
+        self.assertEqual(result, ["dir1/file2.py"])
 
-        self.assertEqual(result, ["file1.py", "dir1/file2.py"])
 
-        mock_repo.get_contents.assert_called_with(path)
-        mock_get_all_repository_paths.assert_called_with(repo, "dir1")
+class TestGetRepositoryTree(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(clear_local_cache)
+
+    def test_get_repository_tree(self):
+        mock_repo = MagicMock()
+        mock_repo.get_git_tree.return_value.raw_data = {"truncated": False}
+        mock_repo.get_git_tree.return_value.tree = [
+            MagicMock(type="blob", path="file1.py", sha="1", size=10),
+            MagicMock(type="tree", path="dir1", sha="2", size=None),
+            MagicMock(type="blob", path="dir1/file2.py", sha="3", size=20),
+        ]
+
+        result = get_repository_tree(mock_repo, "sha")
 
-    @patch("tools.utils.Repository")
-    def test_get_all_repository_paths_empty_repo(self, mock_repository):
+        self.assertEqual(
+            result,
+            [
+                {"path": "file1.py", "sha": "1", "size": 10},
+                {"path": "dir1/file2.py", "sha": "3", "size": 20},
+            ],
+        )
+        mock_repo.get_git_tree.assert_called_once_with("sha", recursive=True)
+        mock_repo.get_contents.assert_not_called()
+
+    def test_get_repository_tree_truncated(self):
         mock_repo = MagicMock()
-        mock_repository.return_value = mock_repo
+        mock_repo.get_git_tree.return_value.raw_data = {"truncated": True}
+        mock_repo.get_contents.side_effect = lambda path, ref: {
+            "": [
+                MagicMock(type="file", path="file1.py", sha="1", size=10),
+                MagicMock(type="dir", path="dir1"),
+            ],
+            "dir1": [MagicMock(type="file", path="dir1/file2.py", sha="3", size=20)],
+        }[path]
 
-        mock_repo.get_contents.return_value = []
+        result = get_repository_tree(mock_repo, "sha")
 
-        repo = mock_repo
-        path = ""
+        self.assertEqual([entry["path"] for entry in result], ["file1.py", "dir1/file2.py"])
+        mock_repo.get_contents.assert_any_call("dir1", ref="sha")
 
-        result = get_all_repository_paths(repo, path)
+    @patch("tools.utils.settings.ENABLE_REDIS", True)
+    def test_get_repository_tree_cached_per_commit(self):
+        redis_client = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+        mock_repo = MagicMock(full_name="username/repository")
+        mock_repo.get_git_tree.return_value.raw_data = {"truncated": False}
+        mock_repo.get_git_tree.return_value.tree = [
+            MagicMock(type="blob", path="file1.py", sha="1", size=10),
+        ]
 
-        self.assertEqual(result, [])
+        with patch("tools.tiered_cache.get_redis_client", return_value=redis_client):
+            first = get_repository_tree(mock_repo, "sha1")
+            second = get_repository_tree(mock_repo, "sha1")
+            get_repository_tree(mock_repo, "sha2")
 
-        mock_repo.get_contents.assert_called_with(path)
+        self.assertEqual(first, second)
+        self.assertEqual(second, [{"path": "file1.py", "sha": "1", "size": 10}])
+        self.assertEqual(mock_repo.get_git_tree.call_count, 2)
+        mock_repo.get_git_tree.assert_any_call("sha2", recursive=True)
+        self.assertTrue(redis_client.exists("repo_tree:username/repository:sha1"))
 
 
 if __name__ == "__main__":
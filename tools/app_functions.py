@@ -1,6 +1,30 @@
-from prompts import review_repository_files_prompt
-from tools.texts import split_large_file
-from tools.utils import get_all_repository_paths, process_file
+import asyncio
+import contextlib
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from prompts import NO_STATIC_FINDINGS, review_repository_files_prompt
+from tools.filters import select_review_files
+from tools.incremental import (
+    ReviewState,
+    load_review_state,
+    plan_incremental_review,
+    save_review_state,
+)
+from tools.metrics import STATIC_ANALYSIS_FILES, time_stage
+from tools.rate_limit import call_model
+from tools.review_cache import build_review_cache_key, get_cached_review, set_cached_review
+from tools.review_pool import ReviewPool
+from tools.texts import TokenCounter, get_token_counter, iter_chunks_by_tokens, iter_lines
+from tools.snapshot import load_repository_snapshot
+from tools.static_analysis import analyze_file, can_analyze
+from tools.summary_reduce import reduce_file_reviews
+from tools.templates import (
+    exclude_template_files,
+    load_assignment_template,
+    template_review_id,
+    template_review_text,
+)
+from tools.utils import get_head_commit_sha, process_file
 from github.Repository import Repository
 from logging import getLogger
 from core.config import settings
@@ -8,22 +32,48 @@ from core.config import settings
 logger = getLogger(__name__)
 
 
-def send_files_to_model(
-    repo: Repository, candidate_level: str, assignment_description: str
+async def send_files_to_model(
+    repo: Repository,
+    candidate_level: str,
+    assignment_description: str,
+    on_files_selected: Optional[Callable[[List[str]], Awaitable[None]]] = None,
+    on_file_reviewed: Optional[Callable[[str, str | None], Awaitable[None]]] = None,
+    commit_sha: Optional[str] = None,
+    pool: Optional[ReviewPool] = None,
 ) -> str:
     """
     Processes all repository files and sends them to the generative model for analysis.
     Clears conversation history for each file and provides an overall summary of the repository.
 
-    This function retrieves all files from a GitHub repository, splits large files into chunks,
-    and sends the chunks to the generative model for analysis. It processes each file individually,
-    appending the results to generate a comprehensive review. If no files are successfully processed,
-    an exception is raised.
+    This function loads a snapshot of all files from a GitHub repository, keeps the relevant ones
+    (see `select_review_files`), splits large files into chunks of at most `LLM_CHUNK_TOKEN_LIMIT`
+    tokens, and sends the chunks to the generative model for analysis. Files are reviewed concurrently,
+    with at most `REVIEW_CONCURRENCY` files in flight, and the results are collected in order of
+    relevance to generate a comprehensive review. File reviews are cached by blob SHA, so unchanged or
+    identical files are not sent to the model again. If no files are successfully processed, an
+    exception is raised.
+
+    Files identical to a file of the starter repository registered for the assignment (see
+    `register_assignment_template`) are not reviewed, and files changed from their starter
+    counterpart may be sent as a diff against it.
+
+    When the repository was already reviewed for the same level and assignment, only the files
+    added or modified since the reviewed commit are fetched and reviewed again (see
+    `plan_incremental_review`); the stored reviews of the other files are reused and only the
+    overall review is regenerated.
 
     Args:
         repo (Repository): The GitHub repository object containing the files to be reviewed.
         candidate_level (str): The level of the candidate (e.g., Junior, Middle, Senior) for the review.
         assignment_description (str): A description of the coding assignment to contextualize the review.
+        on_files_selected (Callable, optional): Awaited with the paths of the files to review, before reviewing them.
+        on_file_reviewed (Callable, optional): Awaited with the path and the review of each file as soon as
+                                               it is reviewed (the review is `None` for empty files).
+        commit_sha (str, optional): The commit to review. Defaults to the head of the default branch.
+        pool (ReviewPool, optional): Shared with the reviews of other repositories, to bound their files
+                                     in flight and tokens per minute together, and to review the files
+                                     they have in common once. Defaults to `REVIEW_CONCURRENCY` files
+                                     in flight for this review alone.
 
     Returns:
         str: A summary of the review for the repository, including a list of processed files and the overall model response.
@@ -31,26 +81,209 @@ def send_files_to_model(
     Raises:
         Exception: If no files are successfully processed or if there is an issue with the repository files.
     """
-    file_paths = get_all_repository_paths(repo)
-    verdicts = []
+    with time_stage("review_state"):
+        state = await asyncio.to_thread(
+            load_review_state, repo.full_name, candidate_level, assignment_description
+        )
+    plan = None
+    if state is not None:
+        with time_stage("incremental_plan"):
+            commit_sha = commit_sha or await asyncio.to_thread(get_head_commit_sha, repo)
+            plan = await asyncio.to_thread(plan_incremental_review, repo, state, commit_sha)
+    if plan is not None:
+        snapshot, file_paths, blob_shas = plan.changed, plan.file_paths, plan.blob_shas
+        reused_summaries, gitignore = plan.reused, plan.gitignore
+    else:
+        with time_stage("snapshot"):
+            snapshot = await asyncio.to_thread(load_repository_snapshot, repo, commit_sha)
+        with time_stage("select_files"):
+            file_paths = select_review_files(snapshot)
+        blob_shas = {file_path: snapshot.blob_shas[file_path] for file_path in file_paths}
+        reused_summaries = {}
+        gitignore = snapshot.read_text(".gitignore") if snapshot.has_content(".gitignore") else None
+    template = await asyncio.to_thread(load_assignment_template, assignment_description)
+    if template is not None:
+        file_paths = exclude_template_files(template, file_paths, blob_shas)
+        blob_shas = {file_path: blob_shas[file_path] for file_path in file_paths}
+    if on_files_selected:
+        await on_files_selected(file_paths)
+    semaphore = pool.semaphore if pool else asyncio.Semaphore(settings.REVIEW_CONCURRENCY)
+    count_tokens = await asyncio.to_thread(get_token_counter, settings.model_name)
+
+    async def review_file(file_path: str) -> str | None:
+        if file_path in reused_summaries:
+            file_summary = reused_summaries[file_path]
+        else:
+            review_id = blob_shas[file_path]
+            read_text = lambda: snapshot.iter_text(file_path)  # noqa: E731
+            if template is not None:
+                review_id = template_review_id(template, file_path, review_id)
+                read_text = lambda: [  # noqa: E731
+                    template_review_text(template, file_path, snapshot.read_text(file_path))
+                ]
 
-    for file_path in file_paths:
-        file_content = repo.get_contents(file_path).decoded_content.decode()
-        file_chunks = split_large_file(file_content, settings.LLM_API_CHAR_LIMIT)
+            def review() -> Awaitable[str | None]:
+                return review_repository_file(
+                    file_path=file_path,
+                    blob_sha=review_id,
+                    read_text=read_text,
+                    candidate_level=candidate_level,
+                    assignment_description=assignment_description,
+                    count_tokens=count_tokens,
+                    semaphore=semaphore,
+                    # Files may be sent as a diff against the template, which is not code to analyze.
+                    static_analysis=review_id == blob_shas[file_path],
+                )
 
-        file_summary = process_file(
-            file_chunks, file_path, candidate_level, assignment_description
+            file_summary = await (
+                pool.review_once(file_path, review_id, review) if pool else review()
+            )
+        if on_file_reviewed:
+            await on_file_reviewed(file_path, file_summary)
+        return file_summary
+
+    file_summaries = await asyncio.gather(*(review_file(file_path) for file_path in file_paths))
+    with time_stage("review_state"):
+        await asyncio.to_thread(
+            save_review_state,
+            repo.full_name,
+            candidate_level,
+            assignment_description,
+            ReviewState(
+                commit_sha=snapshot.commit_sha,
+                blob_shas=blob_shas,
+                summaries=dict(zip(file_paths, file_summaries)),
+                gitignore=gitignore,
+            ),
         )
-        if not file_summary:
-            continue
-        verdicts.append(f"File: {file_path}\n{file_summary}")
-    if not verdicts:
+    return await summarize_file_reviews(
+        file_paths, file_summaries, candidate_level, assignment_description
+    )
+
+
+async def review_repository_file(
+    file_path: str,
+    blob_sha: str,
+    read_text: Callable[[], Iterable[str]],
+    candidate_level: str,
+    assignment_description: str,
+    count_tokens: TokenCounter,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    static_analysis: bool = True,
+) -> str | None:
+    """
+    Reviews a single repository file, reusing the cached review of identical content when available.
+
+    On a cache miss, files with an analyzer (see `can_analyze`) are read whole and first analyzed
+    statically. Both happen under the `semaphore`, so that only as many files as it admits are held in
+    memory and queued to the analysis workers at once. The digest of the findings is sent to the model
+    with the file, and small files without findings are not sent to the model at all (see
+    `FileAnalysis.is_trivial`). Their short review is not cached, as it costs no call.
+
+    Args:
+        file_path (str): The path of the file in the repository.
+        blob_sha (str): The git blob SHA of the file, identifying its content in the review cache.
+        read_text (Callable[[], Iterable[str]]): Returns the content of the file, possibly in pieces
+                                                 which are chunked as they are read; only called
+                                                 on a cache miss.
+        candidate_level (str): The level of the candidate (e.g., Junior, Middle, Senior) for the review.
+        assignment_description (str): A description of the coding assignment to contextualize the review.
+        count_tokens (TokenCounter): Counts the model tokens of a text, used to chunk the file.
+        semaphore (asyncio.Semaphore, optional): Bounds the number of files read, analyzed and sent to the
+                                                 model at once.
+        static_analysis (bool, optional): Whether `read_text` returns the code of the file, which can be
+                                          analyzed when `ENABLE_STATIC_ANALYSIS` is set. Defaults to True.
+
+    Returns:
+        str | None: The review of the file, or `None` if it is not a text file or the model returned nothing for it.
+    """
+    cache_key = build_review_cache_key(blob_sha, candidate_level, assignment_description)
+    with time_stage("cache_lookup"):
+        file_summary = await asyncio.to_thread(get_cached_review, cache_key)
+    if file_summary is not None:
+        return file_summary
+    static_findings = NO_STATIC_FINDINGS
+    async with semaphore or contextlib.nullcontext():
+        if static_analysis and settings.ENABLE_STATIC_ANALYSIS and can_analyze(file_path):
+            try:
+                text = "".join(read_text())
+            except UnicodeDecodeError as e:
+                logger.warning(f"Skipping {file_path}, which is not a text file: {e}")
+                return None
+            read_text = lambda: [text]  # noqa: E731
+            with time_stage("static_analysis"):
+                analysis = await analyze_file(file_path, text)
+            if analysis is not None:
+                if settings.METRICS_ENABLED:
+                    STATIC_ANALYSIS_FILES.inc(result="skipped" if analysis.is_trivial else "reviewed")
+                if analysis.is_trivial:
+                    logger.info(f"Not sending {file_path} to the model: it is small and has no findings")
+                    return analysis.summary()
+                static_findings = analysis.digest()
+        with time_stage("chunking"):
+            try:
+                file_chunks = list(
+                    iter_chunks_by_tokens(
+                        iter_lines(read_text()), settings.LLM_CHUNK_TOKEN_LIMIT, count_tokens
+                    )
+                )
+            except UnicodeDecodeError as e:
+                logger.warning(f"Skipping {file_path}, which is not a text file: {e}")
+                return None
+        with time_stage("file_review"):
+            file_summary = await process_file(
+                file_chunks, file_path, candidate_level, assignment_description, static_findings
+            )
+    if file_summary:
+        with time_stage("cache_write"):
+            await asyncio.to_thread(set_cached_review, cache_key, file_summary)
+    return file_summary
+
+
+async def summarize_file_reviews(
+    file_paths: List[str],
+    file_summaries: List[str | None],
+    candidate_level: str,
+    assignment_description: str,
+) -> str:
+    """
+    Sends the reviews of the repository files to the generative model for an overall review.
+
+    Reviews exceeding `REVIEW_SUMMARY_TOKEN_BUDGET` tokens are first condensed by directory
+    (see `reduce_file_reviews`), so that the final prompt stays bounded for large repositories.
+
+    Args:
+        file_paths (List[str]): The paths of the reviewed files, in order of relevance.
+        file_summaries (List[str | None]): The review of each file, `None` for files without one.
+        candidate_level (str): The level of the candidate (e.g., Junior, Middle, Senior) for the review.
+        assignment_description (str): A description of the coding assignment to contextualize the review.
+
+    Returns:
+        str: The list of reviewed files followed by the overall model response.
+
+    Raises:
+        Exception: If none of the files has a review.
+    """
+    file_reviews = [
+        (file_path, file_summary)
+        for file_path, file_summary in zip(file_paths, file_summaries)
+        if file_summary
+    ]
+    if not file_reviews:
         raise Exception("There was an error processing the repository files.")
+    count_tokens = await asyncio.to_thread(get_token_counter, settings.model_name)
+    with time_stage("summary_reduce"):
+        reduced_summaries = await reduce_file_reviews(
+            file_reviews, candidate_level, assignment_description, count_tokens
+        )
     prompt = review_repository_files_prompt(
-        file_summaries="".join(verdicts),
+        file_summaries=reduced_summaries,
         candidate_level=candidate_level,
         assignment_description=assignment_description,
     )
-    overall_response = settings.GENERATIVE_MODEL.predict(prompt)
+    with time_stage("final_summary"):
+        overall_response = await call_model(
+            lambda: settings.GENERATIVE_MODEL.ainvoke(prompt.messages), prompt.text
+        )
     files = ", ".join(file_paths)
-    return f"Files found: {files}\n{overall_response}"
+    return f"Files found: {files}\n{overall_response.content}"
@@ -0,0 +1,89 @@
+import asyncio
+from logging import getLogger
+from typing import Any, AsyncIterator, Dict, List
+
+from core.config import settings
+from tools.app_functions import send_files_to_model
+from tools.metrics import track_review_cost
+from tools.rate_limit import background_priority, call_github
+from tools.review_pool import create_review_pool
+from tools.review_store import ReviewRecorder, store_review
+from tools.texts import clear_github_url
+from tools.utils import get_head_commit_sha
+
+logger = getLogger(__name__)
+
+
+async def stream_batch_review(
+    github_repo_urls: List[str], candidate_level: str, assignment_description: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Reviews several repositories for the same level and assignment, yielding each result as soon as it is ready.
+
+    The reviews share one `ReviewPool`: at most `REVIEW_CONCURRENCY` files are
+    sent to the model at once over the whole batch, and files with identical content,
+    such as the scaffolding handed out with the assignment, are reviewed once.
+    At most `BATCH_REVIEW_CONCURRENCY` repositories are loaded at the same time.
+    Their model and GitHub calls wait behind the ones of interactive reviews.
+    A failed review does not stop the others. When the consumer stops iterating,
+    the remaining reviews are cancelled. Finished reviews are kept in the review
+    store (see `store_review`).
+
+    Args:
+        github_repo_urls (List[str]): The GitHub URLs of the repositories.
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+        assignment_description (str): The description of the coding assignment.
+
+    Yields:
+        Dict[str, Any]: The ``index`` of the URL in `github_repo_urls` and the ``repository``,
+                        with its ``review`` and ``cost`` (see `track_review_cost`), or an ``error``.
+                        The cost of a file shared by several repositories is counted for the
+                        first one which reviewed it.
+    """
+    pool = create_review_pool()
+    repositories = asyncio.Semaphore(settings.BATCH_REVIEW_CONCURRENCY)
+
+    async def review(index: int, github_repo_url: str) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"index": index, "repository": github_repo_url}
+        async with repositories:
+            try:
+                result["repository"] = clear_github_url(github_repo_url)
+                recorder = ReviewRecorder()
+                with track_review_cost() as cost:
+                    repo = await asyncio.to_thread(
+                        call_github, settings.github_client.get_repo, result["repository"]
+                    )
+                    commit_sha = await asyncio.to_thread(get_head_commit_sha, repo)
+                    result["review"] = await send_files_to_model(
+                        repo=repo,
+                        candidate_level=candidate_level,
+                        assignment_description=assignment_description,
+                        on_files_selected=recorder.on_files_selected,
+                        on_file_reviewed=recorder.on_file_reviewed,
+                        commit_sha=commit_sha,
+                        pool=pool,
+                    )
+                result["cost"] = cost.as_dict()
+                await store_review(
+                    result["repository"],
+                    commit_sha,
+                    candidate_level,
+                    assignment_description,
+                    result["review"],
+                    recorder.file_reviews,
+                    result["cost"],
+                )
+            except Exception as e:
+                logger.exception(f"Batch review of {result['repository']} failed")
+                result["error"] = str(e)
+        return result
+
+    # Bulk reviews let the interactive ones use the model first. The tasks copy the context when created.
+    with background_priority():
+        tasks = [asyncio.create_task(review(index, url)) for index, url in enumerate(github_repo_urls)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in [*tasks, *pool.file_reviews.values()]:
+            task.cancel()
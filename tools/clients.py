@@ -0,0 +1,89 @@
+import asyncio
+import inspect
+import threading
+from logging import getLogger
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.config import settings
+from tools.redis_client import close_redis_pools, ping_redis
+from tools.review_store import close_review_store
+from tools.static_analysis import shutdown_static_analysis
+from tools.tiered_cache import stop_cache_invalidation
+
+logger = getLogger(__name__)
+
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the HTTP session shared by plain HTTP downloads, such as repository archives.
+
+    The session keeps up to `GITHUB_POOL_SIZE` connections alive per host, so that
+    concurrent downloads reuse connections instead of opening new ones.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            adapter = HTTPAdapter(pool_maxsize=settings.GITHUB_POOL_SIZE)
+            _http_session = requests.Session()
+            _http_session.mount("https://", adapter)
+            _http_session.mount("http://", adapter)
+        return _http_session
+
+
+async def check_clients_health() -> Dict[str, str]:
+    """
+    Checks the backends the application depends on.
+
+    Redis is pinged when enabled, and the GitHub client checks its rate limit,
+    which does not count against it. The generative model is not called, since
+    every call is billed.
+
+    Returns:
+        Dict[str, str]: The status of each backend: ``ok``, ``disabled`` or ``unavailable``.
+    """
+    health = {"redis": "disabled", "github": "unavailable"}
+    if settings.ENABLE_REDIS:
+        health["redis"] = "ok" if await ping_redis() else "unavailable"
+    try:
+        await asyncio.to_thread(settings.github_client.get_rate_limit)
+        health["github"] = "ok"
+    except Exception as e:
+        logger.warning(f"GitHub health check failed: {e}")
+    return health
+
+
+async def close_clients() -> None:
+    """
+    Closes the connections of all shared clients, on application shutdown.
+    """
+    global _http_session
+    await asyncio.to_thread(stop_cache_invalidation)
+    await close_redis_pools()
+    close_review_store()
+    await asyncio.to_thread(shutdown_static_analysis)
+    with _http_session_lock:
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+    # Clients created on first use are not created just to be closed.
+    if settings.is_created("github_client"):
+        settings.github_client.close()
+    if not settings.is_created("GENERATIVE_MODEL"):
+        return
+    # ChatOpenAI exposes its httpx clients, ChatOllama its ollama clients, the batched local model its backend.
+    for client_name in ("http_client", "http_async_client", "_client", "_async_client", "backend"):
+        client = getattr(settings.GENERATIVE_MODEL, client_name, None)
+        if client is None:
+            continue
+        closed = (getattr(client, "aclose", None) or client.close)()
+        if inspect.isawaitable(closed):
+            await closed
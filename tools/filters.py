@@ -0,0 +1,239 @@
+import re
+from fnmatch import fnmatchcase
+from logging import getLogger
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from core.config import settings
+from tools.snapshot import RepositorySnapshot
+from tools.texts import detect_encoding
+
+logger = getLogger(__name__)
+
+BINARY_SNIFF_BYTES = 8000
+
+BINARY_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".tiff", ".psd",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".tar", ".jar", ".war", ".whl",
+    ".exe", ".dll", ".so", ".dylib", ".o", ".a", ".class", ".pyc", ".pyo", ".wasm",
+    ".woff", ".woff2", ".ttf", ".otf", ".eot",
+    ".mp3", ".mp4", ".wav", ".ogg", ".mov", ".avi", ".webm",
+    ".db", ".sqlite", ".sqlite3", ".pkl", ".pickle", ".npy", ".npz", ".h5", ".parquet",
+}
+
+# Vendored, generated and tooling files, in the spirit of GitHub linguist's vendor.yml and generated.rb.
+VENDORED_OR_GENERATED_PATTERNS = [
+    re.compile(pattern)
+    for pattern in (
+        r"(^|/)(node_modules|bower_components|vendor|third_party|site-packages)/",
+        r"(^|/)(\.venv|venv|env|__pycache__|\.pytest_cache|\.mypy_cache|\.tox)/",
+        r"(^|/)(\.idea|\.vscode|\.vs|\.git)/",
+        r"(^|/)(dist|build|out|target|coverage|htmlcov|\.next|\.nuxt)/",
+        r"(^|/)migrations/",
+        r"(^|/)(package-lock\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|Pipfile\.lock|"
+        r"composer\.lock|Gemfile\.lock|Cargo\.lock|go\.sum)$",
+        r"\.(min|bundle)\.(js|css)$",
+        r"\.(map|lock|log|svg|csv|tsv)$",
+        r"(_pb2(_grpc)?\.py|\.pb\.go|\.generated\.\w+|\.g\.dart)$",
+        r"(^|/)\.(DS_Store|coverage|env)$",
+    )
+]
+
+SOURCE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".java", ".kt", ".scala", ".rb", ".php",
+    ".cs", ".cpp", ".cc", ".c", ".h", ".hpp", ".rs", ".swift", ".m", ".dart", ".vue", ".svelte",
+    ".sql", ".sh",
+}
+
+ENTRY_POINT_NAMES = {"main", "app", "index", "server", "manage", "cli", "wsgi", "asgi"}
+
+_TEST_PATTERN = re.compile(r"(^|/)(tests?|__tests__|spec)/|(^|/)test_[^/]*$|[._](test|spec)\.\w+$")
+
+
+def select_review_files(snapshot: RepositorySnapshot) -> List[str]:
+    """
+    Selects the repository files worth sending to the generative model, most relevant first.
+
+    Files are dropped when they are binary, larger than `MAX_REVIEW_FILE_BYTES`,
+    vendored or generated, ignored by the repository's own `.gitignore`, excluded
+    by `REVIEW_EXCLUDE_GLOBS` or not matched by `REVIEW_INCLUDE_GLOBS` (when set).
+    The remaining files are ranked by relevance, and when `REVIEW_TOKEN_BUDGET` is
+    set, files are kept in that order for as long as their estimated tokens fit.
+
+    Args:
+        snapshot (RepositorySnapshot): The snapshot of the repository.
+
+    Returns:
+        List[str]: The paths of the files to review, ordered by decreasing relevance.
+    """
+    gitignore = (
+        snapshot.read_bytes(".gitignore").decode(errors="replace")
+        if snapshot.has_content(".gitignore")
+        else None
+    )
+    candidates = []
+    for path in filter_review_paths(snapshot.paths, snapshot.sizes, gitignore):
+        if is_binary_content(snapshot.read_head(path, BINARY_SNIFF_BYTES)):
+            logger.debug(f"Skipping {path}: binary content")
+            continue
+        candidates.append(path)
+
+    candidates = rank_review_files(candidates)
+    if settings.REVIEW_TOKEN_BUDGET <= 0:
+        return candidates
+
+    selected = []
+    remaining_tokens = settings.REVIEW_TOKEN_BUDGET
+    for path in candidates:
+        estimated_tokens = snapshot.sizes.get(path, 0) // 4
+        if estimated_tokens <= remaining_tokens:
+            selected.append(path)
+            remaining_tokens -= estimated_tokens
+    logger.info(f"Selected {len(selected)} of {len(candidates)} files within the token budget")
+    return selected
+
+
+def filter_review_paths(paths: List[str], sizes: Dict[str, int], gitignore: Optional[str]) -> List[str]:
+    """
+    Drops the files excluded from the review by their path or size alone, so before their content is fetched.
+
+    These are the rules of `select_review_files` but the binary content check.
+
+    Args:
+        paths (List[str]): The paths of the files.
+        sizes (Dict[str, int]): Size in bytes of each file, keyed by path.
+        gitignore (Optional[str]): The content of the repository's `.gitignore`, if any.
+
+    Returns:
+        List[str]: The remaining paths, in their original order.
+    """
+    rules = parse_gitignore(gitignore) if gitignore is not None else []
+    remaining = []
+    for path in paths:
+        reason = _exclusion_reason(path, sizes.get(path, 0), rules)
+        if reason:
+            logger.debug(f"Skipping {path}: {reason}")
+            continue
+        remaining.append(path)
+    return remaining
+
+
+def rank_review_files(paths: List[str]) -> List[str]:
+    """
+    Orders file paths by decreasing relevance for the review: source files and
+    entry points first, tests and deeply nested files last.
+
+    Args:
+        paths (List[str]): The paths of the files.
+
+    Returns:
+        List[str]: The same paths, most relevant first.
+    """
+    return sorted(paths, key=lambda path: (-_relevance_score(path), path))
+
+
+def is_binary_content(head: bytes) -> bool:
+    """
+    Detects binary content from the first bytes of a file.
+
+    Content is binary when no text encoding is detected (see `detect_encoding`).
+
+    Args:
+        head (bytes): The first bytes of the file.
+
+    Returns:
+        bool: True if the content is binary.
+    """
+    return detect_encoding(head) is None
+
+
+def parse_gitignore(content: str) -> List[Tuple[Pattern, bool]]:
+    """
+    Compiles `.gitignore` rules into regular expressions matched against file paths.
+
+    Supports comments, negation (`!`), directory-only rules (trailing `/`),
+    anchored rules (containing `/`) and the `*`, `?` and `**` wildcards.
+
+    Args:
+        content (str): The content of a `.gitignore` file.
+
+    Returns:
+        List[Tuple[Pattern, bool]]: The compiled rules with a flag telling whether they are negated.
+    """
+    rules = []
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        line = line.lstrip("!")
+        directory_only = line.endswith("/")
+        anchored = "/" in line.rstrip("/")
+        line = line.strip("/")
+
+        body = ""
+        index = 0
+        while index < len(line):
+            if line.startswith("**/", index):
+                body += "(?:.*/)?"
+                index += 3
+            elif line.startswith("**", index):
+                body += ".*"
+                index += 2
+            elif line[index] == "*":
+                body += "[^/]*"
+                index += 1
+            elif line[index] == "?":
+                body += "[^/]"
+                index += 1
+            else:
+                body += re.escape(line[index])
+                index += 1
+        prefix = "^" if anchored else "(?:^|/)"
+        # A rule matching a directory also matches everything inside of it.
+        suffix = "/" if directory_only else "(?:$|/)"
+        rules.append((re.compile(prefix + body + suffix), negated))
+    return rules
+
+
+def _exclusion_reason(
+    path: str, size: int, gitignore: List[Tuple[Pattern, bool]]
+) -> Optional[str]:
+    if settings.REVIEW_INCLUDE_GLOBS and not any(
+        fnmatchcase(path, pattern) for pattern in settings.REVIEW_INCLUDE_GLOBS
+    ):
+        return "not included"
+    if any(fnmatchcase(path, pattern) for pattern in settings.REVIEW_EXCLUDE_GLOBS):
+        return "excluded"
+    if _extension(path) in BINARY_EXTENSIONS:
+        return "binary extension"
+    if size > settings.MAX_REVIEW_FILE_BYTES:
+        return "too large"
+    if any(pattern.search(path) for pattern in VENDORED_OR_GENERATED_PATTERNS):
+        return "vendored or generated"
+    ignored = False
+    for pattern, negated in gitignore:
+        if pattern.search(path):
+            ignored = not negated
+    if ignored:
+        return "ignored by .gitignore"
+    return None
+
+
+def _relevance_score(path: str) -> float:
+    name = path.rsplit("/", 1)[-1]
+    score = 0.0
+    if _extension(path) in SOURCE_EXTENSIONS:
+        score += 3
+    if name.split(".", 1)[0].lower() in ENTRY_POINT_NAMES:
+        score += 1
+    if name.lower().startswith("readme") or name == "Dockerfile":
+        score += 1
+    if _TEST_PATTERN.search(path):
+        score -= 1
+    return score - 0.25 * path.count("/")
+
+
+def _extension(path: str) -> str:
+    name = path.rsplit("/", 1)[-1]
+    return name[name.rfind("."):].lower() if "." in name else ""
@@ -0,0 +1,206 @@
+import hashlib
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Dict, List, Optional
+
+from github.Repository import Repository
+
+from core.config import settings
+from prompts import PROMPT_VERSION
+from tools.filters import filter_review_paths, rank_review_files, select_review_files
+from tools.rate_limit import call_github, github_rate_limiter
+from tools.serialization import dumps_compact, loads_compact
+from tools.snapshot import RepositorySnapshot, download_blob
+from tools.tiered_cache import cache_get, cache_set
+from tools.utils import get_repository_tree
+
+logger = getLogger(__name__)
+
+# Statuses of the GitHub compare API for which the diff goes from the base commit to the head.
+_LINEAR_COMPARE_STATUSES = ("ahead", "identical")
+
+
+@dataclass
+class ReviewState:
+    """
+    What a previous review of a repository produced, to review later commits incrementally.
+
+    Attributes:
+        commit_sha (str): The reviewed commit.
+        blob_shas (Dict[str, str]): Git blob SHA of each reviewed file, keyed by path.
+        summaries (Dict[str, Optional[str]]): Review of each reviewed file, keyed by path.
+        gitignore (Optional[str]): The repository's `.gitignore` at that commit, used to filter changed files.
+    """
+
+    commit_sha: str
+    blob_shas: Dict[str, str] = field(default_factory=dict)
+    summaries: Dict[str, Optional[str]] = field(default_factory=dict)
+    gitignore: Optional[str] = None
+
+
+@dataclass
+class IncrementalReviewPlan:
+    """
+    The work left to review a commit, given the review of an earlier one.
+
+    Attributes:
+        file_paths (List[str]): The paths of all files of the review, ordered by decreasing relevance.
+        blob_shas (Dict[str, str]): Git blob SHA of each of these files, keyed by path.
+        changed (RepositorySnapshot): The added or modified files to review again.
+        reused (Dict[str, Optional[str]]): The stored reviews of the unchanged files, keyed by path.
+        gitignore (Optional[str]): The repository's `.gitignore`.
+    """
+
+    file_paths: List[str]
+    blob_shas: Dict[str, str]
+    changed: RepositorySnapshot
+    reused: Dict[str, Optional[str]]
+    gitignore: Optional[str] = None
+
+
+def _review_state_key(repository: str, candidate_level: str, assignment_description: str) -> str:
+    # Reviews made with another model or prompts are not reused, like in `build_review_cache_key`.
+    assignment_hash = hashlib.sha256(assignment_description.encode()).hexdigest()[:16]
+    return (
+        f"review_state:{PROMPT_VERSION}:{settings.model_name}:"
+        f"{repository}:{candidate_level}:{assignment_hash}"
+    )
+
+
+def load_review_state(
+    repository: str, candidate_level: str, assignment_description: str
+) -> Optional[ReviewState]:
+    """
+    Returns the state of the last review of a repository for a level and assignment.
+
+    Only reviews made with the current model and prompt version are returned, so
+    that a change of either leads to a full review.
+
+    Args:
+        repository (str): The repository path (username/repository).
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+        assignment_description (str): The description of the coding assignment.
+
+    Returns:
+        Optional[ReviewState]: The stored state, or `None` if there is none or incremental reviews are disabled.
+    """
+    if not (settings.ENABLE_REDIS and settings.ENABLE_INCREMENTAL_REVIEW):
+        return None
+    payload = cache_get(_review_state_key(repository, candidate_level, assignment_description))
+    if payload is None:
+        return None
+    state = loads_compact(payload)
+    return ReviewState(
+        commit_sha=state["commit_sha"],
+        blob_shas={path: blob_sha for path, (blob_sha, _) in state["files"].items()},
+        summaries={path: summary for path, (_, summary) in state["files"].items()},
+        gitignore=state["gitignore"],
+    )
+
+
+def save_review_state(
+    repository: str, candidate_level: str, assignment_description: str, state: ReviewState
+) -> None:
+    """
+    Stores the state of a review, replacing the previous one, for `REVIEW_STATE_TTL_DAYS`.
+
+    Args:
+        repository (str): The repository path (username/repository).
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+        assignment_description (str): The description of the coding assignment.
+        state (ReviewState): The state of the review.
+    """
+    if not (settings.ENABLE_REDIS and settings.ENABLE_INCREMENTAL_REVIEW):
+        return
+    payload = dumps_compact({
+        "commit_sha": state.commit_sha,
+        "files": {
+            path: [blob_sha, state.summaries.get(path)] for path, blob_sha in state.blob_shas.items()
+        },
+        "gitignore": state.gitignore,
+    })
+    cache_set(
+        _review_state_key(repository, candidate_level, assignment_description),
+        payload,
+        ttl_seconds=settings.REVIEW_STATE_TTL_DAYS * 24 * 60 * 60,
+    )
+
+
+def plan_incremental_review(
+    repo: Repository, state: ReviewState, commit_sha: str
+) -> Optional[IncrementalReviewPlan]:
+    """
+    Finds the files to review again since the reviewed commit, with one GitHub compare call.
+
+    Added and modified files are filtered like in a full review: by path and by
+    their size in the git tree first, so that only the files which may be reviewed
+    are downloaded, streamed like in `load_repository_snapshot`, then by content.
+    Deleted files are dropped and the stored reviews of the other files are reused.
+
+    A full review is needed (`None` is returned) when the new commit does not
+    descend from the reviewed one, when more than `INCREMENTAL_REVIEW_MAX_CHANGED_FILES`
+    files changed, when `.gitignore` changed, or when `REVIEW_TOKEN_BUDGET` is set,
+    since the budget depends on every file of the repository.
+
+    Args:
+        repo (Repository): The GitHub repository object.
+        state (ReviewState): The state of the previous review.
+        commit_sha (str): The commit to review.
+
+    Returns:
+        Optional[IncrementalReviewPlan]: The files to review again and the reviews to reuse, or `None`.
+    """
+    if settings.REVIEW_TOKEN_BUDGET > 0:
+        return None
+    changed_blob_shas = {}
+    removed_paths = set()
+    if commit_sha != state.commit_sha:
+        comparison = call_github(repo.compare, state.commit_sha, commit_sha)
+        if comparison.status not in _LINEAR_COMPARE_STATUSES:
+            logger.info(f"{repo.full_name}@{commit_sha} is {comparison.status} of the reviewed commit")
+            return None
+        # Materialized once: the files of a comparison are paginated.
+        files = call_github(list, comparison.files)
+        if len(files) > settings.INCREMENTAL_REVIEW_MAX_CHANGED_FILES:
+            logger.info(f"{len(files)} files of {repo.full_name} changed, reviewing all files")
+            return None
+        for file in files:
+            if ".gitignore" in (file.filename, file.previous_filename):
+                return None
+            if file.previous_filename:
+                removed_paths.add(file.previous_filename)
+            if file.status == "removed":
+                removed_paths.add(file.filename)
+            else:
+                changed_blob_shas[file.filename] = file.sha
+
+    changed = RepositorySnapshot(full_name=repo.full_name, commit_sha=commit_sha)
+    if changed_blob_shas:
+        sizes = {entry["path"]: entry["size"] for entry in get_repository_tree(repo, commit_sha)}
+        changed.sizes = {path: sizes.get(path, 0) for path in changed_blob_shas}
+        for path in filter_review_paths(list(changed_blob_shas), changed.sizes, state.gitignore):
+            changed.blob_shas[path] = changed_blob_shas[path]
+            github_rate_limiter.call_sync(lambda: download_blob(repo, path, changed))
+    if state.gitignore is not None:
+        # Only read by the filters: it is not listed in `blob_shas`, so it is not reviewed again.
+        changed.files.setdefault(".gitignore", state.gitignore.encode())
+    selected_changed = select_review_files(changed)
+
+    reused = {
+        path: summary
+        for path, summary in state.summaries.items()
+        if path not in removed_paths and path not in changed_blob_shas
+    }
+    blob_shas = {path: state.blob_shas[path] for path in reused}
+    blob_shas.update({path: changed.blob_shas[path] for path in selected_changed})
+    logger.info(
+        f"Reviewing {len(selected_changed)} changed files of {repo.full_name} "
+        f"since {state.commit_sha}, reusing {len(reused)} reviews"
+    )
+    return IncrementalReviewPlan(
+        file_paths=rank_review_files(list(blob_shas)),
+        blob_shas=blob_shas,
+        changed=changed,
+        reused=reused,
+        gitignore=state.gitignore,
+    )
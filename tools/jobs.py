@@ -0,0 +1,238 @@
+import asyncio
+import json
+import time
+import uuid
+from logging import getLogger
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from core.config import settings
+from tools.app_functions import send_files_to_model
+from tools.rate_limit import background_priority, call_github
+from tools.metrics import track_review_cost
+from tools.redis_client import get_async_redis_client
+from tools.review_store import ReviewRecorder, store_review
+from tools.utils import get_head_commit_sha
+
+logger = getLogger(__name__)
+
+JOB_FINAL_EVENTS = ("completed", "failed")
+_JOB_INT_FIELDS = ("files_total", "files_done", "tokens_used", "created_at", "updated_at")
+
+
+def _job_key(job_id: str) -> str:
+    return f"review_job:{job_id}"
+
+
+def _events_key(job_id: str) -> str:
+    return f"review_job:{job_id}:events"
+
+
+async def create_review_job(repository: str, candidate_level: str) -> str:
+    """
+    Registers a new review job in Redis, so that any application replica can report on it.
+
+    Args:
+        repository (str): The repository path (username/repository).
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+
+    Returns:
+        str: The identifier of the job.
+    """
+    job_id = uuid.uuid4().hex
+    now = int(time.time())
+    async with get_async_redis_client() as redis_client:
+        await redis_client.hset(
+            _job_key(job_id),
+            mapping={
+                "id": job_id,
+                "status": "queued",
+                "repository": repository,
+                "candidate_level": candidate_level,
+                "files_total": 0,
+                "files_done": 0,
+                "tokens_used": 0,
+                "created_at": now,
+                "updated_at": now,
+            },
+        )
+        await redis_client.expire(_job_key(job_id), settings.REVIEW_JOB_TTL_MINUTES * 60)
+    return job_id
+
+
+async def get_review_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the state of a review job.
+
+    Args:
+        job_id (str): The identifier of the job.
+
+    Returns:
+        Optional[Dict[str, Any]]: The job status, progress (files done/total, tokens used) and,
+                                  once finished, its review or error. `None` if the job is unknown.
+    """
+    async with get_async_redis_client() as redis_client:
+        job = await redis_client.hgetall(_job_key(job_id))
+    if not job:
+        return None
+    for field in _JOB_INT_FIELDS:
+        if field in job:
+            job[field] = int(job[field])
+    return job
+
+
+async def update_review_job(
+    job_id: str, files_done_increment: int = 0, tokens_used_increment: int = 0, **fields: Any
+) -> None:
+    """
+    Updates fields of a review job.
+
+    Args:
+        job_id (str): The identifier of the job.
+        files_done_increment (int, optional): Number of files to add to the job's progress. Defaults to 0.
+        tokens_used_increment (int, optional): Number of tokens to add to the job's usage, for jobs
+                                               split across several workers. Defaults to 0.
+        **fields: The fields to update, e.g. ``status="running"``.
+    """
+    fields["updated_at"] = int(time.time())
+    async with get_async_redis_client() as redis_client:
+        pipeline = redis_client.pipeline()
+        pipeline.hset(_job_key(job_id), mapping=fields)
+        if files_done_increment:
+            pipeline.hincrby(_job_key(job_id), "files_done", files_done_increment)
+        if tokens_used_increment:
+            pipeline.hincrby(_job_key(job_id), "tokens_used", tokens_used_increment)
+        await pipeline.execute()
+
+
+async def publish_review_job_event(job_id: str, event_type: str, **data: Any) -> None:
+    """
+    Appends an event to the job's Redis stream, read by `read_review_job_events`.
+
+    Args:
+        job_id (str): The identifier of the job.
+        event_type (str): The type of the event, e.g. ``file``, ``completed`` or ``failed``.
+        **data: The JSON-serializable payload of the event.
+    """
+    async with get_async_redis_client() as redis_client:
+        await redis_client.xadd(
+            _events_key(job_id), {"type": event_type, "data": json.dumps(data)}
+        )
+        await redis_client.expire(_events_key(job_id), settings.REVIEW_JOB_TTL_MINUTES * 60)
+
+
+async def read_review_job_events(
+    job_id: str, last_event_id: str = "0", block_ms: Optional[int] = None
+) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Reads the events of a job published after `last_event_id`.
+
+    Args:
+        job_id (str): The identifier of the job.
+        last_event_id (str, optional): The id of the last event already read. Defaults to "0", the start.
+        block_ms (int, optional): How long to wait for new events, in milliseconds. Defaults to not waiting.
+
+    Returns:
+        List[Tuple[str, str, Dict[str, Any]]]: The id, type and payload of each new event.
+    """
+    async with get_async_redis_client() as redis_client:
+        response = await redis_client.xread(
+            {_events_key(job_id): last_event_id}, block=block_ms
+        )
+    return [
+        (event_id, fields["type"], json.loads(fields["data"]))
+        for _, events in response
+        for event_id, fields in events
+    ]
+
+
+async def stream_review_job_events(job_id: str, last_event_id: str = "0") -> AsyncIterator[str]:
+    """
+    Yields the events of a job as Server-Sent Events until the job completes or fails.
+
+    Args:
+        job_id (str): The identifier of the job.
+        last_event_id (str, optional): Resume after this event id (the SSE `Last-Event-ID`). Defaults to "0".
+
+    Yields:
+        str: One Server-Sent Event per job event.
+    """
+    while True:
+        events = await read_review_job_events(
+            job_id, last_event_id, block_ms=settings.REVIEW_JOB_POLL_SECONDS * 1000
+        )
+        for event_id, event_type, data in events:
+            last_event_id = event_id
+            yield f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+            if event_type in JOB_FINAL_EVENTS:
+                return
+        if not events and await get_review_job(job_id) is None:
+            return
+
+
+async def run_review_job(
+    job_id: str, repo_name: str, candidate_level: str, assignment_description: str
+) -> None:
+    """
+    Runs `send_files_to_model` for a job, publishing its progress and per-file reviews as they finish.
+
+    The finished review is kept in the review store (see `store_review`).
+
+    Errors are recorded on the job instead of being raised, since nobody awaits
+    the background task.
+
+    Args:
+        job_id (str): The identifier of the job.
+        repo_name (str): The repository path (username/repository).
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+        assignment_description (str): The description of the coding assignment.
+    """
+    recorder = ReviewRecorder()
+    commit_sha = None
+    # Nobody waits on the response, so interactive reviews are served first.
+    with track_review_cost() as cost, background_priority():
+        token_usage = cost.token_usage
+
+        async def on_files_selected(file_paths: List[str]) -> None:
+            await recorder.on_files_selected(file_paths)
+            await update_review_job(job_id, files_total=len(file_paths))
+
+        async def on_file_reviewed(file_path: str, review: str | None) -> None:
+            await recorder.on_file_reviewed(file_path, review)
+            await update_review_job(
+                job_id, files_done_increment=1, tokens_used=token_usage.total_tokens
+            )
+            await publish_review_job_event(job_id, "file", path=file_path, review=review)
+
+        try:
+            await update_review_job(job_id, status="running")
+            repo = await asyncio.to_thread(call_github, settings.github_client.get_repo, repo_name)
+            commit_sha = await asyncio.to_thread(get_head_commit_sha, repo)
+            review = await send_files_to_model(
+                repo=repo,
+                candidate_level=candidate_level,
+                assignment_description=assignment_description,
+                on_files_selected=on_files_selected,
+                on_file_reviewed=on_file_reviewed,
+                commit_sha=commit_sha,
+            )
+        except Exception as e:
+            logger.exception(f"Review job {job_id} failed")
+            await update_review_job(job_id, status="failed", error=str(e))
+            await publish_review_job_event(job_id, "failed", error=str(e))
+            return
+
+        await update_review_job(
+            job_id, status="completed", review=review, tokens_used=token_usage.total_tokens
+        )
+        await publish_review_job_event(
+            job_id, "completed", review=review, tokens_used=token_usage.total_tokens
+        )
+    await store_review(
+        repo_name,
+        commit_sha,
+        candidate_level,
+        assignment_description,
+        review,
+        recorder.file_reviews,
+        cost.as_dict(),
+    )
@@ -0,0 +1,339 @@
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any, Dict, List, Literal, Optional, Set, Tuple
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+logger = getLogger(__name__)
+
+LocalModelApi = Literal["ollama", "completions"]
+# The messages of a prompt, as `{"role": ..., "content": ...}` dictionaries.
+ChatMessages = List[Dict[str, str]]
+
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+@dataclass(frozen=True)
+class ChatTemplate:
+    """
+    The prompt format of a model family, applied on the client to send chat messages
+    as plain prompts to a completions endpoint, which can batch them.
+
+    Attributes:
+        message (str): The format of each message, with ``{role}`` and ``{content}`` fields.
+        generation (str): Appended after the messages, to start the answer of the assistant.
+        stop (str): Ends the answer of the assistant.
+    """
+
+    message: str
+    generation: str
+    stop: str
+
+    def render(self, messages: ChatMessages) -> str:
+        # The beginning of sequence token is added by the server when it tokenizes the prompt.
+        return "".join(self.message.format(**message) for message in messages) + self.generation
+
+
+CHAT_TEMPLATES: Dict[str, ChatTemplate] = {
+    "llama3": ChatTemplate(
+        message="<|start_header_id|>{role}<|end_header_id|>\n\n{content}<|eot_id|>",
+        generation="<|start_header_id|>assistant<|end_header_id|>\n\n",
+        stop="<|eot_id|>",
+    ),
+    "chatml": ChatTemplate(
+        message="<|im_start|>{role}\n{content}<|im_end|>\n",
+        generation="<|im_start|>assistant\n",
+        stop="<|im_end|>",
+    ),
+}
+
+
+@dataclass
+class LocalCompletion:
+    """
+    The text generated for one prompt by a local model server.
+
+    Attributes:
+        text (str): The generated text.
+        prompt_tokens (int): The tokens of the prompt, 0 when not reported.
+        completion_tokens (int): The tokens generated, 0 when not reported.
+    """
+
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+@dataclass
+class LocalEndpoint:
+    """
+    A local model server, and the number of prompts it is generating.
+    """
+
+    url: str
+    in_flight: int = 0
+
+
+@dataclass
+class _LoopState:
+    # httpx clients and futures belong to one event loop.
+    client: httpx.AsyncClient
+    pending: List[Tuple[ChatMessages, asyncio.Future]] = field(default_factory=list)
+    flush_handle: Optional[asyncio.TimerHandle] = None
+    # Running batches, referenced until they finish so that they are not garbage collected.
+    batches: Set[asyncio.Task] = field(default_factory=set)
+
+
+class LocalInferenceBackend:
+    """
+    Micro-batches the prompts sent to local model servers.
+
+    With the ``completions`` API, prompts sent concurrently, by any file of any
+    review, are queued and sent together once `max_batch_size` of them are
+    waiting, or `max_wait_seconds` after the first of them, whichever comes first.
+    A batch is a single call to the OpenAI-compatible ``/v1/completions`` endpoint
+    of vLLM or the llama.cpp server with a list of prompts, the chat messages of
+    each being formatted with `chat_template` (see `CHAT_TEMPLATES`).
+
+    Ollama has no batch endpoint, so with the ``ollama`` API each prompt is sent
+    to ``/api/chat`` as soon as it comes, without waiting, and the server
+    generates concurrent requests together in its parallel slots
+    (``OLLAMA_NUM_PARALLEL``).
+
+    Each batch or prompt goes to the endpoint with the fewest prompts in flight.
+    Completions are cut after `max_tokens` tokens.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        model: str,
+        api: LocalModelApi = "ollama",
+        max_batch_size: int = 8,
+        max_wait_seconds: float = 0.02,
+        timeout_seconds: float = 120,
+        max_connections: int = 20,
+        max_tokens: int = 1024,
+        chat_template: str = "llama3",
+    ):
+        if not endpoints:
+            raise ValueError("At least one local model endpoint must be provided.")
+        if chat_template not in CHAT_TEMPLATES:
+            raise ValueError(f"Unknown chat template {chat_template}, expected one of {', '.join(CHAT_TEMPLATES)}.")
+        self.endpoints = [LocalEndpoint(url.rstrip("/")) for url in endpoints]
+        self.model = model
+        self.api = api
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max_wait_seconds
+        self.timeout_seconds = timeout_seconds
+        self.max_connections = max_connections
+        self.max_tokens = max_tokens
+        self.chat_template = CHAT_TEMPLATES[chat_template]
+        self._lock = threading.Lock()
+        self._next_endpoint = 0
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    async def generate(self, messages: ChatMessages) -> LocalCompletion:
+        """
+        Generates the answer to chat messages, as part of the next batch with the ``completions`` API.
+
+        Args:
+            messages (ChatMessages): The messages of the prompt.
+
+        Returns:
+            LocalCompletion: The generated text.
+
+        Raises:
+            httpx.HTTPError: If the endpoint the prompt was sent to failed.
+        """
+        loop = asyncio.get_running_loop()
+        state = self._state(loop)
+        if self.api == "ollama":
+            endpoint = self._acquire_endpoint(1)
+            try:
+                return await self._chat_ollama(state.client, endpoint, messages)
+            finally:
+                self._release_endpoint(endpoint, 1)
+        future = loop.create_future()
+        state.pending.append((messages, future))
+        if len(state.pending) >= self.max_batch_size:
+            self._flush(state)
+        elif state.flush_handle is None:
+            state.flush_handle = loop.call_later(self.max_wait_seconds, self._flush, state)
+        return await future
+
+    async def aclose(self) -> None:
+        """
+        Closes the HTTP client of the running event loop.
+        """
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is None:
+            return
+        if state.flush_handle is not None:
+            state.flush_handle.cancel()
+        await state.client.aclose()
+
+    def _state(self, loop: asyncio.AbstractEventLoop) -> _LoopState:
+        state = self._states.get(loop)
+        if state is None:
+            state = _LoopState(
+                client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=self.max_connections),
+                    timeout=self.timeout_seconds,
+                )
+            )
+            self._states[loop] = state
+        return state
+
+    def _flush(self, state: _LoopState) -> None:
+        if state.flush_handle is not None:
+            state.flush_handle.cancel()
+            state.flush_handle = None
+        while state.pending:
+            batch = state.pending[:self.max_batch_size]
+            del state.pending[:self.max_batch_size]
+            # Prompts whose caller was cancelled while waiting are not sent.
+            batch = [(prompt, future) for prompt, future in batch if not future.done()]
+            if batch:
+                task = asyncio.get_running_loop().create_task(self._send_batch(state.client, batch))
+                state.batches.add(task)
+                task.add_done_callback(state.batches.discard)
+
+    async def _send_batch(
+        self, client: httpx.AsyncClient, batch: List[Tuple[ChatMessages, asyncio.Future]]
+    ) -> None:
+        endpoint = self._acquire_endpoint(len(batch))
+        logger.debug(f"Sending {len(batch)} prompts to {endpoint.url}")
+        try:
+            results = await self._complete(client, endpoint, [messages for messages, _ in batch])
+        except Exception as e:
+            logger.warning(f"Local model endpoint {endpoint.url} failed: {e}")
+            results = [e] * len(batch)
+        finally:
+            self._release_endpoint(endpoint, len(batch))
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _acquire_endpoint(self, prompts: int) -> LocalEndpoint:
+        # The least loaded endpoint, starting after the last one picked so that ties are spread.
+        with self._lock:
+            count = len(self.endpoints)
+            order = [self.endpoints[(self._next_endpoint + i) % count] for i in range(count)]
+            endpoint = min(order, key=lambda candidate: candidate.in_flight)
+            self._next_endpoint = (self.endpoints.index(endpoint) + 1) % count
+            endpoint.in_flight += prompts
+            return endpoint
+
+    def _release_endpoint(self, endpoint: LocalEndpoint, prompts: int) -> None:
+        with self._lock:
+            endpoint.in_flight -= prompts
+
+    async def _complete(
+        self, client: httpx.AsyncClient, endpoint: LocalEndpoint, prompts: List[ChatMessages]
+    ) -> List[LocalCompletion]:
+        response = await client.post(
+            f"{endpoint.url}/v1/completions",
+            json={
+                "model": self.model,
+                "prompt": [self.chat_template.render(messages) for messages in prompts],
+                # Without `max_tokens`, the completions API generates 16 tokens only.
+                "max_tokens": self.max_tokens,
+                "stop": [self.chat_template.stop],
+            },
+        )
+        response.raise_for_status()
+        body = response.json()
+        choices = sorted(body["choices"], key=lambda choice: choice["index"])
+        if len(choices) != len(prompts):
+            raise ValueError(f"Expected {len(prompts)} completions, got {len(choices)}")
+        # The usage is reported for the whole batch, so it is shared evenly between its prompts.
+        usage = body.get("usage") or {}
+        return [
+            LocalCompletion(
+                text=choice["text"],
+                prompt_tokens=usage.get("prompt_tokens", 0) // len(prompts),
+                completion_tokens=usage.get("completion_tokens", 0) // len(prompts),
+            )
+            for choice in choices
+        ]
+
+    async def _chat_ollama(
+        self, client: httpx.AsyncClient, endpoint: LocalEndpoint, messages: ChatMessages
+    ) -> LocalCompletion:
+        response = await client.post(
+            f"{endpoint.url}/api/chat",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "stream": False,
+                "options": {"num_predict": self.max_tokens},
+            },
+        )
+        response.raise_for_status()
+        body = response.json()
+        return LocalCompletion(
+            text=body["message"]["content"],
+            prompt_tokens=body.get("prompt_eval_count", 0),
+            completion_tokens=body.get("eval_count", 0),
+        )
+
+
+class LocalBatchedChatModel(BaseChatModel):
+    """
+    LangChain chat model generating with a `LocalInferenceBackend`, so that the
+    prompts of concurrent model calls are batched.
+
+    The messages of a call keep their roles: they are formatted with the chat
+    template of the backend for a completions endpoint, or sent as they are to
+    Ollama's chat endpoint, which applies the model's template.
+    """
+
+    backend: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-batched"
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        # Batches are formed in an event loop, so synchronous calls run one of their own.
+        async def generate() -> ChatResult:
+            try:
+                return await self._agenerate(messages, stop=stop, **kwargs)
+            finally:
+                await self.backend.aclose()
+
+        return asyncio.run(generate())
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        if stop:
+            raise ValueError("Stop sequences are not supported by batched local inference.")
+        completion = await self.backend.generate(
+            [{"role": _ROLES.get(message.type, "user"), "content": message.content} for message in messages]
+        )
+        message = AIMessage(
+            content=completion.text,
+            usage_metadata={
+                "input_tokens": completion.prompt_tokens,
+                "output_tokens": completion.completion_tokens,
+                "total_tokens": completion.prompt_tokens + completion.completion_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,298 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+from core.config import settings
+from tools.usage import TokenUsageHandler, response_cached_tokens, response_token_usage, track_token_usage
+
+# Wide enough for sub-millisecond cache lookups as well as minute-long model calls.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_metrics: List["_Metric"] = []
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, label_values: Tuple[str, ...], **extra: str) -> str:
+        pairs = list(zip(self.labelnames, label_values)) + list(extra.items())
+        if not pairs:
+            return ""
+        escaped = (
+            (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+            for name, value in pairs
+        )
+        return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """
+    Prometheus counter, optionally split by labels.
+    """
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{self._format_labels(key)} {value:g}")
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Prometheus histogram with cumulative buckets, optionally split by labels.
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # Per label values: the count of each bucket (not cumulative), the sum and the count.
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[index] += 1
+                    break
+            self._values[key] = (bucket_counts, total + value, count + 1)
+
+    def count(self, **labels: str) -> int:
+        _, _, count = self._values.get(self._label_values(labels), (None, 0.0, 0))
+        return count
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(
+                        f"{self.name}_bucket{self._format_labels(key, le=f'{upper_bound:g}')} {cumulative}"
+                    )
+                lines.append(f"{self.name}_bucket{self._format_labels(key, le='+Inf')} {count}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {total:g}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+REVIEW_DURATION = Histogram("review_duration_seconds", "Duration of whole repository reviews.")
+STAGE_DURATION = Histogram(
+    "review_stage_duration_seconds", "Duration of each stage of the review pipeline.", ("stage",)
+)
+MODEL_CALL_DURATION = Histogram("llm_call_duration_seconds", "Duration of generative model calls.")
+MODEL_CALL_ERRORS = Counter("llm_call_errors_total", "Generative model calls which failed.")
+MODEL_TOKENS = Counter("llm_tokens_total", "Tokens used by generative model calls.", ("type",))
+PROMPT_PREFIX_CACHE_RATIO = Histogram(
+    "review_prompt_cached_prefix_ratio",
+    "Estimated share of the prompt tokens of each review in prefixes already sent.",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+REVIEW_CACHE_REQUESTS = Counter(
+    "review_cache_requests_total", "Lookups of the file review cache.", ("result",)
+)
+STATIC_ANALYSIS_FILES = Counter(
+    "static_analysis_files_total", "Files analyzed before their review, by whether the model was skipped.", ("result",)
+)
+
+
+@dataclass
+class ReviewCost:
+    """
+    What a single repository review cost.
+
+    Attributes:
+        seconds (float): The duration of the review.
+        stages (Dict[str, float]): Seconds spent in each pipeline stage. Files are reviewed
+                                   concurrently, so stages may add up to more than `seconds`.
+        cache_hits (int): File reviews found in the review cache.
+        cache_misses (int): File reviews missing from the review cache.
+        token_usage (TokenUsageHandler): The model calls and tokens of the review.
+    """
+
+    seconds: float = 0.0
+    stages: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    cache_hits: int = 0
+    cache_misses: int = 0
+    token_usage: TokenUsageHandler = field(default_factory=TokenUsageHandler)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "seconds": round(self.seconds, 3),
+            "stages": {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            **self.token_usage.as_dict(),
+        }
+
+
+review_cost_var: ContextVar[Optional[ReviewCost]] = ContextVar("review_cost", default=None)
+
+
+@contextmanager
+def track_review_cost() -> Iterator[ReviewCost]:
+    """
+    Measures the duration, stages, cache lookups and tokens of the review made inside the `with` block.
+
+    Stages are only timed when `METRICS_ENABLED` is set.
+
+    Yields:
+        ReviewCost: The cost of the review, complete once the block exits.
+    """
+    cost = ReviewCost()
+    token = review_cost_var.set(cost)
+    started = time.perf_counter()
+    try:
+        with track_token_usage() as token_usage:
+            cost.token_usage = token_usage
+            yield cost
+    finally:
+        cost.seconds = time.perf_counter() - started
+        review_cost_var.reset(token)
+        if settings.METRICS_ENABLED:
+            REVIEW_DURATION.observe(cost.seconds)
+            if cost.token_usage.estimated_prompt_tokens:
+                PROMPT_PREFIX_CACHE_RATIO.observe(cost.token_usage.cached_prefix_ratio)
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """
+    Records the duration of a pipeline stage in the stage histogram and in the
+    cost of the current review. Does nothing when `METRICS_ENABLED` is not set.
+
+    Args:
+        stage (str): The name of the stage.
+    """
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        cost = review_cost_var.get()
+        if cost is not None:
+            with cost._lock:
+                cost.stages[stage] += elapsed
+
+
+def record_cache_lookup(hit: bool) -> None:
+    """
+    Counts a lookup of the file review cache.
+
+    Args:
+        hit (bool): Whether the review was found.
+    """
+    cost = review_cost_var.get()
+    if cost is not None:
+        with cost._lock:
+            if hit:
+                cost.cache_hits += 1
+            else:
+                cost.cache_misses += 1
+    if settings.METRICS_ENABLED:
+        REVIEW_CACHE_REQUESTS.inc(result="hit" if hit else "miss")
+
+
+def render_metrics() -> str:
+    """
+    Renders every metric of this process in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics, one sample per line.
+    """
+    return "\n".join(line for metric in _metrics for line in metric.render()) + "\n"
+
+
+class ModelMetricsHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler recording the latency and tokens of every model call.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._started: Dict[UUID, float] = {}
+
+    def on_llm_start(
+        self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        if settings.METRICS_ENABLED:
+            self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        if settings.METRICS_ENABLED:
+            self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        MODEL_CALL_DURATION.observe(time.perf_counter() - started)
+        prompt_tokens, completion_tokens = response_token_usage(response)
+        MODEL_TOKENS.inc(prompt_tokens, type="prompt")
+        MODEL_TOKENS.inc(completion_tokens, type="completion")
+        MODEL_TOKENS.inc(response_cached_tokens(response), type="cached_prompt")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        if self._started.pop(run_id, None) is not None:
+            MODEL_CALL_ERRORS.inc()
+
+
+model_metrics_handler_var: ContextVar[Optional[ModelMetricsHandler]] = ContextVar(
+    "model_metrics_handler", default=ModelMetricsHandler()
+)
+# Adds the handler to every LangChain run of the process.
+register_configure_hook(model_metrics_handler_var, inheritable=True)
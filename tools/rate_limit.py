@@ -0,0 +1,439 @@
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import httpx
+import requests
+from github import GithubException, RateLimitExceededException
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+from redis.exceptions import RedisError, WatchError
+
+from core.config import settings
+from tools.redis_client import get_redis_client
+from tools.texts import estimate_tokens
+from tools.usage import response_token_usage
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+# Waiters of a lower priority value are served first.
+rate_limit_priority_var: ContextVar[int] = ContextVar("rate_limit_priority", default=PRIORITY_INTERACTIVE)
+
+_RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+_RETRYABLE_ERRORS = (httpx.TransportError, requests.ConnectionError, requests.Timeout)
+# Shared states are dropped once unused for this long; they only matter for a minute.
+_STATE_TTL_SECONDS = 3600
+
+
+@dataclass
+class _BucketState:
+    requests: float = 0.0
+    tokens: float = 0.0
+    updated: float = 0.0
+    blocked_until: float = 0.0
+
+
+def _refill(
+    state: _BucketState, now: float, requests_per_minute: int, tokens_per_minute: int
+) -> _BucketState:
+    # Refills both budgets of the bucket for the time elapsed since its last update.
+    if not state.updated:
+        # A new bucket starts full.
+        state = _BucketState(requests_per_minute, tokens_per_minute, now, state.blocked_until)
+    elapsed = max(0.0, now - state.updated)
+    return _BucketState(
+        requests=min(requests_per_minute, state.requests + elapsed * requests_per_minute / 60),
+        tokens=min(tokens_per_minute, state.tokens + elapsed * tokens_per_minute / 60),
+        updated=now,
+        blocked_until=state.blocked_until,
+    )
+
+
+def _take(
+    state: _BucketState,
+    now: float,
+    tokens: int,
+    requests_per_minute: int,
+    tokens_per_minute: int,
+) -> Tuple[_BucketState, float]:
+    # Refills the bucket for the time elapsed, then either takes one request and
+    # `tokens` tokens and returns a wait of 0, or takes nothing and returns how
+    # long to wait for enough of them.
+    if state.blocked_until > now:
+        return state, state.blocked_until - now
+    state = _refill(state, now, requests_per_minute, tokens_per_minute)
+    wait = 0.0
+    if requests_per_minute and state.requests < 1:
+        wait = (1 - state.requests) * 60 / requests_per_minute
+    # Requests larger than the whole bucket wait for a full bucket.
+    tokens = min(tokens, tokens_per_minute)
+    if tokens_per_minute and state.tokens < tokens:
+        wait = max(wait, (tokens - state.tokens) * 60 / tokens_per_minute)
+    if wait > 0:
+        return state, wait
+    if requests_per_minute:
+        state.requests -= 1
+    if tokens_per_minute:
+        state.tokens -= tokens
+    return state, 0.0
+
+
+class RateLimiter:
+    """
+    Token bucket scheduler for an API with requests-per-minute and tokens-per-minute budgets.
+
+    With Redis enabled, the bucket is shared by all processes, so that the budgets
+    hold for the whole deployment. When the API reports that a quota is exhausted,
+    through rate-limit headers or a 429 response, every caller is blocked until
+    the quota resets. Callers waiting in the same event loop are served by
+    priority (see `background_priority`), then in arrival order.
+    """
+
+    def __init__(self, name: str, requests_per_minute: Callable[[], int], tokens_per_minute: Callable[[], int]):
+        self.name = name
+        self._requests_per_minute = requests_per_minute
+        self._tokens_per_minute = tokens_per_minute
+        self._local_state = _BucketState()
+        self._local_lock = threading.Lock()
+        self._counter = itertools.count()
+        # Waiters are bound to the event loop they wait in.
+        self._queues: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def key(self) -> str:
+        return f"rate_limit:{self.name}"
+
+    def _update(self, change: Callable[[_BucketState, float], Tuple[_BucketState, T]]) -> T:
+        now = time.time()
+        if settings.ENABLE_REDIS:
+            try:
+                return self._update_shared(change, now)
+            except RedisError:
+                # Rate limiting must not fail the requests: the process falls back to its own bucket.
+                logger.warning(f"Shared {self.name} rate limit unavailable, using the local one", exc_info=True)
+        with self._local_lock:
+            self._local_state, result = change(self._local_state, now)
+        return result
+
+    def _update_shared(self, change: Callable[[_BucketState, float], Tuple[_BucketState, T]], now: float) -> T:
+        # Optimistic transaction: retried when another process updated the bucket meanwhile.
+        with get_redis_client().pipeline() as pipeline:
+            while True:
+                try:
+                    pipeline.watch(self.key)
+                    stored = pipeline.hgetall(self.key)
+                    state = _BucketState(**{field: float(value) for field, value in stored.items()})
+                    state, result = change(state, now)
+                    pipeline.multi()
+                    pipeline.hset(self.key, mapping=asdict(state))
+                    pipeline.expire(self.key, _STATE_TTL_SECONDS)
+                    pipeline.execute()
+                    return result
+                except WatchError:
+                    continue
+
+    def try_acquire(self, tokens: int = 0) -> float:
+        """
+        Takes one request and `tokens` tokens from the bucket if they are available.
+
+        Args:
+            tokens (int): The number of tokens of the request.
+
+        Returns:
+            float: 0 if the request can be sent, otherwise the seconds to wait before trying again.
+        """
+        return self._update(
+            lambda state, now: _take(
+                state, now, tokens, self._requests_per_minute(), self._tokens_per_minute()
+            )
+        )
+
+    def block(self, seconds: float) -> None:
+        """
+        Blocks all callers, in every process, for `seconds` seconds.
+
+        Args:
+            seconds (float): How long the quota of the API is exhausted.
+        """
+        logger.warning(f"{self.name} quota exhausted, blocking requests for {seconds:.1f}s")
+
+        def extend_block(state: _BucketState, now: float) -> Tuple[_BucketState, None]:
+            state.blocked_until = max(state.blocked_until, now + seconds)
+            return state, None
+
+        self._update(extend_block)
+
+    def debit(self, tokens: int) -> None:
+        """
+        Takes tokens used beyond the ones acquired, such as completion tokens, from the bucket.
+
+        The token budget may go negative, delaying the next requests accordingly. The request
+        budget is left as it is: the request was already taken when it was acquired.
+
+        Args:
+            tokens (int): The number of tokens to take.
+        """
+        tokens_per_minute = self._tokens_per_minute()
+        if not tokens or not tokens_per_minute:
+            return
+
+        def take_tokens(state: _BucketState, now: float) -> Tuple[_BucketState, None]:
+            state = _refill(state, now, self._requests_per_minute(), tokens_per_minute)
+            state.tokens -= tokens
+            return state, None
+
+        self._update(take_tokens)
+
+    def acquire_sync(self, tokens: int = 0) -> None:
+        """
+        Waits, blocking the thread, until a request of `tokens` tokens can be sent.
+
+        Args:
+            tokens (int): The number of tokens of the request.
+        """
+        while (wait := self.try_acquire(tokens)) > 0:
+            time.sleep(wait)
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Waits until a request of `tokens` tokens can be sent, after the waiters of higher priority.
+
+        Args:
+            tokens (int): The number of tokens of the request.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._queues:
+            self._queues[loop] = (asyncio.Condition(), [])
+        condition, queue = self._queues[loop]
+        ticket = (rate_limit_priority_var.get(), next(self._counter))
+        async with condition:
+            heapq.heappush(queue, ticket)
+            # A waiter of higher priority may overtake the current head.
+            condition.notify_all()
+            try:
+                while True:
+                    wait = None
+                    if queue[0] == ticket:
+                        wait = await asyncio.to_thread(self.try_acquire, tokens)
+                        if wait <= 0:
+                            return
+                    try:
+                        await asyncio.wait_for(condition.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                queue.remove(ticket)
+                heapq.heapify(queue)
+                condition.notify_all()
+
+    async def call(self, func: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """
+        Sends a request within the budgets, retrying rate-limited and transient failures.
+
+        Failed attempts are retried up to `RATE_LIMIT_MAX_RETRIES` times, after an
+        exponential backoff with full jitter, so that callers do not retry in lockstep.
+
+        Args:
+            func (Callable[[], Awaitable[T]]): Sends the request.
+            tokens (int): The number of tokens of the request.
+
+        Returns:
+            T: The result of the request.
+
+        Raises:
+            Exception: The error of the last attempt, or any error which is not retryable.
+        """
+        for attempt in itertools.count():
+            await self.acquire(tokens)
+            try:
+                return await func()
+            except Exception as error:
+                delay = self._retry_delay(error, attempt)
+            await asyncio.sleep(delay)
+
+    def call_sync(self, func: Callable[[], T], tokens: int = 0) -> T:
+        """
+        Like `call`, for blocking requests sent from worker threads.
+
+        Args:
+            func (Callable[[], T]): Sends the request.
+            tokens (int): The number of tokens of the request.
+
+        Returns:
+            T: The result of the request.
+
+        Raises:
+            Exception: The error of the last attempt, or any error which is not retryable.
+        """
+        for attempt in itertools.count():
+            self.acquire_sync(tokens)
+            try:
+                return func()
+            except Exception as error:
+                delay = self._retry_delay(error, attempt)
+            time.sleep(delay)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        # Raises the error when it is not worth retrying, otherwise blocks the
+        # callers for as long as the API asks and returns the backoff of the attempt.
+        retryable, retry_after = _classify_error(error)
+        if not retryable or attempt >= settings.RATE_LIMIT_MAX_RETRIES:
+            raise error
+        if retry_after:
+            self.block(retry_after)
+        backoff = random.uniform(
+            0, min(settings.RATE_LIMIT_BACKOFF_MAX_SECONDS, settings.RATE_LIMIT_BACKOFF_BASE_SECONDS * 2 ** attempt)
+        )
+        logger.warning(f"{self.name} request failed ({error}), retry {attempt + 1} in {backoff:.1f}s")
+        return backoff
+
+
+def _classify_error(error: Exception) -> Tuple[bool, Optional[float]]:
+    # Whether the error is transient, and how long the API asked to wait, if it did.
+    if isinstance(error, _RETRYABLE_ERRORS):
+        return True, None
+    # openai is only imported along with the OpenAI model, which alone raises its errors.
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return True, None
+    response = getattr(error, "response", None)
+    status = (
+        getattr(error, "status_code", None)
+        or getattr(error, "status", None)
+        or getattr(response, "status_code", None)
+    )
+    headers = getattr(error, "headers", None) or getattr(response, "headers", None) or {}
+    headers = {name.lower(): value for name, value in headers.items()}
+    retry_after = _parse_seconds(headers.get("retry-after"))
+    if retry_after is None and headers.get("x-ratelimit-remaining") == "0":
+        reset = _parse_seconds(headers.get("x-ratelimit-reset"))
+        retry_after = max(0.0, reset - time.time()) if reset else None
+    if isinstance(error, RateLimitExceededException):
+        return True, retry_after
+    if isinstance(error, GithubException) and status == 403:
+        # GitHub answers secondary rate limits with a 403.
+        return retry_after is not None or "rate limit" in str(error).lower(), retry_after
+    return status in _RETRYABLE_STATUSES, retry_after
+
+
+def _parse_seconds(value: Optional[str]) -> Optional[float]:
+    # Parses "12", "1.5" and durations like "6m0s" or "20ms", as sent by OpenAI.
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """
+    Serves the API requests made inside the `with` block after the interactive ones.
+    """
+    token = rate_limit_priority_var.set(PRIORITY_BACKGROUND)
+    try:
+        yield
+    finally:
+        rate_limit_priority_var.reset(token)
+
+
+model_rate_limiter = RateLimiter(
+    "model",
+    requests_per_minute=lambda: settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=lambda: settings.LLM_TOKENS_PER_MINUTE,
+)
+github_rate_limiter = RateLimiter(
+    "github",
+    requests_per_minute=lambda: settings.GITHUB_REQUESTS_PER_MINUTE,
+    tokens_per_minute=lambda: 0,
+)
+
+
+async def call_model(func: Callable[[], Awaitable[T]], prompt: str) -> T:
+    """
+    Sends a prompt to the generative model within the model budgets, retrying failures.
+
+    Args:
+        func (Callable[[], Awaitable[T]]): Sends the prompt to the model.
+        prompt (str): The prompt, to estimate its tokens.
+
+    Returns:
+        T: The response of the model.
+    """
+    return await model_rate_limiter.call(func, tokens=estimate_tokens(prompt))
+
+
+def call_github(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Calls the GitHub API within the GitHub budget, retrying failures. Blocks the thread.
+
+    When GitHub reports that a rate limit is exhausted, every caller waits for its reset.
+
+    Args:
+        func (Callable[..., T]): The PyGithub method to call.
+        *args: Positional arguments of the method.
+        **kwargs: Keyword arguments of the method.
+
+    Returns:
+        T: The result of the method.
+    """
+    return github_rate_limiter.call_sync(lambda: func(*args, **kwargs))
+
+
+class ModelRateLimitHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler adapting the model budgets to the responses.
+
+    Completion tokens are taken from the bucket once known, and the callers are
+    blocked when the rate-limit headers of a response report an exhausted quota.
+    """
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        _, completion_tokens = response_token_usage(response)
+        model_rate_limiter.debit(completion_tokens)
+        for headers in _response_headers(response):
+            for quota in ("requests", "tokens"):
+                if headers.get(f"x-ratelimit-remaining-{quota}") == "0":
+                    reset = _parse_seconds(headers.get(f"x-ratelimit-reset-{quota}"))
+                    if reset:
+                        model_rate_limiter.block(reset)
+
+
+def _response_headers(response: LLMResult) -> List[Dict[str, str]]:
+    # Only sent by ChatOpenAI, with include_response_headers.
+    headers = []
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "response_metadata", None) or {}
+            if metadata.get("headers"):
+                headers.append({name.lower(): value for name, value in metadata["headers"].items()})
+    return headers
+
+
+model_rate_limit_handler_var: ContextVar[Optional[ModelRateLimitHandler]] = ContextVar(
+    "model_rate_limit_handler", default=ModelRateLimitHandler()
+)
+# Adds the handler to every LangChain run of the process.
+register_configure_hook(model_rate_limit_handler_var, inheritable=True)
@@ -1,8 +1,32 @@
+import asyncio
+import threading
+import weakref
+from typing import Dict
+
 import redis
+import redis.asyncio
 from core.config import settings
 
+_pools: Dict[bool, redis.BlockingConnectionPool] = {}
+_pools_lock = threading.Lock()
+# Asyncio connections are bound to the event loop which opened them.
+_async_pools: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _pool_kwargs(decode_responses: bool) -> dict:
+    return {
+        "host": settings.REDIS_HOST,
+        "port": settings.REDIS_PORT,
+        "db": settings.REDIS_DB,
+        "decode_responses": decode_responses,
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "timeout": settings.REDIS_POOL_TIMEOUT_SECONDS,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+        "socket_keepalive": True,
+    }
 
-def get_redis_client():
+
+def get_redis_client(decode_responses: bool = True):
     """
     Establishes a connection to a Redis server.
 
@@ -11,15 +35,74 @@ def get_redis_client():
     returned client can be used to interact with the Redis server for caching and
     other operations.
 
+    Clients share a process-wide pool of at most `REDIS_MAX_CONNECTIONS` kept-alive
+    connections, so creating one is cheap and does not open a new socket.
+
+    Args:
+        decode_responses (bool, optional): Whether values are decoded to `str`. Disable it
+                                           to store binary payloads. Defaults to True.
+
     Returns:
         redis.StrictRedis: A Redis client instance connected to the configured Redis server.
 
     Raises:
         redis.exceptions.ConnectionError: If there is an issue connecting to the Redis server.
     """
-    return redis.StrictRedis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        db=settings.REDIS_DB,
-        decode_responses=True,
-    )
+    with _pools_lock:
+        pool = _pools.get(decode_responses)
+        if pool is None:
+            pool = _pools[decode_responses] = redis.BlockingConnectionPool(
+                **_pool_kwargs(decode_responses)
+            )
+    return redis.StrictRedis(connection_pool=pool)
+
+
+def get_async_redis_client(decode_responses: bool = True):
+    """
+    Establishes an asyncio connection to a Redis server.
+
+    This is the non-blocking counterpart of `get_redis_client`, to be used from
+    coroutines running on the application's event loop. Clients share a pool per
+    event loop; closing a client returns its connection to the pool.
+
+    Args:
+        decode_responses (bool, optional): Whether values are decoded to `str`. Defaults to True.
+
+    Returns:
+        redis.asyncio.StrictRedis: An asyncio Redis client connected to the configured Redis server.
+    """
+    loop_pools = _async_pools.setdefault(asyncio.get_running_loop(), {})
+    pool = loop_pools.get(decode_responses)
+    if pool is None:
+        pool = loop_pools[decode_responses] = redis.asyncio.BlockingConnectionPool(
+            **_pool_kwargs(decode_responses)
+        )
+    return redis.asyncio.StrictRedis(connection_pool=pool)
+
+
+async def ping_redis() -> bool:
+    """
+    Checks that the Redis server answers.
+
+    Returns:
+        bool: True if the server answered the ping.
+    """
+    try:
+        async with get_async_redis_client() as redis_client:
+            return await redis_client.ping()
+    except redis.exceptions.RedisError:
+        return False
+
+
+async def close_redis_pools() -> None:
+    """
+    Closes the connections of the process-wide pool and of the current event loop's pool.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.disconnect()
+    loop_pools = _async_pools.pop(asyncio.get_running_loop(), {})
+    for async_pool in loop_pools.values():
+        await async_pool.disconnect()
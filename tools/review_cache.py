@@ -0,0 +1,148 @@
+import hashlib
+import json
+import time
+from logging import getLogger
+from typing import Dict
+
+import redis
+
+from core.config import settings
+from prompts import PROMPT_VERSION
+from tools.metrics import record_cache_lookup
+from tools.redis_client import get_redis_client
+
+logger = getLogger(__name__)
+
+REVIEW_CACHE_INDEX_KEY = "review_cache:index"
+REVIEW_CACHE_HITS_KEY = "review_cache:hits"
+REVIEW_CACHE_MISSES_KEY = "review_cache:misses"
+
+
+def _analysis_fingerprint() -> str:
+    # The findings sent to the model, and which files skip it, depend on these settings.
+    if not settings.ENABLE_STATIC_ANALYSIS:
+        return "none"
+    options = json.dumps(
+        [
+            settings.STATIC_ANALYSIS_MAX_COMPLEXITY,
+            settings.STATIC_ANALYSIS_MAX_FINDINGS,
+            settings.STATIC_ANALYSIS_TRIVIAL_LINES,
+            settings.STATIC_ANALYSIS_LINTERS,
+        ],
+        sort_keys=True,
+    )
+    return hashlib.sha256(options.encode()).hexdigest()[:8]
+
+
+def build_review_cache_key(
+    blob_sha: str, candidate_level: str, assignment_description: str
+) -> str:
+    """
+    Builds the content-addressed cache key of a single file review.
+
+    The key only depends on what determines the review: the file content (its
+    git blob SHA), the candidate level, the assignment, the model, the prompt
+    version and the static analysis settings. Identical files therefore share
+    the entry across repositories.
+
+    Args:
+        blob_sha (str): The git blob SHA of the file.
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+        assignment_description (str): The description of the coding assignment.
+
+    Returns:
+        str: The Redis key of the cached review.
+    """
+    assignment_hash = hashlib.sha256(assignment_description.encode()).hexdigest()[:16]
+    return (
+        f"review:{PROMPT_VERSION}:{settings.model_name}:{_analysis_fingerprint()}:"
+        f"{candidate_level}:{assignment_hash}:{blob_sha}"
+    )
+
+
+def get_cached_review(cache_key: str) -> str | None:
+    """
+    Returns a previously stored file review and records a cache hit or miss.
+
+    A hit extends the review's TTL, so the index score of a review is always the
+    start of its TTL. When Redis is unavailable, the lookup counts as a miss.
+
+    Args:
+        cache_key (str): The key built by `build_review_cache_key`.
+
+    Returns:
+        str | None: The cached review, or `None` if it is missing or caching is disabled.
+    """
+    if not (settings.ENABLE_REDIS and settings.ENABLE_REVIEW_CACHE):
+        return None
+    try:
+        redis_client = get_redis_client()
+        review = redis_client.get(cache_key)
+        with redis_client.pipeline(transaction=False) as pipeline:
+            if review is None:
+                pipeline.incr(REVIEW_CACHE_MISSES_KEY)
+            else:
+                pipeline.incr(REVIEW_CACHE_HITS_KEY)
+                # Refresh the access time, so eviction drops the least recently used reviews.
+                pipeline.zadd(REVIEW_CACHE_INDEX_KEY, {cache_key: time.time()})
+                pipeline.expire(cache_key, settings.REVIEW_CACHE_TTL_MINUTES * 60)
+            pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Failed to read cached review {cache_key}: {e}")
+        review = None
+    record_cache_lookup(hit=review is not None)
+    if review is not None:
+        logger.info(f"Using cached review: {cache_key}")
+    return review
+
+
+def set_cached_review(cache_key: str, review: str) -> None:
+    """
+    Stores a file review and evicts the least recently used reviews above
+    `REVIEW_CACHE_MAX_ENTRIES`.
+
+    Index entries of reviews whose TTL expired are pruned first, so they are
+    neither counted nor evicted. Storing is best-effort: Redis errors are logged.
+
+    Args:
+        cache_key (str): The key built by `build_review_cache_key`.
+        review (str): The review produced by the generative model.
+    """
+    if not (settings.ENABLE_REDIS and settings.ENABLE_REVIEW_CACHE):
+        return
+    ttl_seconds = settings.REVIEW_CACHE_TTL_MINUTES * 60
+    now = time.time()
+    try:
+        redis_client = get_redis_client()
+        with redis_client.pipeline() as pipeline:
+            pipeline.set(cache_key, review, ex=ttl_seconds)
+            pipeline.zremrangebyscore(REVIEW_CACHE_INDEX_KEY, "-inf", now - ttl_seconds)
+            pipeline.zadd(REVIEW_CACHE_INDEX_KEY, {cache_key: now})
+            pipeline.zcard(REVIEW_CACHE_INDEX_KEY)
+            *_, cached_entries = pipeline.execute()
+
+        overflow = cached_entries - settings.REVIEW_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            evicted = [key for key, _ in redis_client.zpopmin(REVIEW_CACHE_INDEX_KEY, overflow)]
+            redis_client.delete(*evicted)
+            logger.info(f"Evicted {len(evicted)} cached reviews")
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Failed to cache review {cache_key}: {e}")
+
+
+def get_review_cache_stats() -> Dict[str, int]:
+    """
+    Returns the review cache counters shared by all application replicas.
+
+    Returns:
+        Dict[str, int]: The number of cache ``hits``, ``misses`` and stored ``entries``.
+    """
+    if not settings.ENABLE_REDIS:
+        return {"hits": 0, "misses": 0, "entries": 0}
+    redis_client = get_redis_client()
+    hits, misses = redis_client.mget(REVIEW_CACHE_HITS_KEY, REVIEW_CACHE_MISSES_KEY)
+    return {
+        "hits": int(hits or 0),
+        "misses": int(misses or 0),
+        "entries": redis_client.zcard(REVIEW_CACHE_INDEX_KEY),
+    }
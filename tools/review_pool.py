@@ -0,0 +1,63 @@
+import asyncio
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Awaitable, Callable, Dict, Tuple
+
+from core.config import settings
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class ReviewPool:
+    """
+    Resources shared by the reviews of several repositories.
+
+    The model requests and tokens per minute are bounded by `model_rate_limiter`,
+    which every model call waits for, over all reviews and replicas.
+
+    Attributes:
+        semaphore (asyncio.Semaphore): Bounds the number of files sent to the model at once, over all reviews.
+        file_reviews (Dict[Tuple[str, str], asyncio.Task]): The review of each file, by path and blob SHA,
+                                                            so that identical files are reviewed once,
+                                                            even concurrently.
+    """
+
+    semaphore: asyncio.Semaphore
+    file_reviews: Dict[Tuple[str, str], asyncio.Task] = field(default_factory=dict)
+
+    async def review_once(
+        self, file_path: str, blob_sha: str, review: Callable[[], Awaitable[str | None]]
+    ) -> str | None:
+        """
+        Reviews a file once for all the reviews sharing the pool.
+
+        The review is only shared by files at the same path, since it refers to the file by its path.
+
+        Args:
+            file_path (str): The path of the file in the repository.
+            blob_sha (str): The git blob SHA of the file.
+            review (Callable[[], Awaitable[str | None]]): Reviews the file.
+
+        Returns:
+            str | None: The review of the file.
+        """
+        key = (file_path, blob_sha)
+        task = self.file_reviews.get(key)
+        if task is None:
+            task = asyncio.ensure_future(review())
+            self.file_reviews[key] = task
+        else:
+            logger.info(f"Reusing the review of {file_path} (blob {blob_sha}) from the same batch")
+        # Shielded, so that a cancelled repository review does not cancel the file for the others.
+        return await asyncio.shield(task)
+
+
+def create_review_pool() -> ReviewPool:
+    """
+    Creates a pool reviewing at most `REVIEW_CONCURRENCY` files at once.
+
+    Returns:
+        ReviewPool: The pool to share between reviews.
+    """
+    return ReviewPool(semaphore=asyncio.Semaphore(settings.REVIEW_CONCURRENCY))
@@ -0,0 +1,408 @@
+import asyncio
+import json
+import os
+import socket
+from logging import getLogger
+from typing import Dict, List, Optional, Set, Tuple
+
+from redis.exceptions import RedisError, ResponseError
+
+from core.config import settings
+from tools.app_functions import review_repository_file, summarize_file_reviews
+from tools.filters import select_review_files
+from tools.jobs import JOB_FINAL_EVENTS, get_review_job, publish_review_job_event, update_review_job
+from tools.rate_limit import background_priority, call_github
+from tools.redis_client import get_async_redis_client
+from tools.review_store import store_review
+from tools.snapshot import load_repository_snapshot
+from tools.templates import (
+    exclude_template_files,
+    load_assignment_template,
+    template_review_id,
+    template_review_text,
+)
+from tools.texts import TokenCounter, decode_pieces, get_token_counter
+from tools.usage import track_token_usage
+
+logger = getLogger(__name__)
+
+ReviewTask = Tuple[str, Dict[str, str]]
+
+
+def _params_key(job_id: str) -> str:
+    return f"review_job:{job_id}:params"
+
+
+def _results_key(job_id: str) -> str:
+    return f"review_job:{job_id}:results"
+
+
+def _attempts_key(job_id: str) -> str:
+    return f"review_job:{job_id}:attempts"
+
+
+def _summary_lock_key(job_id: str) -> str:
+    return f"review_job:{job_id}:summary_lock"
+
+
+def _blob_key(blob_sha: str) -> str:
+    return f"review_blob:{blob_sha}"
+
+
+async def ensure_review_queue(redis_client) -> None:
+    """
+    Creates the task stream and its consumer group if they do not exist yet.
+
+    Args:
+        redis_client (redis.asyncio.StrictRedis): The Redis client.
+    """
+    try:
+        await redis_client.xgroup_create(
+            settings.REVIEW_QUEUE_STREAM, settings.REVIEW_QUEUE_GROUP, id="0", mkstream=True
+        )
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def enqueue_review_job(
+    job_id: str, repo_name: str, candidate_level: str, assignment_description: str
+) -> None:
+    """
+    Fans a review job out to the workers, as one task per repository file.
+
+    The repository snapshot is loaded once, here, and the content of the selected
+    files is stored in Redis by blob SHA, so that workers never call GitHub. The
+    last worker to store a file review enqueues a ``summarize`` task, which runs
+    the final prompt (see `process_review_task`).
+
+    Errors are recorded on the job instead of being raised, since nobody awaits
+    the background task.
+
+    Args:
+        job_id (str): The identifier of the job.
+        repo_name (str): The repository path (username/repository).
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+        assignment_description (str): The description of the coding assignment.
+    """
+    try:
+        await update_review_job(job_id, status="running")
+        repo = await asyncio.to_thread(call_github, settings.github_client.get_repo, repo_name)
+        snapshot = await asyncio.to_thread(load_repository_snapshot, repo)
+        file_paths = select_review_files(snapshot)
+        template = await asyncio.to_thread(load_assignment_template, assignment_description)
+        if template is not None:
+            file_paths = exclude_template_files(template, file_paths, snapshot.blob_shas)
+        if not file_paths:
+            raise Exception("There was an error processing the repository files.")
+        file_contents = []
+        for file_path in file_paths:
+            blob_sha = snapshot.blob_shas[file_path]
+            content = snapshot.read_bytes(file_path)
+            if template is not None and file_path in template.texts:
+                # Identified by both blob SHAs, since it may be sent as a diff against the template.
+                blob_sha = template_review_id(template, file_path, blob_sha)
+                content = template_review_text(template, file_path, content.decode()).encode()
+            file_contents.append((file_path, blob_sha, content))
+    except Exception as e:
+        logger.exception(f"Review job {job_id} failed")
+        await update_review_job(job_id, status="failed", error=str(e))
+        await publish_review_job_event(job_id, "failed", error=str(e))
+        return
+
+    await update_review_job(job_id, files_total=len(file_paths))
+    ttl = settings.REVIEW_JOB_TTL_MINUTES * 60
+    async with get_async_redis_client(decode_responses=False) as redis_client:
+        await ensure_review_queue(redis_client)
+        pipeline = redis_client.pipeline()
+        pipeline.hset(
+            _params_key(job_id),
+            mapping={
+                "candidate_level": candidate_level,
+                "assignment_description": assignment_description,
+                "commit_sha": snapshot.commit_sha,
+                "file_paths": json.dumps(file_paths),
+            },
+        )
+        pipeline.expire(_params_key(job_id), ttl)
+        for file_path, blob_sha, content in file_contents:
+            pipeline.set(_blob_key(blob_sha), content, ex=ttl)
+            pipeline.xadd(
+                settings.REVIEW_QUEUE_STREAM,
+                {"kind": "file", "job_id": job_id, "path": file_path, "blob_sha": blob_sha},
+            )
+        await pipeline.execute()
+    logger.info(f"Enqueued {len(file_paths)} file tasks for review job {job_id}")
+
+
+async def claim_review_tasks(redis_client, consumer_name: str, count: int) -> List[ReviewTask]:
+    """
+    Takes up to `count` tasks for a worker.
+
+    Tasks left unacknowledged for longer than `REVIEW_TASK_VISIBILITY_TIMEOUT_SECONDS`,
+    by a worker which crashed or lost its connection, are claimed first. Otherwise new
+    tasks are read, waiting at most `REVIEW_QUEUE_BLOCK_MS` for one.
+
+    Args:
+        redis_client (redis.asyncio.StrictRedis): The Redis client, decoding responses.
+        consumer_name (str): The name of the worker in the consumer group.
+        count (int): The maximum number of tasks to take.
+
+    Returns:
+        List[ReviewTask]: The message id and fields of each task.
+    """
+    response = await redis_client.xautoclaim(
+        settings.REVIEW_QUEUE_STREAM,
+        settings.REVIEW_QUEUE_GROUP,
+        consumer_name,
+        min_idle_time=settings.REVIEW_TASK_VISIBILITY_TIMEOUT_SECONDS * 1000,
+        start_id="0-0",
+        count=count,
+    )
+    # Entries deleted from the stream while pending are claimed without fields.
+    tasks = [(message_id, task) for message_id, task in response[1] if task]
+    if tasks:
+        return tasks
+    response = await redis_client.xreadgroup(
+        settings.REVIEW_QUEUE_GROUP,
+        consumer_name,
+        {settings.REVIEW_QUEUE_STREAM: ">"},
+        count=count,
+        block=settings.REVIEW_QUEUE_BLOCK_MS,
+    )
+    return [(message_id, task) for _, messages in response or [] for message_id, task in messages]
+
+
+async def process_review_task(
+    redis_client,
+    blob_client,
+    consumer_name: str,
+    message_id: str,
+    task: Dict[str, str],
+    count_tokens: TokenCounter,
+) -> None:
+    """
+    Processes one task and acknowledges it once its result is stored.
+
+    Delivery is at least once: a task is only acknowledged after its result is
+    written, so it is retried by another worker if this one dies, and storing a
+    result is idempotent. While the task runs, its visibility timeout is renewed.
+    A task which failed `REVIEW_TASK_MAX_ATTEMPTS` times is given up: the file is
+    recorded without review, or the job fails for the ``summarize`` task.
+
+    Args:
+        redis_client (redis.asyncio.StrictRedis): The Redis client, decoding responses.
+        blob_client (redis.asyncio.StrictRedis): The Redis client for the file contents, not decoding responses.
+        consumer_name (str): The name of the worker in the consumer group.
+        message_id (str): The id of the task in the stream.
+        task (Dict[str, str]): The fields of the task.
+        count_tokens (TokenCounter): Counts the model tokens of a text, used to chunk files.
+    """
+    job_id = task["job_id"]
+    heartbeat = asyncio.create_task(
+        _renew_visibility(
+            redis_client,
+            consumer_name,
+            message_id,
+            _summary_lock_key(job_id) if task["kind"] == "summarize" else None,
+        )
+    )
+    try:
+        job = await get_review_job(job_id)
+        if job is None or job["status"] in JOB_FINAL_EVENTS:
+            logger.info(f"Dropping task {message_id} of finished or expired review job {job_id}")
+        elif await _count_attempt(redis_client, job_id, message_id) > settings.REVIEW_TASK_MAX_ATTEMPTS:
+            logger.error(f"Giving up task {message_id} of review job {job_id}")
+            if task["kind"] == "summarize":
+                error = "The final review could not be generated."
+                await update_review_job(job_id, status="failed", error=error)
+                await publish_review_job_event(job_id, "failed", error=error)
+            else:
+                await _record_file_review(redis_client, job_id, task["path"], None)
+        elif task["kind"] == "summarize":
+            await _summarize_job(redis_client, job_id, message_id)
+        else:
+            await _review_file_task(redis_client, blob_client, job_id, task, count_tokens)
+    except Exception:
+        # Left pending, the task is claimed again after its visibility timeout.
+        logger.exception(f"Task {message_id} of review job {job_id} failed")
+        return
+    finally:
+        heartbeat.cancel()
+
+    pipeline = redis_client.pipeline()
+    pipeline.xack(settings.REVIEW_QUEUE_STREAM, settings.REVIEW_QUEUE_GROUP, message_id)
+    pipeline.xdel(settings.REVIEW_QUEUE_STREAM, message_id)
+    await pipeline.execute()
+
+
+async def run_worker(
+    consumer_name: Optional[str] = None, stop_event: Optional[asyncio.Event] = None
+) -> None:
+    """
+    Consumes review tasks until `stop_event` is set, running up to `WORKER_CONCURRENCY` at once.
+
+    Any number of workers can run, on any number of nodes, as long as they share
+    the Redis server: each task is delivered to a single worker of the group. When
+    tasks cannot be claimed, the worker waits `REVIEW_QUEUE_BLOCK_MS` and tries again.
+
+    Args:
+        consumer_name (str, optional): The name of the worker in the consumer group.
+                                       Defaults to the host name and process id.
+        stop_event (asyncio.Event, optional): Stops the worker once set, after the running tasks finish.
+    """
+    consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+    count_tokens = await asyncio.to_thread(get_token_counter, settings.model_name)
+    in_flight: Set[asyncio.Task] = set()
+    # The model calls of the tasks are served after the ones of interactive reviews.
+    with background_priority():
+        async with get_async_redis_client() as redis_client, \
+                get_async_redis_client(decode_responses=False) as blob_client:
+            await ensure_review_queue(redis_client)
+            logger.info(f"Review worker {consumer_name} started")
+            while stop_event is None or not stop_event.is_set():
+                free_slots = settings.WORKER_CONCURRENCY - len(in_flight)
+                if not free_slots:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                try:
+                    tasks = await claim_review_tasks(redis_client, consumer_name, free_slots)
+                except RedisError as e:
+                    # The running tasks keep going; claiming is retried once Redis is back.
+                    logger.warning(f"Review worker {consumer_name} failed to claim tasks: {e}")
+                    await asyncio.sleep(settings.REVIEW_QUEUE_BLOCK_MS / 1000)
+                    continue
+                for message_id, task in tasks:
+                    running = asyncio.create_task(
+                        process_review_task(
+                            redis_client, blob_client, consumer_name, message_id, task, count_tokens
+                        )
+                    )
+                    in_flight.add(running)
+                    running.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.wait(in_flight)
+    logger.info(f"Review worker {consumer_name} stopped")
+
+
+async def _renew_visibility(
+    redis_client, consumer_name: str, message_id: str, lock_key: Optional[str] = None
+) -> None:
+    # Claiming a task again resets its idle time, so that slow model calls are not
+    # mistaken for a crashed worker. The summary lock taken by the task, if any, is
+    # extended alike, so that a summary outliving the timeout is not run twice.
+    while True:
+        await asyncio.sleep(settings.REVIEW_TASK_VISIBILITY_TIMEOUT_SECONDS / 3)
+        await redis_client.xclaim(
+            settings.REVIEW_QUEUE_STREAM,
+            settings.REVIEW_QUEUE_GROUP,
+            consumer_name,
+            min_idle_time=0,
+            message_ids=[message_id],
+            justid=True,
+        )
+        if lock_key is not None and await redis_client.get(lock_key) == message_id:
+            await redis_client.expire(lock_key, settings.REVIEW_TASK_VISIBILITY_TIMEOUT_SECONDS)
+
+
+async def _count_attempt(redis_client, job_id: str, message_id: str) -> int:
+    pipeline = redis_client.pipeline()
+    pipeline.hincrby(_attempts_key(job_id), message_id, 1)
+    pipeline.expire(_attempts_key(job_id), settings.REVIEW_JOB_TTL_MINUTES * 60)
+    attempts, _ = await pipeline.execute()
+    return attempts
+
+
+async def _review_file_task(
+    redis_client, blob_client, job_id: str, task: Dict[str, str], count_tokens: TokenCounter
+) -> None:
+    params = await redis_client.hgetall(_params_key(job_id))
+    content = await blob_client.get(_blob_key(task["blob_sha"]))
+    if content is None:
+        raise Exception(f"The content of {task['path']} has expired.")
+    with track_token_usage() as token_usage:
+        review = await review_repository_file(
+            file_path=task["path"],
+            blob_sha=task["blob_sha"],
+            read_text=lambda: decode_pieces([content]),
+            candidate_level=params["candidate_level"],
+            assignment_description=params["assignment_description"],
+            count_tokens=count_tokens,
+            # Files identified by two blob SHAs may be a diff against the template (see `enqueue_review_job`).
+            static_analysis=":" not in task["blob_sha"],
+        )
+    if token_usage.total_tokens:
+        await update_review_job(job_id, tokens_used_increment=token_usage.total_tokens)
+    await _record_file_review(redis_client, job_id, task["path"], review)
+
+
+async def _record_file_review(redis_client, job_id: str, file_path: str, review: str | None) -> None:
+    params = await redis_client.hgetall(_params_key(job_id))
+    pipeline = redis_client.pipeline()
+    pipeline.hset(_results_key(job_id), file_path, json.dumps(review))
+    pipeline.hlen(_results_key(job_id))
+    pipeline.expire(_results_key(job_id), settings.REVIEW_JOB_TTL_MINUTES * 60)
+    is_new, files_done, _ = await pipeline.execute()
+    # A redelivered task stores the same review again, without counting it twice.
+    if is_new:
+        await update_review_job(job_id, files_done_increment=1)
+        await publish_review_job_event(job_id, "file", path=file_path, review=review)
+    # Checked even for redelivered tasks, in case the worker which stored the last
+    # review died before enqueuing the summary.
+    if files_done == len(json.loads(params["file_paths"])):
+        await redis_client.xadd(settings.REVIEW_QUEUE_STREAM, {"kind": "summarize", "job_id": job_id})
+
+
+async def _summarize_job(redis_client, job_id: str, message_id: str) -> None:
+    # Guards against duplicate summarize tasks. The lock holds the id of its task, whose
+    # heartbeat renews it (see `_renew_visibility`); it expires with the visibility
+    # timeout, so the task is retried if this worker dies.
+    if not await redis_client.set(
+        _summary_lock_key(job_id), message_id, nx=True, ex=settings.REVIEW_TASK_VISIBILITY_TIMEOUT_SECONDS
+    ):
+        return
+    try:
+        params = await redis_client.hgetall(_params_key(job_id))
+        results = await redis_client.hgetall(_results_key(job_id))
+        file_paths = json.loads(params["file_paths"])
+        file_summaries = [json.loads(results.get(file_path, "null")) for file_path in file_paths]
+        with track_token_usage() as token_usage:
+            try:
+                review = await summarize_file_reviews(
+                    file_paths,
+                    file_summaries,
+                    params["candidate_level"],
+                    params["assignment_description"],
+                )
+            except Exception as e:
+                if any(file_summaries):
+                    raise
+                # No file could be reviewed: retrying the summary would not help.
+                await update_review_job(job_id, status="failed", error=str(e))
+                await publish_review_job_event(job_id, "failed", error=str(e))
+                return
+    except Exception:
+        await redis_client.delete(_summary_lock_key(job_id))
+        raise
+
+    await update_review_job(
+        job_id,
+        status="completed",
+        review=review,
+        files_done=len(file_paths),
+        tokens_used_increment=token_usage.total_tokens,
+    )
+    job = await get_review_job(job_id)
+    await publish_review_job_event(
+        job_id, "completed", review=review, tokens_used=job["tokens_used"]
+    )
+    await store_review(
+        job["repository"],
+        params.get("commit_sha"),
+        params["candidate_level"],
+        params["assignment_description"],
+        review,
+        dict(zip(file_paths, file_summaries)),
+        # The files were reviewed by several workers, which only shared their tokens.
+        {"seconds": job["updated_at"] - job["created_at"], "total_tokens": job["tokens_used"]},
+    )
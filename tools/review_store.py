@@ -0,0 +1,335 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from logging import getLogger
+from typing import Any, Dict, List, Optional
+
+from core.config import settings
+from prompts import PROMPT_VERSION
+from tools.serialization import dumps_compact, loads_compact
+
+logger = getLogger(__name__)
+
+# Old reviews are pruned after this many reviews are stored by the process, and on startup.
+PRUNE_EVERY_SAVES = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repository TEXT NOT NULL,
+    commit_sha TEXT,
+    candidate_level TEXT NOT NULL,
+    assignment_hash TEXT NOT NULL,
+    assignment_description TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    review TEXT NOT NULL,
+    cost TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_by_repository ON reviews (repository, commit_sha, id);
+CREATE INDEX IF NOT EXISTS reviews_by_assignment ON reviews (assignment_hash, candidate_level, id);
+CREATE INDEX IF NOT EXISTS reviews_by_commit ON reviews (commit_sha, id);
+CREATE INDEX IF NOT EXISTS reviews_by_level ON reviews (candidate_level, id);
+CREATE INDEX IF NOT EXISTS reviews_by_created_at ON reviews (created_at);
+CREATE TABLE IF NOT EXISTS file_reviews (
+    review_id INTEGER NOT NULL REFERENCES reviews (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    review BLOB NOT NULL,
+    PRIMARY KEY (review_id, position)
+) WITHOUT ROWID;
+"""
+
+_SUMMARY_COLUMNS = (
+    "id, repository, commit_sha, candidate_level, assignment_hash, "
+    "model_name, prompt_version, cost, created_at"
+)
+
+_connection: Optional[sqlite3.Connection] = None
+_connection_path: Optional[str] = None
+_connection_lock = threading.Lock()
+_saves_since_prune = 0
+
+
+def hash_assignment(assignment_description: str) -> str:
+    """
+    Hashes an assignment description, as in the keys of the Redis caches.
+
+    Args:
+        assignment_description (str): The description of the coding assignment.
+
+    Returns:
+        str: The short hash stored with, and filtering, the reviews of the assignment.
+    """
+    return hashlib.sha256(assignment_description.encode()).hexdigest()[:16]
+
+
+def _get_connection() -> sqlite3.Connection:
+    # Called with the lock held. The connection is reopened if `REVIEW_STORE_PATH` changes.
+    global _connection, _connection_path
+    if _connection is not None and _connection_path == settings.REVIEW_STORE_PATH:
+        return _connection
+    if _connection is not None:
+        _connection.close()
+    directory = os.path.dirname(settings.REVIEW_STORE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(settings.REVIEW_STORE_PATH, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    # Only applies to a new database: pruned pages are then released by `incremental_vacuum`.
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(_SCHEMA)
+    _connection, _connection_path = connection, settings.REVIEW_STORE_PATH
+    return connection
+
+
+def close_review_store() -> None:
+    """
+    Closes the connection to the review store, on application shutdown.
+    """
+    global _connection, _connection_path
+    with _connection_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection, _connection_path = None, None
+
+
+def save_review(
+    repository: str,
+    commit_sha: Optional[str],
+    candidate_level: str,
+    assignment_description: str,
+    review: str,
+    file_reviews: Dict[str, Optional[str]],
+    cost: Dict[str, Any],
+) -> int:
+    """
+    Stores a finished repository review, with the review of each of its files.
+
+    File reviews are compressed (see `dumps_compact`). Every `PRUNE_EVERY_SAVES`
+    reviews, the reviews past their retention are pruned (see `prune_review_store`).
+
+    Args:
+        repository (str): The repository path (username/repository).
+        commit_sha (Optional[str]): The reviewed commit.
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+        assignment_description (str): The description of the coding assignment.
+        review (str): The review of the repository.
+        file_reviews (Dict[str, Optional[str]]): The review of each file, keyed by path, ordered by
+                                                 decreasing relevance, `None` for files without one.
+        cost (Dict[str, Any]): The cost of the review, e.g. its tokens and timings (see `ReviewCost`).
+
+    Returns:
+        int: The identifier of the stored review.
+    """
+    global _saves_since_prune
+    with _connection_lock:
+        connection = _get_connection()
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO reviews (repository, commit_sha, candidate_level, assignment_hash, "
+                "assignment_description, model_name, prompt_version, review, cost, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    repository,
+                    commit_sha,
+                    candidate_level,
+                    hash_assignment(assignment_description),
+                    assignment_description,
+                    settings.model_name,
+                    PROMPT_VERSION,
+                    review,
+                    json.dumps(cost),
+                    int(time.time()),
+                ),
+            )
+            review_id = cursor.lastrowid
+            connection.executemany(
+                "INSERT INTO file_reviews (review_id, position, path, review) VALUES (?, ?, ?, ?)",
+                (
+                    (review_id, position, path, dumps_compact(file_review))
+                    for position, (path, file_review) in enumerate(file_reviews.items())
+                ),
+            )
+        _saves_since_prune += 1
+        prune = _saves_since_prune >= PRUNE_EVERY_SAVES
+    if prune:
+        prune_review_store()
+    return review_id
+
+
+def get_stored_review(review_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Returns a stored review, with the review of each of its files.
+
+    Args:
+        review_id (int): The identifier returned by `save_review`.
+
+    Returns:
+        Optional[Dict[str, Any]]: The repository, commit, level, assignment, model, prompt version,
+                                  review, cost and ``files`` (the path and review of each file, by
+                                  decreasing relevance) of the review. `None` if it is unknown or pruned.
+    """
+    with _connection_lock:
+        connection = _get_connection()
+        row = connection.execute("SELECT * FROM reviews WHERE id = ?", (review_id,)).fetchone()
+        if row is None:
+            return None
+        files = connection.execute(
+            "SELECT path, review FROM file_reviews WHERE review_id = ? ORDER BY position", (review_id,)
+        ).fetchall()
+    stored = dict(row)
+    stored["cost"] = json.loads(stored["cost"])
+    stored["files"] = [{"path": path, "review": loads_compact(review)} for path, review in files]
+    return stored
+
+
+def list_stored_reviews(
+    repository: Optional[str] = None,
+    commit_sha: Optional[str] = None,
+    candidate_level: Optional[str] = None,
+    assignment_hash: Optional[str] = None,
+    before: Optional[int] = None,
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    Lists stored reviews, most recent first, without their texts.
+
+    Each filter alone, the repository with the commit, and the assignment with the
+    level are served by an index; other combinations read the reviews matching one
+    of their filters. Pages follow each other by passing the smallest identifier
+    of a page as `before`, which stays fast however deep the page.
+
+    Only the reviews of the database at `REVIEW_STORE_PATH` are listed: replicas
+    which do not share that file list different reviews.
+
+    Args:
+        repository (str, optional): Only the reviews of this repository (username/repository).
+        commit_sha (str, optional): Only the reviews of this commit.
+        candidate_level (str, optional): Only the reviews for this level.
+        assignment_hash (str, optional): Only the reviews of this assignment (see `hash_assignment`).
+        before (int, optional): Only the reviews stored before the one with this identifier.
+        limit (int, optional): The maximum number of reviews. Defaults to 20.
+
+    Returns:
+        List[Dict[str, Any]]: The identifier, repository, commit, level, assignment hash, model,
+                              prompt version, cost and creation time of each review.
+    """
+    filters = {
+        "repository = ?": repository,
+        "commit_sha = ?": commit_sha,
+        "candidate_level = ?": candidate_level,
+        "assignment_hash = ?": assignment_hash,
+        "id < ?": before,
+    }
+    conditions = [condition for condition, value in filters.items() if value is not None]
+    values = [value for value in filters.values() if value is not None]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with _connection_lock:
+        rows = _get_connection().execute(
+            f"SELECT {_SUMMARY_COLUMNS} FROM reviews {where} ORDER BY id DESC LIMIT ?",
+            (*values, limit),
+        ).fetchall()
+    return [{**dict(row), "cost": json.loads(row["cost"])} for row in rows]
+
+
+def prune_review_store(now: Optional[float] = None) -> int:
+    """
+    Deletes the reviews older than `REVIEW_STORE_RETENTION_DAYS`, then the oldest ones
+    above `REVIEW_STORE_MAX_REVIEWS`, and releases the pages they used.
+
+    Args:
+        now (float, optional): The current time. Defaults to `time.time()`.
+
+    Returns:
+        int: The number of deleted reviews.
+    """
+    global _saves_since_prune
+    now = time.time() if now is None else now
+    with _connection_lock:
+        connection = _get_connection()
+        with connection:
+            deleted = 0
+            if settings.REVIEW_STORE_RETENTION_DAYS:
+                deleted += connection.execute(
+                    "DELETE FROM reviews WHERE created_at < ?",
+                    (int(now - settings.REVIEW_STORE_RETENTION_DAYS * 24 * 3600),),
+                ).rowcount
+            if settings.REVIEW_STORE_MAX_REVIEWS:
+                # Identifiers increase with time, so the oldest reviews have the smallest ones.
+                deleted += connection.execute(
+                    "DELETE FROM reviews WHERE id <= "
+                    "(SELECT id FROM reviews ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (settings.REVIEW_STORE_MAX_REVIEWS,),
+                ).rowcount
+        if deleted:
+            # Each step of the pragma releases one page.
+            connection.execute("PRAGMA incremental_vacuum").fetchall()
+        _saves_since_prune = 0
+    if deleted:
+        logger.info(f"Pruned {deleted} stored reviews")
+    return deleted
+
+
+class ReviewRecorder:
+    """
+    Collects the file reviews of a review in progress, in order of relevance, to store them with it.
+
+    Its methods are the `on_files_selected` and `on_file_reviewed` callbacks of `send_files_to_model`.
+
+    Attributes:
+        file_reviews (Dict[str, Optional[str]]): The review of each file, keyed by path.
+    """
+
+    def __init__(self):
+        self.file_reviews: Dict[str, Optional[str]] = {}
+
+    async def on_files_selected(self, file_paths: List[str]) -> None:
+        # Files finish in any order: their reviews fill the slots reserved in order of relevance.
+        self.file_reviews = dict.fromkeys(file_paths)
+
+    async def on_file_reviewed(self, file_path: str, review: Optional[str]) -> None:
+        self.file_reviews[file_path] = review
+
+
+async def store_review(
+    repository: str,
+    commit_sha: Optional[str],
+    candidate_level: str,
+    assignment_description: str,
+    review: str,
+    file_reviews: Dict[str, Optional[str]],
+    cost: Dict[str, Any],
+) -> Optional[int]:
+    """
+    Stores a finished review (see `save_review`) when `ENABLE_REVIEW_STORE` is set.
+
+    The review was already produced, so a failure to store it is logged instead of raised.
+
+    Returns:
+        Optional[int]: The identifier of the stored review, or `None` if it was not stored.
+    """
+    if not settings.ENABLE_REVIEW_STORE:
+        return None
+    try:
+        return await asyncio.to_thread(
+            save_review,
+            repository,
+            commit_sha,
+            candidate_level,
+            assignment_description,
+            review,
+            file_reviews,
+            cost,
+        )
+    except Exception:
+        logger.exception(f"Could not store the review of {repository}")
+        return None
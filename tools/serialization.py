@@ -0,0 +1,48 @@
+import json
+import zlib
+from typing import Any
+
+from core.config import settings
+
+_RAW_MARKER = b"j"
+_COMPRESSED_MARKER = b"z"
+
+
+def dumps_compact(value: Any) -> bytes:
+    """
+    Serializes a JSON-compatible value into a compact binary payload for caching.
+
+    Payloads larger than `CACHE_COMPRESSION_MIN_BYTES` are zlib-compressed. The
+    first byte records which encoding was used, so `loads_compact` can read both.
+
+    Args:
+        value (Any): The value to serialize.
+
+    Returns:
+        bytes: The serialized payload.
+    """
+    payload = json.dumps(value, separators=(",", ":")).encode()
+    if len(payload) < settings.CACHE_COMPRESSION_MIN_BYTES:
+        return _RAW_MARKER + payload
+    return _COMPRESSED_MARKER + zlib.compress(payload)
+
+
+def loads_compact(payload: bytes) -> Any:
+    """
+    Deserializes a payload produced by `dumps_compact`.
+
+    Args:
+        payload (bytes): The serialized payload.
+
+    Returns:
+        Any: The deserialized value.
+
+    Raises:
+        ValueError: If the payload was not produced by `dumps_compact`.
+    """
+    marker, body = payload[:1], payload[1:]
+    if marker == _COMPRESSED_MARKER:
+        body = zlib.decompress(body)
+    elif marker != _RAW_MARKER:
+        raise ValueError("Unknown cache payload encoding.")
+    return json.loads(body)
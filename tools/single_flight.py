@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import uuid
+from collections import Counter
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Dict
+
+from redis.exceptions import WatchError
+
+from core.config import settings
+from tools.redis_client import get_async_redis_client
+
+logger = getLogger(__name__)
+
+SINGLE_FLIGHT_STATS_KEY = "review_flight:stats"
+SINGLE_FLIGHT_EVENTS = ("leaders", "coalesced", "takeovers")
+
+_local_flights: Dict[str, asyncio.Task] = {}
+_local_stats: Counter = Counter()
+
+
+def build_review_flight_key(
+    repository: str, commit_sha: str, candidate_level: str, assignment_description: str
+) -> str:
+    """
+    Builds the key identifying identical repository reviews.
+
+    Args:
+        repository (str): The repository path (username/repository).
+        commit_sha (str): The commit the repository is reviewed at.
+        candidate_level (str): The candidate's level (Junior, Middle, Senior).
+        assignment_description (str): The description of the coding assignment.
+
+    Returns:
+        str: The key of the review computation.
+    """
+    assignment_hash = hashlib.sha256(assignment_description.encode()).hexdigest()[:16]
+    return f"review_flight:{repository}:{commit_sha}:{candidate_level}:{assignment_hash}"
+
+
+async def run_single_flight(key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Runs `compute` once for all concurrent callers using the same key.
+
+    Callers in the same process share one task. Across processes, the first one
+    to take a Redis lease computes the result while the others poll for it; the
+    lease is renewed while the computation runs and expires after
+    `SINGLE_FLIGHT_LEASE_SECONDS` if its holder dies, so that a waiting caller
+    takes over. Errors are shared like results. Results are stored under the
+    lease token of their flight, so that the callers of a new flight never read
+    the result of a previous one.
+
+    Args:
+        key (str): The key built by `build_review_flight_key`.
+        compute (Callable[[], Awaitable[Any]]): Computes the result, which must be JSON serializable.
+
+    Returns:
+        Any: The result of the computation.
+
+    Raises:
+        Exception: If the computation failed, in this or in another process.
+    """
+    if not settings.ENABLE_SINGLE_FLIGHT:
+        return await compute()
+    flight = _local_flights.get(key)
+    if flight is None:
+        flight = asyncio.create_task(_fly(key, compute))
+        _local_flights[key] = flight
+        flight.add_done_callback(lambda task: _land(key, task))
+    else:
+        await _record("coalesced")
+    # Shielded, so that a caller giving up does not cancel the computation for the others.
+    return await asyncio.shield(flight)
+
+
+async def get_single_flight_stats() -> Dict[str, int]:
+    """
+    Returns how many computations were run (``leaders``), joined by concurrent callers
+    (``coalesced``) and taken over after their leader died (``takeovers``).
+
+    The counters are shared by all application replicas when Redis is enabled.
+
+    Returns:
+        Dict[str, int]: The single-flight counters.
+    """
+    if not settings.ENABLE_REDIS:
+        return {event: _local_stats[event] for event in SINGLE_FLIGHT_EVENTS}
+    async with get_async_redis_client() as redis_client:
+        stats = await redis_client.hgetall(SINGLE_FLIGHT_STATS_KEY)
+    return {event: int(stats.get(event, 0)) for event in SINGLE_FLIGHT_EVENTS}
+
+
+def _land(key: str, flight: asyncio.Task) -> None:
+    _local_flights.pop(key, None)
+    if not flight.cancelled():
+        # Retrieved, so that a failure nobody waits for anymore is not reported as unhandled.
+        flight.exception()
+
+
+async def _record(event: str) -> None:
+    _local_stats[event] += 1
+    if settings.ENABLE_REDIS:
+        async with get_async_redis_client() as redis_client:
+            await redis_client.hincrby(SINGLE_FLIGHT_STATS_KEY, event, 1)
+
+
+async def _fly(key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    if not settings.ENABLE_REDIS:
+        await _record("leaders")
+        return await compute()
+
+    lease_key = f"{key}:lease"
+    token = uuid.uuid4().hex
+    lease_ms = settings.SINGLE_FLIGHT_LEASE_SECONDS * 1000
+    async with get_async_redis_client() as redis_client:
+        waited = False
+        while True:
+            if await redis_client.set(lease_key, token, nx=True, px=lease_ms):
+                await _record("takeovers" if waited else "leaders")
+                return await _lead(redis_client, lease_key, _result_key(key, token), token, compute)
+            leader_token = await redis_client.get(lease_key)
+            if leader_token is None:
+                # The leader finished or died in between: the lease is free again.
+                continue
+            if not waited:
+                await _record("coalesced")
+                waited = True
+            payload = await _wait_for_result(
+                redis_client, lease_key, _result_key(key, leader_token), leader_token
+            )
+            if payload is not None:
+                if "error" in payload:
+                    raise Exception(payload["error"])
+                return payload["result"]
+            logger.warning(f"The leader of {key} died, taking over")
+
+
+async def _lead(redis_client, lease_key: str, result_key: str, token: str, compute) -> Any:
+    renewal = asyncio.create_task(_renew_lease(redis_client, lease_key, token))
+    # The result is stored before the lease is released, so that waiting callers
+    # never mistake a finished leader for a dead one.
+    try:
+        try:
+            result = await compute()
+        except Exception as e:
+            await redis_client.set(
+                result_key, json.dumps({"error": str(e)}), ex=settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS
+            )
+            raise
+        await redis_client.set(
+            result_key, json.dumps({"result": result}), ex=settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS
+        )
+        return result
+    finally:
+        renewal.cancel()
+        await _if_lease_held(
+            redis_client, lease_key, token, lambda pipeline: pipeline.delete(lease_key)
+        )
+
+
+def _result_key(key: str, token: str) -> str:
+    return f"{key}:result:{token}"
+
+
+async def _wait_for_result(redis_client, lease_key: str, result_key: str, leader_token: str) -> dict | None:
+    while True:
+        payload = await redis_client.get(result_key)
+        if payload is not None:
+            return json.loads(payload)
+        if await redis_client.get(lease_key) != leader_token:
+            payload = await redis_client.get(result_key)
+            return json.loads(payload) if payload is not None else None
+        await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_MS / 1000)
+
+
+async def _renew_lease(redis_client, lease_key: str, token: str) -> None:
+    lease_ms = settings.SINGLE_FLIGHT_LEASE_SECONDS * 1000
+    while True:
+        await asyncio.sleep(settings.SINGLE_FLIGHT_LEASE_SECONDS / 3)
+        await _if_lease_held(
+            redis_client, lease_key, token, lambda pipeline: pipeline.pexpire(lease_key, lease_ms)
+        )
+
+
+async def _if_lease_held(redis_client, lease_key: str, token: str, action) -> None:
+    # Compare-and-set with WATCH, so that a lease taken over by another process is left alone.
+    async with redis_client.pipeline() as pipeline:
+        try:
+            await pipeline.watch(lease_key)
+            if await pipeline.get(lease_key) != token:
+                return
+            pipeline.multi()
+            action(pipeline)
+            await pipeline.execute()
+        except WatchError:
+            pass
@@ -0,0 +1,207 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from github.Repository import Repository
+
+from core.config import settings
+from tools.clients import get_http_session
+from tools.metrics import time_stage
+from tools.rate_limit import call_github, github_rate_limiter
+from tools.texts import decode_pieces
+from tools.utils import get_head_commit_sha, get_repository_tree
+
+logger = getLogger(__name__)
+
+# Size of the pieces file contents are copied and decoded in.
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+@dataclass
+class RepositorySnapshot:
+    """
+    Copy of every file of a repository at a single commit.
+
+    Files of at most `SNAPSHOT_MEMORY_FILE_BYTES` bytes are held in memory. Larger
+    ones, such as data files, are spilled to a temporary directory, removed with
+    the snapshot, so that they do not inflate the memory of the process.
+
+    Attributes:
+        full_name (str): The repository name (username/repository).
+        commit_sha (str): The commit the snapshot was taken at.
+        blob_shas (Dict[str, str]): Git blob SHA of each file, keyed by path, in tree order.
+        sizes (Dict[str, int]): Size in bytes of each file, keyed by path.
+        files (Dict[str, bytes]): Raw content of each file held in memory, keyed by path.
+        spilled (Dict[str, str]): Location on disk of the content of each spilled file, keyed by path.
+    """
+
+    full_name: str
+    commit_sha: str
+    blob_shas: Dict[str, str] = field(default_factory=dict)
+    sizes: Dict[str, int] = field(default_factory=dict)
+    files: Dict[str, bytes] = field(default_factory=dict)
+    spilled: Dict[str, str] = field(default_factory=dict)
+    _spill_directory: Optional[tempfile.TemporaryDirectory] = field(default=None, repr=False, compare=False)
+
+    @property
+    def paths(self) -> List[str]:
+        return list(self.blob_shas)
+
+    def has_content(self, path: str) -> bool:
+        return path in self.files or path in self.spilled
+
+    def open(self, path: str) -> BinaryIO:
+        """
+        Opens the raw content of a file, to read it in pieces.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            BinaryIO: The content, to be closed after use.
+        """
+        if path in self.spilled:
+            return open(self.spilled[path], "rb")
+        return io.BytesIO(self.files[path])
+
+    def read_bytes(self, path: str) -> bytes:
+        with self.open(path) as content:
+            return content.read()
+
+    def read_head(self, path: str, size: int) -> bytes:
+        with self.open(path) as content:
+            return content.read(size)
+
+    def iter_text(self, path: str) -> Iterator[str]:
+        """
+        Decodes the content of a file piece by piece (see `decode_pieces`).
+
+        Args:
+            path (str): The path of the file.
+
+        Yields:
+            str: The text of the file, in pieces of at most `STREAM_CHUNK_BYTES` bytes.
+
+        Raises:
+            UnicodeDecodeError: If the file is not a text file.
+        """
+        with self.open(path) as content:
+            yield from decode_pieces(iter(lambda: content.read(STREAM_CHUNK_BYTES), b""))
+
+    def read_text(self, path: str) -> str:
+        return "".join(self.iter_text(path))
+
+    def store(self, path: str, content: BinaryIO) -> int:
+        """
+        Stores the content of a file, read in pieces, in memory or on disk depending on its size.
+
+        Args:
+            path (str): The path of the file.
+            content (BinaryIO): The content of the file, read up to its end.
+
+        Returns:
+            int: The size of the content in bytes.
+        """
+        head = content.read(settings.SNAPSHOT_MEMORY_FILE_BYTES + 1)
+        if len(head) <= settings.SNAPSHOT_MEMORY_FILE_BYTES:
+            self.files[path] = head
+            return len(head)
+        if self._spill_directory is None:
+            self._spill_directory = tempfile.TemporaryDirectory(prefix="snapshot-")
+        spill_path = os.path.join(self._spill_directory.name, str(len(self.spilled)))
+        with open(spill_path, "wb") as spill_file:
+            spill_file.write(head)
+            shutil.copyfileobj(content, spill_file, STREAM_CHUNK_BYTES)
+            size = spill_file.tell()
+        self.spilled[path] = spill_path
+        logger.info(f"Spilled {path} ({size} bytes) of {self.full_name} to disk")
+        return size
+
+
+def load_repository_snapshot(
+    repo: Repository, commit_sha: Optional[str] = None
+) -> RepositorySnapshot:
+    """
+    Loads all files of a repository with a constant number of GitHub API calls.
+
+    The file list and blob SHAs come from one recursive git tree call, and the
+    contents are streamed from one tarball download of the same commit, instead
+    of calling ``get_contents`` once per file. Files missing from the archive
+    (e.g. marked ``export-ignore``) are fetched individually as raw git blobs.
+    Contents are copied in pieces of `STREAM_CHUNK_BYTES` bytes, so that a large
+    file never needs to fit in memory (see `RepositorySnapshot`).
+
+    Args:
+        repo (Repository): The GitHub repository object.
+        commit_sha (str, optional): The commit to load. Defaults to the head of the default branch.
+
+    Returns:
+        RepositorySnapshot: The snapshot holding every file of the repository.
+
+    Raises:
+        requests.HTTPError: If the tarball download fails.
+    """
+    commit_sha = commit_sha or get_head_commit_sha(repo)
+    snapshot = RepositorySnapshot(full_name=repo.full_name, commit_sha=commit_sha)
+    for entry in get_repository_tree(repo, commit_sha):
+        snapshot.blob_shas[entry["path"]] = entry["sha"]
+        snapshot.sizes[entry["path"]] = entry["size"]
+
+    with time_stage("fetch"):
+        archive_url = call_github(repo.get_archive_link, "tarball", commit_sha)
+        logger.info(f"Downloading snapshot of {repo.full_name}@{commit_sha}")
+        _extract_tarball(archive_url, snapshot)
+
+        for path in snapshot.paths:
+            if not snapshot.has_content(path):
+                github_rate_limiter.call_sync(lambda: download_blob(repo, path, snapshot))
+    return snapshot
+
+
+def _extract_tarball(archive_url: str, snapshot: RepositorySnapshot) -> None:
+    with get_http_session().get(
+        archive_url, stream=True, timeout=settings.GITHUB_ARCHIVE_TIMEOUT_SECONDS
+    ) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                # Archive members are prefixed with a "{owner}-{repo}-{sha}/" folder.
+                _, _, path = member.name.partition("/")
+                if path in snapshot.blob_shas:
+                    snapshot.store(path, archive.extractfile(member))
+
+
+def download_blob(repo: Repository, path: str, snapshot: RepositorySnapshot) -> None:
+    """
+    Streams the content of a file, by its blob SHA in `snapshot`, into the snapshot.
+
+    The raw media type streams the content itself, instead of base64 in a JSON document.
+
+    Args:
+        repo (Repository): The GitHub repository object.
+        path (str): The path of the file, listed in `snapshot.blob_shas`.
+        snapshot (RepositorySnapshot): The snapshot to store the content in.
+
+    Raises:
+        requests.HTTPError: If the download fails.
+    """
+    with get_http_session().get(
+        f"{repo.url}/git/blobs/{snapshot.blob_shas[path]}",
+        headers={
+            "Accept": "application/vnd.github.raw",
+            "Authorization": f"token {settings.GITHUB_ACCESS_TOKEN}",
+        },
+        stream=True,
+        timeout=settings.GITHUB_ARCHIVE_TIMEOUT_SECONDS,
+    ) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        snapshot.store(path, response.raw)
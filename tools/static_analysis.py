@@ -0,0 +1,333 @@
+import ast
+import asyncio
+import multiprocessing
+import os
+import re
+import shlex
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Dict, Iterator, List, Optional, Union
+
+from core.config import settings
+
+logger = getLogger(__name__)
+
+# Lines of linter output pointing at a line, e.g. `main.go:12:5: message` or `-:12: message`.
+_LINTER_LINE_PATTERN = re.compile(r"^[^:\n]*:(\d+):(?:\d+:)?\s*(.+)$", re.MULTILINE)
+_FUNCTION_NAME_PATTERN = re.compile(r"^_{0,2}[a-z][a-z0-9_]*$|^__[a-z0-9_]+__$")
+_CLASS_NAME_PATTERN = re.compile(r"^_?[A-Z][A-Za-z0-9]*$")
+# Methods named by the classes they override, e.g. `unittest.TestCase.setUp`, `ast.NodeVisitor.visit_Name`
+# or `http.server.BaseHTTPRequestHandler.do_GET`.
+_OVERRIDE_NAME_PATTERN = re.compile(
+    r"^(?:setUp|tearDown|asyncSetUp|asyncTearDown)(?:Class|Module)?$|^visit_|^do_[A-Z]+$"
+)
+# Nodes adding a branch to the control flow of a function, for its cyclomatic complexity.
+_BRANCH_NODES = (
+    ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.comprehension, ast.match_case,
+)
+_SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+
+_executor: Optional[Union[ProcessPoolExecutor, "_InlineExecutor"]] = None
+_executor_lock = threading.Lock()
+
+
+@dataclass(frozen=True, order=True)
+class Finding:
+    """
+    An issue found by a static check.
+
+    Attributes:
+        line (int): The line of the file the issue is at, from 1.
+        code (str): The check which found it, e.g. ``unused-import``.
+        message (str): What is wrong.
+    """
+
+    line: int
+    code: str
+    message: str
+
+
+@dataclass
+class FileAnalysis:
+    """
+    The static analysis of a file.
+
+    Attributes:
+        file_path (str): The path of the analyzed file.
+        lines (int): The number of non-blank lines of the file.
+        findings (List[Finding]): The issues found, by line.
+    """
+
+    file_path: str
+    lines: int
+    findings: List[Finding] = field(default_factory=list)
+
+    @property
+    def is_trivial(self) -> bool:
+        """
+        Whether the file is small and clean enough not to need a model review.
+        """
+        return not self.findings and self.lines <= settings.STATIC_ANALYSIS_TRIVIAL_LINES
+
+    def digest(self) -> str:
+        """
+        Lists the findings compactly for the prompts, at most `STATIC_ANALYSIS_MAX_FINDINGS` of them.
+
+        Returns:
+            str: One ``line: [code] message`` line per finding, or ``None`` if there is none.
+        """
+        if not self.findings:
+            return "None"
+        shown = self.findings[: settings.STATIC_ANALYSIS_MAX_FINDINGS]
+        lines = [f"{finding.line}: [{finding.code}] {finding.message}" for finding in shown]
+        if len(self.findings) > len(shown):
+            lines.append(f"... and {len(self.findings) - len(shown)} more")
+        return "\n".join(lines)
+
+    def summary(self) -> str:
+        """
+        Returns the review of a trivial file (see `is_trivial`), which is not sent to the model.
+        """
+        return (
+            f"Static analysis found no issues in this {self.lines}-line file; "
+            "it is too small to need a detailed review."
+        )
+
+
+@dataclass(frozen=True)
+class AnalysisOptions:
+    """
+    The settings of an analysis, passed to the worker processes along with the file.
+
+    Attributes:
+        max_complexity (int): Functions more complex than this are reported.
+        linters (Dict[str, str]): The command of the external linter of each file extension.
+        linter_timeout_seconds (int): How long an external linter may run.
+    """
+
+    max_complexity: int
+    linters: Dict[str, str]
+    linter_timeout_seconds: int
+
+    @classmethod
+    def from_settings(cls) -> "AnalysisOptions":
+        return cls(
+            max_complexity=settings.STATIC_ANALYSIS_MAX_COMPLEXITY,
+            linters=dict(settings.STATIC_ANALYSIS_LINTERS),
+            linter_timeout_seconds=settings.STATIC_ANALYSIS_LINTER_TIMEOUT_SECONDS,
+        )
+
+
+def _extension(file_path: str) -> str:
+    return os.path.splitext(file_path)[1].lower()
+
+
+def can_analyze(file_path: str, options: Optional[AnalysisOptions] = None) -> bool:
+    """
+    Tells whether a file is analyzed: Python files, and the files of the extensions of `STATIC_ANALYSIS_LINTERS`.
+
+    Args:
+        file_path (str): The path of the file.
+        options (AnalysisOptions, optional): The settings of the analysis. Defaults to the current settings.
+
+    Returns:
+        bool: Whether `analyze_source` has an analyzer for the file.
+    """
+    extension = _extension(file_path)
+    linters = options.linters if options is not None else settings.STATIC_ANALYSIS_LINTERS
+    return extension == ".py" or extension in linters
+
+
+def analyze_source(file_path: str, text: str, options: AnalysisOptions) -> Optional[FileAnalysis]:
+    """
+    Analyzes the content of a file: Python files with checks of their syntax tree, and other
+    files with the external linter configured for their extension, if any.
+
+    The Python checks report syntax errors, unused imports (except in ``__init__.py``, where
+    imports are re-exports), functions whose cyclomatic complexity exceeds `max_complexity`,
+    public functions, classes and methods without docstring, and names not following PEP 8.
+
+    Runs in the worker processes of `analyze_file`, so it only depends on its arguments.
+
+    Args:
+        file_path (str): The path of the file.
+        text (str): The content of the file.
+        options (AnalysisOptions): The settings of the analysis.
+
+    Returns:
+        Optional[FileAnalysis]: The analysis, or `None` if the file has no analyzer or its linter failed.
+    """
+    lines = sum(1 for line in text.splitlines() if line.strip())
+    extension = _extension(file_path)
+    if extension in options.linters:
+        findings = _run_linter(options.linters[extension], file_path, text, options.linter_timeout_seconds)
+    elif extension == ".py":
+        findings = _check_python(file_path, text, options.max_complexity)
+    else:
+        return None
+    if findings is None:
+        return None
+    return FileAnalysis(file_path=file_path, lines=lines, findings=sorted(set(findings)))
+
+
+def _check_python(file_path: str, text: str, max_complexity: int) -> List[Finding]:
+    try:
+        tree = ast.parse(text)
+    except SyntaxError as e:
+        return [Finding(e.lineno or 1, "syntax-error", e.msg)]
+    findings = []
+    if os.path.basename(file_path) != "__init__.py":
+        findings.extend(_find_unused_imports(tree))
+    api_nodes = set(_iter_api_nodes(tree.body))
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            complexity = _complexity(node)
+            if complexity > max_complexity:
+                findings.append(Finding(
+                    node.lineno, "complexity", f"`{node.name}` has a cyclomatic complexity of {complexity}"
+                ))
+            if not _FUNCTION_NAME_PATTERN.match(node.name) and not _OVERRIDE_NAME_PATTERN.match(node.name):
+                findings.append(Finding(node.lineno, "naming", f"function `{node.name}` is not snake_case"))
+        elif isinstance(node, ast.ClassDef):
+            if not _CLASS_NAME_PATTERN.match(node.name):
+                findings.append(Finding(node.lineno, "naming", f"class `{node.name}` is not CapWords"))
+        else:
+            continue
+        # Tests are named after what they check.
+        public = node in api_nodes and not node.name.lower().startswith(("_", "test"))
+        if public and ast.get_docstring(node) is None:
+            findings.append(Finding(node.lineno, "docstring", f"`{node.name}` has no docstring"))
+    return findings
+
+
+def _iter_api_nodes(body: List[ast.stmt]) -> Iterator[ast.AST]:
+    # The functions and classes of the module and the methods of its classes, which need docstrings,
+    # unlike the functions nested in functions.
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            yield node
+        elif isinstance(node, ast.ClassDef):
+            yield node
+            yield from _iter_api_nodes(node.body)
+
+
+def _find_unused_imports(tree: ast.Module) -> List[Finding]:
+    imported = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                # `import a.b` binds `a`.
+                imported[alias.asname or alias.name.split(".")[0]] = (node.lineno, alias.name)
+        elif isinstance(node, ast.ImportFrom) and node.module != "__future__":
+            for alias in node.names:
+                if alias.name != "*":
+                    imported[alias.asname or alias.name] = (node.lineno, alias.name)
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            used.add(node.id)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            # Names quoted in annotations or listed in `__all__`.
+            used.update(re.findall(r"[A-Za-z_]\w*", node.value) if len(node.value) < 200 else ())
+    return [
+        Finding(line, "unused-import", f"`{name}` is imported but unused")
+        for bound_name, (line, name) in imported.items()
+        if bound_name not in used
+    ]
+
+
+def _complexity(function: ast.AST) -> int:
+    complexity = 1
+    nodes = list(ast.iter_child_nodes(function))
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, _SCOPE_NODES):
+            # Nested functions and classes are measured on their own.
+            continue
+        if isinstance(node, _BRANCH_NODES):
+            complexity += 1 + (len(node.ifs) if isinstance(node, ast.comprehension) else 0)
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        nodes.extend(ast.iter_child_nodes(node))
+    return complexity
+
+
+def _run_linter(command: str, file_path: str, text: str, timeout_seconds: int) -> Optional[List[Finding]]:
+    arguments = [argument.replace("{path}", file_path) for argument in shlex.split(command)]
+    try:
+        completed = subprocess.run(
+            arguments, input=text, capture_output=True, text=True, timeout=timeout_seconds
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Linter `{arguments[0]}` failed on {file_path}: {e}")
+        return None
+    # Linters exit with a non-zero status when they find issues, so only their output is used.
+    name = os.path.basename(arguments[0])
+    return [
+        Finding(int(line), name, message.strip())
+        for line, message in _LINTER_LINE_PATTERN.findall(completed.stdout)
+    ]
+
+
+class _InlineExecutor:
+    # Stands for the process pool when `STATIC_ANALYSIS_WORKERS` is 0.
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        pass
+
+
+def _get_executor() -> Union[ProcessPoolExecutor, _InlineExecutor]:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if settings.STATIC_ANALYSIS_WORKERS == 0:
+                _executor = _InlineExecutor()
+            else:
+                # Spawned workers do not inherit the event loop, threads and connections of this process.
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.STATIC_ANALYSIS_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return _executor
+
+
+async def analyze_file(file_path: str, text: str) -> Optional[FileAnalysis]:
+    """
+    Analyzes a file (see `analyze_source`) in a pool of `STATIC_ANALYSIS_WORKERS` processes,
+    so the files of all reviews in flight are analyzed in parallel, outside the event loop.
+
+    An analysis which fails is logged and skipped: the file is then reviewed without it.
+
+    Args:
+        file_path (str): The path of the file.
+        text (str): The content of the file.
+
+    Returns:
+        Optional[FileAnalysis]: The analysis, or `None` if the file has no analyzer or its analysis failed.
+    """
+    options = AnalysisOptions.from_settings()
+    if not can_analyze(file_path, options):
+        return None
+    executor = _get_executor()
+    try:
+        if isinstance(executor, _InlineExecutor):
+            return await asyncio.to_thread(analyze_source, file_path, text, options)
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, analyze_source, file_path, text, options
+        )
+    except Exception:
+        logger.exception(f"Could not analyze {file_path}")
+        return None
+
+
+def shutdown_static_analysis() -> None:
+    """
+    Stops the worker processes of `analyze_file`, on shutdown.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,146 @@
+import asyncio
+import posixpath
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Dict, List, Tuple
+
+from core.config import settings
+from prompts import review_group_summary_prompt
+from tools.rate_limit import call_model
+from tools.texts import TokenCounter
+
+logger = getLogger(__name__)
+
+# Rounds moving single short summaries up cost no model call, so deep trees are fine.
+MAX_REDUCE_ROUNDS = 32
+
+
+@dataclass
+class ReviewSummary:
+    """
+    The review of a file, or the condensed reviews of a directory.
+
+    Attributes:
+        path (str): The path of the file or directory ("" for the repository root).
+        text (str): The review, with its header.
+        files (int): The number of files the review covers.
+    """
+
+    path: str
+    text: str
+    files: int = 1
+
+
+async def reduce_file_reviews(
+    file_reviews: List[Tuple[str, str]],
+    candidate_level: str,
+    assignment_description: str,
+    count_tokens: TokenCounter,
+) -> str:
+    """
+    Bounds the file reviews sent to the final repository review prompt.
+
+    When the reviews fit in `REVIEW_SUMMARY_TOKEN_BUDGET` tokens, they are joined
+    unchanged. Otherwise they are reduced like a tree: the reviews of the files of
+    each directory are condensed into a review of that directory, of about
+    `REVIEW_GROUP_SUMMARY_TOKENS` tokens, then the reviews of sibling directories
+    into a review of their parent, and so on until everything fits. The groups of
+    a round are summarized concurrently, so the number of rounds, and not the
+    number of files, drives the latency.
+
+    Args:
+        file_reviews (List[Tuple[str, str]]): The path and review of each file, most relevant first.
+        candidate_level (str): The level of the candidate (e.g., Junior, Middle, Senior) for the review.
+        assignment_description (str): A description of the coding assignment to contextualize the review.
+        count_tokens (TokenCounter): Counts the model tokens of a text.
+
+    Returns:
+        str: The reviews to send to the final prompt, within the budget when possible.
+    """
+    summaries = [
+        ReviewSummary(path=file_path, text=f"File: {file_path}\n{review}")
+        for file_path, review in file_reviews
+    ]
+    semaphore = asyncio.Semaphore(settings.REVIEW_CONCURRENCY)
+    for round_num in range(MAX_REDUCE_ROUNDS):
+        if sum(count_tokens(summary.text) for summary in summaries) <= settings.REVIEW_SUMMARY_TOKEN_BUDGET:
+            break
+        if len(summaries) == 1 and not summaries[0].path:
+            break
+        slots = _group_deepest(summaries, count_tokens)
+        logger.info(f"Reducing {len(summaries)} reviews into {len(slots)} (round {round_num + 1})")
+        condensed = iter(await asyncio.gather(
+            *(
+                _summarize_group(slot, candidate_level, assignment_description, count_tokens, semaphore)
+                for slot in slots
+                if isinstance(slot, list)
+            )
+        ))
+        summaries = [next(condensed) if isinstance(slot, list) else slot for slot in slots]
+    return "".join(summary.text for summary in summaries)
+
+
+def _depth(path: str) -> int:
+    return path.count("/") + 1 if path else 0
+
+
+def _group_deepest(
+    summaries: List[ReviewSummary], count_tokens: TokenCounter
+) -> List[ReviewSummary | List[ReviewSummary]]:
+    # Only the deepest summaries are grouped, by parent directory, so that a
+    # directory is condensed once all of its subdirectories are. Groups are packed
+    # to at most the token budget, so that every group fits in a single model
+    # call, and keep the position of their first summary, i.e. the order of relevance.
+    deepest = max(_depth(summary.path) for summary in summaries)
+    slots: List[ReviewSummary | List[ReviewSummary]] = []
+    open_groups: Dict[str, Tuple[List[ReviewSummary], int]] = {}
+    for summary in summaries:
+        if _depth(summary.path) < deepest:
+            slots.append(summary)
+            continue
+        parent = posixpath.dirname(summary.path)
+        tokens = count_tokens(summary.text)
+        group, group_tokens = open_groups.get(parent, (None, 0))
+        if group is None or group_tokens + tokens > settings.REVIEW_SUMMARY_TOKEN_BUDGET:
+            group, group_tokens = [], 0
+            slots.append(group)
+        group.append(summary)
+        open_groups[parent] = (group, group_tokens + tokens)
+    return slots
+
+
+async def _summarize_group(
+    group: List[ReviewSummary],
+    candidate_level: str,
+    assignment_description: str,
+    count_tokens: TokenCounter,
+    semaphore: asyncio.Semaphore,
+) -> ReviewSummary:
+    parent = posixpath.dirname(group[0].path)
+    if (
+        len(group) == 1
+        and group[0].path != parent
+        and count_tokens(group[0].text) <= 2 * settings.REVIEW_GROUP_SUMMARY_TOKENS
+    ):
+        # A summary alone in its directory moves up without a model call, unless
+        # it is much longer than a condensed one. At the root, it cannot move up.
+        return ReviewSummary(path=parent, text=group[0].text, files=group[0].files)
+    files = sum(summary.files for summary in group)
+    name = f"{parent}/" if parent else "the repository root"
+    prompt = review_group_summary_prompt(
+        summaries="".join(summary.text for summary in group),
+        group_name=name,
+        candidate_level=candidate_level,
+        assignment_description=assignment_description,
+        # About 3 words for 4 tokens in English text.
+        max_words=settings.REVIEW_GROUP_SUMMARY_TOKENS * 3 // 4,
+    )
+    async with semaphore:
+        condensed = await call_model(
+            lambda: settings.GENERATIVE_MODEL.ainvoke(prompt.messages), prompt.text
+        )
+    return ReviewSummary(
+        path=parent,
+        text=f"Module: {name} ({files} file{'s' if files > 1 else ''})\n{condensed.content}\n",
+        files=files,
+    )
@@ -0,0 +1,177 @@
+import difflib
+import hashlib
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Dict, List, Optional
+
+from github.Repository import Repository
+
+from core.config import settings
+from tools.filters import select_review_files
+from tools.serialization import dumps_compact, loads_compact
+from tools.snapshot import load_repository_snapshot
+from tools.tiered_cache import cache_get, cache_set
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class AssignmentTemplate:
+    """
+    The starter repository handed out with an assignment.
+
+    Attributes:
+        repository (str): The template repository (username/repository).
+        commit_sha (str): The indexed commit of the template.
+        blob_shas (Dict[str, str]): Git blob SHA of every file of the template, keyed by path.
+        texts (Dict[str, str]): Content of the template files which would be reviewed, keyed by path.
+    """
+
+    repository: str
+    commit_sha: str
+    blob_shas: Dict[str, str] = field(default_factory=dict)
+    texts: Dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._blob_sha_set = set(self.blob_shas.values())
+
+    def contains_blob(self, blob_sha: str) -> bool:
+        return blob_sha in self._blob_sha_set
+
+
+def _template_key(assignment_description: str) -> str:
+    assignment_hash = hashlib.sha256(assignment_description.encode()).hexdigest()[:16]
+    return f"assignment_template:{assignment_hash}"
+
+
+def register_assignment_template(repo: Repository, assignment_description: str) -> AssignmentTemplate:
+    """
+    Indexes the starter repository of an assignment, replacing the previous one.
+
+    The blob SHAs of all its files, and the content of the files which would be
+    reviewed, are stored in Redis without expiration, and cached by each process
+    (see `cache_get`), which is told when the template is replaced.
+
+    Args:
+        repo (Repository): The GitHub repository object of the template.
+        assignment_description (str): The description of the coding assignment.
+
+    Returns:
+        AssignmentTemplate: The indexed template.
+    """
+    snapshot = load_repository_snapshot(repo)
+    template = AssignmentTemplate(
+        repository=repo.full_name,
+        commit_sha=snapshot.commit_sha,
+        blob_shas=dict(snapshot.blob_shas),
+        texts={path: snapshot.read_text(path) for path in select_review_files(snapshot)},
+    )
+    cache_set(
+        _template_key(assignment_description),
+        dumps_compact({
+            "repository": template.repository,
+            "commit_sha": template.commit_sha,
+            "blob_shas": template.blob_shas,
+            "texts": template.texts,
+        }),
+        required=True,
+    )
+    logger.info(
+        f"Indexed {len(template.blob_shas)} files of template {repo.full_name}@{snapshot.commit_sha}"
+    )
+    return template
+
+
+def load_assignment_template(assignment_description: str) -> Optional[AssignmentTemplate]:
+    """
+    Returns the starter repository registered for an assignment.
+
+    Args:
+        assignment_description (str): The description of the coding assignment.
+
+    Returns:
+        Optional[AssignmentTemplate]: The template, or `None` if there is none or Redis is disabled.
+    """
+    if not settings.ENABLE_REDIS:
+        return None
+    payload = cache_get(_template_key(assignment_description))
+    if payload is None:
+        return None
+    return AssignmentTemplate(**loads_compact(payload))
+
+
+def exclude_template_files(
+    template: AssignmentTemplate, file_paths: List[str], blob_shas: Dict[str, str]
+) -> List[str]:
+    """
+    Drops the files whose content is identical to a file of the template, at any path.
+
+    Args:
+        template (AssignmentTemplate): The template of the assignment.
+        file_paths (List[str]): The paths of the files to review.
+        blob_shas (Dict[str, str]): Git blob SHA of each of these files, keyed by path.
+
+    Returns:
+        List[str]: The paths of the files to review, in the same order.
+    """
+    kept = [path for path in file_paths if not template.contains_blob(blob_shas[path])]
+    if len(kept) < len(file_paths):
+        logger.info(f"Skipping {len(file_paths) - len(kept)} files unchanged from template {template.repository}")
+    return kept
+
+
+def template_review_id(template: AssignmentTemplate, file_path: str, blob_sha: str) -> str:
+    """
+    Identifies what is sent to the model for a file, for the review cache.
+
+    A file with a counterpart in the template may be sent as a diff against it
+    (see `template_review_text`), so its review depends on both contents.
+
+    Args:
+        template (AssignmentTemplate): The template of the assignment.
+        file_path (str): The path of the file.
+        blob_sha (str): The git blob SHA of the file.
+
+    Returns:
+        str: The blob SHA of the file, followed by the one of the template file, if any.
+    """
+    if file_path in template.texts:
+        return f"{blob_sha}:{template.blob_shas[file_path]}"
+    return blob_sha
+
+
+def template_review_text(template: AssignmentTemplate, file_path: str, text: str) -> str:
+    """
+    Returns what to send to the model for a file, given the template of the assignment.
+
+    A file changed from its template counterpart is sent as a unified diff against
+    it when the diff is at most `TEMPLATE_DIFF_MAX_RATIO` times the size of the file,
+    so that the review focuses on the candidate's changes. Otherwise the file is
+    sent in full.
+
+    Args:
+        template (AssignmentTemplate): The template of the assignment.
+        file_path (str): The path of the file.
+        text (str): The content of the file.
+
+    Returns:
+        str: The diff against the template, with a short explanation, or the content of the file.
+    """
+    template_text = template.texts.get(file_path)
+    if template_text is None:
+        return text
+    diff = "".join(
+        difflib.unified_diff(
+            template_text.splitlines(keepends=True),
+            text.splitlines(keepends=True),
+            fromfile=f"template/{file_path}",
+            tofile=f"submission/{file_path}",
+            n=settings.TEMPLATE_DIFF_CONTEXT_LINES,
+        )
+    )
+    if len(diff) > len(text) * settings.TEMPLATE_DIFF_MAX_RATIO:
+        return text
+    return (
+        "This file comes from the starter code of the assignment. Only the candidate's "
+        "changes are shown, as a unified diff against the starter code:\n" + diff
+    )
@@ -1,6 +1,22 @@
-from typing import List
+import codecs
+import re
+from logging import getLogger
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse
 
+logger = getLogger(__name__)
+
+TokenCounter = Callable[[str], int]
+
+_token_counters: Dict[str, TokenCounter] = {}
+
+# Lines starting a definition, e.g. `def`, `class`, `function`, `fn`, `func` or a decorator.
+_DEFINITION_PATTERN = re.compile(
+    r"\s*(?:@|(?:async\s+)?def\s|class\s|(?:export\s+)?(?:default\s+)?(?:async\s+)?function\b|"
+    r"(?:pub(?:\([^)]*\))?\s+)?(?:fn|struct|enum|impl|trait)\s|func\s|interface\s|"
+    r"(?:public|private|protected|internal|static)\s)"
+)
+
 
 def split_large_file(file_content: str, chunk_size: int) -> List[str]:
     """
@@ -35,6 +51,254 @@ def split_large_file(file_content: str, chunk_size: int) -> List[str]:
     return chunks
 
 
+def detect_encoding(head: bytes) -> Optional[str]:
+    """
+    Detects the text encoding of a file from its first bytes.
+
+    Like git, a NUL byte marks the content as binary. Content which is not valid
+    UTF-8 is treated as binary too, since it cannot be sent to the model as text.
+    A UTF-8 byte order mark is dropped when decoding.
+
+    Args:
+        head (bytes): The first bytes of the file.
+
+    Returns:
+        Optional[str]: The codec to decode the file with, or `None` if the content is binary.
+    """
+    if b"\0" in head:
+        return None
+    try:
+        # final=False tolerates a multi-byte character cut at the end of the head.
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return None
+    return "utf-8-sig" if head.startswith(codecs.BOM_UTF8) else "utf-8"
+
+
+def decode_pieces(pieces: Iterable[bytes]) -> Iterator[str]:
+    """
+    Decodes file content read in pieces, without joining them.
+
+    The encoding is detected from the first piece (see `detect_encoding`).
+
+    Args:
+        pieces (Iterable[bytes]): The content of the file, in order.
+
+    Yields:
+        str: The decoded text of each piece.
+
+    Raises:
+        UnicodeDecodeError: If the content is binary, or stops being valid text after the first piece.
+    """
+    decoder = None
+    for piece in pieces:
+        if decoder is None:
+            encoding = detect_encoding(piece)
+            if encoding is None:
+                raise UnicodeDecodeError("utf-8", piece[:1], 0, 1, "binary content")
+            decoder = codecs.getincrementaldecoder(encoding)()
+        text = decoder.decode(piece)
+        if text:
+            yield text
+    if decoder is not None:
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+
+def iter_lines(pieces: Iterable[str]) -> Iterator[str]:
+    """
+    Splits text read in pieces into lines, like `str.split("\\n")` on the whole text.
+
+    Args:
+        pieces (Iterable[str]): The text, in order.
+
+    Yields:
+        str: Each line, without its newline.
+    """
+    pending: List[str] = []
+    for piece in pieces:
+        *lines, last = piece.split("\n")
+        if lines:
+            lines[0] = "".join(pending) + lines[0]
+            pending = []
+            yield from lines
+        pending.append(last)
+    yield "".join(pending)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimates the number of tokens in a text (about four characters per token).
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return (len(text) + 3) // 4
+
+
+def register_token_counter(model_name: str, token_counter: TokenCounter) -> None:
+    """
+    Registers the tokenizer used to measure prompts sent to a model.
+
+    Args:
+        model_name (str): The name of the model, as in `settings.model_name`.
+        token_counter (TokenCounter): A function returning the number of tokens in a text.
+    """
+    _token_counters[model_name] = token_counter
+
+
+def get_token_counter(model_name: str) -> TokenCounter:
+    """
+    Returns the tokenizer of a model.
+
+    Registered tokenizers take precedence. Otherwise the model's tiktoken encoding
+    is used (`cl100k_base` for models tiktoken does not know), and if tiktoken or
+    its encoding files are not available the tokens are estimated from the length.
+
+    Args:
+        model_name (str): The name of the model, as in `settings.model_name`.
+
+    Returns:
+        TokenCounter: A function returning the number of tokens in a text.
+    """
+    if model_name in _token_counters:
+        return _token_counters[model_name]
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        token_counter = lambda text: len(encoding.encode_ordinary(text))  # noqa: E731
+    except Exception as e:
+        logger.warning(f"Tokenizer for {model_name} is not available, estimating tokens: {e}")
+        token_counter = estimate_tokens
+    _token_counters[model_name] = token_counter
+    return token_counter
+
+
+def split_by_tokens(file_content: str, max_tokens: int, count_tokens: TokenCounter) -> List[str]:
+    """
+    Splits file content into chunks of at most `max_tokens` tokens, preferring definition boundaries.
+
+    See `iter_chunks_by_tokens`, which this applies to the lines of the whole content.
+
+    Args:
+        file_content (str): The content of the file as a single string.
+        max_tokens (int): The maximum number of tokens of each chunk.
+        count_tokens (TokenCounter): The tokenizer of the model the chunks are sent to.
+
+    Returns:
+        List[str]: A list of file content chunks, each of at most `max_tokens` tokens.
+    """
+    return list(iter_chunks_by_tokens(file_content.split("\n"), max_tokens, count_tokens))
+
+
+def iter_chunks_by_tokens(
+    lines: Iterable[str], max_tokens: int, count_tokens: TokenCounter
+) -> Iterator[str]:
+    """
+    Packs lines into chunks of at most `max_tokens` tokens, preferring definition boundaries.
+
+    Lines are packed greedily. When a chunk is full, it is cut before the last
+    top-level definition (e.g. `def`, `class`, `function`) if that keeps at least
+    half of the budget, otherwise before the last nested definition, and only
+    falls back to the last line that fits. Every line is measured once, so the
+    split runs in linear time. Lines longer than the budget are cut into pieces.
+
+    Lines are consumed lazily and each chunk is yielded as soon as it is cut, so
+    only the lines of the current chunk are held, whatever the size of the file.
+
+    Args:
+        lines (Iterable[str]): The lines of the file, without their newlines (see `iter_lines`).
+        max_tokens (int): The maximum number of tokens of each chunk.
+        count_tokens (TokenCounter): The tokenizer of the model the chunks are sent to.
+
+    Yields:
+        str: The chunks, in order. An empty file yields no chunk.
+    """
+    lines_buffer, sizes = [], []
+    current_size = 0
+    top_level_cut, top_level_size, nested_cut = 0, 0, 0
+    after_decorator = False
+    chunked = False
+
+    for line, line_size in _measure_lines(lines, max_tokens, count_tokens):
+        if lines_buffer and current_size + line_size > max_tokens:
+            if top_level_cut and top_level_size >= max_tokens // 2:
+                cut = top_level_cut
+            else:
+                cut = max(top_level_cut, nested_cut) or len(lines_buffer)
+            yield "\n".join(lines_buffer[:cut])
+            chunked = True
+            lines_buffer, sizes = lines_buffer[cut:], sizes[cut:]
+            current_size = sum(sizes)
+            top_level_cut, top_level_size, nested_cut = 0, 0, 0
+            if current_size + line_size > max_tokens:
+                yield "\n".join(lines_buffer)
+                lines_buffer, sizes, current_size = [], [], 0
+
+        is_definition = _DEFINITION_PATTERN.match(line) is not None
+        if lines_buffer and is_definition and not after_decorator:
+            if line[:1].isspace():
+                nested_cut = len(lines_buffer)
+            else:
+                top_level_cut, top_level_size = len(lines_buffer), current_size
+        after_decorator = is_definition and line.lstrip().startswith("@")
+
+        lines_buffer.append(line)
+        sizes.append(line_size)
+        current_size += line_size
+
+    # An empty file is a single empty line.
+    if lines_buffer and (chunked or lines_buffer != [""]):
+        yield "\n".join(lines_buffer)
+
+
+def build_file_outline(file_content: str, max_lines: int = 60) -> str:
+    """
+    Builds a compact outline of a file from its definition lines.
+
+    The outline gives every independently reviewed chunk the context of the rest
+    of the file without resending its content.
+
+    Args:
+        file_content (str): The content of the file as a single string.
+        max_lines (int, optional): The maximum number of definitions listed. Defaults to 60.
+
+    Returns:
+        str: One ``line number: definition`` entry per line.
+    """
+    outline = []
+    for line_number, line in enumerate(file_content.split("\n"), start=1):
+        if _DEFINITION_PATTERN.match(line) and not line.lstrip().startswith("@"):
+            outline.append(f"{line_number}: {line.rstrip()[:120]}")
+            if len(outline) == max_lines:
+                outline.append("...")
+                break
+    return "\n".join(outline)
+
+
+def _measure_lines(
+    lines: Iterable[str], max_tokens: int, count_tokens: TokenCounter
+) -> Iterator[Tuple[str, int]]:
+    for line in lines:
+        # One extra token for the newline joining the line to the next one.
+        line_size = count_tokens(line) + 1
+        if line_size <= max_tokens:
+            yield line, line_size
+            continue
+        piece_length = max(1, len(line) * max_tokens // line_size)
+        for start in range(0, len(line), piece_length):
+            piece = line[start:start + piece_length]
+            yield piece, count_tokens(piece) + 1
+
+
 def clear_github_url(url: str) -> str:
     """
     Extracts the repository path from a full GitHub URL.
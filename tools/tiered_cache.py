@@ -0,0 +1,240 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from logging import getLogger
+from typing import Dict, Optional, Tuple
+
+import redis
+
+from core.config import settings
+from tools.redis_client import get_redis_client
+
+logger = getLogger(__name__)
+
+# Identifies the invalidations published by this process, which it already applied.
+_PROCESS_ID = uuid.uuid4().hex
+
+
+class LocalCache:
+    """
+    An in-process LRU cache of binary values, bounded by their total size in bytes, with a TTL per entry.
+
+    Values larger than a quarter of the budget are not kept, so that a single value
+    does not evict the whole cache. The cache is safe to use from several threads.
+
+    Attributes:
+        max_bytes (int): The budget of the keys and values held; 0 disables the cache.
+        size_bytes (int): The size of the keys and values held.
+        hits (int): Lookups which found a live entry.
+        misses (int): Lookups which found no entry, or an expired one.
+        evictions (int): Entries dropped to stay within the budget.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        size = len(key) + len(value)
+        with self._lock:
+            self._remove(key)
+            if ttl_seconds <= 0 or size > self.max_bytes // 4:
+                return
+            self._entries[key] = (value, time.monotonic() + ttl_seconds)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(key) + len(entry[0])
+
+
+_local_cache = LocalCache(settings.LOCAL_CACHE_MAX_BYTES)
+_redis_retry_at = 0.0
+_listener: Optional[threading.Thread] = None
+_listener_stop = threading.Event()
+
+
+def _redis_available(retry_now: bool = False) -> bool:
+    return settings.ENABLE_REDIS and (retry_now or time.monotonic() >= _redis_retry_at)
+
+
+def _redis_failed(error: redis.exceptions.RedisError) -> None:
+    # Skips Redis for a while instead of paying a connection timeout on every lookup.
+    global _redis_retry_at
+    _redis_retry_at = time.monotonic() + settings.CACHE_REDIS_RETRY_SECONDS
+    logger.warning(
+        f"Redis is unavailable, caching in this process only for {settings.CACHE_REDIS_RETRY_SECONDS}s: {error}"
+    )
+
+
+def cache_get(key: str) -> Optional[bytes]:
+    """
+    Returns a cached value from the in-process cache, or else from Redis.
+
+    Values read from Redis are kept in the in-process cache for at most
+    `LOCAL_CACHE_TTL_SECONDS`. When Redis is disabled or unavailable, only the
+    in-process cache is used.
+
+    Args:
+        key (str): The cache key.
+
+    Returns:
+        Optional[bytes]: The cached value, or `None` if it is missing.
+    """
+    value = _local_cache.get(key)
+    if value is not None or not _redis_available():
+        return value
+    try:
+        redis_client = get_redis_client(decode_responses=False)
+        with redis_client.pipeline(transaction=False) as pipeline:
+            value, ttl_milliseconds = pipeline.get(key).pttl(key).execute()
+    except redis.exceptions.RedisError as e:
+        _redis_failed(e)
+        return None
+    if value is not None:
+        # A negative TTL means the key does not expire.
+        ttl_seconds = ttl_milliseconds / 1000 if ttl_milliseconds >= 0 else settings.LOCAL_CACHE_TTL_SECONDS
+        _local_cache.set(key, value, min(ttl_seconds, settings.LOCAL_CACHE_TTL_SECONDS))
+    return value
+
+
+def cache_set(key: str, value: bytes, ttl_seconds: Optional[int] = None, required: bool = False) -> None:
+    """
+    Caches a value in the in-process cache and in Redis, and invalidates the key in the other processes.
+
+    Args:
+        key (str): The cache key.
+        value (bytes): The value to cache.
+        ttl_seconds (int, optional): How long the value is kept. Defaults to no expiration in Redis.
+        required (bool, optional): Raise instead of caching in this process only when Redis is
+                                   unavailable, for values other processes must see. Defaults to False.
+
+    Raises:
+        redis.exceptions.RedisError: If `required` is set and the value could not be stored in Redis.
+    """
+    local_ttl_seconds = settings.LOCAL_CACHE_TTL_SECONDS
+    if ttl_seconds is not None:
+        local_ttl_seconds = min(ttl_seconds, local_ttl_seconds)
+    _local_cache.set(key, value, local_ttl_seconds)
+    if not _redis_available(retry_now=required):
+        return
+    try:
+        redis_client = get_redis_client(decode_responses=False)
+        with redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.set(key, value, ex=ttl_seconds)
+            pipeline.publish(settings.CACHE_INVALIDATION_CHANNEL, f"{_PROCESS_ID}:{key}")
+            pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        _redis_failed(e)
+        if required:
+            _local_cache.delete(key)
+            raise
+
+
+def clear_local_cache() -> None:
+    """
+    Empties the in-process cache, e.g. between tests.
+    """
+    _local_cache.clear()
+
+
+def get_local_cache_stats() -> Dict[str, int]:
+    """
+    Returns the counters of the in-process cache of this process.
+
+    Returns:
+        Dict[str, int]: The number of ``entries``, their size in ``bytes``, and the ``hits``,
+                        ``misses`` and ``evictions``.
+    """
+    return _local_cache.stats()
+
+
+def _listen_for_invalidations() -> None:
+    while not _listener_stop.is_set():
+        try:
+            pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+                # Invalidations published while unsubscribed were missed.
+                _local_cache.clear()
+                while not _listener_stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    process_id, _, key = message["data"].partition(":")
+                    if process_id != _PROCESS_ID:
+                        _local_cache.delete(key)
+            finally:
+                pubsub.close()
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Cache invalidation listener disconnected: {e}")
+            _listener_stop.wait(settings.CACHE_REDIS_RETRY_SECONDS)
+
+
+def start_cache_invalidation() -> None:
+    """
+    Starts listening, in a background thread, to the keys other processes change, to drop them from the
+    in-process cache. Without it, values changed by other processes stay cached for up to
+    `LOCAL_CACHE_TTL_SECONDS`.
+
+    Does nothing when Redis is disabled or the listener already runs.
+    """
+    global _listener
+    if not settings.ENABLE_REDIS or (_listener is not None and _listener.is_alive()):
+        return
+    _listener_stop.clear()
+    _listener = threading.Thread(target=_listen_for_invalidations, name="cache-invalidation", daemon=True)
+    _listener.start()
+
+
+def stop_cache_invalidation() -> None:
+    """
+    Stops the listener started by `start_cache_invalidation`, on shutdown.
+    """
+    global _listener
+    _listener_stop.set()
+    if _listener is not None:
+        _listener.join(timeout=5)
+        _listener = None
@@ -0,0 +1,147 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+from tools.texts import estimate_tokens
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler summing the tokens used by every model call.
+
+    It also measures how much of the prompts could be served from a prompt cache:
+    the messages before the last one of a prompt form its prefix, and a prefix
+    already sent by an earlier call is counted as cached. Those tokens are
+    estimated, since they are measured before the call. The prompt tokens which
+    the provider reports as read from its cache are summed too, when reported.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._prefixes: Set[int] = set()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.estimated_prompt_tokens = 0
+        self.cached_prefix_tokens = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cached_prefix_ratio(self) -> float:
+        """
+        The estimated share of the prompt tokens in prefixes already sent, from 0 to 1.
+        """
+        return self.cached_prefix_tokens / self.estimated_prompt_tokens if self.estimated_prompt_tokens else 0.0
+
+    def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], **kwargs: Any
+    ) -> None:
+        for prompt in messages:
+            prefix = [str(message.content) for message in prompt[:-1]]
+            prefix_tokens = sum(estimate_tokens(text) for text in prefix)
+            prompt_tokens = prefix_tokens + sum(estimate_tokens(str(message.content)) for message in prompt[-1:])
+            key = hash(tuple((message.type, text) for message, text in zip(prompt, prefix)))
+            with self._lock:
+                self.estimated_prompt_tokens += prompt_tokens
+                if not prefix:
+                    continue
+                if key in self._prefixes:
+                    self.cached_prefix_tokens += prefix_tokens
+                else:
+                    self._prefixes.add(key)
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        prompt_tokens, completion_tokens = response_token_usage(response)
+        cached_prompt_tokens = response_cached_tokens(response)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cached_prompt_tokens += cached_prompt_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "cached_prefix_ratio": round(self.cached_prefix_ratio, 3),
+        }
+
+
+token_usage_handler_var: ContextVar[Optional[TokenUsageHandler]] = ContextVar(
+    "token_usage_handler", default=None
+)
+# Adds the handler of the current context to every LangChain run, including
+# the ones started in tasks and threads spawned from that context.
+register_configure_hook(token_usage_handler_var, inheritable=True)
+
+
+@contextmanager
+def track_token_usage() -> Iterator[TokenUsageHandler]:
+    """
+    Counts the tokens of all model calls made inside the `with` block.
+
+    Yields:
+        TokenUsageHandler: The handler accumulating the token usage.
+    """
+    handler = TokenUsageHandler()
+    token = token_usage_handler_var.set(handler)
+    try:
+        yield handler
+    finally:
+        token_usage_handler_var.reset(token)
+
+
+def response_token_usage(response: LLMResult) -> tuple[int, int]:
+    """
+    Returns the prompt and completion tokens reported by a model response.
+
+    Args:
+        response (LLMResult): The result of a model call.
+
+    Returns:
+        tuple[int, int]: The prompt tokens and the completion tokens, 0 when not reported.
+    """
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+    if not (prompt_tokens or completion_tokens):
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+def response_cached_tokens(response: LLMResult) -> int:
+    """
+    Returns the prompt tokens which the provider reports as read from its prompt cache.
+
+    Args:
+        response (LLMResult): The result of a model call.
+
+    Returns:
+        int: The cached prompt tokens, 0 when not reported.
+    """
+    cached_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+    return cached_tokens
@@ -1,34 +1,71 @@
-from typing import List
+import asyncio
+import weakref
+from typing import Any, Dict, List
 from github.Repository import Repository
-from langchain.chains.conversation.base import ConversationChain
-from langchain.memory import ConversationBufferMemory
 from logging import getLogger
 from core.config import settings
-from prompts import review_single_file_prompt, review_single_file_summary_prompt, review_one_chunk_file_prompt
-from tools.redis_client import get_redis_client
+from prompts import (
+    NO_FILE_OUTLINE,
+    NO_STATIC_FINDINGS,
+    Prompt,
+    review_chunk_map_prompt,
+    review_chunk_reduce_prompt,
+    review_one_chunk_file_prompt,
+    review_single_file_prompt,
+    review_single_file_summary_prompt,
+)
+from tools.metrics import time_stage
+from tools.rate_limit import call_github, call_model
+from tools.serialization import dumps_compact, loads_compact
+from tools.texts import build_file_outline
+from tools.tiered_cache import cache_get, cache_set
 
 logger = getLogger(__name__)
 
+# Bounds the chunk reviews of all files at once, per event loop (see `_chunk_semaphore`).
+_chunk_semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
-def process_file(
+
+def _chunk_semaphore() -> asyncio.Semaphore:
+    # Shared by every file, so that files reviewed concurrently do not each send
+    # `REVIEW_CONCURRENCY` chunks at once.
+    loop = asyncio.get_running_loop()
+    semaphore = _chunk_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _chunk_semaphores[loop] = asyncio.Semaphore(settings.REVIEW_CONCURRENCY)
+    return semaphore
+
+
+async def process_file(
     file_chunks: List[str],
     file_path: str,
     candidate_level: str,
     assignment_description: str,
+    static_findings: str = NO_STATIC_FINDINGS,
 ) -> str | None:
     """
     Processes a file in chunks and generates a review based on the file's content.
 
-    This function takes in chunks of a file, processes each chunk sequentially,
-    and generates a review or summary using a generative AI model. If the file
-    is too large, it breaks it into smaller chunks and processes each chunk
-    separately before generating a final summary.
+    This function takes in chunks of a file and generates a review or summary
+    using a generative AI model. A file made of a single chunk is reviewed with
+    one prompt. Larger files are reviewed according to `REVIEW_MODE`:
+
+    - ``map_reduce``: every chunk is reviewed independently and concurrently,
+      with the static findings of the file, or else its outline, as shared
+      context, and a final reduce prompt combines the chunk notes into the file
+      summary. At most `REVIEW_CONCURRENCY` chunks are reviewed at once over all
+      files of the process.
+    - ``conversation``: the chunks are sent one after another to a conversation
+      which keeps the whole history, before asking for the file summary.
 
     Args:
         file_chunks (List[str]): A list of file content chunks to be processed.
         file_path (str): The path of the file being reviewed.
         candidate_level (str): The candidate's level (Junior, Middle, Senior).
         assignment_description (str): The description of the coding assignment.
+        static_findings (str, optional): The digest of the static analysis of the file (see
+                                         `FileAnalysis.digest`), sent with files of one chunk and
+                                         with every chunk in ``map_reduce`` mode. Defaults to none.
 
     Returns:
         str | None: The review or summary of the file if processing is successful,
@@ -36,59 +73,207 @@ def process_file(
     """
     if not file_chunks:
         return None
+    logger.info(f"Processing file: {file_path}")
+    if settings.REVIEW_MODE == "conversation":
+        return await _process_file_conversation(
+            file_chunks, file_path, candidate_level, assignment_description, static_findings
+        )
+    return await _process_file_map_reduce(
+        file_chunks, file_path, candidate_level, assignment_description, static_findings
+    )
+
+
+async def _process_file_map_reduce(
+    file_chunks: List[str],
+    file_path: str,
+    candidate_level: str,
+    assignment_description: str,
+    static_findings: str,
+) -> str:
+    model = settings.GENERATIVE_MODEL
+    if len(file_chunks) == 1:
+        prompt = review_one_chunk_file_prompt(
+            file_content=file_chunks[0],
+            file_path=file_path,
+            candidate_level=candidate_level,
+            assignment_description=assignment_description,
+            static_findings=static_findings,
+        )
+        response = await call_model(lambda: model.ainvoke(prompt.messages), prompt.text)
+        return response.content
+
+    # The findings of analyzed files replace their outline, instead of adding to every chunk.
+    file_outline = NO_FILE_OUTLINE
+    if static_findings == NO_STATIC_FINDINGS:
+        file_outline = build_file_outline("\n".join(file_chunks))
+    semaphore = _chunk_semaphore()
+
+    async def review_chunk(i: int, chunk: str) -> str:
+        prompt = review_chunk_map_prompt(
+            file_content=chunk,
+            file_path=file_path,
+            candidate_level=candidate_level,
+            chunk_num=i + 1,
+            total_chunk_num=len(file_chunks),
+            file_outline=file_outline,
+            assignment_description=assignment_description,
+            static_findings=static_findings,
+        )
+        async with semaphore:
+            logger.info(f"Chunk {i + 1}/{len(file_chunks)}")
+            with time_stage("chunk_review"):
+                response = await call_model(lambda: model.ainvoke(prompt.messages), prompt.text)
+        return f"Chunk {i + 1}:\n{response.content}"
+
+    chunk_reviews = await asyncio.gather(
+        *(review_chunk(i, chunk) for i, chunk in enumerate(file_chunks))
+    )
+    prompt = review_chunk_reduce_prompt(
+        chunk_reviews="\n\n".join(chunk_reviews),
+        file_path=file_path,
+        candidate_level=candidate_level,
+        assignment_description=assignment_description,
+    )
+    with time_stage("chunk_reduce"):
+        file_summary = await call_model(lambda: model.ainvoke(prompt.messages), prompt.text)
+    return file_summary.content
+
+
+async def _process_file_conversation(
+    file_chunks: List[str],
+    file_path: str,
+    candidate_level: str,
+    assignment_description: str,
+    static_findings: str,
+) -> str:
+    # Imported here since langchain's chains take a noticeable part of the startup time.
+    from langchain.chains.conversation.base import ConversationChain
+    from langchain.memory import ConversationBufferMemory
+
     memory = ConversationBufferMemory()
     conversation_chain = ConversationChain(
         llm=settings.GENERATIVE_MODEL,
         memory=memory,
     )
-    logger.info(f"Processing file: {file_path}")
+
+    async def send(prompt: Prompt) -> dict:
+        # The chain takes text, and sends the whole conversation so far before it.
+        return await call_model(
+            lambda: conversation_chain.ainvoke({"input": prompt.text}), memory.buffer + prompt.text
+        )
+
     if len(file_chunks) > 1:
         for i, chunk in enumerate(file_chunks):
             logger.info(f"Chunk {i + 1}/{len(file_chunks)}")
-            conversation_chain.invoke(
-                {
-                    "input": review_single_file_prompt(
-                        file_content=chunk,
-                        file_path=file_path,
-                        candidate_level=candidate_level,
-                        chunk_num=i,
-                        total_chunk_num=len(file_chunks),
-                        assignment_description=assignment_description,
-                    )
-                }
-            )
-
-        file_summary = conversation_chain.invoke(
-            {
-                "input": review_single_file_summary_prompt(
+            await send(
+                review_single_file_prompt(
+                    file_content=chunk,
                     file_path=file_path,
                     candidate_level=candidate_level,
+                    chunk_num=i,
+                    total_chunk_num=len(file_chunks),
                     assignment_description=assignment_description,
                 )
-            }
+            )
+
+        file_summary = await send(
+            review_single_file_summary_prompt(
+                file_path=file_path,
+                candidate_level=candidate_level,
+                assignment_description=assignment_description,
+            )
         )
     else:
-        file_summary = conversation_chain.invoke(
-            {
-                "input": review_one_chunk_file_prompt(
-                    file_content=file_chunks[0],
-                    file_path=file_path,
-                    candidate_level=candidate_level,
-                    assignment_description=assignment_description,
-                )
-            }
+        file_summary = await send(
+            review_one_chunk_file_prompt(
+                file_content=file_chunks[0],
+                file_path=file_path,
+                candidate_level=candidate_level,
+                assignment_description=assignment_description,
+                static_findings=static_findings,
+            )
         )
     result = file_summary.get("response", f"Error processing file {file_path}")
     return result
 
 
+def get_head_commit_sha(repo: Repository) -> str:
+    """
+    Resolves the commit SHA at the head of the repository's default branch.
+
+    A single ref lookup is used instead of listing commits, so resolving the
+    current state of a repository costs one small API call.
+
+    Args:
+        repo (Repository): The GitHub repository object.
+
+    Returns:
+        str: The SHA of the latest commit on the default branch.
+    """
+    return call_github(repo.get_git_ref, f"heads/{repo.default_branch}").object.sha
+
+
+def get_repository_tree(repo: Repository, commit_sha: str) -> List[Dict[str, Any]]:
+    """
+    Retrieves every file (blob) of a repository at a given commit.
+
+    The whole tree is fetched with one recursive git tree call. GitHub truncates
+    very large trees, in which case the directories are walked one by one. The
+    result is cached in this process and in Redis (see `cache_get`) under the
+    commit SHA, so a cached tree never goes stale when new commits are pushed.
+
+    Args:
+        repo (Repository): The GitHub repository object.
+        commit_sha (str): The commit to list the files of.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per file with its ``path``, blob ``sha`` and ``size``.
+    """
+    cache_key = f"repo_tree:{repo.full_name}:{commit_sha}"
+    cached_tree = cache_get(cache_key)
+    if cached_tree:
+        logger.info(f"Using cached tree for repository: {repo.full_name}@{commit_sha}")
+        return [
+            {"path": path, "sha": sha, "size": size}
+            for path, sha, size in loads_compact(cached_tree)
+        ]
+
+    with time_stage("tree"):
+        tree = call_github(repo.get_git_tree, commit_sha, recursive=True)
+        if tree.raw_data.get("truncated"):
+            logger.info(f"Git tree of {repo.full_name} is truncated, walking directories")
+            entries = _walk_repository_contents(repo, "", commit_sha)
+        else:
+            entries = [
+                {"path": element.path, "sha": element.sha, "size": element.size}
+                for element in tree.tree
+                if element.type == "blob"
+            ]
+
+    payload = dumps_compact([[entry["path"], entry["sha"], entry["size"]] for entry in entries])
+    cache_set(cache_key, payload, ttl_seconds=settings.CACHE_EXPIRATION_MINUTES * 60)
+
+    return entries
+
+
+def _walk_repository_contents(repo: Repository, path: str, ref: str) -> List[Dict[str, Any]]:
+    entries = []
+    for content in call_github(repo.get_contents, path, ref=ref):
+        if content.type == "dir":
+            entries.extend(_walk_repository_contents(repo, content.path, ref))
+        elif content.type == "file":
+            entries.append({"path": content.path, "sha": content.sha, "size": content.size})
+    return entries
+
+
 def get_all_repository_paths(repo: Repository, path: str = "") -> List[str]:
     """
     Retrieves all file paths in a GitHub repository, starting from a specified path.
 
-    This function retrieves the paths of all files within a GitHub repository,
-    traversing the directory structure recursively. It supports caching the
-    paths in Redis for faster retrieval on subsequent requests.
+    This function resolves the head commit of the default branch with one cheap
+    ref lookup, lists its files with `get_repository_tree` and keeps the ones
+    located under ``path``. The tree is cached in Redis per commit, so repeated
+    calls are fast and still reflect the latest push.
 
     Args:
         repo (Repository): The GitHub repository object.
@@ -101,24 +286,6 @@ def get_all_repository_paths(repo: Repository, path: str = "") -> List[str]:
     Raises:
         Exception: If there are issues retrieving the repository contents or processing the paths.
     """
-    if settings.ENABLE_REDIS:
-        redis_client = get_redis_client()
-        cache_key = f"repo_paths:{repo.full_name}"
-
-        cached_paths = redis_client.get(cache_key)
-        if cached_paths:
-            logger.info(f"Using cached paths for repository: {repo.full_name}")
-            return eval(cached_paths)
-
-    paths = []
-    contents = repo.get_contents(path)
-    for content in contents:
-        if content.type == "dir":
-            paths.extend(get_all_repository_paths(repo, content.path))
-        else:
-            paths.append(content.path)
-
-    if settings.ENABLE_REDIS:
-        redis_client.set(cache_key, str(paths), ex=settings.CACHE_EXPIRATION_MINUTES * 60)
-
-    return paths
+    prefix = f"{path.strip('/')}/" if path.strip("/") else ""
+    tree = get_repository_tree(repo, get_head_commit_sha(repo))
+    return [entry["path"] for entry in tree if entry["path"].startswith(prefix)]
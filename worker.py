@@ -0,0 +1,17 @@
+import asyncio
+
+from tools.clients import close_clients
+from tools.review_queue import run_worker
+from tools.tiered_cache import start_cache_invalidation
+
+
+async def main():
+    start_cache_invalidation()
+    try:
+        await run_worker()
+    finally:
+        await close_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())